@@ -0,0 +1,89 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Snapshot of the global inputs of boot configurations.
+
+Most of the work of `maasserver.rpc.boot.get_config` does not depend on the
+machine that is booting: the configuration items, the boot resources and
+the addresses of the rack controllers are the same for every request of
+every machine's boot chain. Each regiond process keeps these in the current
+`BootConfigSnapshot`, so that they're only looked up once.
+
+The database triggers send a notification on the 'sys_bootsnapshot' channel
+once a change to any of them is committed, and the current snapshot is then
+discarded. A request gets the current snapshot before starting its
+transaction, so that it sees every change whose notification was received
+before. If a notification is received during the request, the snapshot it
+has is discarded, and what it adds to it is never used again.
+
+Snapshots are only kept while notifications are being received. Otherwise
+each request gets a snapshot of its own, and looks everything up.
+"""
+
+__all__ = ["boot_config_snapshots", "BootConfigSnapshot"]
+
+import threading
+
+from maasserver.listener import ListenerSubscriber
+
+
+class BootConfigSnapshot:
+    """Values worked out from the global inputs of boot configurations.
+
+    Values are shared between requests, which must not modify them.
+    """
+
+    def __init__(self):
+        self._values = {}
+
+    def get(self, func, *args):
+        """Return the value of `func(*args)`, calling it the first time.
+
+        `func` is called in a transaction, and must only depend on the
+        global inputs of boot configurations and `args`.
+        """
+        key = func, args
+        try:
+            return self._values[key]
+        except KeyError:
+            value = self._values[key] = func(*args)
+            return value
+
+
+class BootConfigSnapshots(ListenerSubscriber):
+    """The current `BootConfigSnapshot`, discarded on notifications.
+
+    See the module documentation for how it's kept up to date.
+    """
+
+    channel = "sys_bootsnapshot"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._current = None
+        self.enabled = False
+
+    def current(self):
+        """Return the current snapshot.
+
+        Must be called before starting the transaction the snapshot is used
+        in.
+        """
+        with self._lock:
+            if not self.enabled:
+                return BootConfigSnapshot()
+            if self._current is None:
+                self._current = BootConfigSnapshot()
+            return self._current
+
+    def clear(self):
+        """Discard the current snapshot."""
+        with self._lock:
+            self._current = None
+
+    def on_notify(self, channel, payload):
+        """Called when the 'sys_bootsnapshot' message is received."""
+        self.clear()
+
+
+boot_config_snapshots = BootConfigSnapshots()
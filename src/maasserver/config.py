@@ -5,7 +5,7 @@
 
 __all__ = ["RegionConfiguration"]
 
-from formencode.validators import Int
+from formencode.validators import Int, Number
 from provisioningserver.config import (
     Configuration,
     ConfigurationFile,
@@ -97,6 +97,64 @@ class RegionConfiguration(Configuration, metaclass=RegionConfigurationMeta):
         Int(if_missing=4, accept_python=False, min=1),
     )
 
+    # Websocket options.
+    websocket_notify_window = ConfigurationOption(
+        "websocket_notify_window",
+        "Time (in seconds) over which websocket notifications for the same "
+        "object are coalesced. Set to 0 to send every notification.",
+        Number(if_missing=0.5, accept_python=False, min=0),
+    )
+    websocket_notify_delta_objects = ConfigurationOption(
+        "websocket_notify_delta_objects",
+        "Number of objects per websocket connection whose last notified "
+        "data is kept to send updates as deltas. Objects notified least "
+        "recently are then sent in full.",
+        Int(if_missing=1000, accept_python=False, min=0),
+    )
+    websocket_compression = ConfigurationOption(
+        "websocket_compression",
+        "Compress websocket messages with permessage-deflate when the "
+        "browser supports it.",
+        OneWayStringBool(if_missing=True),
+    )
+    websocket_compression_window_bits = ConfigurationOption(
+        "websocket_compression_window_bits",
+        "Base two logarithm of the LZ77 window used to compress websocket "
+        "messages. Smaller windows use less memory per connection.",
+        Int(if_missing=15, accept_python=False, min=9, max=15),
+    )
+    websocket_compression_threshold = ConfigurationOption(
+        "websocket_compression_threshold",
+        "Size (in bytes) from which websocket messages are compressed.",
+        Int(if_missing=256, accept_python=False, min=0),
+    )
+    websocket_slow_call_budget = ConfigurationOption(
+        "websocket_slow_call_budget",
+        "Time (in seconds) above which a websocket call is logged as slow, "
+        "with its slowest queries. Set to 0 to never log.",
+        Number(if_missing=2, accept_python=False, min=0),
+    )
+    websocket_slow_call_queries = ConfigurationOption(
+        "websocket_slow_call_queries",
+        "Number of queries included when logging a slow websocket call.",
+        Int(if_missing=5, accept_python=False, min=0),
+    )
+
+    # DNS options.
+    dns_incremental_updates = ConfigurationOption(
+        "dns_incremental_updates",
+        "Send changes to address records to BIND as dynamic updates, "
+        "rather than rewriting and reloading every zone.",
+        OneWayStringBool(if_missing=False),
+    )
+    dns_zone_writer_processes = ConfigurationOption(
+        "dns_zone_writer_processes",
+        "Number of processes the region starts to render and write zone "
+        "files in. Set to 0 for one per CPU, or 1 to write them in the "
+        "region itself.",
+        Int(if_missing=1, accept_python=False, min=0),
+    )
+
     # Debug options.
     debug = ConfigurationOption(
         "debug",
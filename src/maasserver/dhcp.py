@@ -427,12 +427,14 @@ def make_subnet_config(
     failover_peer=None,
     subnets_dhcp_snippets: list = None,
     peer_rack=None,
+    cache=None,
 ):
     """Return DHCP subnet configuration dict for a rack interface.
 
     :param ntp_servers: Either a list of NTP server addresses or hostnames to
         include in DHCP responses, or a dict; if the latter, it ought to match
         the output from `get_ntp_server_addresses_for_rack`.
+    :param cache: A `DHCPConfigurationCache` to get the pools from.
     """
     ip_network = subnet.get_ipnetwork()
     if subnet.dns_servers is not None and len(subnet.dns_servers) > 0:
@@ -454,7 +456,11 @@ def make_subnet_config(
         "dns_servers": dns_servers,
         "ntp_servers": get_ntp_servers(ntp_servers, subnet, peer_rack),
         "domain_name": default_domain.name,
-        "pools": make_pools_for_subnet(subnet, failover_peer),
+        "pools": (
+            make_pools_for_subnet(subnet, failover_peer)
+            if cache is None
+            else cache.get_pools_for_subnet(subnet, failover_peer)
+        ),
         "dhcp_snippets": [
             make_dhcp_snippet(dhcp_snippet)
             for dhcp_snippet in subnets_dhcp_snippets
@@ -516,16 +522,9 @@ def get_ntp_servers(ntp_servers, subnet, peer_rack):
         return ntp_servers
 
 
-@typed
-def get_dns_server_addresses_for_rack(
-    rack_controller: RackController, subnet: Subnet
-) -> dict:
-    """Return a map of IP addresses suitable for DNS on subnet.
-
-    This will define a list of IP addresses across all rack controllers that
-    exist on `subnet`. The `rack_controller` will always be the first in the
-    list followed by other rack controllers that are also on the subnet.
-    """
+def get_rack_addresses_on_subnet(subnet):
+    """Return `(ip, node_id)` tuples of the addresses of all the rack
+    controllers on `subnet`."""
     addresses = StaticIPAddress.objects.filter(
         subnet=subnet,
         alloc_type__in={IPADDRESS_TYPE.STICKY, IPADDRESS_TYPE.USER_RESERVED},
@@ -536,7 +535,25 @@ def get_dns_server_addresses_for_rack(
         },
     )
     addresses = addresses.distinct()
-    addresses = addresses.values_list("ip", "interface__node_id")
+    return list(addresses.values_list("ip", "interface__node_id"))
+
+
+@typed
+def get_dns_server_addresses_for_rack(
+    rack_controller: RackController, subnet: Subnet, cache=None
+) -> dict:
+    """Return a map of IP addresses suitable for DNS on subnet.
+
+    This will define a list of IP addresses across all rack controllers that
+    exist on `subnet`. The `rack_controller` will always be the first in the
+    list followed by other rack controllers that are also on the subnet.
+
+    :param cache: A `DHCPConfigurationCache` to get the addresses from.
+    """
+    if cache is None:
+        addresses = get_rack_addresses_on_subnet(subnet)
+    else:
+        addresses = cache.get_rack_addresses_on_subnet(subnet)
 
     def sort_key__rack__ip(record):
         ip, node_id = record
@@ -548,7 +565,9 @@ def get_dns_server_addresses_for_rack(
     ]
 
 
-def get_default_dns_servers(rack_controller, subnet, use_rack_proxy=True):
+def get_default_dns_servers(
+    rack_controller, subnet, use_rack_proxy=True, cache=None
+):
     """Calculates the DNS servers on a per-subnet basis, to make sure we
     choose the best possible IP addresses for each subnet.
 
@@ -556,6 +575,7 @@ def get_default_dns_servers(rack_controller, subnet, use_rack_proxy=True):
     :param subnet: The DHCP-managed subnet.
     :param use_rack_proxy: Whether to proxy DNS through the rack controller
       or not.
+    :param cache: A `DHCPConfigurationCache` shared with other racks.
     """
     ip_version = subnet.get_ip_version()
     try:
@@ -573,7 +593,9 @@ def get_default_dns_servers(rack_controller, subnet, use_rack_proxy=True):
     if use_rack_proxy:
         # Add the IP address for the rack controllers on the subnet before the
         # region DNS servers.
-        rack_ips = get_dns_server_addresses_for_rack(rack_controller, subnet)
+        rack_ips = get_dns_server_addresses_for_rack(
+            rack_controller, subnet, cache
+        )
         if dns_servers:
             dns_servers = rack_ips + [
                 server for server in dns_servers if server not in rack_ips
@@ -595,8 +617,13 @@ def get_dhcp_configure_for(
     search_list=None,
     dhcp_snippets: Iterable = None,
     use_rack_proxy=True,
+    cache=None,
 ):
-    """Get the DHCP configuration for `ip_version`."""
+    """Get the DHCP configuration for `ip_version`.
+
+    :param cache: A `DHCPConfigurationCache` holding the parts of the
+        configuration that are the same for every rack controller.
+    """
     # Select the best interface for this VLAN. This is an interface that
     # at least has an IP address.
     interfaces = get_interfaces_with_ip_on_vlan(
@@ -632,7 +659,7 @@ def get_dhcp_configure_for(
     subnet_configs = []
     for subnet in subnets:
         maas_dns_servers = get_default_dns_servers(
-            rack_controller, subnet, use_rack_proxy
+            rack_controller, subnet, use_rack_proxy, cache
         )
         subnet_configs.append(
             make_subnet_config(
@@ -645,11 +672,15 @@ def get_dhcp_configure_for(
                 peer_name,
                 subnets_dhcp_snippets,
                 peer_rack,
+                cache,
             )
         )
 
     # Generate the hosts for all subnets.
-    hosts = make_hosts_for_subnets(subnets, nodes_dhcp_snippets)
+    if cache is None:
+        hosts = make_hosts_for_subnets(subnets, nodes_dhcp_snippets)
+    else:
+        hosts = cache.get_hosts_for_subnets(subnets, nodes_dhcp_snippets)
     return (
         peer_config,
         sorted(subnet_configs, key=itemgetter("subnet")),
@@ -658,28 +689,16 @@ def get_dhcp_configure_for(
     )
 
 
-@synchronous
-@transactional
-def get_dhcp_configuration(rack_controller, test_dhcp_snippet=None):
-    """Return tuple with IPv4 and IPv6 configurations for the
-    rack controller."""
-    # Get list of all vlans that are being managed by the rack controller.
-    vlans = gen_managed_vlans_for(rack_controller)
-
-    # Group the subnets on each VLAN into IPv4 and IPv6 subnets.
-    vlan_subnets = {
-        vlan: split_managed_ipv4_ipv6_subnets(vlan.subnet_set.all())
-        for vlan in vlans
-    }
-
+def get_dhcp_snippets(test_dhcp_snippet=None):
+    """Return the enabled DHCP snippets, with `test_dhcp_snippet` in place
+    of the snippet it modifies, if given."""
     # Get the list of all DHCP snippets so we only have to query the database
     # 1 + (the number of DHCP snippets used in this VLAN) instead of
     # 1 + (the number of subnets in this VLAN) +
     #     (the number of nodes in this VLAN)
-    dhcp_snippets = DHCPSnippet.objects.filter(enabled=True)
+    dhcp_snippets = list(DHCPSnippet.objects.filter(enabled=True))
     # If we're testing a DHCP Snippet insert it into our list
     if test_dhcp_snippet is not None:
-        dhcp_snippets = list(dhcp_snippets)
         replaced_snippet = False
         # If its an existing DHCPSnippet with its contents being modified
         # replace it with the new values and test
@@ -692,33 +711,41 @@ def get_dhcp_configuration(rack_controller, test_dhcp_snippet=None):
         # disabled snippet
         if not replaced_snippet:
             dhcp_snippets.append(test_dhcp_snippet)
+    return dhcp_snippets
+
+
+DHCPSharedConfiguration = namedtuple(
+    "DHCPSharedConfiguration",
+    (
+        "dhcp_snippets",
+        "global_dhcp_snippets",
+        "use_rack_proxy",
+        "ntp_external_only",
+        "ntp_servers",
+        "default_domain",
+        "search_list",
+        "omapi_key",
+    ),
+)
+
+
+def get_shared_dhcp_configuration(test_dhcp_snippet=None):
+    """Return the settings of the DHCP configuration that are the same for
+    every rack controller."""
+    dhcp_snippets = get_dhcp_snippets(test_dhcp_snippet)
     global_dhcp_snippets = [
         make_dhcp_snippet(dhcp_snippet)
         for dhcp_snippet in dhcp_snippets
         if dhcp_snippet.node is None and dhcp_snippet.subnet is None
     ]
 
-    # Configure both DHCPv4 and DHCPv6 on the rack controller.
-    failover_peers_v4 = []
-    shared_networks_v4 = []
-    hosts_v4 = []
-    interfaces_v4 = set()
-    failover_peers_v6 = []
-    shared_networks_v6 = []
-    hosts_v6 = []
-    interfaces_v6 = set()
-
-    # DNS can either go through the rack controller or directly to the
-    # region controller.
-    use_rack_proxy = Config.objects.get_config("use_rack_proxy")
-
     # NTP configuration can get tricky...
     ntp_external_only = Config.objects.get_config("ntp_external_only")
     if ntp_external_only:
         ntp_servers = Config.objects.get_config("ntp_servers")
         ntp_servers = list(split_string_list(ntp_servers))
     else:
-        ntp_servers = get_ntp_server_addresses_for_rack(rack_controller)
+        ntp_servers = None
 
     default_domain = Domain.objects.get_default_domain()
     search_list = [default_domain.name] + [
@@ -726,6 +753,118 @@ def get_dhcp_configuration(rack_controller, test_dhcp_snippet=None):
         for name in sorted(get_dns_search_paths())
         if name != default_domain.name
     ]
+    return DHCPSharedConfiguration(
+        dhcp_snippets,
+        global_dhcp_snippets,
+        # DNS can either go through the rack controller or directly to the
+        # region controller.
+        Config.objects.get_config("use_rack_proxy"),
+        ntp_external_only,
+        ntp_servers,
+        default_domain,
+        search_list,
+        get_omapi_key(),
+    )
+
+
+class DHCPConfigurationCache:
+    """The parts of the DHCP configuration that are the same for every rack
+    controller.
+
+    Primary and secondary rack controllers on a VLAN serve the same pools
+    and host reservations, and all of them share the snippets and settings.
+    Passing the same cache to `get_dhcp_configuration` for each rack
+    controller computes these only once. A cache must be discarded as soon
+    as any of the DHCP configuration may have changed.
+    """
+
+    def __init__(self, test_dhcp_snippet=None):
+        self.test_dhcp_snippet = test_dhcp_snippet
+        self._shared = None
+        self._hosts = {}
+        self._pools = {}
+        self._rack_addresses = {}
+
+    def get_shared_configuration(self):
+        """Return the `DHCPSharedConfiguration`."""
+        if self._shared is None:
+            self._shared = get_shared_dhcp_configuration(
+                self.test_dhcp_snippet
+            )
+        return self._shared
+
+    def get_hosts_for_subnets(self, subnets, nodes_dhcp_snippets):
+        """See `make_hosts_for_subnets`."""
+        key = tuple(subnet.id for subnet in subnets)
+        if key not in self._hosts:
+            self._hosts[key] = make_hosts_for_subnets(
+                subnets, nodes_dhcp_snippets
+            )
+        return self._hosts[key]
+
+    def get_pools_for_subnet(self, subnet, failover_peer=None):
+        """See `make_pools_for_subnet`."""
+        if subnet.id not in self._pools:
+            self._pools[subnet.id] = make_pools_for_subnet(subnet)
+        pools = [dict(pool) for pool in self._pools[subnet.id]]
+        if failover_peer is not None:
+            for pool in pools:
+                pool["failover_peer"] = failover_peer
+        return pools
+
+    def get_rack_addresses_on_subnet(self, subnet):
+        """See `get_rack_addresses_on_subnet`."""
+        if subnet.id not in self._rack_addresses:
+            self._rack_addresses[subnet.id] = get_rack_addresses_on_subnet(
+                subnet
+            )
+        return self._rack_addresses[subnet.id]
+
+
+@synchronous
+@transactional
+def get_dhcp_configuration(
+    rack_controller, test_dhcp_snippet=None, cache=None
+):
+    """Return tuple with IPv4 and IPv6 configurations for the
+    rack controller.
+
+    :param cache: A `DHCPConfigurationCache` shared with the other rack
+        controllers being configured. It is not used when testing
+        `test_dhcp_snippet`.
+    """
+    if cache is None or test_dhcp_snippet is not None:
+        cache = DHCPConfigurationCache(test_dhcp_snippet)
+    shared = cache.get_shared_configuration()
+
+    # Get list of all vlans that are being managed by the rack controller.
+    vlans = gen_managed_vlans_for(rack_controller)
+
+    # Group the subnets on each VLAN into IPv4 and IPv6 subnets.
+    vlan_subnets = {
+        vlan: split_managed_ipv4_ipv6_subnets(vlan.subnet_set.all())
+        for vlan in vlans
+    }
+
+    # Configure both DHCPv4 and DHCPv6 on the rack controller.
+    failover_peers_v4 = []
+    shared_networks_v4 = []
+    hosts_v4 = []
+    interfaces_v4 = set()
+    failover_peers_v6 = []
+    shared_networks_v6 = []
+    hosts_v6 = []
+    interfaces_v6 = set()
+
+    if shared.ntp_external_only:
+        ntp_servers = shared.ntp_servers
+    else:
+        ntp_servers = get_ntp_server_addresses_for_rack(rack_controller)
+
+    dhcp_snippets = shared.dhcp_snippets
+    use_rack_proxy = shared.use_rack_proxy
+    default_domain = shared.default_domain
+    search_list = shared.search_list
     for vlan, (subnets_v4, subnets_v6) in vlan_subnets.items():
         # IPv4
         if len(subnets_v4) > 0:
@@ -739,6 +878,7 @@ def get_dhcp_configuration(rack_controller, test_dhcp_snippet=None):
                 search_list=search_list,
                 dhcp_snippets=dhcp_snippets,
                 use_rack_proxy=use_rack_proxy,
+                cache=cache,
             )
             failover_peer, subnets, hosts, interface = config
             if failover_peer is not None:
@@ -765,6 +905,7 @@ def get_dhcp_configuration(rack_controller, test_dhcp_snippet=None):
                 search_list=search_list,
                 dhcp_snippets=dhcp_snippets,
                 use_rack_proxy=use_rack_proxy,
+                cache=cache,
             )
             failover_peer, subnets, hosts, interface = config
             if failover_peer is not None:
@@ -794,8 +935,8 @@ def get_dhcp_configuration(rack_controller, test_dhcp_snippet=None):
         shared_networks_v6,
         hosts_v6,
         interfaces_v6,
-        get_omapi_key(),
-        global_dhcp_snippets,
+        shared.omapi_key,
+        shared.global_dhcp_snippets,
     )
 
 
@@ -818,9 +959,11 @@ DHCPConfigurationForRack = namedtuple(
 
 @asynchronous
 @inlineCallbacks
-def configure_dhcp(rack_controller):
+def configure_dhcp(rack_controller, cache=None):
     """Write the DHCP configuration files and restart the DHCP servers.
 
+    :param cache: A `DHCPConfigurationCache` shared with the other rack
+        controllers being configured.
     :raises: :py:class:`~.exceptions.NoConnectionsAvailable` when there
         are no open connections to the specified cluster controller.
     """
@@ -836,7 +979,9 @@ def configure_dhcp(rack_controller):
     client = yield getClientFor(rack_controller.system_id)
 
     # Get configuration for both IPv4 and IPv6.
-    config = yield deferToDatabase(get_dhcp_configuration, rack_controller)
+    config = yield deferToDatabase(
+        get_dhcp_configuration, rack_controller, cache=cache
+    )
 
     # Fix interfaces to go over the wire.
     interfaces_v4 = [{"name": name} for name in config.interfaces_v4]
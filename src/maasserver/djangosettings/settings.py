@@ -49,6 +49,26 @@ DEBUG = False
 DEBUG_QUERIES = False
 DEBUG_HTTP = False
 
+# Time (in seconds) over which websocket notifications for the same object
+# are coalesced.
+WEBSOCKET_NOTIFY_WINDOW = 0.5
+
+# Number of objects per websocket connection whose last notified data is
+# kept, so that updates to them can be sent as deltas.
+WEBSOCKET_NOTIFY_DELTA_OBJECTS = 1000
+
+# Compression of websocket messages with permessage-deflate: whether it's
+# enabled, the LZ77 window bits and the size (in bytes) from which messages
+# are compressed.
+WEBSOCKET_COMPRESSION = True
+WEBSOCKET_COMPRESSION_WINDOW_BITS = 15
+WEBSOCKET_COMPRESSION_THRESHOLD = 256
+
+# Time (in seconds) above which a websocket call is logged as slow, and the
+# number of its slowest queries included in the log. 0 disables the log.
+WEBSOCKET_SLOW_CALL_BUDGET = 2
+WEBSOCKET_SLOW_CALL_QUERIES = 5
+
 # The following specify named URL patterns.
 LOGOUT_URL = "logout"
 LOGIN_REDIRECT_URL = "index"
@@ -63,6 +83,14 @@ USE_X_FORWARDED_HOST = True
 # machinery. TODO: Use the signals manager instead.
 DNS_CONNECT = True
 
+# Should changes to DNS address records be sent to BIND as dynamic updates,
+# rather than rewriting and reloading all zones?
+DNS_INCREMENTAL_UPDATES = False
+
+# How many processes should the region start to render and write zone files
+# in? 0 means one per CPU, and 1 that they're written in the region itself.
+DNS_ZONE_WRITER_PROCESSES = 1
+
 # Should the DHCP features be enabled?  Having this config option is a
 # debugging/testing feature to be able to quickly disconnect the DNS
 # machinery. TODO: Use the signals manager instead.
@@ -120,6 +148,19 @@ try:
         DEBUG = config.debug
         DEBUG_QUERIES = config.debug_queries
         DEBUG_HTTP = config.debug_http
+        WEBSOCKET_NOTIFY_WINDOW = config.websocket_notify_window
+        WEBSOCKET_NOTIFY_DELTA_OBJECTS = config.websocket_notify_delta_objects
+        WEBSOCKET_COMPRESSION = config.websocket_compression
+        WEBSOCKET_COMPRESSION_WINDOW_BITS = (
+            config.websocket_compression_window_bits
+        )
+        WEBSOCKET_COMPRESSION_THRESHOLD = (
+            config.websocket_compression_threshold
+        )
+        WEBSOCKET_SLOW_CALL_BUDGET = config.websocket_slow_call_budget
+        WEBSOCKET_SLOW_CALL_QUERIES = config.websocket_slow_call_queries
+        DNS_INCREMENTAL_UPDATES = config.dns_incremental_updates
+        DNS_ZONE_WRITER_PROCESSES = config.dns_zone_writer_processes
         if DEBUG_QUERIES and not DEBUG:
             # For debug queries to work debug most also be on, so Django will
             # track the queries made.
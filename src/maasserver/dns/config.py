@@ -6,6 +6,7 @@
 __all__ = ["dns_force_reload", "dns_update_all_zones"]
 
 from collections import defaultdict
+import time
 
 from django.conf import settings
 from maasserver.dns.zonegenerator import (
@@ -22,17 +23,55 @@ from maasserver.models.node import RackController
 from maasserver.models.subnet import Subnet
 from netaddr import IPAddress
 from provisioningserver.dns.actions import (
+    bind_freeze_zones,
     bind_reload,
     bind_reload_with_retries,
+    bind_reload_zones,
+    bind_reload_zones_with_retries,
+    bind_remove_journals,
+    bind_thaw_zones,
+    bind_update_zone,
     bind_write_configuration,
     bind_write_options,
     bind_write_zones,
+    DNS_UPDATE_MAX_SIZE,
+    get_zone_update_size,
 )
 from provisioningserver.logger import get_maas_logger
 
 
 maaslog = get_maas_logger("dns")
 
+# Above this many changed records, rewriting the zone files is cheaper than
+# sending dynamic updates.
+DNS_INCREMENTAL_UPDATE_LIMIT = 2000
+
+# The source of the DNS publication that asks for all zones to be rewritten.
+DNS_FORCE_RELOAD_SOURCE = "Force reload"
+
+
+class PublishedZones:
+    """The zones last published to this region controller's BIND.
+
+    Used to only send the changed records, as dynamic updates, when
+    `DNS_INCREMENTAL_UPDATES` is set, and otherwise to only rewrite and
+    reload the zones whose content has changed.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        """Forget what was published; the next update rewrites all zones."""
+        self.structure = None
+        self.records = {}
+        self.serial = None
+        self.options = None
+        self.fingerprints = {}
+
+
+published_zones = PublishedZones()
+
 
 def current_zone_serial():
     return "%0.10d" % DNSPublication.objects.get_most_recent().serial
@@ -45,19 +84,54 @@ def is_dns_enabled():
 
 def dns_force_reload():
     """Force the DNS to be regenerated."""
-    DNSPublication(source="Force reload").save()
+    DNSPublication(source=DNS_FORCE_RELOAD_SOURCE).save()
+
+
+def is_dns_reload_forced(since_serial, serial):
+    """Has all of the DNS been asked to be regenerated since `since_serial`?
+
+    This is the case after `dns_force_reload`, or when the serial has been
+    set back.
+    """
+    if int(serial) < since_serial:
+        return True
+    return DNSPublication.objects.filter(
+        serial__gt=since_serial, source=DNS_FORCE_RELOAD_SOURCE
+    ).exists()
 
 
-def dns_update_all_zones(reload_retry=False, reload_timeout=2):
+def dns_update_all_zones(
+    reload_retry=False, reload_timeout=2, zone_timings=None
+):
     """Update all zone files for all domains.
 
     Serving these zone files means updating BIND's configuration to include
     them, then asking it to load the new configuration.
 
+    Once all zones have been written, only the zones whose content has
+    changed since are rewritten, with the new serial, and reloaded. Only
+    those zones are then returned.
+    When the set of zones or BIND's options change, all zones are written
+    again and BIND's configuration reloaded.
+
+    When `DNS_INCREMENTAL_UPDATES` is set, and only address records have
+    changed since the last update, the changes are instead sent to BIND as
+    dynamic updates (RFC 2136) to the affected zones. Only those zones are
+    then returned.
+
+    Either way, all zones are written again after `dns_force_reload`, or
+    when the serial has been set back.
+
     :param reload_retry: Should the DNS server reload be retried in case
         of failure? Defaults to `False`.
     :type reload_retry: bool
+    :param zone_timings: A dict in which to record the seconds it took to
+        update each of the zones updated one by one, by zone name.
+    :type zone_timings: dict
+    :return: A `(serial, reloaded, zone_names)` tuple.
     """
+    if zone_timings is not None:
+        zone_timings.clear()
     if not is_dns_enabled():
         return
 
@@ -72,7 +146,58 @@ def dns_update_all_zones(reload_retry=False, reload_timeout=2):
         serial,
         internal_domains=[get_internal_domain()],
     ).as_list()
+    upstream_dns = get_upstream_dns()
+    dnssec_validation = get_dnssec_validation()
+    trusted_networks = get_trusted_networks()
+
+    if published_zones.serial is not None and is_dns_reload_forced(
+        published_zones.serial, serial
+    ):
+        published_zones.clear()
+
+    incremental = settings.DNS_INCREMENTAL_UPDATES
+    if incremental:
+        structure = get_zones_structure(
+            zones, upstream_dns, dnssec_validation, trusted_networks
+        )
+        records = get_zones_records(zones)
+        updated = dns_update_zones_incrementally(
+            zones, structure, records, timeout=reload_timeout
+        )
+        if updated is not None:
+            published_zones.serial = int(serial)
+            return serial, True, updated
+        # BIND journals dynamic updates; have it write them to the zone
+        # files, and stop accepting more, before the files are replaced.
+        published_zones.clear()
+        bind_freeze_zones(timeout=reload_timeout)
+    else:
+        options = (
+            tuple(upstream_dns),
+            dnssec_validation,
+            frozenset(trusted_networks),
+        )
+        fingerprints = get_zones_fingerprints(zones)
+        changed = get_changed_zones(fingerprints, options)
+        if changed is not None:
+            reloaded, timings = dns_update_changed_zones(
+                zones,
+                changed,
+                reload_retry=reload_retry,
+                reload_timeout=reload_timeout,
+            )
+            if zone_timings is not None:
+                zone_timings.update(timings)
+            if reloaded:
+                published_zones.serial = int(serial)
+                published_zones.fingerprints = fingerprints
+            else:
+                published_zones.clear()
+            return serial, reloaded, changed
+
     bind_write_zones(zones)
+    if incremental:
+        bind_remove_journals(zones)
 
     # We should not be calling bind_write_options() here; call-sites should be
     # making a separate call. It's a historical legacy, where many sites now
@@ -80,15 +205,16 @@ def dns_update_all_zones(reload_retry=False, reload_timeout=2):
     # some that call it for this side-effect alone. At present all it does is
     # set the upstream DNS servers, nothing to do with serving zones at all!
     bind_write_options(
-        upstream_dns=get_upstream_dns(),
-        dnssec_validation=get_dnssec_validation(),
+        upstream_dns=upstream_dns, dnssec_validation=dnssec_validation
     )
 
     # Nor should we be rewriting ACLs that are related only to allowing
     # recursive queries to the upstream DNS servers. Again, this is legacy,
     # where the "trusted" ACL ended up in the same configuration file as the
     # zone stanzas, and so both need to be rewritten at the same time.
-    bind_write_configuration(zones, trusted_networks=get_trusted_networks())
+    bind_write_configuration(
+        zones, trusted_networks=trusted_networks, dynamic_updates=incremental
+    )
 
     # Reloading with retries may be a legacy from Celery days, or it may be
     # necessary to recover from races during start-up. We're not sure if it is
@@ -99,10 +225,160 @@ def dns_update_all_zones(reload_retry=False, reload_timeout=2):
     else:
         reloaded = bind_reload(timeout=reload_timeout)
 
+    if incremental:
+        bind_thaw_zones(timeout=reload_timeout)
+        if reloaded:
+            published_zones.serial = int(serial)
+            published_zones.structure = structure
+            published_zones.records = records
+    elif reloaded:
+        published_zones.serial = int(serial)
+        published_zones.options = options
+        published_zones.fingerprints = fingerprints
+    else:
+        published_zones.clear()
+
     # Return the current serial and list of domain names.
     return serial, reloaded, [domain.name for domain in domains]
 
 
+def get_zones_fingerprints(zones):
+    """Return the fingerprints of the content of `zones`, by zone name."""
+    fingerprints = {}
+    for zone in zones:
+        fingerprints.update(zone.get_fingerprints())
+    return fingerprints
+
+
+def get_changed_zones(fingerprints, options):
+    """Return the names of the zones whose content has changed since they
+    were last published.
+
+    :param fingerprints: The fingerprints of the zones, by zone name.
+    :param options: BIND's options and trusted networks.
+    :return: A sorted list of zone names, or `None` if all zones need to be
+        written: nothing has been published yet, or zones have been added
+        or removed, or the options have changed.
+    """
+    if published_zones.options is None:
+        return None
+    if options != published_zones.options:
+        return None
+    if fingerprints.keys() != published_zones.fingerprints.keys():
+        return None
+    return sorted(
+        zone_name
+        for zone_name, fingerprint in fingerprints.items()
+        if fingerprint != published_zones.fingerprints[zone_name]
+    )
+
+
+def dns_update_changed_zones(
+    zones, zone_names, reload_retry=False, reload_timeout=2
+):
+    """Rewrite the zones named in `zone_names`, and reload each of them.
+
+    :param reload_retry: Should the reload of each zone be retried in case
+        of failure? Defaults to `False`.
+    :return: A `(reloaded, timings)` tuple, where `timings` maps each of
+        the zone names to the seconds it took to write and reload it.
+    """
+    zones_by_name = {
+        zone_info.zone_name: zone
+        for zone in zones
+        for zone_info in zone.zone_info
+    }
+    reloaded, timings = True, {}
+    for zone_name in zone_names:
+        start = time.monotonic()
+        bind_write_zones([zones_by_name[zone_name]], zone_names={zone_name})
+        if reload_retry:
+            zone_reloaded = bind_reload_zones_with_retries(
+                zone_name, timeout=reload_timeout
+            )
+        else:
+            zone_reloaded = bind_reload_zones(
+                zone_name, timeout=reload_timeout
+            )
+        if not zone_reloaded:
+            reloaded = False
+        timings[zone_name] = time.monotonic() - start
+    return reloaded, timings
+
+
+def get_zones_structure(zones, upstream_dns, dnssec_validation, networks):
+    """Return the parts of the DNS configuration that can only be changed by
+    rewriting BIND's configuration and zone files.
+
+    These are which zones there are, their content other than address
+    records, and BIND's options.
+    """
+    structure = {}
+    for zone in zones:
+        structure.update(zone.get_structure())
+    return structure, tuple(upstream_dns), dnssec_validation, set(networks)
+
+
+def get_zones_records(zones):
+    """Return the address records of `zones`, by zone name."""
+    records = {}
+    for zone in zones:
+        records.update(zone.get_records())
+    return records
+
+
+def dns_update_zones_incrementally(zones, structure, records, timeout=2):
+    """Publish the changes to the records of `zones` as dynamic updates.
+
+    Each changed zone gets a single update, which includes its new serial.
+    Splitting a zone's changes across several updates would have BIND step
+    its serial past the one being published, so a zone whose changes do not
+    fit in one DNS message is rewritten instead, like all the others.
+
+    :return: The names of the updated zones, or `None` if the zones cannot
+        be updated this way: nothing has been published yet, the structure
+        of the zones has changed, there are too many changes, the changes to
+        a zone do not fit in one update, or an update failed.
+    """
+    if published_zones.structure is None:
+        return None
+    if structure != published_zones.structure:
+        return None
+    changes = {}
+    for zone_name, zone_records in records.items():
+        previous = published_zones.records[zone_name]
+        if zone_records != previous:
+            changes[zone_name] = (
+                previous - zone_records,
+                zone_records - previous,
+            )
+    total = sum(
+        len(deleted) + len(added) for deleted, added in changes.values()
+    )
+    if total > DNS_INCREMENTAL_UPDATE_LIMIT:
+        return None
+    soas = {
+        zone_info.zone_name: zone.get_soa()
+        for zone in zones
+        for zone_info in zone.zone_info
+    }
+    for zone_name, (deleted, added) in changes.items():
+        size = get_zone_update_size(zone_name, soas[zone_name], deleted, added)
+        if size > DNS_UPDATE_MAX_SIZE:
+            return None
+    for zone_name, (deleted, added) in sorted(changes.items()):
+        if not bind_update_zone(
+            zone_name, soas[zone_name], deleted, added, timeout=timeout
+        ):
+            maaslog.warning(
+                "Dynamic update of zone %s failed; rewriting all zones.",
+                zone_name,
+            )
+            return None
+        published_zones.records[zone_name] = records[zone_name]
+    return sorted(changes)
+
+
 def get_upstream_dns():
     """Return the IP addresses of configured upstream DNS servers.
 
@@ -8,6 +8,7 @@ __all__ = []
 from argparse import ArgumentParser
 import random
 import time
+from unittest.mock import ANY, call
 
 from django.conf import settings
 import dns.resolver
@@ -17,11 +18,13 @@ from maasserver.dns.config import (
     current_zone_serial,
     dns_force_reload,
     dns_update_all_zones,
+    dns_update_zones_incrementally,
     get_internal_domain,
     get_resource_name_for_subnet,
     get_trusted_acls,
     get_trusted_networks,
     get_upstream_dns,
+    published_zones,
 )
 from maasserver.dns.zonegenerator import InternalDomainResourseRecord
 from maasserver.enum import IPADDRESS_TYPE, NODE_STATUS
@@ -31,14 +34,21 @@ from maasserver.models.dnspublication import DNSPublication
 from maasserver.testing.config import RegionConfigurationFixture
 from maasserver.testing.factory import factory
 from maasserver.testing.testcase import MAASServerTestCase
-from maastesting.matchers import MockCalledOnceWith
+from maastesting.matchers import (
+    MockCalledOnceWith,
+    MockCallsMatch,
+    MockNotCalled,
+)
 from netaddr import IPAddress
 from provisioningserver.dns.commands import get_named_conf, setup_dns
 from provisioningserver.dns.config import compose_config_path, DNSConfig
 from provisioningserver.dns.testing import (
     patch_dns_config_path,
+    patch_dns_port,
     patch_dns_rndc_port,
 )
+from provisioningserver.dns.tests.test_zoneconfig import HostnameIPMapping
+from provisioningserver.dns.zoneconfig import DNSForwardZoneConfig
 from provisioningserver.testing.bindfixture import allocate_ports, BINDServer
 from provisioningserver.testing.tests.test_bindfixture import dig_call
 from provisioningserver.utils.twisted import retries
@@ -98,6 +108,9 @@ class TestDNSServer(MAASServerTestCase):
         self.useFixture(RegionConfigurationFixture())
         # Immediately make DNS changes as they're needed.
         self.patch(dns_config_module, "DNS_DEFER_UPDATES", False)
+        # Start from a clean slate: all zones get written.
+        published_zones.clear()
+        self.addCleanup(published_zones.clear)
         # Create a DNS server.
         self.bind = self.useFixture(BINDServer())
         # Use the dnspython resolver for at least some queries.
@@ -391,9 +404,13 @@ class TestDNSConfigModifications(TestDNSServer):
         self.patch(
             dns_config_module, "current_zone_serial"
         ).return_value = fake_serial
-        serial, reloaded, domains = dns_update_all_zones()
+        zone_timings = {}
+        serial, reloaded, domains = dns_update_all_zones(
+            zone_timings=zone_timings
+        )
         self.assertThat(serial, Equals(fake_serial))
         self.assertThat(reloaded, Is(True))
+        self.assertEqual({}, zone_timings)
         self.assertThat(
             domains,
             MatchesSetwise(
@@ -405,6 +422,281 @@ class TestDNSConfigModifications(TestDNSServer):
         )
 
 
+class TestDNSChangedZonesUpdates(TestDNSServer):
+    """Only the zones whose content has changed are rewritten."""
+
+    def setUp(self):
+        super(TestDNSChangedZonesUpdates, self).setUp()
+        self.patch(settings, "DNS_CONNECT", True)
+
+    def test_only_changed_zones_are_written_and_reloaded(self):
+        node, static = self.create_node_with_static_ip()
+        other_domain = factory.make_Domain()
+        dns_update_all_zones()
+        other_node, other_static = self.create_node_with_static_ip(
+            domain=node.domain, subnet=static.subnet
+        )
+        DNSPublication(source="Added %s" % other_static.ip).save()
+        bind_write_zones = self.patch(
+            dns_config_module,
+            "bind_write_zones",
+            dns_config_module.bind_write_zones,
+        )
+        bind_reload = self.patch(dns_config_module, "bind_reload")
+        zone_timings = {}
+        serial, reloaded, zone_names = dns_update_all_zones(
+            zone_timings=zone_timings
+        )
+        self.assertThat(bind_reload, MockNotCalled())
+        self.assertTrue(reloaded)
+        self.assertIn(node.domain.name, zone_names)
+        self.assertNotIn(other_domain.name, zone_names)
+        self.assertItemsEqual(zone_names, zone_timings)
+        self.assertThat(
+            bind_write_zones.call_args_list,
+            HasLength(len(zone_names)),
+        )
+        self.assertDNSMatches(
+            other_node.hostname, other_node.domain.name, other_static.ip
+        )
+
+    def test_nothing_written_when_nothing_changed(self):
+        dns_update_all_zones()
+        DNSPublication(source=factory.make_name("reason")).save()
+        bind_write_zones = self.patch(dns_config_module, "bind_write_zones")
+        serial, reloaded, zone_names = dns_update_all_zones()
+        self.assertThat(bind_write_zones, MockNotCalled())
+        self.assertTrue(reloaded)
+        self.assertEqual([], zone_names)
+
+    def test_new_domain_rewrites_all_zones(self):
+        dns_update_all_zones()
+        domain = factory.make_Domain()
+        node, static = self.create_node_with_static_ip(domain=domain)
+        DNSPublication(source="Added %s" % domain.name).save()
+        bind_write_zones = self.patch(
+            dns_config_module,
+            "bind_write_zones",
+            dns_config_module.bind_write_zones,
+        )
+        dns_update_all_zones()
+        self.assertThat(bind_write_zones, MockCalledOnceWith(ANY))
+        self.assertDNSMatches(node.hostname, domain.name, static.ip)
+
+    def test_force_reload_rewrites_all_zones(self):
+        dns_update_all_zones()
+        dns_force_reload()
+        bind_write_zones = self.patch(dns_config_module, "bind_write_zones")
+        self.patch(dns_config_module, "bind_reload").return_value = True
+        dns_update_all_zones()
+        self.assertThat(bind_write_zones, MockCalledOnceWith(ANY))
+
+    def test_failed_reload_rewrites_all_zones_next_time(self):
+        self.patch(dns_config_module, "bind_reload").return_value = False
+        dns_update_all_zones()
+        self.assertIsNone(published_zones.options)
+
+    def test_changed_zones_are_reloaded_with_retries(self):
+        node, static = self.create_node_with_static_ip()
+        dns_update_all_zones()
+        self.create_node_with_static_ip(
+            domain=node.domain, subnet=static.subnet
+        )
+        DNSPublication(source=factory.make_name("reason")).save()
+        bind_reload_zones = self.patch(
+            dns_config_module, "bind_reload_zones_with_retries"
+        )
+        bind_reload_zones.return_value = True
+        serial, reloaded, zone_names = dns_update_all_zones(
+            reload_retry=True, reload_timeout=5
+        )
+        self.assertTrue(reloaded)
+        self.assertThat(
+            bind_reload_zones,
+            MockCallsMatch(
+                *(call(zone_name, timeout=5) for zone_name in zone_names)
+            ),
+        )
+
+
+class TestDNSIncrementalUpdates(TestDNSServer):
+    """Address changes are sent to BIND as dynamic updates."""
+
+    def setUp(self):
+        super(TestDNSIncrementalUpdates, self).setUp()
+        self.patch(settings, "DNS_CONNECT", True)
+        self.patch(settings, "DNS_INCREMENTAL_UPDATES", True)
+        patch_dns_port(self, self.bind.config.port)
+        published_zones.clear()
+        self.addCleanup(published_zones.clear)
+
+    def test_first_update_rewrites_all_zones(self):
+        node, static = self.create_node_with_static_ip()
+        bind_write_zones = self.patch(
+            dns_config_module,
+            "bind_write_zones",
+            dns_config_module.bind_write_zones,
+        )
+        dns_update_all_zones()
+        self.assertThat(bind_write_zones, MockCalledOnceWith(ANY))
+        self.assertDNSMatches(node.hostname, node.domain.name, static.ip)
+
+    def test_new_address_is_sent_as_dynamic_update(self):
+        node, static = self.create_node_with_static_ip()
+        dns_update_all_zones()
+        other_node, other_static = self.create_node_with_static_ip(
+            domain=node.domain, subnet=static.subnet
+        )
+        DNSPublication(source="Added %s" % other_static.ip).save()
+        bind_write_zones = self.patch(dns_config_module, "bind_write_zones")
+        serial, reloaded, zone_names = dns_update_all_zones()
+        self.assertThat(bind_write_zones, MockNotCalled())
+        self.assertTrue(reloaded)
+        self.assertIn(node.domain.name, zone_names)
+        self.assertEqual(int(serial), published_zones.serial)
+        self.assertDNSMatches(
+            other_node.hostname, other_node.domain.name, other_static.ip
+        )
+        self.assertDNSMatches(node.hostname, node.domain.name, static.ip)
+
+    def test_new_domain_rewrites_all_zones(self):
+        dns_update_all_zones()
+        domain = factory.make_Domain()
+        node, static = self.create_node_with_static_ip(domain=domain)
+        DNSPublication(source="Added %s" % domain.name).save()
+        bind_write_zones = self.patch(
+            dns_config_module,
+            "bind_write_zones",
+            dns_config_module.bind_write_zones,
+        )
+        dns_update_all_zones()
+        self.assertThat(bind_write_zones, MockCalledOnceWith(ANY))
+        self.assertDNSMatches(node.hostname, domain.name, static.ip)
+
+    def test_force_reload_rewrites_all_zones(self):
+        node, static = self.create_node_with_static_ip()
+        serial, _, _ = dns_update_all_zones()
+        self.assertEqual(int(serial), published_zones.serial)
+        self.create_node_with_static_ip(
+            domain=node.domain, subnet=static.subnet
+        )
+        dns_force_reload()
+        bind_write_zones = self.patch(
+            dns_config_module,
+            "bind_write_zones",
+            dns_config_module.bind_write_zones,
+        )
+        bind_update_zone = self.patch(dns_config_module, "bind_update_zone")
+        serial, reloaded, _ = dns_update_all_zones()
+        self.assertTrue(reloaded)
+        self.assertThat(bind_update_zone, MockNotCalled())
+        self.assertThat(bind_write_zones, MockCalledOnceWith(ANY))
+        self.assertEqual(int(serial), published_zones.serial)
+
+
+class TestDNSUpdateZonesIncrementally(MAASServerTestCase):
+    """Tests for `dns_update_zones_incrementally`."""
+
+    def setUp(self):
+        super(TestDNSUpdateZonesIncrementally, self).setUp()
+        published_zones.clear()
+        self.addCleanup(published_zones.clear)
+        self.bind_update_zone = self.patch_autospec(
+            dns_config_module, "bind_update_zone"
+        )
+        self.bind_update_zone.return_value = True
+
+    def make_zone(self, domain, serial=1, **mapping):
+        return DNSForwardZoneConfig(
+            domain,
+            serial=serial,
+            default_ttl=30,
+            mapping={
+                hostname: HostnameIPMapping(None, 30, {ip})
+                for hostname, ip in mapping.items()
+            },
+        )
+
+    def publish(self, *zones):
+        published_zones.structure = dns_config_module.get_zones_structure(
+            zones, [], "auto", []
+        )
+        published_zones.records = dns_config_module.get_zones_records(zones)
+
+    def update(self, *zones):
+        return dns_update_zones_incrementally(
+            zones,
+            dns_config_module.get_zones_structure(zones, [], "auto", []),
+            dns_config_module.get_zones_records(zones),
+        )
+
+    def test_returns_none_when_nothing_published(self):
+        self.assertIsNone(self.update(self.make_zone("example.com")))
+        self.assertThat(self.bind_update_zone, MockNotCalled())
+
+    def test_returns_none_when_structure_changed(self):
+        self.publish(self.make_zone("example.com"))
+        self.assertIsNone(
+            self.update(self.make_zone("example.com"), self.make_zone("new"))
+        )
+        self.assertThat(self.bind_update_zone, MockNotCalled())
+
+    def test_updates_only_changed_zones(self):
+        self.publish(
+            self.make_zone("example.com", host="10.0.0.1"),
+            self.make_zone("other.com", host="10.0.1.1"),
+        )
+        changed = self.make_zone("example.com", serial=2, host="10.0.0.2")
+        unchanged = self.make_zone("other.com", serial=2, host="10.0.1.1")
+        self.assertEqual(["example.com"], self.update(changed, unchanged))
+        self.assertThat(
+            self.bind_update_zone,
+            MockCalledOnceWith(
+                "example.com",
+                changed.get_soa(),
+                {("host.example.com.", 30, "A", "10.0.0.1")},
+                {("host.example.com.", 30, "A", "10.0.0.2")},
+                timeout=2,
+            ),
+        )
+        self.assertEqual(
+            {
+                "example.com": {("host.example.com.", 30, "A", "10.0.0.2")},
+                "other.com": {("host.other.com.", 30, "A", "10.0.1.1")},
+            },
+            published_zones.records,
+        )
+
+    def test_returns_none_when_too_many_changes(self):
+        self.patch(dns_config_module, "DNS_INCREMENTAL_UPDATE_LIMIT", 1)
+        self.publish(self.make_zone("example.com", host="10.0.0.1"))
+        self.assertIsNone(
+            self.update(self.make_zone("example.com", host="10.0.0.2"))
+        )
+        self.assertThat(self.bind_update_zone, MockNotCalled())
+
+    def test_returns_none_when_zone_update_too_large(self):
+        self.patch(dns_config_module, "DNS_UPDATE_MAX_SIZE", 100)
+        self.publish(
+            self.make_zone("example.com", host="10.0.0.1"),
+            self.make_zone("other.com", host="10.0.1.1"),
+        )
+        self.assertIsNone(
+            self.update(
+                self.make_zone("example.com", host="10.0.0.2"),
+                self.make_zone("other.com", host="10.0.1.2"),
+            )
+        )
+        self.assertThat(self.bind_update_zone, MockNotCalled())
+
+    def test_returns_none_when_update_fails(self):
+        self.bind_update_zone.return_value = False
+        self.publish(self.make_zone("example.com", host="10.0.0.1"))
+        self.assertIsNone(
+            self.update(self.make_zone("example.com", host="10.0.0.2"))
+        )
+
+
 class TestDNSDynamicIPAddresses(TestDNSServer):
     """Allocated nodes with IP addresses in the dynamic range get a DNS
     record.
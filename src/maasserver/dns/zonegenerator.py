@@ -203,15 +203,23 @@ class ZoneGenerator:
         if self.internal_domains is None:
             self.internal_domains = []
 
-    @staticmethod
-    def _get_mappings():
-        """Return a lazily evaluated mapping dict."""
-        return lazydict(get_hostname_ip_mapping)
-
-    @staticmethod
-    def _get_rrset_mappings():
-        """Return a lazily evaluated mapping dict."""
-        return lazydict(get_hostname_dnsdata_mapping)
+    def _get_mappings(self):
+        """Return the hostname to IP mappings of all of the domains, and of
+        the subnets as "reverse", fetched together."""
+        manager = StaticIPAddress.objects
+        mappings, subnet_mapping = manager.get_hostname_ip_mappings(
+            self.domains, subnets=len(self.subnets) > 0
+        )
+        if subnet_mapping is not None:
+            mappings["reverse"] = subnet_mapping
+        return mappings
+
+    def _get_rrset_mappings(self):
+        """Return the hostname to RRset mappings of all of the domains,
+        fetched together."""
+        return DNSData.objects.get_hostname_dnsdata_mappings(
+            self.domains, with_ids=False
+        )
 
     @staticmethod
     def _gen_forward_zones(
@@ -344,11 +352,6 @@ class ZoneGenerator:
                     )
                     rfc2317_glue.setdefault(basenet, set()).add(network)
 
-        # Since get_hostname_ip_mapping(Subnet) ignores Subnet.id, so we can
-        # just do it once and be happy.  LP#1600259
-        if len(subnets):
-            mappings["reverse"] = mappings[Subnet.objects.first()]
-
         # For each of the zones that we are generating (one or more per
         # subnet), compile the zone from:
         # 1. Dynamic ranges on this subnet.
@@ -381,8 +384,8 @@ class ZoneGenerator:
             # 2. Start with the map of all of the nodes, including all
             # DNSResource-associated addresses.  We will prune this to just
             # entries for the subnet when we actually generate the zonefile.
-            # If we get here, then we have subnets, so we noticed that above
-            # and created mappings['reverse'].  LP#1600259
+            # If we get here, then we have subnets, so the mappings include
+            # the one for all subnets, as 'reverse'.  LP#1600259
             mapping = mappings["reverse"]
 
             # Use the default_domain as the name for the NS host in the reverse
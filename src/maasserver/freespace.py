@@ -0,0 +1,236 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Index of the free addresses in subnets, for allocating addresses.
+
+Working out which addresses of a subnet are free means loading all of its
+IP addresses and ranges, which is slow for large subnets and was done for
+every address allocated. Instead, each regiond process keeps the free ranges
+of the subnets it allocates from in the `free_space_index`. It is updated as
+addresses are allocated by this process, and from the notifications that
+the database triggers send on the 'sys_ipalloc' channel once the changes of
+any process are committed:
+
+    <subnet id> taken <txid> <ip>
+        `ip` is now in use in the subnet, so it is removed from the index.
+
+    <subnet id> changed <txid>
+        Something else changed that may have freed addresses or changed the
+        ranges in use, so the subnet is evicted. Its free ranges are worked
+        out again the next time they're needed.
+
+The free ranges are worked out in the transaction of an allocation, whose
+snapshot may not include changes that were already notified. `txid` is the
+id of the transaction that made a change, and acts as the generation of the
+subnet: free ranges are only indexed when the snapshot they were worked out
+from includes the last change notified for their subnet. As notifications
+are delivered in commit order, it then includes all of them.
+
+The index is only used while notifications are being received. Even then,
+the addresses it holds may have been taken by changes of other processes
+that are not notified yet, or by the transaction of the allocation itself,
+whose changes are only notified once it commits. Each address picked from
+the index is checked against the addresses and ranges in use in that
+transaction, and taken out of the index and another one picked if it's in
+use.
+"""
+
+__all__ = ["free_space_index", "FreeSpaceIndex", "SubnetFreeSpace"]
+
+from bisect import bisect_left, bisect_right, insort
+from contextlib import closing
+import threading
+
+from django.db import connection
+from maasserver.listener import ListenerSubscriber
+from netaddr import IPAddress
+
+
+def get_transaction_snapshot():
+    """Return the snapshot of the current transaction.
+
+    :return: A ``(xmin, xmax, xip)`` tuple, as described for
+        ``txid_current_snapshot()`` in the PostgreSQL documentation.
+    """
+    with closing(connection.cursor()) as cursor:
+        cursor.execute("SELECT txid_current_snapshot()::text")
+        [snapshot] = cursor.fetchone()
+    xmin, xmax, xip = snapshot.split(":")
+    return int(xmin), int(xmax), {int(txid) for txid in xip.split(",") if txid}
+
+
+def is_visible_in_snapshot(txid, snapshot):
+    """Return whether the transaction `txid` had committed in `snapshot`.
+
+    A `txid` of `None` is always visible.
+    """
+    if txid is None:
+        return True
+    xmin, xmax, xip = snapshot
+    return txid < xmin or (txid < xmax and txid not in xip)
+
+
+class SubnetFreeSpace:
+    """The free ranges of a subnet, by address and by size.
+
+    Ranges are ``(first, last)`` tuples of integer addresses. They're kept
+    sorted by their first address to find the range holding an address, and
+    by their size to find the smallest one, each with a binary search.
+    """
+
+    def __init__(self, ranges):
+        self._ranges = sorted((item.first, item.last) for item in ranges)
+        self._firsts = [first for first, _ in self._ranges]
+        self._by_size = sorted(
+            (last - first, first) for first, last in self._ranges
+        )
+
+    def __len__(self):
+        return len(self._ranges)
+
+    def _find(self, address):
+        """Return the index of the range holding `address`, or `None`."""
+        index = bisect_right(self._firsts, address) - 1
+        if index >= 0 and address <= self._ranges[index][1]:
+            return index
+        return None
+
+    def take(self, address):
+        """Remove `address` from the free ranges, if it's in one."""
+        index = self._find(address)
+        if index is None:
+            return
+        first, last = self._ranges.pop(index)
+        del self._firsts[index]
+        del self._by_size[bisect_left(self._by_size, (last - first, first))]
+        for first, last in (first, address - 1), (address + 1, last):
+            if first <= last:
+                self._ranges.insert(index, (first, last))
+                self._firsts.insert(index, first)
+                insort(self._by_size, (last - first, first))
+                index += 1
+
+    def get_next_address(self, exclude=()):
+        """Return the first address of the smallest free range, or `None`.
+
+        Using the smallest range keeps larger ones available for uses that
+        need them. The smallest range with the lowest address is used when
+        several are the same size.
+
+        :param exclude: Addresses that must not be used, as integers. The
+            ranges holding them are split before looking for the smallest.
+        """
+        excluded = {}
+        for address in exclude:
+            index = self._find(address)
+            if index is not None:
+                excluded.setdefault(index, []).append(address)
+        best = None
+        # The smallest range that does not hold an excluded address.
+        for size, first in self._by_size:
+            if self._find(first) not in excluded:
+                best = size, first
+                break
+        # The pieces of the ranges that do.
+        for index, addresses in excluded.items():
+            first, last = self._ranges[index]
+            for address in sorted(addresses) + [last + 1]:
+                if first < address:
+                    piece = address - 1 - first, first
+                    if best is None or piece < best:
+                        best = piece
+                first = address + 1
+        return None if best is None else best[1]
+
+
+class FreeSpaceIndex(ListenerSubscriber):
+    """The free ranges of subnets, kept up to date from notifications.
+
+    See the module documentation for how it's kept up to date. Subnets are
+    looked up from the database threads, while notifications are received
+    in the reactor, so all access is serialised with a lock.
+    """
+
+    channel = "sys_ipalloc"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subnets = {}
+        # The id of the transaction that made the last change notified for
+        # each subnet.
+        self._notified = {}
+        # Incremented when notifications may have been missed, so that free
+        # ranges worked out before that are not indexed.
+        self._epoch = 0
+        self.enabled = False
+
+    def get_next_address(self, subnet, exclude=()):
+        """Return the next address to allocate from `subnet`, or `None`.
+
+        Must be called in a transaction. The address is picked as by
+        `SubnetFreeSpace.get_next_address`, and one from the index is only
+        returned if `subnet.is_address_in_use` says it's free.
+        """
+        while True:
+            with self._lock:
+                free = self._subnets.get(subnet.id)
+                if free is None:
+                    break
+                address = free.get_next_address(exclude)
+                if address is None:
+                    # Addresses allocated by transactions that were rolled
+                    # back are only free again once the subnet is worked out
+                    # again.
+                    del self._subnets[subnet.id]
+                    break
+            if not subnet.is_address_in_use(address):
+                return address
+            self.take(subnet.id, address)
+        with self._lock:
+            enabled, epoch = self.enabled, self._epoch
+        free = SubnetFreeSpace(subnet.get_ipranges_not_in_use())
+        if enabled:
+            snapshot = get_transaction_snapshot()
+            with self._lock:
+                notified = self._notified.get(subnet.id)
+                if epoch == self._epoch and is_visible_in_snapshot(
+                    notified, snapshot
+                ):
+                    self._subnets[subnet.id] = free
+                    return free.get_next_address(exclude)
+        return free.get_next_address(exclude)
+
+    def take(self, subnet_id, address):
+        """Remove `address` from the free ranges of subnet `subnet_id`.
+
+        Called when allocating `address`, so that other transactions of this
+        process do not try to allocate it as well.
+        """
+        with self._lock:
+            free = self._subnets.get(subnet_id)
+            if free is not None:
+                free.take(address)
+
+    def clear(self):
+        """Evict the free ranges of all subnets."""
+        with self._lock:
+            self._epoch += 1
+            self._subnets.clear()
+            self._notified.clear()
+
+    def on_notify(self, channel, payload):
+        """Called when the 'sys_ipalloc' message is received."""
+        subnet_id, action, txid, *ip = payload.split()
+        subnet_id, txid = int(subnet_id), int(txid)
+        with self._lock:
+            self._notified[subnet_id] = txid
+            free = self._subnets.get(subnet_id)
+            if free is None:
+                return
+            if action == "taken":
+                free.take(int(IPAddress(ip[0])))
+            else:
+                del self._subnets[subnet_id]
+
+
+free_space_index = FreeSpaceIndex()
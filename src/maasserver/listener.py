@@ -3,11 +3,16 @@
 
 """Listens for NOTIFY events from the postgres database."""
 
-__all__ = ["PostgresListenerNotifyError", "PostgresListenerService"]
+__all__ = [
+    "ListenerSubscriber",
+    "PostgresListenerNotifyError",
+    "PostgresListenerService",
+]
 
 from collections import defaultdict
 from contextlib import closing
 from errno import ENOENT
+import json
 
 from django.db import connections
 from django.db.utils import load_backend
@@ -32,6 +37,25 @@ class ACTIONS:
     DELETE = "delete"
 
 
+def split_payload(payload):
+    """Split a notification `payload` into the object id and its changes.
+
+    Triggers can send the new values of the changed columns as a JSON
+    object after the id, separated by a space. `None` is returned for the
+    changes when the payload has none.
+    """
+    pk, _, changes = payload.partition(" ")
+    if not changes.startswith("{"):
+        return payload, None
+    try:
+        changes = json.loads(changes)
+    except ValueError:
+        return payload, None
+    if not isinstance(changes, dict):
+        return payload, None
+    return pk, changes
+
+
 class PostgresListenerNotifyError(Exception):
     """Error raised when the listener gets a notify message that cannot be
     decoded or is not being handled."""
@@ -45,6 +69,55 @@ class PostgresListenerUnregistrationError(Exception):
     """Error raised when unregistering a handler fails."""
 
 
+class ListenerSubscriber:
+    """Mixin for state kept up to date from the notifications of `channel`.
+
+    The state is only used while the listener is connected, as notifications
+    may be missed otherwise. It's discarded with `clear` when the listener
+    connects or disconnects. Subclasses set `channel` and implement `clear`
+    and `on_notify`.
+    """
+
+    channel = None
+    enabled = False
+
+    def clear(self):
+        """Discard the state kept up to date."""
+        raise NotImplementedError()
+
+    def register(self, listener):
+        """Register with `listener` to be kept up to date.
+
+        The state is used while `listener` is connected.
+        """
+        listener.register(self.channel, self.on_notify)
+        listener.events.connected.registerHandler(self.on_connect)
+        listener.events.disconnected.registerHandler(self.on_disconnect)
+        if listener.connected():
+            self.on_connect()
+
+    def unregister(self, listener):
+        """Unregister from `listener`, and stop using the state."""
+        listener.unregister(self.channel, self.on_notify)
+        listener.events.connected.unregisterHandler(self.on_connect)
+        listener.events.disconnected.unregisterHandler(self.on_disconnect)
+        self.on_disconnect(None)
+
+    def on_connect(self):
+        """Called when the listener has connected."""
+        self.clear()
+        self.enabled = True
+
+    def on_disconnect(self, reason):
+        """Called when the listener has disconnected."""
+        self.enabled = False
+        self.clear()
+
+    def on_notify(self, channel, payload):
+        """Called when a message is received on `channel`."""
+        raise NotImplementedError()
+
+
 @implementer(interfaces.IReadDescriptor)
 class PostgresListenerService(Service, object):
     """Listens for NOTIFY messages from postgres.
@@ -76,6 +149,10 @@ class PostgresListenerService(Service, object):
         self.connection = None
         self.connectionFileno = None
         self.notifications = set()
+        # Changes carried by the queued notifications, merged in the order
+        # they were received, and the handlers they are passed to.
+        self.notificationChanges = {}
+        self.changesHandlers = set()
         self.notifier = task.LoopingCall(self.handleNotifies)
         self.notifierDone = None
         self.connecting = None
@@ -163,13 +240,31 @@ class PostgresListenerService(Service, object):
                     else:
                         # Place non-system messages into the queue to be
                         # processed.
-                        self.notifications.add(
-                            (notify.channel, notify.payload)
-                        )
+                        self.queueNotification(notify.channel, notify.payload)
                 # Delete the contents of the connection's notifies list so
                 # that we don't process them a second time.
                 del notifies[:]
 
+    def queueNotification(self, channel, payload):
+        """Queue the notification of `payload` on `channel`.
+
+        Notifications for the same object are queued once. Their changes
+        are merged, unless one of them has none, in which case the object
+        has to be reloaded anyway.
+        """
+        pk, changes = split_payload(payload)
+        notification = (channel, pk)
+        if notification in self.notifications:
+            queued = self.notificationChanges.get(notification)
+            if queued is None or changes is None:
+                self.notificationChanges.pop(notification, None)
+            else:
+                queued.update(changes)
+        else:
+            self.notifications.add(notification)
+            if changes is not None:
+                self.notificationChanges[notification] = changes
+
     def fileno(self):
         """Return the fileno of the connection."""
         return self.connectionFileno
@@ -192,11 +287,12 @@ class PostgresListenerService(Service, object):
         finally:
             self.connectionFileno = None
 
-    def register(self, channel, handler):
+    def register(self, channel, handler, changes=False):
         """Register listening for notifications from a channel.
 
         When a notification is received for that `channel` the `handler` will
-        be called with the action and object id.
+        be called with the action and object id. With `changes`, it's also
+        called with the changed columns sent by the trigger, or `None`.
         """
         handlers = self.listeners[channel]
         if self.isSystemChannel(channel) and len(handlers) > 0:
@@ -210,6 +306,8 @@ class PostgresListenerService(Service, object):
             )
         else:
             handlers.append(handler)
+        if changes:
+            self.changesHandlers.add((channel, handler))
         if self.registeredChannels and self.connection:
             # Channels have already been registered. Register the
             # new channel on the already existing connection.
@@ -227,6 +325,7 @@ class PostgresListenerService(Service, object):
         handlers = self.listeners[channel]
         if handler in handlers:
             handlers.remove(handler)
+            self.changesHandlers.discard((channel, handler))
         else:
             raise PostgresListenerUnregistrationError(
                 "Handler is not registered on that channel '%s'." % channel
@@ -417,6 +516,7 @@ class PostgresListenerService(Service, object):
 
     def handleNotify(self, notification, clock=reactor):
         """Process a notify message in the notifications set."""
+        changes = self.notificationChanges.pop(notification, None)
         channel, payload = notification
         try:
             channel, action = self.convertChannel(channel)
@@ -432,7 +532,10 @@ class PostgresListenerService(Service, object):
             # XXX: There could be an arbitrary number of listeners. Should we
             # limit concurrency here? Perhaps even do one at a time.
             for handler in handlers:
-                d = defer.maybeDeferred(handler, action, payload)
+                if (channel, handler) in self.changesHandlers:
+                    d = defer.maybeDeferred(handler, action, payload, changes)
+                else:
+                    d = defer.maybeDeferred(handler, action, payload)
                 d.addErrback(
                     lambda failure: self.log.failure(
                         "Failure while handling notification to {channel!r}: "
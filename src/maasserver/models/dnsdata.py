@@ -147,6 +147,20 @@ class DNSDataManager(Manager, DNSDataQueriesMixin):
         self, domain, raw_ttl=False, with_ids=True
     ):
         """Return hostname to RRset mapping for this domain."""
+        return self.get_hostname_dnsdata_mappings(
+            [domain], raw_ttl=raw_ttl, with_ids=with_ids
+        )[domain]
+
+    def get_hostname_dnsdata_mappings(
+        self, domains, raw_ttl=False, with_ids=True
+    ):
+        """Return hostname to RRset mappings for each of `domains`.
+
+        The query is run once for all of the domains, and its results are
+        partitioned in memory.
+
+        :return: A dict of `Domain` to its mapping.
+        """
         cursor = connection.cursor()
         default_ttl = "%d" % Config.objects.get_config("default_dns_ttl")
         if raw_ttl:
@@ -174,7 +188,9 @@ class DNSDataManager(Manager, DNSDataQueriesMixin):
             + ttl_clause
             + """ AS ttl,
                 dnsdata.rrtype,
-                dnsdata.rrdata
+                dnsdata.rrdata,
+                dnsresource.domain_id,
+                node.fqdn IS NOT NULL AS has_node
             FROM maasserver_dnsdata AS dnsdata
             JOIN maasserver_dnsresource AS dnsresource ON
                 dnsdata.dnsresource_id = dnsresource.id
@@ -226,7 +242,7 @@ class DNSDataManager(Manager, DNSDataQueriesMixin):
                  * wins, and we drop the CNAME until the node no longer has the
                  * same name.
                  */
-                (dnsresource.domain_id = %s OR node.fqdn IS NOT NULL) AND
+                (dnsresource.domain_id = ANY(%s) OR node.fqdn IS NOT NULL) AND
                 (dnsdata.rrtype != 'CNAME' OR node.fqdn IS NULL)
             ORDER BY
                 dnsresource.name,
@@ -237,8 +253,12 @@ class DNSDataManager(Manager, DNSDataQueriesMixin):
         # N.B.: The "node.hostname IS NULL" above is actually checking that
         # no node exists with the same name, in order to make sure that we do
         # not spill CNAME and other data.
-        mapping = defaultdict(HostnameRRsetMapping)
-        cursor.execute(sql_query, (domain.id,))
+        domains = {domain.id: domain for domain in domains}
+        mappings = {
+            domain_id: defaultdict(HostnameRRsetMapping)
+            for domain_id in domains
+        }
+        cursor.execute(sql_query, (list(domains),))
         for (
             dnsresource_id,
             name,
@@ -250,26 +270,42 @@ class DNSDataManager(Manager, DNSDataQueriesMixin):
             ttl,
             rrtype,
             rrdata,
+            dnsresource_domain_id,
+            has_node,
         ) in cursor.fetchall():
-            if name == "@" and d_name != domain.name:
-                name, d_name = d_name.split(".", 1)
-                # Since we don't allow more than one label in dnsresource
-                # names, we should never ever be wrong in this assertion.
-                assert d_name == domain.name, (
-                    "Invalid domain; expected '%s' == '%s'"
-                    % (d_name, domain.name)
-                )
-            entry = mapping[name]
-            entry.node_type = node_type
-            entry.system_id = system_id
-            entry.user_id = user_id
-            if with_ids:
-                entry.dnsresource_id = dnsresource_id
-                rrtuple = (ttl, rrtype, rrdata, dnsdata_id)
+            # Records of nodes belong in all of the domains; others only in
+            # their own.
+            if has_node:
+                domain_ids = domains.keys()
             else:
-                rrtuple = (ttl, rrtype, rrdata)
-            entry.rrset.add(rrtuple)
-        return mapping
+                domain_ids = [dnsresource_domain_id]
+            for domain_id in domain_ids:
+                domain = domains[domain_id]
+                entry_name = name
+                if name == "@" and d_name != domain.name:
+                    entry_name, entry_d_name = d_name.split(".", 1)
+                    # Since we don't allow more than one label in dnsresource
+                    # names, we should never ever be wrong in this assertion.
+                    assert (
+                        entry_d_name == domain.name
+                    ), "Invalid domain; expected '%s' == '%s'" % (
+                        entry_d_name,
+                        domain.name,
+                    )
+                entry = mappings[domain_id][entry_name]
+                entry.node_type = node_type
+                entry.system_id = system_id
+                entry.user_id = user_id
+                if with_ids:
+                    entry.dnsresource_id = dnsresource_id
+                    rrtuple = (ttl, rrtype, rrdata, dnsdata_id)
+                else:
+                    rrtuple = (ttl, rrtype, rrdata)
+                entry.rrset.add(rrtuple)
+        return {
+            domain: mappings[domain_id]
+            for domain_id, domain in domains.items()
+        }
 
 
 class DNSData(CleanSave, TimestampedModel):
@@ -38,6 +38,7 @@ from maasserver.exceptions import (
     StaticIPAddressUnavailable,
 )
 from maasserver.fields import MAASIPAddressField
+from maasserver.freespace import free_space_index
 from maasserver.models.cleansave import CleanSave
 from maasserver.models.config import Config
 from maasserver.models.domain import Domain
@@ -58,15 +59,31 @@ _mapping_base_fields = (
     "ip",
 )
 
-_special_mapping_result = _mapping_base_fields + ("dnsresource_id",)
+_special_mapping_result = _mapping_base_fields + (
+    "dnsresource_id",
+    "alloc_type",
+    "dnsrr_fqdn",
+    "node_fqdn",
+    "dnsrr_domain_id",
+    "dnsrr_dom2_id",
+    "node_domain_id",
+    "node_dom2_id",
+)
 
 _mapping_query_result = _mapping_base_fields + (
     "is_boot",
     "preference",
     "family",
+    "domain_id",
+    "domain2_id",
 )
 
-_interface_mapping_result = _mapping_base_fields + ("iface_name", "assigned")
+_interface_mapping_result = _mapping_base_fields + (
+    "iface_name",
+    "assigned",
+    "domain_id",
+    "domain2_id",
+)
 
 SpecialMappingQueryResult = namedtuple(
     "SpecialMappingQueryResult", _special_mapping_result
@@ -291,6 +308,8 @@ class StaticIPAddressManager(Manager):
             requested_address = subnet.get_next_ip_for_allocation(
                 exclude_addresses=exclude_addresses
             )
+            # So that other transactions in this process don't pick it too.
+            free_space_index.take(subnet.id, int(IPAddress(requested_address)))
             return self._attempt_allocation_of_free_address(
                 requested_address, alloc_type, user=user, subnet=subnet
             )
@@ -310,6 +329,7 @@ class StaticIPAddressManager(Manager):
                 )
 
             subnet.validate_static_ip(requested_address)
+            free_space_index.take(subnet.id, int(requested_address))
             return self._attempt_allocation(
                 requested_address, alloc_type, user=user, subnet=subnet
             )
@@ -342,6 +362,70 @@ class StaticIPAddressManager(Manager):
             zone generation.
         :return: a (default) dict of hostname: HostnameIPMapping entries.
         """
+        sql_query = self._get_special_mappings_query(raw_ttl)
+        query_parms = []
+        if isinstance(domain, Domain):
+            if domain.is_default():
+                # The default domain is extra special, since it needs to have
+                # A/AAAA RRs for any USER_RESERVED addresses that have no name
+                # otherwise attached to them.
+                # We need to get all of the entries that are:
+                # - in this domain and have a dnsrr associated, OR
+                # - are USER_RESERVED and have NO fqdn associated at all.
+                sql_query += """ ((
+                        staticip.alloc_type = %s AND
+                        dnsrr.fqdn IS NULL AND
+                        node.fqdn IS NULL
+                    ) OR (
+                        dnsrr.fqdn IS NOT NULL AND
+                        (
+                            dnsrr.dom2_id = %s OR
+                            node.dom2_id = %s OR
+                            dnsrr.domain_id = %s OR
+                            node.domain_id = %s)))"""
+                query_parms += [IPADDRESS_TYPE.USER_RESERVED]
+            else:
+                # For domains, we only need answers for the domain we were
+                # given.  These can can possibly come from either the child or
+                # the parent for glue.  Anything with a node associated will be
+                # found inside of get_hostname_ip_mapping() - we need any
+                # entries that are:
+                # - in this domain and have a dnsrr associated.
+                sql_query += """ (
+                    dnsrr.fqdn IS NOT NULL AND
+                    (
+                        dnsrr.dom2_id = %s OR
+                        node.dom2_id = %s OR
+                        dnsrr.domain_id = %s OR
+                        node.domain_id = %s))"""
+            query_parms += [domain.id, domain.id, domain.id, domain.id]
+        else:
+            # In the subnet map, addresses attached to nodes only map back to
+            # the node, since some things don't like multiple PTR RRs in
+            # answers from the DNS.
+            # Since that is handled in get_hostname_ip_mapping, we exclude
+            # anything where the node also has a link to the address.
+            sql_query += """ ((
+                    node.fqdn IS NULL AND dnsrr.fqdn IS NOT NULL
+                ) OR (
+                    staticip.alloc_type = %s AND
+                    dnsrr.fqdn IS NULL AND
+                    node.fqdn IS NULL))"""
+            query_parms += [IPADDRESS_TYPE.USER_RESERVED]
+
+        cursor = connection.cursor()
+        cursor.execute(sql_query, query_parms)
+        return self._make_special_mapping(
+            map(SpecialMappingQueryResult._make, cursor.fetchall()),
+            Domain.objects.get_default_domain(),
+        )
+
+    def _get_special_mappings_query(self, raw_ttl=False):
+        """Return the SQL query for the special mappings.
+
+        It ends with the start of the WHERE clause, to which the caller adds
+        the condition selecting the mappings it needs.
+        """
         default_ttl = "%d" % Config.objects.get_config("default_dns_ttl")
         # raw_ttl says that we don't coalesce, but we need to pick one, so we
         # go with DNSResource if it is involved.
@@ -373,7 +457,14 @@ class StaticIPAddressManager(Manager):
             + ttl_clause
             + """ AS ttl,
                 staticip.ip,
-                dnsrr.id AS dnsresource_id
+                dnsrr.id AS dnsresource_id,
+                staticip.alloc_type,
+                dnsrr.fqdn,
+                node.fqdn,
+                dnsrr.domain_id,
+                dnsrr.dom2_id,
+                node.domain_id,
+                node.dom2_id
             FROM
                 maasserver_staticipaddress AS staticip
             LEFT JOIN (
@@ -433,64 +524,15 @@ class StaticIPAddressManager(Manager):
                  staticip.temp_expires_on IS NULL) AND
                 """
         )
+        return sql_query
 
-        query_parms = []
-        if isinstance(domain, Domain):
-            if domain.is_default():
-                # The default domain is extra special, since it needs to have
-                # A/AAAA RRs for any USER_RESERVED addresses that have no name
-                # otherwise attached to them.
-                # We need to get all of the entries that are:
-                # - in this domain and have a dnsrr associated, OR
-                # - are USER_RESERVED and have NO fqdn associated at all.
-                sql_query += """ ((
-                        staticip.alloc_type = %s AND
-                        dnsrr.fqdn IS NULL AND
-                        node.fqdn IS NULL
-                    ) OR (
-                        dnsrr.fqdn IS NOT NULL AND
-                        (
-                            dnsrr.dom2_id = %s OR
-                            node.dom2_id = %s OR
-                            dnsrr.domain_id = %s OR
-                            node.domain_id = %s)))"""
-                query_parms += [IPADDRESS_TYPE.USER_RESERVED]
-            else:
-                # For domains, we only need answers for the domain we were
-                # given.  These can can possibly come from either the child or
-                # the parent for glue.  Anything with a node associated will be
-                # found inside of get_hostname_ip_mapping() - we need any
-                # entries that are:
-                # - in this domain and have a dnsrr associated.
-                sql_query += """ (
-                    dnsrr.fqdn IS NOT NULL AND
-                    (
-                        dnsrr.dom2_id = %s OR
-                        node.dom2_id = %s OR
-                        dnsrr.domain_id = %s OR
-                        node.domain_id = %s))"""
-            query_parms += [domain.id, domain.id, domain.id, domain.id]
-        else:
-            # In the subnet map, addresses attached to nodes only map back to
-            # the node, since some things don't like multiple PTR RRs in
-            # answers from the DNS.
-            # Since that is handled in get_hostname_ip_mapping, we exclude
-            # anything where the node also has a link to the address.
-            domain = None
-            sql_query += """ ((
-                    node.fqdn IS NULL AND dnsrr.fqdn IS NOT NULL
-                ) OR (
-                    staticip.alloc_type = %s AND
-                    dnsrr.fqdn IS NULL AND
-                    node.fqdn IS NULL))"""
-            query_parms += [IPADDRESS_TYPE.USER_RESERVED]
+    def _make_special_mapping(self, results, default_domain):
+        """Return the special mapping of the `SpecialMappingQueryResult`s.
 
-        default_domain = Domain.objects.get_default_domain()
+        :return: a (default) dict of hostname: HostnameIPMapping entries.
+        """
         mapping = defaultdict(HostnameIPMapping)
-        cursor = connection.cursor()
-        cursor.execute(sql_query, query_parms)
-        for result in cursor.fetchall():
-            result = SpecialMappingQueryResult(*result)
+        for result in results:
             if result.fqdn is None or result.fqdn == "":
                 fqdn = "%s.%s" % (
                     get_ip_based_hostname(result.ip),
@@ -527,8 +569,146 @@ class StaticIPAddressManager(Manager):
 
         The returned name is an FQDN (no trailing dot.)
         """
+        if isinstance(domain_or_subnet, Domain):
+            # The model has nodes in the parent domain, but they actually live
+            # in the child domain.  And the parent needs the glue.  So we
+            # return such nodes addresses in _BOTH_ the parent and the child
+            # domains. domain2.name will be non-null if this host's fqdn is the
+            # name of a domain in MAAS.
+            where_clause = """
+                (domain2.id = %s OR node.domain_id = %s) AND
+            """
+            query_parms = [domain_or_subnet.id, domain_or_subnet.id]
+        else:
+            # For subnets, we need ALL the names, so that we can correctly
+            # identify which ones should have the FQDN.  dns/zonegenerator.py
+            # optimizes based on this, and only calls once with a subnet,
+            # expecting to get all the subnets back in one table.
+            where_clause = ""
+            query_parms = []
+        sql_query, iface_sql_query = self._get_hostname_ip_mapping_queries(
+            where_clause, raw_ttl
+        )
+        # We get user reserved et al mappings first, so that we can overwrite
+        # TTL as we process the return from the SQL horror above.
+        mapping = self._get_special_mappings(domain_or_subnet, raw_ttl)
+        cursor = connection.cursor()
+        cursor.execute(sql_query, query_parms)
+        results = [MappingQueryResult._make(row) for row in cursor.fetchall()]
+        cursor.execute(iface_sql_query, query_parms)
+        iface_results = [
+            InterfaceMappingResult._make(row) for row in cursor.fetchall()
+        ]
+        return self._add_hostname_ip_mappings(mapping, results, iface_results)
+
+    def get_hostname_ip_mappings(self, domains, subnets=True, raw_ttl=False):
+        """Return hostname mappings for each of `domains`, and for subnets.
+
+        The mappings are the same as those from calling
+        `get_hostname_ip_mapping` for each of the domains, and once for a
+        subnet, but each query is only run once for all of them, and its
+        results are partitioned in memory.
+
+        :param domains: The `Domain`s to return mappings for.
+        :param subnets: Whether to also return the mapping for subnets.
+        :return: A `(mappings, subnet_mapping)` tuple, where `mappings` is a
+            dict of `Domain` to its mapping, and `subnet_mapping` is the
+            mapping for subnets, or `None` if not asked for.
+        """
+        domains = {domain.id: domain for domain in domains}
+        default_domain = Domain.objects.get_default_domain()
         cursor = connection.cursor()
 
+        # Every special mapping is for an address with a DNSResource, or for
+        # a USER_RESERVED address with no name at all.  Partition them as
+        # _get_special_mappings does.
+        sql_query = (
+            self._get_special_mappings_query(raw_ttl)
+            + """ (
+                dnsrr.fqdn IS NOT NULL OR (
+                    staticip.alloc_type = %s AND
+                    node.fqdn IS NULL))"""
+        )
+        cursor.execute(sql_query, [IPADDRESS_TYPE.USER_RESERVED])
+        special_results = {domain_id: [] for domain_id in domains}
+        subnet_special_results = []
+        for row in cursor.fetchall():
+            result = SpecialMappingQueryResult._make(row)
+            if result.dnsrr_fqdn is not None:
+                domain_ids = {
+                    result.dnsrr_domain_id,
+                    result.dnsrr_dom2_id,
+                    result.node_domain_id,
+                    result.node_dom2_id,
+                }
+                in_subnets = result.node_fqdn is None
+            else:
+                domain_ids = {default_domain.id}
+                in_subnets = True
+            for domain_id in domain_ids:
+                if domain_id in special_results:
+                    special_results[domain_id].append(result)
+            if in_subnets:
+                subnet_special_results.append(result)
+
+        # Subnets need all of the names; each domain only those of the nodes
+        # in it, or whose FQDN is its name.
+        sql_query, iface_sql_query = self._get_hostname_ip_mapping_queries(
+            "", raw_ttl
+        )
+        cursor.execute(sql_query, [])
+        results = [MappingQueryResult._make(row) for row in cursor.fetchall()]
+        cursor.execute(iface_sql_query, [])
+        iface_results = [
+            InterfaceMappingResult._make(row) for row in cursor.fetchall()
+        ]
+        results_by_domain = self._partition_by_domain(results, domains)
+        iface_results_by_domain = self._partition_by_domain(
+            iface_results, domains
+        )
+
+        mappings = {
+            domain: self._add_hostname_ip_mappings(
+                self._make_special_mapping(
+                    special_results[domain_id], default_domain
+                ),
+                results_by_domain[domain_id],
+                iface_results_by_domain[domain_id],
+            )
+            for domain_id, domain in domains.items()
+        }
+        if subnets:
+            subnet_mapping = self._add_hostname_ip_mappings(
+                self._make_special_mapping(
+                    subnet_special_results, default_domain
+                ),
+                results,
+                iface_results,
+            )
+        else:
+            subnet_mapping = None
+        return mappings, subnet_mapping
+
+    def _partition_by_domain(self, results, domain_ids):
+        """Partition mapping query results by the domains they belong to.
+
+        A result belongs to the domain of its node, and to the domain whose
+        name is its FQDN, if any.  The order of the results is kept.
+        """
+        partitions = {domain_id: [] for domain_id in domain_ids}
+        for result in results:
+            for domain_id in {result.domain_id, result.domain2_id}:
+                if domain_id in partitions:
+                    partitions[domain_id].append(result)
+        return partitions
+
+    def _get_hostname_ip_mapping_queries(self, where_clause, raw_ttl=False):
+        """Return the SQL queries for the node and interface mappings.
+
+        :param where_clause: A condition, ending with AND, that the rows must
+            meet.  It can refer to `node.domain_id` and `domain2.id`, the
+            domain whose name is the FQDN of the row.
+        """
         # DISTINCT ON returns the first matching row for any given
         # hostname, using the query's ordering.  Here, we're trying to
         # return the IPs for the oldest Interface address.
@@ -580,7 +760,9 @@ class StaticIPAddressManager(Manager):
                     WHEN interface.type = 'unknown' THEN 9
                     ELSE 10
                 END AS preference,
-                family(staticip.ip) AS family
+                family(staticip.ip) AS family,
+                node.domain_id,
+                domain2.id AS domain2_id
             FROM
                 maasserver_interface AS interface
             LEFT OUTER JOIN maasserver_interfacerelationship AS rel ON
@@ -599,33 +781,14 @@ class StaticIPAddressManager(Manager):
                 link.interface_id = interface.id
             JOIN maasserver_staticipaddress AS staticip ON
                 staticip.id = link.staticipaddress_id
-            """
-        )
-        if isinstance(domain_or_subnet, Domain):
-            # The model has nodes in the parent domain, but they actually live
-            # in the child domain.  And the parent needs the glue.  So we
-            # return such nodes addresses in _BOTH_ the parent and the child
-            # domains. domain2.name will be non-null if this host's fqdn is the
-            # name of a domain in MAAS.
-            sql_query += """
             LEFT JOIN maasserver_domain AS domain2 ON
                 /* Pick up another copy of domain looking for instances of
                  * nodes a the top of a domain.
                  */ domain2.name = CONCAT(node.hostname, '.', domain.name)
             WHERE
-                (domain2.id = %s OR node.domain_id = %s) AND
             """
-            query_parms = [domain_or_subnet.id, domain_or_subnet.id]
-        else:
-            # For subnets, we need ALL the names, so that we can correctly
-            # identify which ones should have the FQDN.  dns/zonegenerator.py
-            # optimizes based on this, and only calls once with a subnet,
-            # expecting to get all the subnets back in one table.
-            sql_query += """
-            WHERE
-            """
-            query_parms = []
-        sql_query += """
+            + where_clause
+            + """
                 staticip.ip IS NOT NULL AND
                 host(staticip.ip) != '' AND
                 staticip.temp_expires_on IS NULL
@@ -654,6 +817,7 @@ class StaticIPAddressManager(Manager):
                 interface.id,
                 inet 'fc00::/7' >> ip /* ULA after non-ULA */
             """
+        )
         iface_sql_query = (
             """
             SELECT
@@ -666,7 +830,9 @@ class StaticIPAddressManager(Manager):
             + """ AS ttl,
                 staticip.ip,
                 interface.name,
-                alloc_type != 6 /* DISCOVERED */ AS assigned
+                alloc_type != 6 /* DISCOVERED */ AS assigned,
+                node.domain_id,
+                domain2.id AS domain2_id
             FROM
                 maasserver_interface AS interface
             JOIN maasserver_node AS node ON
@@ -677,29 +843,16 @@ class StaticIPAddressManager(Manager):
                 link.interface_id = interface.id
             JOIN maasserver_staticipaddress AS staticip ON
                 staticip.id = link.staticipaddress_id
-            """
-        )
-        if isinstance(domain_or_subnet, Domain):
-            # This logic is similar to the logic in sql_query above.
-            iface_sql_query += """
             LEFT JOIN maasserver_domain AS domain2 ON
                 /* Pick up another copy of domain looking for instances of
                  * the name as the top of a domain.
                  */
                 domain2.name = CONCAT(
                     interface.name, '.', node.hostname, '.', domain.name)
-            WHERE
-                (domain2.id = %s OR node.domain_id = %s) AND
-            """
-        else:
-            # For subnets, we need ALL the names, so that we can correctly
-            # identify which ones should have the FQDN.  dns/zonegenerator.py
-            # optimizes based on this, and only calls once with a subnet,
-            # expecting to get all the subnets back in one table.
-            iface_sql_query += """
             WHERE
             """
-        iface_sql_query += """
+            + where_clause
+            + """
                 staticip.ip IS NOT NULL AND
                 host(staticip.ip) != '' AND
                 staticip.temp_expires_on IS NULL
@@ -708,24 +861,31 @@ class StaticIPAddressManager(Manager):
                 assigned DESC, /* Return all assigned IPs for a node first. */
                 interface.id
             """
-        # We get user reserved et al mappings first, so that we can overwrite
-        # TTL as we process the return from the SQL horror above.
-        mapping = self._get_special_mappings(domain_or_subnet, raw_ttl)
+        )
+        return sql_query, iface_sql_query
+
+    def _add_hostname_ip_mappings(self, mapping, results, iface_results):
+        """Add the node addresses from the mapping query results to
+        `mapping`, the special mappings of the same domain or subnet.
+
+        :param results: `MappingQueryResult`s, in the query's order.
+        :param iface_results: `InterfaceMappingResult`s, in the query's
+            order.
+        :return: `mapping`.
+        """
         # All of the mappings that we got mean that we will only want to add
         # addresses for the boot interface (is_boot == True).
         iface_is_boot = defaultdict(
             bool, {hostname: True for hostname in mapping.keys()}
         )
         assigned_ips = defaultdict(bool)
-        cursor.execute(sql_query, query_parms)
         # The records from the query provide, for each hostname (after
         # stripping domain), the boot and non-boot interface ip address in ipv4
         # and ipv6.  Our task: if there are boot interace IPs, they win.  If
         # there are none, then whatever we got wins.  The ORDER BY means that
         # we will see all of the boot interfaces before we see any non-boot
         # interface IPs.  See Bug#1584850
-        for result in cursor.fetchall():
-            result = MappingQueryResult(*result)
+        for result in results:
             entry = mapping[result.fqdn]
             entry.node_type = result.node_type
             entry.system_id = result.system_id
@@ -740,9 +900,7 @@ class StaticIPAddressManager(Manager):
         # Next, get all the addresses, on all the interfaces, and add the ones
         # that are not already present on the FQDN as $IFACE.$FQDN.  Exclude
         # any discovered addresses once there are any non-discovered addresses.
-        cursor.execute(iface_sql_query, query_parms)
-        for result in cursor.fetchall():
-            result = InterfaceMappingResult(*result)
+        for result in iface_results:
             if result.assigned:
                 assigned_ips[result.fqdn] = True
             # If this is an assigned IP, or there are NO assigned IPs on the
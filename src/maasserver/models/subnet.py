@@ -5,7 +5,6 @@
 
 __all__ = ["create_cidr", "get_allocated_ips", "Subnet"]
 
-from operator import attrgetter
 from typing import Iterable, Optional
 
 from django.contrib.postgres.fields import ArrayField
@@ -35,6 +34,7 @@ from maasserver.exceptions import (
     StaticIPAddressUnavailable,
 )
 from maasserver.fields import CIDRField, MAASIPAddressField
+from maasserver.freespace import free_space_index
 from maasserver.models.cleansave import CleanSave
 from maasserver.models.staticroute import StaticRoute
 from maasserver.models.timestampedmodel import TimestampedModel
@@ -156,6 +156,44 @@ class SubnetQueriesMixin(MAASQueriesMixin):
         else:
             return None
 
+    # As `find_best_subnet_for_ip_query`, for each of an array of IP
+    # addresses. The address each subnet was found for is in "for_ip".
+    find_best_subnets_for_ips_query = """
+        SELECT DISTINCT ON (address.ip)
+            subnet.*,
+            host(address.ip) "for_ip"
+        FROM unnest(%s::inet[]) AS address(ip)
+        INNER JOIN maasserver_subnet AS subnet
+            ON address.ip << subnet.cidr
+        INNER JOIN maasserver_vlan AS vlan
+            ON subnet.vlan_id = vlan.id
+        ORDER BY
+            address.ip,
+            vlan.dhcp_on DESC,
+            masklen(subnet.cidr) DESC
+        """
+
+    def get_best_subnets_for_ips(self, ips):
+        """Find the most-specific managed Subnet each of the specified IP
+        addresses belongs to, in one query.
+
+        :return: A dict mapping each of `ips` to its `Subnet`, or to None.
+        """
+        addresses = {}
+        for ip in ips:
+            address = IPAddress(ip)
+            if address.is_ipv4_mapped():
+                address = address.ipv4()
+            addresses[ip] = str(address)
+        subnets = {
+            subnet.for_ip: subnet
+            for subnet in self.raw(
+                self.find_best_subnets_for_ips_query,
+                params=[sorted(set(addresses.values()))],
+            )
+        }
+        return {ip: subnets.get(address) for ip, address in addresses.items()}
+
     def validate_filter_specifiers(self, specifiers):
         """Validate the given filter string."""
         try:
@@ -765,6 +803,30 @@ class Subnet(CleanSave, TimestampedModel):
             reserved_ranges |= self.get_maasipset_for_neighbours()
         return reserved_ranges.get_full_range(self.get_ipnetwork())
 
+    def is_address_in_use(self, address):
+        """Return whether `address` of this subnet can't be allocated.
+
+        Addresses allocated other than by being discovered are in use, as
+        are those in dynamic ranges and, in managed subnets, in reserved
+        ranges. Unmanaged subnets allocate from their reserved ranges, so
+        there the addresses outside of them are in use. This is checked in
+        the current transaction, so includes the addresses it allocated.
+
+        :param address: The address, as an integer.
+        """
+        from maasserver.models.staticipaddress import StaticIPAddress
+
+        ip = IPAddress(address, self.get_ipnetwork().version)
+        in_use = StaticIPAddress.objects.filter(ip=str(ip)).exclude(
+            alloc_type=IPADDRESS_TYPE.DISCOVERED
+        )
+        if in_use.exists():
+            return True
+        for iprange in self.iprange_set.all():
+            if ip in iprange.netaddr_iprange:
+                return self.managed or iprange.type != IPRANGE_TYPE.RESERVED
+        return not self.managed
+
     def get_next_ip_for_allocation(
         self,
         exclude_addresses: Optional[Iterable] = None,
@@ -781,23 +843,39 @@ class Subnet(CleanSave, TimestampedModel):
         """
         if exclude_addresses is None:
             exclude_addresses = []
-        free_ranges = self.get_ipranges_not_in_use(
-            exclude_addresses=exclude_addresses,
-            with_neighbours=avoid_observed_neighbours,
-        )
-        if len(free_ranges) == 0 and avoid_observed_neighbours is True:
+        network = self.get_ipnetwork()
+        # The free ranges of the subnet are indexed, so the addresses to
+        # avoid are left out of them here rather than when they are found.
+        exclude = {
+            int(IPAddress(address))
+            for address in exclude_addresses
+            if address in network
+        }
+        if avoid_observed_neighbours:
+            # Circular imports.
+            from maasserver.models import Discovery
+
+            # As in get_maasipset_for_neighbours(), known IP addresses are
+            # already in use.
+            neighbours = Discovery.objects.filter(subnet=self).by_unknown_ip()
+            exclude.update(
+                int(IPAddress(ip))
+                for ip in neighbours.values_list("ip", flat=True)
+            )
+        address = free_space_index.get_next_address(self, exclude)
+        if address is None and avoid_observed_neighbours is True:
             # Try again recursively, but this time consider neighbours to be
             # "free" IP addresses. (We'll pick the least recently seen IP.)
             return self.get_next_ip_for_allocation(
                 exclude_addresses, avoid_observed_neighbours=False
             )
-        elif len(free_ranges) == 0:
+        elif address is None:
             raise StaticIPAddressExhaustion(
                 "No more IPs available in subnet: %s." % self.cidr
             )
         # The first time through this function, we aren't trying to avoid
-        # observed neighbours. In fact, `free_ranges` only contains completely
-        # unused ranges. So we don't need to check for the least recently seen
+        # observed neighbours. In fact, `address` is in a completely unused
+        # range. So we don't need to check for the least recently seen
         # neighbour on the first pass.
         if avoid_observed_neighbours is False:
             # We tried considering neighbours as "in-use" addresses, but the
@@ -817,12 +895,10 @@ class Subnet(CleanSave, TimestampedModel):
                     )
                 )
                 return str(discovery.ip)
-        # The purpose of this is to that we ensure we always get an IP address
-        # from the *smallest* free contiguous range. This way, larger ranges
-        # can be preserved in case they need to be used for applications
-        # requiring them.
-        free_range = min(free_ranges, key=attrgetter("num_addresses"))
-        return str(IPAddress(free_range.first))
+        # The address is the first of the *smallest* free contiguous range.
+        # This way, larger ranges can be preserved in case they need to be
+        # used for applications requiring them.
+        return str(IPAddress(address, network.version))
 
     def render_json_for_related_ips(
         self, with_username=True, with_summary=True
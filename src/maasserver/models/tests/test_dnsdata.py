@@ -381,3 +381,28 @@ class TestDNSDataMapping(MAASServerTestCase):
                 dom, raw_ttl=True
             )
             self.assertEqual(expected_mapping, actual)
+
+    def test_get_hostname_dnsdata_mappings_matches_per_domain_mapping(self):
+        parent = Domain.objects.get_default_domain()
+        name = factory.make_name("node")
+        child = factory.make_Domain(name="%s.%s" % (name, parent.name))
+        other = factory.make_Domain(ttl=random.randint(100, 199))
+        factory.make_Node_with_Interface_on_Subnet(
+            hostname=name, domain=parent
+        )
+        dnsrr = factory.make_DNSResource(
+            name="@", domain=child, no_ip_addresses=True
+        )
+        factory.make_DNSData(dnsresource=dnsrr, ip_addresses=True)
+        for dom in (parent, child, other):
+            factory.make_DNSData(domain=dom)
+            factory.make_DNSData(domain=dom, ttl=random.randint(200, 299))
+        domains = [parent, child, other]
+        mappings = DNSData.objects.get_hostname_dnsdata_mappings(domains)
+        self.assertEqual(
+            {
+                dom: DNSData.objects.get_hostname_dnsdata_mapping(dom)
+                for dom in domains
+            },
+            mappings,
+        )
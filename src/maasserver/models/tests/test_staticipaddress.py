@@ -26,6 +26,7 @@ from maasserver.exceptions import (
     StaticIPAddressOutOfRange,
     StaticIPAddressUnavailable,
 )
+from maasserver.freespace import free_space_index
 from maasserver.models.config import Config
 from maasserver.models.domain import Domain
 from maasserver.models.staticipaddress import (
@@ -42,6 +43,8 @@ from maasserver.utils import orm
 from maasserver.utils.dns import get_ip_based_hostname
 from maasserver.utils.orm import reload_object, transactional
 from maasserver.websockets.base import dehydrate_datetime
+from maastesting.djangotestcase import count_queries
+from maastesting.matchers import MockCalledOnceWith
 from netaddr import IPAddress
 from psycopg2.errorcodes import FOREIGN_KEY_VIOLATION
 from testtools import ExpectedException
@@ -210,6 +213,16 @@ class TestStaticIPAddressManager(MAASServerTestCase):
         )
         self.assertEqual("10.0.0.1", ipaddress.ip)
 
+    def test_allocate_new_takes_requested_IP_from_free_space_index(self):
+        take = self.patch(free_space_index, "take")
+        subnet = factory.make_Subnet(cidr="10.0.0.0/24")
+        StaticIPAddress.objects.allocate_new(
+            subnet, requested_address="10.0.0.1"
+        )
+        self.assertThat(
+            take, MockCalledOnceWith(subnet.id, int(IPAddress("10.0.0.1")))
+        )
+
     def test_allocate_new_raises_when_requested_IP_unavailable(self):
         subnet = factory.make_ipv4_Subnet_with_IPRanges()
         requested_address = StaticIPAddress.objects.allocate_new(
@@ -1187,6 +1200,71 @@ class TestStaticIPAddressManagerMapping(MAASServerTestCase):
             mapping,
         )
 
+    def test_get_hostname_ip_mappings_matches_get_hostname_ip_mapping(self):
+        default_domain = Domain.objects.get_default_domain()
+        parent = factory.make_Domain()
+        name = factory.make_name()
+        child = factory.make_Domain(name="%s.%s" % (name, parent.name))
+        other = factory.make_Domain()
+        subnet = factory.make_Subnet()
+        # A node at the head of the child domain, with an address on a
+        # second interface.
+        node = factory.make_Node_with_Interface_on_Subnet(
+            subnet=subnet, domain=parent, hostname=name
+        )
+        node.interface_set.first().ip_addresses.add(
+            factory.make_StaticIPAddress(subnet=subnet)
+        )
+        factory.make_Interface(node=node).ip_addresses.add(
+            factory.make_StaticIPAddress(subnet=subnet)
+        )
+        factory.make_Node_with_Interface_on_Subnet(
+            subnet=subnet, domain=default_domain
+        )
+        # Addresses with and without names.
+        factory.make_StaticIPAddress(
+            subnet=subnet,
+            hostname="%s.%s" % (factory.make_name("host"), other.name),
+            alloc_type=IPADDRESS_TYPE.USER_RESERVED,
+        )
+        factory.make_StaticIPAddress(
+            subnet=subnet, alloc_type=IPADDRESS_TYPE.USER_RESERVED
+        )
+        domains = [default_domain, parent, child, other]
+        manager = StaticIPAddress.objects
+        mappings, subnet_mapping = manager.get_hostname_ip_mappings(domains)
+        self.assertEqual(
+            {
+                domain: manager.get_hostname_ip_mapping(domain)
+                for domain in domains
+            },
+            mappings,
+        )
+        self.assertEqual(
+            manager.get_hostname_ip_mapping(subnet), subnet_mapping
+        )
+
+    def test_get_hostname_ip_mappings_uses_same_queries_for_any_domains(self):
+        domains = [factory.make_Domain() for _ in range(3)]
+        for domain in domains:
+            factory.make_Node_with_Interface_on_Subnet(domain=domain)
+        count_one, _ = count_queries(
+            StaticIPAddress.objects.get_hostname_ip_mappings, domains[:1]
+        )
+        count_all, _ = count_queries(
+            StaticIPAddress.objects.get_hostname_ip_mappings, domains
+        )
+        self.assertEqual(count_one, count_all)
+
+    def test_get_hostname_ip_mappings_without_subnets(self):
+        domain = factory.make_Domain()
+        manager = StaticIPAddress.objects
+        mappings, subnet_mapping = manager.get_hostname_ip_mappings(
+            [domain], subnets=False
+        )
+        self.assertEqual({domain: {}}, mappings)
+        self.assertIsNone(subnet_mapping)
+
     def test_get_hostname_ip_mapping_does_not_return_discovered_and_auto(self):
         # Create a situation where we have an AUTO ip on the pxeboot interface,
         # and a discovered IP of the other address family (v4/v6) on another
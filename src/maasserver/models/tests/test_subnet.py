@@ -21,6 +21,7 @@ from maasserver.enum import (
     RDNS_MODE_CHOICES,
 )
 from maasserver.exceptions import StaticIPAddressExhaustion
+from maasserver.freespace import free_space_index
 from maasserver.models import Config, Notification, Space
 from maasserver.models.subnet import create_cidr, get_allocated_ips, Subnet
 from maasserver.models.timestampedmodel import now
@@ -824,6 +825,40 @@ class TestGetBestSubnetForIP(MAASServerTestCase):
         self.expectThat(subnet, Is(None))
 
 
+class TestGetBestSubnetsForIPs(MAASServerTestCase):
+    def test__returns_most_specific_subnet_for_each_ip(self):
+        factory.make_Subnet(cidr="10.0.0.0/8")
+        ipv4_subnet = factory.make_Subnet(cidr="10.1.1.0/24")
+        factory.make_Subnet(cidr="10.1.0.0/16")
+        factory.make_Subnet(cidr="2001::/16")
+        ipv6_subnet = factory.make_Subnet(cidr="2001:db8:1:2::/64")
+        subnets = Subnet.objects.get_best_subnets_for_ips(
+            ["10.1.1.1", "::ffff:10.1.1.2", "2001:db8:1:2::1", "::"]
+        )
+        self.assertEqual(
+            {
+                "10.1.1.1": ipv4_subnet,
+                "::ffff:10.1.1.2": ipv4_subnet,
+                "2001:db8:1:2::1": ipv6_subnet,
+                "::": None,
+            },
+            subnets,
+        )
+
+    def test__prefers_subnet_on_managed_vlan(self):
+        factory.make_Subnet(cidr="10.1.1.0/24")
+        expected_subnet = factory.make_Subnet(
+            cidr="10.1.0.0/16", dhcp_on=True
+        )
+        self.assertEqual(
+            {"10.1.1.1": expected_subnet},
+            Subnet.objects.get_best_subnets_for_ips(["10.1.1.1"]),
+        )
+
+    def test__returns_empty_dict_for_no_ips(self):
+        self.assertEqual({}, Subnet.objects.get_best_subnets_for_ips([]))
+
+
 class SubnetLabelTest(MAASServerTestCase):
     def test__returns_cidr_for_null_name(self):
         network = factory.make_ip4_or_6_network()
@@ -1325,6 +1360,47 @@ class TestSubnetGetLeastRecentlySeenUnknownNeighbour(MAASServerTestCase):
         self.assertThat(ip, Is(None))
 
 
+class TestSubnetIsAddressInUse(MAASServerTestCase):
+    def test_free_address_is_not_in_use(self):
+        subnet = factory.make_Subnet(cidr="10.0.0.0/24")
+        self.assertFalse(subnet.is_address_in_use(int(IPAddress("10.0.0.5"))))
+
+    def test_allocated_address_is_in_use(self):
+        subnet = factory.make_Subnet(cidr="10.0.0.0/24")
+        factory.make_StaticIPAddress(
+            ip="10.0.0.5", alloc_type=IPADDRESS_TYPE.STICKY, subnet=subnet
+        )
+        self.assertTrue(subnet.is_address_in_use(int(IPAddress("10.0.0.5"))))
+
+    def test_discovered_address_is_not_in_use(self):
+        subnet = factory.make_Subnet(cidr="10.0.0.0/24")
+        factory.make_StaticIPAddress(
+            ip="10.0.0.5", alloc_type=IPADDRESS_TYPE.DISCOVERED, subnet=subnet
+        )
+        self.assertFalse(subnet.is_address_in_use(int(IPAddress("10.0.0.5"))))
+
+    def test_address_in_range_is_in_use(self):
+        subnet = factory.make_Subnet(cidr="10.0.0.0/24")
+        factory.make_IPRange(
+            subnet,
+            start_ip="10.0.0.2",
+            end_ip="10.0.0.9",
+            alloc_type=IPRANGE_TYPE.RESERVED,
+        )
+        self.assertTrue(subnet.is_address_in_use(int(IPAddress("10.0.0.5"))))
+
+    def test_unmanaged_address_in_reserved_range_is_not_in_use(self):
+        subnet = factory.make_Subnet(cidr="10.0.0.0/24", managed=False)
+        factory.make_IPRange(
+            subnet,
+            start_ip="10.0.0.2",
+            end_ip="10.0.0.9",
+            alloc_type=IPRANGE_TYPE.RESERVED,
+        )
+        self.assertFalse(subnet.is_address_in_use(int(IPAddress("10.0.0.5"))))
+        self.assertTrue(subnet.is_address_in_use(int(IPAddress("10.0.0.10"))))
+
+
 class TestSubnetGetNextIPForAllocation(MAASServerTestCase):
 
     scenarios = (
@@ -1427,6 +1503,21 @@ class TestSubnetGetNextIPForAllocation(MAASServerTestCase):
             DocTestMatches("Next IP address...observed previously..."),
         )
 
+    def test__does_not_use_indexed_address_allocated_since(self):
+        self.patch(free_space_index, "enabled", True)
+        self.addCleanup(free_space_index.clear)
+        # Note: 10.0.0.0/29 --> 10.0.0.1 through 10.0.0.0.6 are usable.
+        subnet = self.make_Subnet(
+            cidr="10.0.0.0/29", gateway_ip=None, dns_servers=None
+        )
+        ip = subnet.get_next_ip_for_allocation()
+        self.assertThat(ip, Equals("10.0.0.1"))
+        factory.make_StaticIPAddress(
+            ip="10.0.0.1", alloc_type=IPADDRESS_TYPE.STICKY, subnet=subnet
+        )
+        ip = subnet.get_next_ip_for_allocation()
+        self.assertThat(ip, Equals("10.0.0.2"))
+
     def test__uses_smallest_free_range_when_not_considering_neighbours(self):
         # Note: 10.0.0.0/29 --> 10.0.0.1 through 10.0.0.0.6 are usable.
         subnet = self.make_Subnet(
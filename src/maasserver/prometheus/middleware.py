@@ -10,30 +10,38 @@ from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 
 
 class QueryCountCursorWrapper(CursorWrapper):
-    """Track execution times for queries."""
+    """Track execution times for queries.
 
-    def __init__(self, cursor, db, times):
+    If `queries` is not `None`, the time and SQL of each query are also
+    appended to it.
+    """
+
+    def __init__(self, cursor, db, times, queries=None):
         super().__init__(cursor, db)
         self.times = times
+        self.queries = queries
 
     def execute(self, sql, params=None):
-        with self._track_time():
+        with self._track_time(sql):
             return super().execute(sql, params=params)
 
     # XXX this doesn't support executemany as it's not really possible to get
     # times for each call, and it's not used in MAAS anyway.
 
     def callproc(self, procname, params=None, kparams=None):
-        with self._track_time():
+        with self._track_time(procname):
             return super().callproc(procname, params=None, kparams=None)
 
     @contextmanager
-    def _track_time(self):
+    def _track_time(self, sql):
         start = time()
         try:
             yield
         finally:
-            self.times.append(time() - start)
+            elapsed = time() - start
+            self.times.append(elapsed)
+            if self.queries is not None:
+                self.queries.append((elapsed, sql))
 
 
 class PrometheusRequestMetricsMiddleware:
@@ -91,12 +99,14 @@ class PrometheusRequestMetricsMiddleware:
 
 
 @contextmanager
-def wrap_query_counter_cursor(query_latencies, dbconn_name="default"):
+def wrap_query_counter_cursor(
+    query_latencies, dbconn_name="default", queries=None
+):
     """Context manager replacing the cursor with a QueryCountCursorWrapper."""
     dbconn = connections[dbconn_name]
     orig_make_cursor = dbconn.make_cursor
     dbconn.make_cursor = lambda cursor: QueryCountCursorWrapper(
-        cursor, dbconn, query_latencies
+        cursor, dbconn, query_latencies, queries=queries
     )
     try:
         yield
@@ -30,6 +30,19 @@ DHCP:
     for messages on 'sys_dhcp_{id}' channel and set that rack controller as
     needing an update. Any time a message is received on this queue that rack
     controller is marked as needing an update.
+
+    The rack controllers needing an update share a `DHCPConfigurationCache`,
+    so the parts of the configuration that are the same for all of them are
+    computed once per change. The cache is discarded whenever another message
+    is received, and once all of the rack controllers have been updated.
+
+Boot configurations:
+    Rack controllers cache the boot configurations they get from the region.
+    Each regiond process listens for messages on the 'sys_bootconfig' channel,
+    which hold the MAC addresses of machines whose boot configurations have
+    changed, or nothing when all of them have. The rack controllers it is
+    watching are told to invalidate the cached boot configurations for those
+    MAC addresses.
 """
 
 __all__ = ["RackControllerService"]
@@ -40,15 +53,22 @@ import os
 from maasserver import dhcp
 from maasserver.listener import PostgresListenerUnregistrationError
 from maasserver.models.node import RackController
+from maasserver.rpc import getClientFor
 from maasserver.utils.orm import transactional
 from maasserver.utils.threads import deferToDatabase
 from provisioningserver.logger import LegacyLogger
+from provisioningserver.rpc.cluster import InvalidateBootConfigs
 from provisioningserver.rpc.exceptions import NoConnectionsAvailable
 from provisioningserver.utils.twisted import asynchronous, callOut, FOREVER
 from twisted.application.service import Service
 from twisted.internet import reactor
-from twisted.internet.defer import CancelledError, maybeDeferred
+from twisted.internet.defer import (
+    CancelledError,
+    DeferredList,
+    maybeDeferred,
+)
 from twisted.internet.task import LoopingCall
+from twisted.protocols.amp import UnhandledCommand
 
 
 log = LegacyLogger()
@@ -77,6 +97,7 @@ class RackControllerService(Service):
         self.processingDone = None
         self.watching = set()
         self.needsDHCPUpdate = set()
+        self.dhcpCache = None
         self.ipcWorker = ipcWorker
         self.postgresListener = postgresListener
 
@@ -91,6 +112,9 @@ class RackControllerService(Service):
             self.postgresListener.register(
                 "sys_core_%d" % self.processId, self.coreHandler
             )
+            self.postgresListener.register(
+                "sys_bootconfig", self.bootConfigHandler
+            )
             return self.processId
 
         @transactional
@@ -146,6 +170,13 @@ class RackControllerService(Service):
             except PostgresListenerUnregistrationError:
                 # Error is acceptable as it might not have been called yet.
                 pass
+            try:
+                self.postgresListener.unregister(
+                    "sys_bootconfig", self.bootConfigHandler
+                )
+            except PostgresListenerUnregistrationError:
+                # Error is acceptable as it might not have been called yet.
+                pass
 
             # Unregister all DHCP handling.
             for rack_id in self.watching:
@@ -159,6 +190,7 @@ class RackControllerService(Service):
 
             self.watching = set()
             self.needsDHCPUpdate = set()
+            self.dhcpCache = None
             self.starting = None
             if self.processing.running:
                 self.processing.stop()
@@ -211,6 +243,7 @@ class RackControllerService(Service):
                 )
             self.watching.add(rack_id)
             self.needsDHCPUpdate.add(rack_id)
+            self.dhcpCache = None
             self.startProcessing()
         else:
             raise ValueError("Unknown action: %s." % action)
@@ -236,6 +269,8 @@ class RackControllerService(Service):
         rack_id = int(rack_id)
         if rack_id in self.watching:
             self.needsDHCPUpdate.add(rack_id)
+            # The DHCP configuration has changed.
+            self.dhcpCache = None
             self.startProcessing()
 
             log.debug(
@@ -253,6 +288,50 @@ class RackControllerService(Service):
                 rack_id=rack_id,
             )
 
+    def bootConfigHandler(self, channel, message):
+        """Called when the `sys_bootconfig` message is received."""
+        if len(self.watching) == 0:
+            return
+        # The message holds the MAC addresses whose boot configurations have
+        # changed, or nothing when all of them have.
+        macs = message.split() or None
+        d = deferToDatabase(self.getWatchedSystemIDs)
+        d.addCallback(self.invalidateBootConfigs, macs)
+        d.addErrback(
+            log.err,
+            "Failed invalidating boot configurations on rack controllers.",
+        )
+        return d
+
+    @transactional
+    def getWatchedSystemIDs(self):
+        """Return the system_ids of the rack controllers being watched."""
+        return list(
+            RackController.objects.filter(id__in=self.watching).values_list(
+                "system_id", flat=True
+            )
+        )
+
+    def invalidateBootConfigs(self, system_ids, macs):
+        """Invalidate the boot configurations of `macs` cached by the rack
+        controllers with `system_ids`."""
+
+        def invalidate(system_id):
+            d = getClientFor(system_id)
+            d.addCallback(
+                lambda client: client(InvalidateBootConfigs, macs=macs)
+            )
+            # Older rack controllers do not cache boot configurations.
+            d.addErrback(lambda f: f.trap(UnhandledCommand))
+            d.addErrback(lambda f: f.trap(NoConnectionsAvailable))
+            return d
+
+        return DeferredList(
+            map(invalidate, system_ids),
+            fireOnOneErrback=True,
+            consumeErrors=True,
+        )
+
     def startProcessing(self):
         """Start the process looping call."""
         if not self.processing.running:
@@ -265,6 +344,7 @@ class RackControllerService(Service):
             self.processing.stop()
         elif len(self.needsDHCPUpdate) == 0:
             # Nothing more to do.
+            self.dhcpCache = None
             self.processing.stop()
         else:
 
@@ -291,8 +371,10 @@ class RackControllerService(Service):
             rack_id=rack_id,
         )
 
+        if self.dhcpCache is None:
+            self.dhcpCache = dhcp.DHCPConfigurationCache()
         d = deferToDatabase(
             transactional(RackController.objects.get), id=rack_id
         )
-        d.addCallback(dhcp.configure_dhcp)
+        d.addCallback(dhcp.configure_dhcp, self.dhcpCache)
         return d
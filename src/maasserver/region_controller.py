@@ -29,6 +29,7 @@ __all__ = ["RegionControllerService"]
 
 from operator import attrgetter
 
+from django.conf import settings
 from maasserver import locks
 from maasserver.dns.config import dns_update_all_zones
 from maasserver.macaroon_auth import get_auth_info
@@ -42,8 +43,17 @@ from maasserver.service_monitor import service_monitor
 from maasserver.utils import synchronised
 from maasserver.utils.orm import transactional, with_connection
 from maasserver.utils.threads import deferToDatabase
+from provisioningserver.dns.actions import (
+    start_zone_writers,
+    stop_zone_writers,
+)
 from provisioningserver.logger import LegacyLogger
-from provisioningserver.utils.twisted import asynchronous, FOREVER, pause
+from provisioningserver.utils.twisted import (
+    asynchronous,
+    callOut,
+    FOREVER,
+    pause,
+)
 from twisted.application.service import Service
 from twisted.internet import reactor
 from twisted.internet.defer import DeferredList, inlineCallbacks
@@ -104,6 +114,7 @@ class RegionControllerService(Service):
     def startService(self):
         """Start listening for messages."""
         super(RegionControllerService, self).startService()
+        start_zone_writers(settings.DNS_ZONE_WRITER_PROCESSES)
         self.postgresListener.register("sys_dns", self.markDNSForUpdate)
         self.postgresListener.register("sys_proxy", self.markProxyForUpdate)
         self.postgresListener.register("sys_rbac", self.markRBACForUpdate)
@@ -124,7 +135,8 @@ class RegionControllerService(Service):
         if self.processingDefer is not None:
             self.processingDefer, d = None, self.processingDefer
             self.processing.stop()
-            return d
+            return d.addBoth(callOut, stop_zone_writers)
+        stop_zone_writers()
 
     def markAllForUpdate(self):
         self.markDNSForUpdate(None, None)
@@ -178,9 +190,12 @@ class RegionControllerService(Service):
         defers = []
         if self.needsDNSUpdate:
             self.needsDNSUpdate = False
-            d = deferToDatabase(transactional(dns_update_all_zones))
+            zone_timings = {}
+            d = deferToDatabase(
+                transactional(dns_update_all_zones), zone_timings=zone_timings
+            )
             d.addCallback(self._checkSerial)
-            d.addCallback(self._logDNSReload)
+            d.addCallback(self._logDNSReload, zone_timings)
             # Order here matters, first needsDNSUpdate is set then pass the
             # failure onto `_onDNSReloadFailure` to do the correct thing
             # with the DNS server.
@@ -249,15 +264,22 @@ class RegionControllerService(Service):
             )
         return result
 
-    def _logDNSReload(self, result):
-        """Log the reason DNS was reloaded."""
+    def _logDNSReload(self, result, timings=None):
+        """Log the reason DNS was reloaded.
+
+        :param timings: The seconds it took to update each of the zones
+            updated one by one, by zone name.
+        """
         if result is None:
             return None
-        serial, _, domain_names = result
+        serial, _, _ = result
         if self.previousSerial is None:
             # This was the first load for starting the service.
             self.previousSerial = serial
-            log.msg("Reloaded DNS configuration; regiond started.")
+            log.msg(
+                "Reloaded DNS configuration; regiond started."
+                + self._formatZoneTimings(timings)
+            )
         else:
             # This is a reload since the region has been running. Get the
             # reason for the reload.
@@ -273,7 +295,7 @@ class RegionControllerService(Service):
                     msg = "Reloaded DNS configuration: \n" + "\n".join(
                         " * %s" % reason for reason in reasons
                     )
-                log.msg(msg)
+                log.msg(msg + self._formatZoneTimings(timings))
 
             d = deferToDatabase(
                 self._getReloadReasons, self.previousSerial, serial
@@ -284,6 +306,23 @@ class RegionControllerService(Service):
             self.previousSerial = serial
             return d
 
+    def _formatZoneTimings(self, timings, limit=5):
+        """Format the time taken to update each zone, slowest first."""
+        if not timings:
+            return ""
+        slowest = sorted(timings.items(), key=lambda item: -item[1])
+        msg = "\nUpdated %d zone(s) in %.3fs: %s" % (
+            len(timings),
+            sum(timings.values()),
+            ", ".join(
+                "%s (%.3fs)" % (zone_name, seconds)
+                for zone_name, seconds in slowest[:limit]
+            ),
+        )
+        if len(slowest) > limit:
+            msg += " and %d more" % (len(slowest) - limit)
+        return msg
+
     def _onDNSReloadFailure(self, failure):
         """Force kill and restart bind9."""
         failure.trap(DNSReloadError)
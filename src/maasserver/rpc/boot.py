@@ -10,6 +10,7 @@ import shlex
 
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.db.models import Q
+from maasserver.bootsnapshot import boot_config_snapshots
 from maasserver.compose_preseed import RSYSLOG_PORT
 from maasserver.dns.config import get_resource_name_for_subnet
 from maasserver.enum import BOOT_RESOURCE_FILE_TYPE, INTERFACE_TYPE
@@ -43,6 +44,21 @@ maaslog = get_maas_logger("rpc.boot")
 
 DEFAULT_ARCH = "i386"
 
+# The configuration items that boot configurations use.
+BOOT_CONFIG_NAMES = [
+    "commissioning_osystem",
+    "commissioning_distro_series",
+    "enable_third_party_drivers",
+    "default_min_hwe_kernel",
+    "default_osystem",
+    "default_distro_series",
+    "kernel_opts",
+    "use_rack_proxy",
+    "maas_internal_domain",
+    "remote_syslog",
+    "maas_syslog_port",
+]
+
 
 def get_node_from_mac_or_hardware_uuid(mac=None, hardware_uuid=None):
     """Get a Node object from a MAC address or hardware UUID string.
@@ -299,6 +315,27 @@ def get_base_url_for_local_ip(local_ip, internal_domain):
         return "http://%s:5248/" % local_ip
 
 
+def get_boot_configs():
+    """Get the configuration items that boot configurations use."""
+    return Config.objects.get_configs(BOOT_CONFIG_NAMES)
+
+
+def get_default_commissioning_arch(osystem, series):
+    """Get the architecture to enlist a machine with when it's not known.
+
+    This is the architecture of the best boot resource for the operating
+    system and series, or the default architecture if there is none.
+    LP #1181334
+    """
+    resource = BootResource.objects.get_default_commissioning_resource(
+        osystem, series
+    )
+    if resource is None:
+        return DEFAULT_ARCH
+    arch, _ = resource.split_arch()
+    return arch
+
+
 def get_final_boot_purpose(machine, arch, purpose):
     """Return the final boot purpose."""
     if machine is None and arch == DEFAULT_ARCH:
@@ -315,7 +352,6 @@ def get_final_boot_purpose(machine, arch, purpose):
 
 
 @synchronous
-@transactional
 def get_config(
     system_id,
     local_ip,
@@ -333,6 +369,36 @@ def get_config(
 
     Raises BootConfigNoResponse when booting machine should fail to next file.
     """
+    # The snapshot must be got before the transaction starts; see
+    # `maasserver.bootsnapshot`.
+    snapshot = boot_config_snapshots.current()
+    return _get_config(
+        snapshot,
+        system_id,
+        local_ip,
+        remote_ip,
+        arch=arch,
+        subarch=subarch,
+        mac=mac,
+        hardware_uuid=hardware_uuid,
+        bios_boot_method=bios_boot_method,
+    )
+
+
+@transactional
+def _get_config(
+    snapshot,
+    system_id,
+    local_ip,
+    remote_ip,
+    arch=None,
+    subarch=None,
+    mac=None,
+    hardware_uuid=None,
+    bios_boot_method=None,
+):
+    """Get the booting configuration for a machine, using `snapshot` for
+    what does not depend on the machine."""
     rack_controller = RackController.objects.get(system_id=system_id)
     region_ip = None
     if remote_ip is not None:
@@ -350,21 +416,7 @@ def get_config(
         raise BootConfigNoResponse()
 
     # Get all required configuration objects in a single query.
-    configs = Config.objects.get_configs(
-        [
-            "commissioning_osystem",
-            "commissioning_distro_series",
-            "enable_third_party_drivers",
-            "default_min_hwe_kernel",
-            "default_osystem",
-            "default_distro_series",
-            "kernel_opts",
-            "use_rack_proxy",
-            "maas_internal_domain",
-            "remote_syslog",
-            "maas_syslog_port",
-        ]
-    )
+    configs = snapshot.get(get_boot_configs)
 
     # Compute the syslog server.
     log_host, log_port = (
@@ -442,8 +494,10 @@ def get_config(
         if configs["use_rack_proxy"]:
             preseed_url = compose_preseed_url(
                 machine,
-                base_url=get_base_url_for_local_ip(
-                    local_ip, configs["maas_internal_domain"]
+                base_url=snapshot.get(
+                    get_base_url_for_local_ip,
+                    local_ip,
+                    configs["maas_internal_domain"],
                 ),
             )
         else:
@@ -549,8 +603,10 @@ def get_config(
         purpose = "commissioning"  # enlistment
         if configs["use_rack_proxy"]:
             preseed_url = compose_enlistment_preseed_url(
-                base_url=get_base_url_for_local_ip(
-                    local_ip, configs["maas_internal_domain"]
+                base_url=snapshot.get(
+                    get_base_url_for_local_ip,
+                    local_ip,
+                    configs["maas_internal_domain"],
                 )
             )
         else:
@@ -564,32 +620,23 @@ def get_config(
         min_hwe_kernel = configs["default_min_hwe_kernel"]
 
         # When no architecture is defined for the enlisting machine select
-        # the best boot resource for the operating system and series. If
-        # none exists fallback to the default architecture. LP #1181334
+        # the best boot resource for the operating system and series.
         if arch is None:
-            resource = BootResource.objects.get_default_commissioning_resource(
-                osystem, series
+            arch = snapshot.get(
+                get_default_commissioning_arch, osystem, series
             )
-            if resource is None:
-                arch = DEFAULT_ARCH
-            else:
-                arch, _ = resource.split_arch()
         # The subarch defines what kernel is booted. With MAAS 2.1 this changed
         # from hwe-<letter> to hwe-<version> or ga-<version>. Validation
         # converts between the two formats to make sure a bootable subarch is
         # selected.
-        if subarch is None:
-            min_hwe_kernel = validate_hwe_kernel(
-                None, min_hwe_kernel, "%s/generic" % arch, osystem, series
-            )
-        else:
-            min_hwe_kernel = validate_hwe_kernel(
-                None,
-                min_hwe_kernel,
-                "%s/%s" % (arch, subarch),
-                osystem,
-                series,
-            )
+        min_hwe_kernel = snapshot.get(
+            validate_hwe_kernel,
+            None,
+            min_hwe_kernel,
+            "%s/%s" % (arch, "generic" if subarch is None else subarch),
+            osystem,
+            series,
+        )
         # If no hwe_kernel was found set the subarch to the default, 'generic.'
         if min_hwe_kernel is None:
             subarch = "generic"
@@ -600,13 +647,14 @@ def get_config(
         extra_kernel_opts = configs["kernel_opts"]
 
     boot_purpose = get_final_boot_purpose(machine, arch, purpose)
-    kernel, initrd, boot_dtb = get_boot_filenames(
+    kernel, initrd, boot_dtb = snapshot.get(
+        get_boot_filenames,
         arch,
         subarch,
         osystem,
         series,
-        commissioning_osystem=configs["commissioning_osystem"],
-        commissioning_distro_series=configs["commissioning_distro_series"],
+        configs["commissioning_osystem"],
+        configs["commissioning_distro_series"],
     )
 
     # Return the params to the rack controller. Include the system_id only
@@ -3,21 +3,24 @@
 
 """RPC helpers relating to DHCP leases."""
 
-__all__ = ["update_lease"]
+__all__ = ["update_lease", "update_leases"]
 
+from collections import defaultdict
+from contextlib import contextmanager
 from datetime import datetime
 
-from maasserver.enum import IPADDRESS_FAMILY, IPADDRESS_TYPE
+from maasserver.enum import IPADDRESS_FAMILY, IPADDRESS_TYPE, IPRANGE_TYPE
 from maasserver.models import (
     DNSResource,
     Interface,
+    IPRange,
     Node,
     StaticIPAddress,
     Subnet,
     UnknownInterface,
 )
-from maasserver.utils.orm import transactional
-from netaddr import IPAddress
+from maasserver.utils.orm import is_retryable_failure, savepoint, transactional
+from netaddr import AddrFormatError, EUI, IPAddress, mac_unix_expanded
 from provisioningserver.logger import LegacyLogger
 from provisioningserver.utils.network import coerce_to_valid_hostname
 from provisioningserver.utils.twisted import synchronous
@@ -39,6 +42,129 @@ def _is_valid_hostname(hostname):
     )
 
 
+def _normalise_mac(mac):
+    """Return `mac` as PostgreSQL renders it, e.g. for "0:1a:2b:3c:4d:5e"."""
+    try:
+        return str(EUI(mac, dialect=mac_unix_expanded))
+    except (AddrFormatError, TypeError, ValueError):
+        return mac
+
+
+class LeaseUpdateBatch:
+    """The database state needed to update a batch of DHCP leases.
+
+    The subnets, dynamic ranges, interfaces and node hostnames the leases
+    refer to are each fetched in one query for the whole batch, instead of
+    once for each lease.
+    """
+
+    def __init__(self, leases):
+        ips = set()
+        for lease in leases:
+            try:
+                IPAddress(lease["ip"])
+            except (AddrFormatError, TypeError, ValueError):
+                continue
+            ips.add(lease["ip"])
+        self.subnets = Subnet.objects.get_best_subnets_for_ips(ips)
+        subnet_ids = {
+            subnet.id for subnet in self.subnets.values() if subnet is not None
+        }
+        self.dynamic_ranges = defaultdict(list)
+        for iprange in IPRange.objects.filter(
+            type=IPRANGE_TYPE.DYNAMIC, subnet_id__in=subnet_ids
+        ):
+            self.dynamic_ranges[iprange.subnet_id].append(iprange)
+        self.interfaces = defaultdict(list)
+        self._added_interfaces = []
+        for interface in Interface.objects.filter(
+            mac_address__in={lease["mac"] for lease in leases}
+        ):
+            self.add_interface(interface)
+        hostnames = {
+            coerce_to_valid_hostname(lease.get("hostname"))
+            for lease in leases
+            if _is_valid_hostname(lease.get("hostname"))
+        }
+        self.node_hostnames = set(
+            Node.objects.filter(hostname__in=hostnames).values_list(
+                "hostname", flat=True
+            )
+        )
+
+    def get_subnet(self, ip):
+        """Return the best subnet for `ip`, or None."""
+        return self.subnets.get(ip)
+
+    def get_dynamic_range(self, subnet, ip):
+        """Return the dynamic `IPRange` of `subnet` holding `ip`, or None."""
+        for iprange in self.dynamic_ranges[subnet.id]:
+            if ip in iprange.netaddr_iprange:
+                return iprange
+        return None
+
+    def get_interfaces(self, mac):
+        """Return the interfaces with `mac`."""
+        return list(self.interfaces[_normalise_mac(mac)])
+
+    def add_interface(self, interface):
+        """Record `interface` as having its MAC address."""
+        mac = _normalise_mac(str(interface.mac_address))
+        self.interfaces[mac].append(interface)
+        self._added_interfaces.append((mac, interface))
+
+    @contextmanager
+    def savepoint(self):
+        """Context manager to wrap the update of one lease in a savepoint.
+
+        The interfaces added within it are forgotten when it fails, as they
+        are rolled back with the savepoint.
+        """
+        self._added_interfaces = []
+        try:
+            with savepoint():
+                yield
+        except BaseException:
+            for mac, interface in self._added_interfaces:
+                self.interfaces[mac].remove(interface)
+            raise
+        finally:
+            self._added_interfaces = []
+
+    def is_node_hostname(self, hostname):
+        """Return whether a node has `hostname`."""
+        return coerce_to_valid_hostname(hostname) in self.node_hostnames
+
+
+@synchronous
+@transactional
+def update_leases(leases):
+    """Update a batch of DHCP leases from a cluster, in one transaction.
+
+    :param leases: Dicts with the arguments of `update_lease` for each lease,
+        as found in :py:class`~provisioningserver.rpc.region.UpdateLeases`.
+    :return: A list of dicts with the "index" of each lease that could not
+        be updated, and the "error". Each lease is applied in a savepoint,
+        so those that fail do not affect the rest of the batch.
+    """
+    batch = LeaseUpdateBatch(leases)
+    failures = []
+    for index, lease in enumerate(leases):
+        try:
+            with batch.savepoint():
+                _update_lease(batch, **lease)
+        except LeaseUpdateError as error:
+            log.msg("Failed to update lease: %s" % error)
+            failures.append({"index": index, "error": str(error)})
+        except Exception as error:
+            # The whole transaction has to be retried for these.
+            if is_retryable_failure(error):
+                raise
+            log.err(None, "Failed to update lease for %s." % lease.get("ip"))
+            failures.append({"index": index, "error": str(error)})
+    return failures
+
+
 @synchronous
 @transactional
 def update_lease(
@@ -74,13 +200,40 @@ def update_lease(
     :raises NoSuchCluster: If the cluster identified by `cluster_uuid` does not
         exist.
     """
+    lease = dict(mac=mac, ip=ip, hostname=hostname)
+    return _update_lease(
+        LeaseUpdateBatch([lease]),
+        action,
+        mac,
+        ip_family,
+        ip,
+        timestamp,
+        lease_time,
+        hostname,
+    )
+
+
+def _update_lease(
+    batch,
+    action,
+    mac,
+    ip_family,
+    ip,
+    timestamp,
+    lease_time=None,
+    hostname=None,
+):
+    """Update one DHCP lease, using the state fetched for its `batch`.
+
+    See `update_lease`.
+    """
     # Check for a valid action.
     if action not in ["commit", "expiry", "release"]:
         raise LeaseUpdateError("Unknown lease action: %s" % action)
 
     # Get the subnet for this IP address. If no subnet exists then something
     # is wrong as we should not be recieving message about unknown subnets.
-    subnet = Subnet.objects.get_best_subnet_for_ip(ip)
+    subnet = batch.get_subnet(ip)
     if subnet is None:
         raise LeaseUpdateError("No subnet exists for: %s" % ip)
 
@@ -114,12 +267,12 @@ def update_lease(
 
     # We will recieve actions on all addresses in the subnet. We only want
     # to update the addresses in the dynamic range.
-    dynamic_range = subnet.get_dynamic_range_for_ip(IPAddress(ip))
+    dynamic_range = batch.get_dynamic_range(subnet, IPAddress(ip))
     if dynamic_range is None:
         # Do nothing.
         return {}
 
-    interfaces = list(Interface.objects.filter(mac_address=mac))
+    interfaces = batch.get_interfaces(mac)
     if len(interfaces) == 0 and action == "commit":
         # A MAC address that is unknown to MAAS was given an IP address. Create
         # an unknown interface for this lease.
@@ -127,6 +280,7 @@ def update_lease(
             name="eth0", mac_address=mac, vlan_id=subnet.vlan_id
         )
         unknown_interface.save()
+        batch.add_interface(unknown_interface)
         interfaces = [unknown_interface]
     elif len(interfaces) == 0:
         # No interfaces and not commit action so nothing needs to be done.
@@ -180,10 +334,7 @@ def update_lease(
         if sip_hostname is not None:
             # MAAS automatically manages DNS for node hostnames, so we cannot
             # allow a DHCP client to override that.
-            hostname_belongs_to_a_node = Node.objects.filter(
-                hostname=coerce_to_valid_hostname(sip_hostname)
-            ).exists()
-            if hostname_belongs_to_a_node:
+            if batch.is_node_hostname(sip_hostname):
                 # Ensure we don't allow a DHCP hostname to override a node
                 # hostname.
                 DNSResource.objects.release_dynamic_hostname(sip)
@@ -28,6 +28,7 @@ from maasserver.rpc import (
     packagerepository,
     rackcontrollers,
 )
+from maasserver.rpc.leases import update_leases
 from maasserver.rpc.nodes import (
     commission_node,
     create_node,
@@ -161,6 +162,38 @@ class Region(RPCProtocol):
         # region recieves the message.
         return d
 
+    @region.UpdateLeases.responder
+    def update_leases(self, cluster_uuid, leases):
+        """update_leases(cluster_uuid, leases)
+
+        Implementation of
+        :py:class`~provisioningserver.rpc.region.UpdateLeases`.
+        """
+        dbtasks = eventloop.services.getServiceNamed("database-tasks")
+        d = dbtasks.deferTask(update_leases, leases)
+        d.addCallback(lambda failures: {"failures": failures})
+
+        # Report all of the leases as failed on any other error, except for
+        # the NoSuchCluster failure which is sent back to the cluster.
+        def err_NoSuchCluster_passThrough(failure):
+            if failure.check(NoSuchCluster):
+                return failure
+            else:
+                log.err(failure, "Unhandled failure in updating leases.")
+                error = failure.getErrorMessage()
+                return {
+                    "failures": [
+                        {"index": index, "error": error}
+                        for index in range(len(leases))
+                    ]
+                }
+
+        d.addErrback(err_NoSuchCluster_passThrough)
+
+        # As for UpdateLease, wait for the batch to be handled so that the
+        # cluster sends one batch at a time, in order.
+        return d
+
     @amp.StartTLS.responder
     def get_tls_parameters(self):
         """get_tls_parameters()
@@ -10,6 +10,7 @@ import random
 from unittest.mock import ANY
 
 from maasserver import server_address
+from maasserver.bootsnapshot import BootConfigSnapshots
 from maasserver.dns.config import get_resource_name_for_subnet
 from maasserver.enum import (
     BOOT_RESOURCE_FILE_TYPE,
@@ -186,6 +187,33 @@ class TestGetConfig(MAASServerTestCase):
             hardware_uuid=node.hardware_uuid,
         )
 
+    def test__reuses_global_inputs_from_snapshot(self):
+        snapshots = BootConfigSnapshots()
+        snapshots.enabled = True
+        self.patch(boot_module, "boot_config_snapshots", snapshots)
+        rack_controller = factory.make_RackController()
+        local_ip = factory.make_ip_address()
+        remote_ip = factory.make_ip_address()
+        node = self.make_node(status=NODE_STATUS.COMMISSIONING)
+        mac = node.get_boot_interface().mac_address
+        self.patch_autospec(boot_module, "event_log_pxe_request")
+        first_count, first_config = count_queries(
+            orig_get_config,
+            rack_controller.system_id,
+            local_ip,
+            remote_ip,
+            mac=mac,
+        )
+        second_count, second_config = count_queries(
+            orig_get_config,
+            rack_controller.system_id,
+            local_ip,
+            remote_ip,
+            mac=mac,
+        )
+        self.assertEqual(first_config, second_config)
+        self.assertLess(second_count, first_count)
+
     def test__purpose_local_does_less_work(self):
         rack_controller = factory.make_RackController()
         local_ip = factory.make_ip_address()
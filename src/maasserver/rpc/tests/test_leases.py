@@ -14,10 +14,19 @@ from maasserver.enum import INTERFACE_TYPE, IPADDRESS_FAMILY, IPADDRESS_TYPE
 from maasserver.models import DNSResource
 from maasserver.models.interface import UnknownInterface
 from maasserver.models.staticipaddress import StaticIPAddress
-from maasserver.rpc.leases import LeaseUpdateError, update_lease
+from maasserver.rpc import leases as leases_module
+from maasserver.rpc.leases import (
+    LeaseUpdateError,
+    update_lease,
+    update_leases,
+)
 from maasserver.testing.factory import factory
 from maasserver.testing.testcase import MAASServerTestCase
-from maasserver.utils.orm import get_one, reload_object
+from maasserver.utils.orm import (
+    get_one,
+    make_serialization_failure,
+    reload_object,
+)
 from netaddr import IPAddress
 from testtools.matchers import Contains, Equals, MatchesStructure, Not
 
@@ -507,3 +516,116 @@ class TestUpdateLease(MAASServerTestCase):
         self.assertEqual(1, ip_address2.interface_set.count())
         self.assertEqual(1, boot_interface1.ip_addresses.count())
         self.assertEqual(1, boot_interface2.ip_addresses.count())
+
+
+class TestUpdateLeases(MAASServerTestCase):
+    def make_lease(self, subnet, action="commit", mac=None, hostname=None):
+        ip = factory.pick_ip_in_IPRange(subnet.get_dynamic_ranges()[0])
+        if mac is None:
+            mac = factory.make_mac_address()
+        return {
+            "action": action,
+            "mac": mac,
+            "ip": ip,
+            "ip_family": "ipv4",
+            "timestamp": int(time.time()),
+            "lease_time": random.randint(30, 1000),
+            "hostname": hostname,
+        }
+
+    def make_managed_subnet(self):
+        return factory.make_ipv4_Subnet_with_IPRanges(
+            with_static_range=False, dhcp_on=True
+        )
+
+    def test_updates_all_leases(self):
+        subnet = self.make_managed_subnet()
+        leases = [self.make_lease(subnet) for _ in range(3)]
+        self.assertEqual([], update_leases(leases))
+        for lease in leases:
+            unknown_interface = UnknownInterface.objects.get(
+                mac_address=lease["mac"]
+            )
+            self.assertEqual(
+                [lease["ip"]],
+                [sip.ip for sip in unknown_interface.ip_addresses.all()],
+            )
+
+    def test_applies_leases_in_order(self):
+        subnet = self.make_managed_subnet()
+        commit = self.make_lease(subnet)
+        release = dict(commit, action="release")
+        self.assertEqual([], update_leases([commit, release]))
+        unknown_interface = UnknownInterface.objects.get(
+            mac_address=commit["mac"]
+        )
+        [sip] = unknown_interface.ip_addresses.all()
+        self.assertIsNone(sip.ip)
+
+    def test_matches_mac_address_without_leading_zeros(self):
+        subnet = self.make_managed_subnet()
+        node = factory.make_Node_with_Interface_on_Subnet(subnet=subnet)
+        boot_interface = node.get_boot_interface()
+        mac = ":".join(
+            octet.lstrip("0") or "0"
+            for octet in str(boot_interface.mac_address).split(":")
+        )
+        lease = self.make_lease(subnet, mac=mac)
+        self.assertEqual([], update_leases([lease]))
+        self.assertIn(
+            lease["ip"], [sip.ip for sip in boot_interface.ip_addresses.all()]
+        )
+
+    def test_does_not_create_dns_record_for_node_hostname(self):
+        subnet = self.make_managed_subnet()
+        node = factory.make_Node()
+        lease = self.make_lease(subnet, hostname=node.hostname)
+        self.assertEqual([], update_leases([lease]))
+        self.assertEqual(0, DNSResource.objects.count())
+
+    def test_reports_failed_leases_and_applies_others(self):
+        subnet = self.make_managed_subnet()
+        bad_action = dict(self.make_lease(subnet), action="unknown")
+        no_subnet = dict(
+            self.make_lease(subnet), ip=factory.make_ipv6_address()
+        )
+        good = self.make_lease(subnet)
+        failures = update_leases([bad_action, good, no_subnet])
+        self.assertEqual(
+            [
+                {"index": 0, "error": "Unknown lease action: unknown"},
+                {
+                    "index": 2,
+                    "error": "No subnet exists for: %s" % no_subnet["ip"],
+                },
+            ],
+            failures,
+        )
+        self.assertIsNotNone(
+            UnknownInterface.objects.filter(mac_address=good["mac"]).first()
+        )
+
+    def test_reports_unexpected_failures_and_forgets_their_interfaces(self):
+        subnet = self.make_managed_subnet()
+        failing = self.make_lease(subnet, hostname=factory.make_name("host"))
+        retry = dict(self.make_lease(subnet), mac=failing["mac"])
+        update_dynamic_hostname = self.patch(
+            DNSResource.objects, "update_dynamic_hostname"
+        )
+        update_dynamic_hostname.side_effect = ValueError("boom")
+        failures = update_leases([failing, retry])
+        self.assertEqual([{"index": 0, "error": "boom"}], failures)
+        unknown_interface = UnknownInterface.objects.get(
+            mac_address=failing["mac"]
+        )
+        self.assertEqual(
+            [retry["ip"]],
+            [sip.ip for sip in unknown_interface.ip_addresses.all()],
+        )
+
+    def test_raises_retryable_failures(self):
+        subnet = self.make_managed_subnet()
+        error = make_serialization_failure()
+        self.patch(leases_module, "_update_lease").side_effect = error
+        lease = self.make_lease(subnet)
+        self.assertRaises(type(error), update_leases, [lease])
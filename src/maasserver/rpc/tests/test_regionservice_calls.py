@@ -77,6 +77,7 @@ from provisioningserver.rpc.region import (
     SendEventMACAddress,
     UpdateInterfaces,
     UpdateLease,
+    UpdateLeases,
     UpdateNodePowerState,
     UpdateServices,
 )
@@ -280,6 +281,74 @@ class TestRegionProtocol_UpdateLease(MAASTransactionServerTestCase):
         # works as expected.
 
 
+class TestRegionProtocol_UpdateLeases(MAASTransactionServerTestCase):
+    def setUp(self):
+        super(TestRegionProtocol_UpdateLeases, self).setUp()
+        self.useFixture(RegionEventLoopFixture("database-tasks"))
+
+    def make_lease(self):
+        return {
+            "action": "expiry",
+            "mac": factory.make_mac_address(),
+            "ip_family": "ipv4",
+            "ip": factory.make_ipv4_address(),
+            "timestamp": int(time.time()),
+        }
+
+    def test_update_leases_is_registered(self):
+        protocol = Region()
+        responder = protocol.locateResponder(UpdateLeases.commandName)
+        self.assertIsNotNone(responder)
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__returns_failures(self):
+        failures = [{"index": 1, "error": factory.make_name("error")}]
+        update_leases = self.patch(regionservice, "update_leases")
+        update_leases.return_value = failures
+        leases = [self.make_lease(), self.make_lease()]
+
+        yield eventloop.start()
+        try:
+            response = yield call_responder(
+                Region(),
+                UpdateLeases,
+                {"cluster_uuid": factory.make_name("uuid"), "leases": leases},
+            )
+        finally:
+            yield eventloop.reset()
+
+        self.assertEqual({"failures": failures}, response)
+        self.assertThat(update_leases, MockCalledOnceWith(leases))
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__reports_all_leases_as_failed_on_other_errors(self):
+        exception = factory.make_exception()
+        self.patch(regionservice, "update_leases").side_effect = exception
+        leases = [self.make_lease(), self.make_lease()]
+
+        yield eventloop.start()
+        try:
+            response = yield call_responder(
+                Region(),
+                UpdateLeases,
+                {"cluster_uuid": factory.make_name("uuid"), "leases": leases},
+            )
+        finally:
+            yield eventloop.reset()
+
+        self.assertEqual(
+            {
+                "failures": [
+                    {"index": 0, "error": str(exception)},
+                    {"index": 1, "error": str(exception)},
+                ]
+            },
+            response,
+        )
+
+
 class TestRegionProtocol_GetBootConfig(MAASTransactionServerTestCase):
     def test_get_boot_config_is_registered(self):
         protocol = Region()
@@ -13,7 +13,8 @@ const MSG_TYPE = {
   RESPONSE: 1,
   NOTIFY: 2,
   PING: 3,
-  PING_REPLY: 4
+  PING_REPLY: 4,
+  NOTIFY_DELTA: 5
 };
 
 // Response types
@@ -47,6 +48,9 @@ class RegionConnection {
     this.requestId = 0;
     this.url = null;
     this.websocket = null;
+    // Last data notified for each object, updates can be sent by the
+    // region as a delta from it.
+    this.notified = {};
     this.state = REGION_STATE.DOWN;
     this.ensureConnectionPromise = null;
     this.connectionCheckInterval = 5000;
@@ -199,6 +203,7 @@ class RegionConnection {
   // Opens the websocket connection.
   connect() {
     this.url = this._buildUrl();
+    this.notified = {};
     this.websocket = this.buildSocket(this.url);
 
     this.websocket.onopen = evt => {
@@ -292,6 +297,9 @@ class RegionConnection {
     }
     url += path + "ws";
 
+    // Ask the region to send updates as deltas.
+    url += "?deltas=1";
+
     // Include the csrftoken in the URL if it's defined.
     let csrftoken;
     if (angular.isFunction(this.$cookies.get)) {
@@ -300,7 +308,7 @@ class RegionConnection {
       csrftoken = this.$cookies.csrftoken;
     }
     if (angular.isDefined(csrftoken)) {
-      url += "?csrftoken=" + encodeURIComponent(csrftoken);
+      url += "&csrftoken=" + encodeURIComponent(csrftoken);
     }
 
     return url;
@@ -354,6 +362,8 @@ class RegionConnection {
       // Asynchronous notification
     } else if (msg.type === MSG_TYPE.NOTIFY) {
       this.onNotify(msg);
+    } else if (msg.type === MSG_TYPE.NOTIFY_DELTA) {
+      this.onNotifyDelta(msg);
       // Reply to connectivity check
     } else if (msg.type === MSG_TYPE.PING_REPLY) {
       this.onPingReply(msg);
@@ -392,6 +402,11 @@ class RegionConnection {
 
   // Called when a notify response is recieved.
   onNotify(msg) {
+    if (msg.action === "delete") {
+      delete this.notified[msg.name + ":" + msg.data];
+    } else if (angular.isDefined(msg.pk)) {
+      this.notified[msg.name + ":" + msg.pk] = angular.copy(msg.data);
+    }
     let handlers = this.notifiers[msg.name];
     if (angular.isArray(handlers)) {
       angular.forEach(handlers, function(handler) {
@@ -400,6 +415,39 @@ class RegionConnection {
     }
   }
 
+  // Called when a notify delta is recieved. The delta is applied to the
+  // last data notified for the object, which is then notified in full.
+  onNotifyDelta(msg) {
+    let data = angular.copy(this.notified[msg.name + ":" + msg.pk]);
+    if (!angular.isObject(data)) {
+      this.log.warn("Notify delta for unknown " + msg.name + ": " + msg.pk);
+      return;
+    }
+    angular.forEach(msg.changed, (value, field) => {
+      data[field] = value;
+    });
+    angular.forEach(msg.removed, field => {
+      delete data[field];
+    });
+    angular.forEach(msg.lists, (patch, field) => {
+      let items = {};
+      angular.forEach(data[field], item => {
+        items[item.id] = item;
+      });
+      angular.forEach(patch.items, item => {
+        items[item.id] = item;
+      });
+      data[field] = patch.ids.map(id => items[id]);
+    });
+    this.onNotify({
+      type: MSG_TYPE.NOTIFY,
+      name: msg.name,
+      action: msg.action,
+      pk: msg.pk,
+      data: data
+    });
+  }
+
   onPingReply(msg) {
     // Note: The msg.result at this point contains the last sequence
     // number received, but it isn't really relevant for us. It could
@@ -377,7 +377,7 @@ describe("RegionConnection", function() {
           ":" +
           $window.location.port +
           $window.location.pathname +
-          "ws"
+          "ws?deltas=1"
       );
     });
 
@@ -389,7 +389,7 @@ describe("RegionConnection", function() {
           ":" +
           $window.location.port +
           $window.location.pathname +
-          "ws"
+          "ws?deltas=1"
       );
     });
 
@@ -412,7 +412,7 @@ describe("RegionConnection", function() {
           ":" +
           $window.location.port +
           path +
-          "/ws"
+          "/ws?deltas=1"
       );
 
       // Reset angular.element so the test will complete successfully as
@@ -439,7 +439,7 @@ describe("RegionConnection", function() {
           ":" +
           port +
           $window.location.pathname +
-          "ws"
+          "ws?deltas=1"
       );
 
       // Reset angular.element so the test will complete successfully as
@@ -458,11 +458,14 @@ describe("RegionConnection", function() {
             ":" +
             $window.location.port +
             $window.location.pathname +
-            "ws"
+            "ws?deltas=1"
         );
       } else {
         expect(RegionConnection._buildUrl()).toBe(
-          "ws://" + $window.location.hostname + $window.location.pathname + "ws"
+          "ws://" +
+            $window.location.hostname +
+            $window.location.pathname +
+            "ws?deltas=1"
         );
       }
     });
@@ -483,7 +486,7 @@ describe("RegionConnection", function() {
           $window.location.port +
           $window.location.pathname +
           "ws" +
-          "?csrftoken=" +
+          "?deltas=1&csrftoken=" +
           csrftoken
       );
     });
@@ -533,6 +536,13 @@ describe("RegionConnection", function() {
       RegionConnection.onMessage(msg);
       expect(RegionConnection.onNotify).toHaveBeenCalledWith(msg);
     });
+
+    it("calls onNotifyDelta for a notify delta message", function() {
+      spyOn(RegionConnection, "onNotifyDelta");
+      var msg = { type: 5 };
+      RegionConnection.onMessage(msg);
+      expect(RegionConnection.onNotifyDelta).toHaveBeenCalledWith(msg);
+    });
   });
 
   describe("onResponse", function() {
@@ -644,6 +654,69 @@ describe("RegionConnection", function() {
     });
   });
 
+  describe("onNotifyDelta", function() {
+    it("applies delta to last notified data", function() {
+      var handler = jasmine.createSpy();
+      RegionConnection.registerNotifier("test", handler);
+      RegionConnection.onNotify({
+        type: 2,
+        name: "test",
+        action: "create",
+        pk: 1,
+        data: {
+          id: 1,
+          status: "Ready",
+          removed: true,
+          disks: [{ id: 1, size: 1 }, { id: 2, size: 2 }]
+        }
+      });
+      RegionConnection.onNotifyDelta({
+        type: 5,
+        name: "test",
+        action: "update",
+        pk: 1,
+        changed: { status: "Deploying" },
+        removed: ["removed"],
+        lists: { disks: { ids: [2, 3], items: [{ id: 3, size: 3 }] } }
+      });
+      expect(handler).toHaveBeenCalledWith("update", {
+        id: 1,
+        status: "Deploying",
+        disks: [{ id: 2, size: 2 }, { id: 3, size: 3 }]
+      });
+    });
+
+    it("ignores delta for unknown object", function() {
+      var handler = jasmine.createSpy();
+      RegionConnection.registerNotifier("test", handler);
+      RegionConnection.onNotifyDelta({
+        type: 5,
+        name: "test",
+        action: "update",
+        pk: 1,
+        changed: { status: "Deploying" }
+      });
+      expect(handler).not.toHaveBeenCalled();
+    });
+
+    it("forgets deleted objects", function() {
+      RegionConnection.onNotify({
+        type: 2,
+        name: "test",
+        action: "create",
+        pk: 1,
+        data: { id: 1 }
+      });
+      RegionConnection.onNotify({
+        type: 2,
+        name: "test",
+        action: "delete",
+        data: 1
+      });
+      expect(RegionConnection.notified).toEqual({});
+    });
+  });
+
   describe("callMethod", function() {
     var promise, defer;
     beforeEach(function() {
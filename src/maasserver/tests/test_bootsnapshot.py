@@ -0,0 +1,68 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for `maasserver.bootsnapshot`."""
+
+__all__ = []
+
+from unittest.mock import Mock
+
+from maasserver.bootsnapshot import BootConfigSnapshot, BootConfigSnapshots
+from maastesting.testcase import MAASTestCase
+
+
+class TestBootConfigSnapshot(MAASTestCase):
+    def test_get_calls_func_once_per_args(self):
+        func = Mock(side_effect=lambda *args: sum(args))
+        snapshot = BootConfigSnapshot()
+        self.assertEqual(3, snapshot.get(func, 1, 2))
+        self.assertEqual(3, snapshot.get(func, 1, 2))
+        self.assertEqual(4, snapshot.get(func, 1, 3))
+        self.assertEqual(2, func.call_count)
+
+    def test_get_does_not_keep_exceptions(self):
+        func = Mock(side_effect=[ValueError(), 1])
+        snapshot = BootConfigSnapshot()
+        self.assertRaises(ValueError, snapshot.get, func)
+        self.assertEqual(1, snapshot.get(func))
+
+
+class TestBootConfigSnapshots(MAASTestCase):
+    def test_current_returns_new_snapshot_when_disabled(self):
+        snapshots = BootConfigSnapshots()
+        self.assertIsNot(snapshots.current(), snapshots.current())
+
+    def test_current_returns_same_snapshot_when_enabled(self):
+        snapshots = BootConfigSnapshots()
+        snapshots.enabled = True
+        self.assertIs(snapshots.current(), snapshots.current())
+
+    def test_notification_discards_snapshot(self):
+        snapshots = BootConfigSnapshots()
+        snapshots.enabled = True
+        snapshot = snapshots.current()
+        snapshots.on_notify("sys_bootsnapshot", "")
+        self.assertIsNot(snapshot, snapshots.current())
+
+    def test_disconnect_disables_and_discards(self):
+        snapshots = BootConfigSnapshots()
+        snapshots.on_connect()
+        snapshots.current()
+        snapshots.on_disconnect(None)
+        self.assertFalse(snapshots.enabled)
+        self.assertIsNone(snapshots._current)
+
+    def test_register_and_unregister_with_listener(self):
+        listener = Mock()
+        listener.connected.return_value = True
+        snapshots = BootConfigSnapshots()
+        snapshots.register(listener)
+        listener.register.assert_called_once_with(
+            "sys_bootsnapshot", snapshots.on_notify
+        )
+        self.assertTrue(snapshots.enabled)
+        snapshots.unregister(listener)
+        listener.unregister.assert_called_once_with(
+            "sys_bootsnapshot", snapshots.on_notify
+        )
+        self.assertFalse(snapshots.enabled)
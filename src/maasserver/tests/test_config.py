@@ -129,6 +129,78 @@ class TestRegionConfigurationWorkerOptions(MAASTestCase):
         self.assertEqual({"num_workers": workers}, config.store)
 
 
+class TestRegionConfigurationWebsocketOptions(MAASTestCase):
+    """Tests for the websocket options in `RegionConfiguration`."""
+
+    def test__default(self):
+        config = RegionConfiguration({})
+        self.assertEqual(0.5, config.websocket_notify_window)
+
+    def test__set_and_get(self):
+        config = RegionConfiguration({})
+        config.websocket_notify_window = "2.5"
+        self.assertEqual(2.5, config.websocket_notify_window)
+        # It's also stored in the configuration database.
+        self.assertEqual({"websocket_notify_window": 2.5}, config.store)
+
+    def test__rejects_negative(self):
+        config = RegionConfiguration({})
+        with ExpectedException(formencode.api.Invalid):
+            config.websocket_notify_window = "-1"
+
+    def test__notify_delta_objects_default(self):
+        config = RegionConfiguration({})
+        self.assertEqual(1000, config.websocket_notify_delta_objects)
+
+    def test__compression_defaults(self):
+        config = RegionConfiguration({})
+        self.assertTrue(config.websocket_compression)
+        self.assertEqual(15, config.websocket_compression_window_bits)
+        self.assertEqual(256, config.websocket_compression_threshold)
+
+    def test__compression_window_bits_range(self):
+        config = RegionConfiguration({})
+        config.websocket_compression_window_bits = "9"
+        self.assertEqual(9, config.websocket_compression_window_bits)
+        for value in ("8", "16"):
+            with ExpectedException(formencode.api.Invalid):
+                config.websocket_compression_window_bits = value
+
+    def test__slow_call_defaults(self):
+        config = RegionConfiguration({})
+        self.assertEqual(2, config.websocket_slow_call_budget)
+        self.assertEqual(5, config.websocket_slow_call_queries)
+
+    def test__slow_call_budget_rejects_negative(self):
+        config = RegionConfiguration({})
+        with ExpectedException(formencode.api.Invalid):
+            config.websocket_slow_call_budget = "-1"
+
+
+class TestRegionConfigurationDNSOptions(MAASTestCase):
+    """Tests for the DNS options in `RegionConfiguration`."""
+
+    def test__default(self):
+        config = RegionConfiguration({})
+        self.assertFalse(config.dns_incremental_updates)
+
+    def test__set_and_get(self):
+        config = RegionConfiguration({})
+        config.dns_incremental_updates = "true"
+        self.assertTrue(config.dns_incremental_updates)
+        # It's also stored in the configuration database.
+        self.assertEqual({"dns_incremental_updates": True}, config.store)
+
+    def test__zone_writer_processes_default(self):
+        config = RegionConfiguration({})
+        self.assertEqual(1, config.dns_zone_writer_processes)
+
+    def test__zone_writer_processes_rejects_negative(self):
+        config = RegionConfiguration({})
+        with ExpectedException(formencode.api.Invalid):
+            config.dns_zone_writer_processes = "-1"
+
+
 class TestRegionConfigurationDebugOptions(MAASTestCase):
     """Tests for the debug options in `RegionConfiguration`."""
 
@@ -2308,6 +2308,67 @@ class TestGetDHCPConfiguration(MAASServerTestCase):
             config.shared_networks_v6, addr6.subnet, [addr6.ip]
         )
 
+    def make_racks_sharing_VLAN(self):
+        primary_rack = factory.make_RackController()
+        secondary_rack = factory.make_RackController()
+        vlan = factory.make_VLAN(
+            dhcp_on=True,
+            primary_rack=primary_rack,
+            secondary_rack=secondary_rack,
+        )
+        subnet = factory.make_ipv4_Subnet_with_IPRanges(vlan=vlan)
+        for rack in (primary_rack, secondary_rack):
+            factory.make_StaticIPAddress(
+                alloc_type=IPADDRESS_TYPE.STICKY,
+                subnet=subnet,
+                interface=factory.make_Interface(
+                    INTERFACE_TYPE.PHYSICAL, node=rack, vlan=vlan
+                ),
+            )
+        for _ in range(3):
+            node = factory.make_Node(interface=False)
+            factory.make_StaticIPAddress(
+                alloc_type=IPADDRESS_TYPE.STICKY,
+                subnet=subnet,
+                interface=factory.make_Interface(
+                    INTERFACE_TYPE.PHYSICAL, node=node, vlan=vlan
+                ),
+            )
+        return primary_rack, secondary_rack
+
+    def test__cache_gives_same_configuration(self):
+        primary_rack, secondary_rack = self.make_racks_sharing_VLAN()
+        cache = dhcp.DHCPConfigurationCache()
+        dhcp.get_dhcp_configuration(primary_rack, cache=cache)
+        self.assertEqual(
+            dhcp.get_dhcp_configuration(secondary_rack),
+            dhcp.get_dhcp_configuration(secondary_rack, cache=cache),
+        )
+
+    def test__cache_saves_queries_for_other_racks(self):
+        primary_rack, secondary_rack = self.make_racks_sharing_VLAN()
+        cache = dhcp.DHCPConfigurationCache()
+        dhcp.get_dhcp_configuration(primary_rack, cache=cache)
+        uncached_count, _ = count_queries(
+            dhcp.get_dhcp_configuration, secondary_rack
+        )
+        cached_count, _ = count_queries(
+            dhcp.get_dhcp_configuration, secondary_rack, cache=cache
+        )
+        self.assertLess(cached_count, uncached_count)
+
+    def test__cache_not_used_when_testing_snippet(self):
+        primary_rack, _ = self.make_racks_sharing_VLAN()
+        cache = dhcp.DHCPConfigurationCache()
+        dhcp.get_dhcp_configuration(primary_rack, cache=cache)
+        dhcp_snippet = factory.make_DHCPSnippet(enabled=False)
+        config = dhcp.get_dhcp_configuration(
+            primary_rack, test_dhcp_snippet=dhcp_snippet, cache=cache
+        )
+        self.assertIn(
+            dhcp.make_dhcp_snippet(dhcp_snippet), config.global_dhcp_snippets
+        )
+
 
 class TestConfigureDHCP(MAASTransactionServerTestCase):
     """Tests for `configure_dhcp`."""
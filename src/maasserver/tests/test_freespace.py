@@ -0,0 +1,194 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for `maasserver.freespace`."""
+
+__all__ = []
+
+from unittest.mock import Mock
+
+from maasserver import freespace
+from maasserver.freespace import (
+    FreeSpaceIndex,
+    is_visible_in_snapshot,
+    SubnetFreeSpace,
+)
+from maastesting.testcase import MAASTestCase
+from netaddr import IPAddress
+from provisioningserver.utils.network import make_iprange
+
+
+def make_free_space(*ranges):
+    return SubnetFreeSpace(
+        make_iprange(IPAddress(first), IPAddress(last))
+        for first, last in ranges
+    )
+
+
+class TestIsVisibleInSnapshot(MAASTestCase):
+    def test_none_is_visible(self):
+        self.assertTrue(is_visible_in_snapshot(None, (10, 20, set())))
+
+    def test_before_xmin_is_visible(self):
+        self.assertTrue(is_visible_in_snapshot(9, (10, 20, set())))
+
+    def test_committed_before_xmax_is_visible(self):
+        self.assertTrue(is_visible_in_snapshot(15, (10, 20, {12})))
+
+    def test_in_progress_is_not_visible(self):
+        self.assertFalse(is_visible_in_snapshot(12, (10, 20, {12})))
+
+    def test_from_xmax_is_not_visible(self):
+        self.assertFalse(is_visible_in_snapshot(20, (10, 20, set())))
+
+
+class TestSubnetFreeSpace(MAASTestCase):
+    def test_returns_first_address_of_smallest_range(self):
+        free = make_free_space((10, 19), (30, 32), (40, 49))
+        self.assertEqual(30, free.get_next_address())
+
+    def test_returns_lowest_of_smallest_ranges(self):
+        free = make_free_space((40, 42), (10, 19), (30, 32))
+        self.assertEqual(30, free.get_next_address())
+
+    def test_returns_none_when_full(self):
+        self.assertIsNone(make_free_space().get_next_address())
+
+    def test_take_splits_range(self):
+        free = make_free_space((10, 19), (30, 39))
+        free.take(12)
+        self.assertEqual([(10, 11), (13, 19), (30, 39)], free._ranges)
+        self.assertEqual(10, free.get_next_address())
+
+    def test_take_ends_of_range(self):
+        free = make_free_space((10, 12))
+        free.take(10)
+        free.take(12)
+        self.assertEqual([(11, 11)], free._ranges)
+        free.take(11)
+        self.assertEqual(0, len(free))
+        self.assertIsNone(free.get_next_address())
+
+    def test_take_ignores_address_not_free(self):
+        free = make_free_space((10, 12))
+        free.take(20)
+        self.assertEqual([(10, 12)], free._ranges)
+
+    def test_exclude_splits_ranges_without_changing_them(self):
+        free = make_free_space((10, 19), (30, 34))
+        self.assertEqual(30, free.get_next_address(exclude={17, 31, 33}))
+        self.assertEqual([(10, 19), (30, 34)], free._ranges)
+
+    def test_exclude_uses_smallest_piece(self):
+        free = make_free_space((10, 19), (30, 32))
+        self.assertEqual(30, free.get_next_address(exclude={15}))
+        self.assertEqual(11, free.get_next_address(exclude={10, 12}))
+
+    def test_exclude_everything_returns_none(self):
+        free = make_free_space((10, 11))
+        self.assertIsNone(free.get_next_address(exclude={10, 11}))
+
+
+class TestFreeSpaceIndex(MAASTestCase):
+    def setUp(self):
+        super(TestFreeSpaceIndex, self).setUp()
+        self.snapshot = (100, 100, set())
+        self.patch(
+            freespace, "get_transaction_snapshot", lambda: self.snapshot
+        )
+        self.index = FreeSpaceIndex()
+        self.index.enabled = True
+
+    def make_subnet(self, *ranges, in_use=()):
+        subnet = Mock(id=1)
+        subnet.get_ipranges_not_in_use.side_effect = lambda: [
+            make_iprange(IPAddress(first), IPAddress(last))
+            for first, last in ranges
+        ]
+        subnet.is_address_in_use.side_effect = lambda address: (
+            address in in_use
+        )
+        return subnet
+
+    def test_indexes_free_space(self):
+        subnet = self.make_subnet((10, 19))
+        self.assertEqual(10, self.index.get_next_address(subnet))
+        self.index.take(subnet.id, 10)
+        self.assertEqual(11, self.index.get_next_address(subnet))
+        subnet.get_ipranges_not_in_use.assert_called_once_with()
+
+    def test_takes_indexed_address_in_use(self):
+        subnet = self.make_subnet((10, 19), in_use={11, 12})
+        self.assertEqual(10, self.index.get_next_address(subnet))
+        self.index.take(subnet.id, 10)
+        self.assertEqual(13, self.index.get_next_address(subnet))
+        self.assertEqual(13, self.index.get_next_address(subnet))
+        subnet.get_ipranges_not_in_use.assert_called_once_with()
+
+    def test_works_out_free_space_again_when_indexed_addresses_in_use(self):
+        in_use = set()
+        subnet = self.make_subnet((10, 11), in_use=in_use)
+        self.assertEqual(10, self.index.get_next_address(subnet))
+        in_use.update({10, 11})
+        self.assertEqual(10, self.index.get_next_address(subnet))
+        self.assertEqual(2, subnet.get_ipranges_not_in_use.call_count)
+
+    def test_does_not_index_when_disabled(self):
+        self.index.enabled = False
+        subnet = self.make_subnet((10, 19))
+        self.index.get_next_address(subnet)
+        self.index.get_next_address(subnet)
+        self.assertEqual(2, subnet.get_ipranges_not_in_use.call_count)
+
+    def test_does_not_index_when_notified_change_is_not_visible(self):
+        self.index.on_notify("sys_ipalloc", "1 changed 105")
+        subnet = self.make_subnet((10, 19))
+        self.index.get_next_address(subnet)
+        self.assertEqual({}, self.index._subnets)
+        self.snapshot = (110, 110, set())
+        self.index.get_next_address(subnet)
+        self.assertIn(subnet.id, self.index._subnets)
+
+    def test_taken_notification_removes_address(self):
+        subnet = self.make_subnet((10, 19))
+        self.index.get_next_address(subnet)
+        self.index.on_notify("sys_ipalloc", "1 taken 99 0.0.0.10")
+        self.assertEqual(11, self.index.get_next_address(subnet))
+        subnet.get_ipranges_not_in_use.assert_called_once_with()
+
+    def test_changed_notification_evicts_subnet(self):
+        subnet = self.make_subnet((10, 19))
+        self.index.get_next_address(subnet)
+        self.index.on_notify("sys_ipalloc", "1 changed 99")
+        self.assertEqual({}, self.index._subnets)
+
+    def test_works_out_free_space_again_when_full(self):
+        subnet = self.make_subnet((10, 10))
+        self.assertEqual(10, self.index.get_next_address(subnet))
+        self.index.take(subnet.id, 10)
+        self.assertEqual(10, self.index.get_next_address(subnet))
+        self.assertEqual(2, subnet.get_ipranges_not_in_use.call_count)
+
+    def test_disconnect_disables_and_clears(self):
+        subnet = self.make_subnet((10, 19))
+        self.index.get_next_address(subnet)
+        self.index.on_disconnect(None)
+        self.assertFalse(self.index.enabled)
+        self.assertEqual({}, self.index._subnets)
+        self.index.on_connect()
+        self.assertTrue(self.index.enabled)
+
+    def test_register_and_unregister_with_listener(self):
+        listener = Mock()
+        listener.connected.return_value = True
+        self.index.enabled = False
+        self.index.register(listener)
+        listener.register.assert_called_once_with(
+            "sys_ipalloc", self.index.on_notify
+        )
+        self.assertTrue(self.index.enabled)
+        self.index.unregister(listener)
+        listener.unregister.assert_called_once_with(
+            "sys_ipalloc", self.index.on_notify
+        )
+        self.assertFalse(self.index.enabled)
@@ -17,6 +17,7 @@ from maasserver.listener import (
     PostgresListenerRegistrationError,
     PostgresListenerService,
     PostgresListenerUnregistrationError,
+    split_payload,
 )
 from maasserver.testing.factory import factory
 from maasserver.testing.testcase import MAASServerTestCase
@@ -29,6 +30,7 @@ from maastesting.matchers import (
     MockCallsMatch,
     MockNotCalled,
 )
+from maastesting.testcase import MAASTestCase
 from maastesting.twisted import TwistedLoggerFixture
 from provisioningserver.utils.twisted import DeferredValue
 from psycopg2 import OperationalError
@@ -498,6 +500,40 @@ class TestPostgresListenerService(MAASServerTestCase):
         listener.doRead()
         self.assertItemsEqual(listener.notifications, set(notifications))
 
+    def test__queueNotification_merges_changes(self):
+        listener = PostgresListenerService()
+        listener.queueNotification("machine_update", 'abc {"a": 1, "b": 1}')
+        listener.queueNotification("machine_update", 'abc {"b": 2}')
+        self.assertEqual({("machine_update", "abc")}, listener.notifications)
+        self.assertEqual(
+            {("machine_update", "abc"): {"a": 1, "b": 2}},
+            listener.notificationChanges,
+        )
+
+    def test__queueNotification_drops_changes_without_changes(self):
+        listener = PostgresListenerService()
+        listener.queueNotification("machine_update", 'abc {"a": 1}')
+        listener.queueNotification("machine_update", "abc")
+        listener.queueNotification("machine_update", 'abc {"b": 2}')
+        self.assertEqual({("machine_update", "abc")}, listener.notifications)
+        self.assertEqual({}, listener.notificationChanges)
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__handleNotify_passes_changes_to_changes_handlers(self):
+        listener = PostgresListenerService()
+        handler = MagicMock()
+        changes_handler = MagicMock()
+        listener.register("machine", handler)
+        listener.register("machine", changes_handler, changes=True)
+        listener.queueNotification("machine_update", 'abc {"a": 1}')
+        yield listener.handleNotify(("machine_update", "abc"))
+        self.assertThat(handler, MockCalledOnceWith("update", "abc"))
+        self.assertThat(
+            changes_handler, MockCalledOnceWith("update", "abc", {"a": 1})
+        )
+        self.assertEqual({}, listener.notificationChanges)
+
     @wait_for_reactor
     @inlineCallbacks
     def test__listener_ignores_ENOENT_when_removing_itself_from_reactor(self):
@@ -624,3 +660,19 @@ class TestPostgresListenerService(MAASServerTestCase):
                 call("UNLISTEN %s_update;" % channel),
             ),
         )
+
+
+class TestSplitPayload(MAASTestCase):
+    def test_returns_payload_without_changes(self):
+        self.assertEqual(("abc", None), split_payload("abc"))
+
+    def test_returns_pk_and_changes(self):
+        self.assertEqual(
+            ("abc", {"power_state": "on"}),
+            split_payload('abc {"power_state": "on"}'),
+        )
+
+    def test_ignores_invalid_changes(self):
+        self.assertEqual(("abc {x", None), split_payload("abc {x"))
+        self.assertEqual(("abc [1]", None), split_payload("abc [1]"))
+        self.assertEqual(("abc def", None), split_payload("abc def"))
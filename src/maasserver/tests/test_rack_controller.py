@@ -22,6 +22,7 @@ from maastesting.matchers import (
     MockCallsMatch,
     MockNotCalled,
 )
+from provisioningserver.rpc.exceptions import NoConnectionsAvailable
 from testtools import ExpectedException
 from testtools.matchers import MatchesStructure
 from twisted.internet import reactor
@@ -69,8 +70,9 @@ class TestRackControllerService(MAASTransactionServerTestCase):
         yield service.startService()
         self.assertThat(
             listener.register,
-            MockCalledOnceWith(
-                "sys_core_%d" % regionProcessId, service.coreHandler
+            MockCallsMatch(
+                call("sys_core_%d" % regionProcessId, service.coreHandler),
+                call("sys_bootconfig", service.bootConfigHandler),
             ),
         )
         self.assertEqual(regionProcessId, service.processId)
@@ -139,7 +141,7 @@ class TestRackControllerService(MAASTransactionServerTestCase):
         yield service.stopService()
         self.assertThat(
             listener.unregister,
-            MockCalledOnceWith(
+            MockAnyCall(
                 "sys_core_%d" % service.processId, service.coreHandler
             ),
         )
@@ -155,7 +157,10 @@ class TestRackControllerService(MAASTransactionServerTestCase):
         yield service.stopService()
         self.assertThat(
             listener.unregister,
-            MockCalledOnceWith("sys_core_%d" % processId, service.coreHandler),
+            MockCallsMatch(
+                call("sys_core_%d" % processId, service.coreHandler),
+                call("sys_bootconfig", service.bootConfigHandler),
+            ),
         )
 
     @wait_for_reactor
@@ -254,6 +259,16 @@ class TestRackControllerService(MAASTransactionServerTestCase):
         self.assertEquals(set([rack_id]), service.needsDHCPUpdate)
         self.assertThat(mock_startProcessing, MockCalledOnceWith())
 
+    def test_dhcpHandler_discards_dhcpCache(self):
+        rack_id = random.randint(0, 100)
+        listener = Mock()
+        service = RackControllerService(sentinel.ipcWorker, listener)
+        service.watching = set([rack_id])
+        service.dhcpCache = sentinel.dhcpCache
+        self.patch(service, "startProcessing")
+        service.dhcpHandler("sys_dhcp_%d" % rack_id, "")
+        self.assertIsNone(service.dhcpCache)
+
     def test_dhcpHandler_doesnt_add_to_needsDHCPUpdate(self):
         rack_id = random.randint(0, 100)
         listener = Mock()
@@ -263,6 +278,66 @@ class TestRackControllerService(MAASTransactionServerTestCase):
         self.assertEquals(set(), service.needsDHCPUpdate)
         self.assertThat(mock_startProcessing, MockNotCalled())
 
+    def test_bootConfigHandler_does_nothing_when_not_watching(self):
+        service = RackControllerService(sentinel.ipcWorker, sentinel.listener)
+        mock_getClientFor = self.patch(rack_controller, "getClientFor")
+        self.assertIsNone(service.bootConfigHandler("sys_bootconfig", ""))
+        self.assertThat(mock_getClientFor, MockNotCalled())
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_bootConfigHandler_invalidates_macs_on_watched_racks(self):
+        rack = yield deferToDatabase(
+            transactional(factory.make_RackController)
+        )
+        service = RackControllerService(sentinel.ipcWorker, sentinel.listener)
+        service.watching = {rack.id}
+        client = Mock(return_value=succeed({}))
+        mock_getClientFor = self.patch(rack_controller, "getClientFor")
+        mock_getClientFor.return_value = succeed(client)
+        macs = [factory.make_mac_address() for _ in range(2)]
+        yield service.bootConfigHandler("sys_bootconfig", " ".join(macs))
+        self.assertThat(mock_getClientFor, MockCalledOnceWith(rack.system_id))
+        self.assertThat(
+            client,
+            MockCalledOnceWith(
+                rack_controller.InvalidateBootConfigs, macs=macs
+            ),
+        )
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_bootConfigHandler_invalidates_all_for_empty_message(self):
+        rack = yield deferToDatabase(
+            transactional(factory.make_RackController)
+        )
+        service = RackControllerService(sentinel.ipcWorker, sentinel.listener)
+        service.watching = {rack.id}
+        client = Mock(return_value=succeed({}))
+        mock_getClientFor = self.patch(rack_controller, "getClientFor")
+        mock_getClientFor.return_value = succeed(client)
+        yield service.bootConfigHandler("sys_bootconfig", "")
+        self.assertThat(
+            client,
+            MockCalledOnceWith(
+                rack_controller.InvalidateBootConfigs, macs=None
+            ),
+        )
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_bootConfigHandler_ignores_disconnected_racks(self):
+        rack = yield deferToDatabase(
+            transactional(factory.make_RackController)
+        )
+        service = RackControllerService(sentinel.ipcWorker, sentinel.listener)
+        service.watching = {rack.id}
+        mock_getClientFor = self.patch(rack_controller, "getClientFor")
+        mock_getClientFor.return_value = fail(NoConnectionsAvailable())
+        mock_err = self.patch(rack_controller.log, "err")
+        yield service.bootConfigHandler("sys_bootconfig", "")
+        self.assertThat(mock_err, MockNotCalled())
+
     def test_startProcessing_doesnt_call_start_when_looping_call_running(self):
         service = RackControllerService(sentinel.ipcWorker, sentinel.listener)
         mock_start = self.patch(service.processing, "start")
@@ -350,6 +425,17 @@ class TestRackControllerService(MAASTransactionServerTestCase):
             mock_processDHCP, MockCallsMatch(call(rack_id), call(rack_id))
         )
 
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_process_discards_dhcpCache_when_nothing_to_process(self):
+        service = RackControllerService(sentinel.ipcWorker, sentinel.listener)
+        service.needsDHCPUpdate = set()
+        service.dhcpCache = sentinel.dhcpCache
+        service.running = True
+        service.startProcessing()
+        yield service.processingDone
+        self.assertIsNone(service.dhcpCache)
+
     @wait_for_reactor
     @inlineCallbacks
     def test_processDHCP_calls_configure_dhcp(self):
@@ -362,4 +448,32 @@ class TestRackControllerService(MAASTransactionServerTestCase):
         )
         mock_configure_dhcp.return_value = succeed(None)
         yield service.processDHCP(rack.id)
-        self.assertThat(mock_configure_dhcp, MockCalledOnceWith(rack))
+        self.assertThat(
+            mock_configure_dhcp, MockCalledOnceWith(rack, service.dhcpCache)
+        )
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_processDHCP_shares_dhcpCache_between_racks(self):
+        racks = yield deferToDatabase(
+            transactional(
+                lambda: [factory.make_RackController() for _ in range(2)]
+            )
+        )
+        service = RackControllerService(sentinel.ipcWorker, sentinel.listener)
+        mock_configure_dhcp = self.patch(
+            rack_controller.dhcp, "configure_dhcp"
+        )
+        mock_configure_dhcp.return_value = succeed(None)
+        for rack in racks:
+            yield service.processDHCP(rack.id)
+        self.assertThat(
+            mock_configure_dhcp,
+            MockCallsMatch(
+                call(racks[0], service.dhcpCache),
+                call(racks[1], service.dhcpCache),
+            ),
+        )
+        self.assertIsInstance(
+            service.dhcpCache, rack_controller.dhcp.DHCPConfigurationCache
+        )
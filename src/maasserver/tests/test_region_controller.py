@@ -10,6 +10,7 @@ import random
 from unittest.mock import ANY, call, MagicMock, sentinel
 
 from crochet import wait_for
+from django.conf import settings
 from maasserver import region_controller
 from maasserver.models.config import Config
 from maasserver.models.dnspublication import DNSPublication
@@ -88,6 +89,21 @@ class TestRegionControllerService(MAASServerTestCase):
         mock_mark_rbac_for_update.assert_called_once()
         mock_mark_proxy_for_update.assert_called_once()
 
+    def test_startService_starts_zone_writers(self):
+        self.patch(settings, "DNS_ZONE_WRITER_PROCESSES", 3)
+        start_zone_writers = self.patch(
+            region_controller, "start_zone_writers"
+        )
+        service = self.make_service(MagicMock())
+        service.startService()
+        self.assertThat(start_zone_writers, MockCalledOnceWith(3))
+
+    def test_stopService_stops_zone_writers(self):
+        stop_zone_writers = self.patch(region_controller, "stop_zone_writers")
+        service = self.make_service(MagicMock())
+        service.stopService()
+        self.assertThat(stop_zone_writers, MockCalledOnceWith())
+
     def test_stopService_calls_unregister_on_the_listener(self):
         listener = MagicMock()
         service = self.make_service(listener)
@@ -209,13 +225,30 @@ class TestRegionControllerService(MAASServerTestCase):
         mock_msg = self.patch(region_controller.log, "msg")
         service.startProcessing()
         yield service.processingDefer
-        self.assertThat(mock_dns_update_all_zones, MockCalledOnceWith())
+        self.assertThat(
+            mock_dns_update_all_zones, MockCalledOnceWith(zone_timings={})
+        )
         self.assertThat(mock_check_serial, MockCalledOnceWith(dns_result))
         self.assertThat(
             mock_msg,
             MockCalledOnceWith("Reloaded DNS configuration; regiond started."),
         )
 
+    def test__logDNSReload_logs_zone_timings_slowest_first(self):
+        service = self.make_service(sentinel.listener)
+        timings = {"zone%d" % i: i / 10 for i in range(7)}
+        mock_msg = self.patch(region_controller.log, "msg")
+        service._logDNSReload((1, True, sorted(timings)), timings)
+        self.assertThat(
+            mock_msg,
+            MockCalledOnceWith(
+                "Reloaded DNS configuration; regiond started.\n"
+                "Updated 7 zone(s) in 2.100s: zone6 (0.600s), "
+                "zone5 (0.500s), zone4 (0.400s), zone3 (0.300s), "
+                "zone2 (0.200s) and 2 more"
+            ),
+        )
+
     @wait_for_reactor
     @inlineCallbacks
     def test_process_zones_kills_bind_on_failed_reload(self):
@@ -251,7 +284,8 @@ class TestRegionControllerService(MAASServerTestCase):
         service.startProcessing()
         yield service.processingDefer
         self.assertThat(
-            mock_dns_update_all_zones, MockCallsMatch(call(), call())
+            mock_dns_update_all_zones,
+            MockCallsMatch(call(zone_timings={}), call(zone_timings={})),
         )
         self.assertThat(
             mock_check_serial,
@@ -306,7 +340,9 @@ class TestRegionControllerService(MAASServerTestCase):
         mock_err = self.patch(region_controller.log, "err")
         service.startProcessing()
         yield service.processingDefer
-        self.assertThat(mock_dns_update_all_zones, MockCalledOnceWith())
+        self.assertThat(
+            mock_dns_update_all_zones, MockCalledOnceWith(zone_timings={})
+        )
         self.assertThat(
             mock_err, MockCalledOnceWith(ANY, "Failed configuring DNS.")
         )
@@ -393,7 +429,9 @@ class TestRegionControllerService(MAASServerTestCase):
         mock_rbacSync.return_value = None
         service.startProcessing()
         yield service.processingDefer
-        self.assertThat(mock_dns_update_all_zones, MockCalledOnceWith())
+        self.assertThat(
+            mock_dns_update_all_zones, MockCalledOnceWith(zone_timings={})
+        )
         self.assertThat(mock_check_serial, MockCalledOnceWith(dns_result))
         self.assertThat(
             mock_proxy_update_config, MockCalledOnceWith(reload_proxy=True)
@@ -611,7 +649,9 @@ class TestRegionControllerServiceTransactional(MAASTransactionServerTestCase):
         mock_msg = self.patch(region_controller.log, "msg")
         service.startProcessing()
         yield service.processingDefer
-        self.assertThat(mock_dns_update_all_zones, MockCalledOnceWith())
+        self.assertThat(
+            mock_dns_update_all_zones, MockCalledOnceWith(zone_timings={})
+        )
         self.assertThat(mock_check_serial, MockCalledOnceWith(dns_result))
         self.assertThat(
             mock_msg,
@@ -655,7 +695,9 @@ class TestRegionControllerServiceTransactional(MAASTransactionServerTestCase):
             " * %s" % publication.source
             for publication in reversed(publications[1:])
         )
-        self.assertThat(mock_dns_update_all_zones, MockCalledOnceWith())
+        self.assertThat(
+            mock_dns_update_all_zones, MockCalledOnceWith(zone_timings={})
+        )
         self.assertThat(mock_check_serial, MockCalledOnceWith(dns_result))
         self.assertThat(mock_msg, MockCalledOnceWith(expected_msg))
 
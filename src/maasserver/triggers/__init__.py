@@ -10,7 +10,13 @@ its previous trigger. All triggers will be added into the database via the
 `start_up` method for regiond.
 """
 
-__all__ = ["register_all_triggers", "register_procedure", "register_trigger"]
+__all__ = [
+    "register_all_triggers",
+    "register_procedure",
+    "register_statement_trigger",
+    "register_trigger",
+    "supports_statement_triggers",
+]
 
 from contextlib import closing
 from textwrap import dedent
@@ -164,6 +170,56 @@ def register_trigger(
         cursor.execute(trigger_sql)
 
 
+def supports_statement_triggers():
+    """Return whether statement triggers can use transition tables.
+
+    Transition tables were added in PostgreSQL 10.
+    """
+    return connection.pg_version >= 100000
+
+
+# Transition tables available to statement triggers, per event.
+TRANSITION_TABLES = {
+    "insert": "NEW TABLE AS new_table",
+    "update": "OLD TABLE AS old_table NEW TABLE AS new_table",
+    "delete": "OLD TABLE AS old_table",
+}
+
+
+def register_statement_trigger(table, procedure, event):
+    """Register statement level `trigger` on `table`, replacing any trigger
+    of the same name.
+
+    The trigger fires once per statement, after it completes. The rows it
+    changed are in the `new_table` and `old_table` transition tables, so
+    `procedure` can handle all of them at once.
+    """
+    # Strip the "maasserver_" off the front of the table name.
+    table_name = table
+    if table.startswith("maasserver_"):
+        table_name = table_name[11:]
+    trigger_name = "%s_%s" % (table_name, procedure)
+    trigger_sql = dedent(
+        """\
+        DROP TRIGGER IF EXISTS {trigger_name} ON {table};
+        CREATE TRIGGER {trigger_name}
+        AFTER {event} ON {table}
+        REFERENCING {transition_tables}
+        FOR EACH STATEMENT
+        EXECUTE PROCEDURE {procedure}();
+        """
+    )
+    trigger_sql = trigger_sql.format(
+        trigger_name=trigger_name,
+        table=table,
+        event=event.upper(),
+        transition_tables=TRANSITION_TABLES[event],
+        procedure=procedure,
+    )
+    with closing(connection.cursor()) as cursor:
+        cursor.execute(trigger_sql)
+
+
 @transactional
 def register_all_triggers():
     """Register all triggers into the database."""
@@ -14,7 +14,13 @@ __all__ = ["register_system_triggers"]
 from textwrap import dedent
 
 from maasserver.models.dnspublication import zone_serial
-from maasserver.triggers import register_procedure, register_trigger
+from maasserver.rpc.boot import BOOT_CONFIG_NAMES
+from maasserver.triggers import (
+    register_procedure,
+    register_statement_trigger,
+    register_trigger,
+    supports_statement_triggers,
+)
 from maasserver.utils.orm import transactional
 
 # Note that the corresponding test module (test_system) only tests that the
@@ -581,6 +587,33 @@ DHCP_STATICIPADDRESS_INSERT = dedent(
     """
 )
 
+# Statement level variant of DHCP_STATICIPADDRESS_INSERT. Alerts the rack
+# controllers of each VLAN once, however many IP addresses were inserted.
+DHCP_STATICIPADDRESS_INSERT_STATEMENT = dedent(
+    """\
+    CREATE OR REPLACE FUNCTION sys_dhcp_staticipaddress_insert()
+    RETURNS trigger as $$
+    DECLARE
+      vlan maasserver_vlan;
+    BEGIN
+      -- Update VLANs if DHCP is enabled, IP is set and not DISCOVERED.
+      FOR vlan IN (
+        SELECT DISTINCT ON (maasserver_vlan.id)
+          maasserver_vlan.*
+        FROM new_table AS new_ip, maasserver_vlan, maasserver_subnet
+        WHERE new_ip.alloc_type != 6 AND new_ip.ip IS NOT NULL AND
+          host(new_ip.ip) != '' AND new_ip.temp_expires_on IS NULL AND
+          maasserver_subnet.id = new_ip.subnet_id AND
+          maasserver_subnet.vlan_id = maasserver_vlan.id)
+      LOOP
+        PERFORM sys_dhcp_alert(vlan);
+      END LOOP;
+      RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+)
+
 # Triggered when an IP address that has an IP set (not temp) and is not
 # DISCOVERED is updated. If the subnet changes then it alerts the rack
 # controllers of each VLAN if the VLAN differs from the previous VLAN.
@@ -631,6 +664,46 @@ DHCP_STATICIPADDRESS_UPDATE = dedent(
     """
 )
 
+# Statement level variant of DHCP_STATICIPADDRESS_UPDATE. Alerts the rack
+# controllers of each VLAN once, however many IP addresses were updated.
+DHCP_STATICIPADDRESS_UPDATE_STATEMENT = dedent(
+    """\
+    CREATE OR REPLACE FUNCTION sys_dhcp_staticipaddress_update()
+    RETURNS trigger as $$
+    DECLARE
+      vlan maasserver_vlan;
+    BEGIN
+      -- Ignore DISCOVERED IP addresses. When the subnet has changed update
+      -- the VLAN of the old and new subnet, otherwise only update the VLAN
+      -- when the assigned IP address has changed.
+      FOR vlan IN (
+        SELECT DISTINCT ON (maasserver_vlan.id)
+          maasserver_vlan.*
+        FROM old_table AS old_ip
+        JOIN new_table AS new_ip ON new_ip.id = old_ip.id
+        JOIN maasserver_subnet ON
+          maasserver_subnet.id = old_ip.subnet_id OR
+          maasserver_subnet.id = new_ip.subnet_id
+        JOIN maasserver_vlan ON maasserver_vlan.id = maasserver_subnet.vlan_id
+        WHERE new_ip.alloc_type != 6 AND (
+          (old_ip.subnet_id != new_ip.subnet_id) OR (
+            maasserver_subnet.id = new_ip.subnet_id AND (
+              (old_ip.ip IS NULL AND new_ip.ip IS NOT NULL) OR
+              (old_ip.ip IS NOT NULL and new_ip.ip IS NULL) OR
+              (old_ip.temp_expires_on IS NULL AND
+               new_ip.temp_expires_on IS NOT NULL) OR
+              (old_ip.temp_expires_on IS NOT NULL AND
+               new_ip.temp_expires_on IS NULL) OR
+              (host(old_ip.ip) != host(new_ip.ip))))))
+      LOOP
+        PERFORM sys_dhcp_alert(vlan);
+      END LOOP;
+      RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+)
+
 # Triggered when an IP address is removed from a subnet that is on a
 # managed VLAN. Alerts the rack controllers of that VLAN.
 DHCP_STATICIPADDRESS_DELETE = dedent(
@@ -654,6 +727,32 @@ DHCP_STATICIPADDRESS_DELETE = dedent(
     """
 )
 
+# Statement level variant of DHCP_STATICIPADDRESS_DELETE. Alerts the rack
+# controllers of each VLAN once, however many IP addresses were removed.
+DHCP_STATICIPADDRESS_DELETE_STATEMENT = dedent(
+    """\
+    CREATE OR REPLACE FUNCTION sys_dhcp_staticipaddress_delete()
+    RETURNS trigger as $$
+    DECLARE
+      vlan maasserver_vlan;
+    BEGIN
+      -- Update VLANs if DHCP is enabled and has an IP address.
+      FOR vlan IN (
+        SELECT DISTINCT ON (maasserver_vlan.id)
+          maasserver_vlan.*
+        FROM old_table AS old_ip, maasserver_vlan, maasserver_subnet
+        WHERE host(old_ip.ip) != '' AND old_ip.temp_expires_on IS NULL AND
+          maasserver_subnet.id = old_ip.subnet_id AND
+          maasserver_subnet.vlan_id = maasserver_vlan.id)
+      LOOP
+        PERFORM sys_dhcp_alert(vlan);
+      END LOOP;
+      RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+)
+
 # Triggered when the interface name or MAC address is updated. Alerts
 # rack controllers on all managed VLAN's that the interface has a non
 # DISCOVERED IP address on.
@@ -982,6 +1081,29 @@ DNS_PUBLISH_UPDATE = dedent(
 )
 
 
+# Procedure to mark DNS as needing an update for several reasons at once. A
+# single publication is made, giving the first reason and how many others
+# there were.
+DNS_PUBLISH_UPDATES = dedent(
+    """\
+    CREATE OR REPLACE FUNCTION sys_dns_publish_updates(reasons text[])
+    RETURNS void as $$
+    DECLARE
+      total integer := COALESCE(array_length(reasons, 1), 0);
+    BEGIN
+      IF total = 1 THEN
+        PERFORM sys_dns_publish_update(reasons[1]);
+      ELSIF total > 1 THEN
+        PERFORM sys_dns_publish_update(
+          substring(reasons[1] FOR 200) || ' and ' || (total - 1) ||
+          ' more');
+      END IF;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+)
+
+
 # Triggered when a new domain is added. Increments the zone serial and
 # notifies that DNS needs to be updated.
 DNS_DOMAIN_INSERT = dedent(
@@ -1134,6 +1256,85 @@ DNS_STATICIPADDRESS_UPDATE = dedent(
 )
 
 
+# Statement level variant of DNS_STATICIPADDRESS_UPDATE. Makes a single
+# publication for all the static IP addresses that were updated.
+DNS_STATICIPADDRESS_UPDATE_STATEMENT = dedent(
+    """\
+    CREATE OR REPLACE FUNCTION sys_dns_staticipaddress_update()
+    RETURNS trigger as $$
+    DECLARE
+      reasons text[];
+    BEGIN
+      SELECT array_agg(changes.reason ORDER BY changes.id) INTO reasons
+      FROM (
+        SELECT
+          new_ip.id,
+          CASE
+            WHEN old_ip.ip IS NULL and new_ip.ip IS NOT NULL and
+              new_ip.temp_expires_on IS NULL THEN
+              'ip ' || host(new_ip.ip) || ' allocated'
+            WHEN old_ip.ip IS NOT NULL and new_ip.ip IS NULL and
+              new_ip.temp_expires_on IS NULL THEN
+              'ip ' || host(old_ip.ip) || ' released'
+            WHEN old_ip.ip != new_ip.ip and
+              new_ip.temp_expires_on IS NULL THEN
+              'ip ' || host(old_ip.ip) || ' changed to ' || host(new_ip.ip)
+            WHEN old_ip.ip = new_ip.ip and
+              old_ip.temp_expires_on IS NOT NULL and
+              new_ip.temp_expires_on IS NULL THEN
+              'ip ' || host(new_ip.ip) || ' allocated'
+            WHEN old_ip.ip = new_ip.ip and
+              old_ip.temp_expires_on IS NULL and
+              new_ip.temp_expires_on IS NOT NULL THEN
+              'ip ' || host(new_ip.ip) || ' released'
+            -- Only alloc_type has changed. Only send a notification if the
+            -- IP address is assigned.
+            WHEN new_ip.ip IS NOT NULL and new_ip.temp_expires_on IS NULL THEN
+              'ip ' || host(old_ip.ip) || ' alloc_type changed to ' ||
+              new_ip.alloc_type
+          END AS reason
+        FROM old_table AS old_ip
+        JOIN new_table AS new_ip ON new_ip.id = old_ip.id
+        WHERE
+          ((old_ip.ip IS NULL and new_ip.ip IS NOT NULL) OR
+           (old_ip.ip IS NOT NULL and new_ip.ip IS NULL) OR
+           (old_ip.temp_expires_on IS NULL AND
+            new_ip.temp_expires_on IS NOT NULL) OR
+           (old_ip.temp_expires_on IS NOT NULL AND
+            new_ip.temp_expires_on IS NULL) OR
+           (old_ip.ip != new_ip.ip) OR
+           (old_ip.alloc_type != new_ip.alloc_type)) AND
+          EXISTS (
+            SELECT
+              domain.id
+            FROM maasserver_staticipaddress AS staticipaddress
+            LEFT JOIN (
+              maasserver_interface_ip_addresses AS iia
+              JOIN maasserver_interface AS interface ON
+                iia.interface_id = interface.id
+              JOIN maasserver_node AS node ON
+                node.id = interface.node_id) ON
+              iia.staticipaddress_id = staticipaddress.id
+            LEFT JOIN (
+              maasserver_dnsresource_ip_addresses AS dia
+              JOIN maasserver_dnsresource AS dnsresource ON
+                dia.dnsresource_id = dnsresource.id) ON
+              dia.staticipaddress_id = staticipaddress.id
+            JOIN maasserver_domain AS domain ON
+              domain.id = node.domain_id OR domain.id = dnsresource.domain_id
+            WHERE
+              domain.authoritative = TRUE AND
+              staticipaddress.id = new_ip.id)
+      ) AS changes
+      WHERE changes.reason IS NOT NULL;
+      PERFORM sys_dns_publish_updates(reasons);
+      RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+)
+
+
 # Triggered when an interface is linked to an IP address. Increments the zone
 # serial and notifies that DNS needs to be updated.
 DNS_NIC_IP_LINK = dedent(
@@ -1173,6 +1374,34 @@ DNS_NIC_IP_LINK = dedent(
 )
 
 
+# Statement level variant of DNS_NIC_IP_LINK. Makes a single publication for
+# all the IP addresses that were linked.
+DNS_NIC_IP_LINK_STATEMENT = dedent(
+    """\
+    CREATE OR REPLACE FUNCTION sys_dns_nic_ip_link()
+    RETURNS trigger as $$
+    DECLARE
+      reasons text[];
+    BEGIN
+      SELECT array_agg(
+        'ip ' || host(ip.ip) || ' connected to ' || node.hostname ||
+        ' on ' || nic.name ORDER BY link.id) INTO reasons
+      FROM new_table AS link
+      JOIN maasserver_interface AS nic ON nic.id = link.interface_id
+      JOIN maasserver_node AS node ON node.id = nic.node_id
+      JOIN maasserver_staticipaddress AS ip ON
+        ip.id = link.staticipaddress_id
+      JOIN maasserver_domain AS domain ON domain.id = node.domain_id
+      WHERE ip.ip IS NOT NULL AND ip.temp_expires_on IS NULL AND
+        host(ip.ip) != '' AND domain.authoritative = TRUE;
+      PERFORM sys_dns_publish_updates(reasons);
+      RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+)
+
+
 # Triggered when an interface is unlinked to an IP address. Increments the zone
 # serial and notifies that DNS needs to be updated.
 DNS_NIC_IP_UNLINK = dedent(
@@ -1212,6 +1441,34 @@ DNS_NIC_IP_UNLINK = dedent(
 )
 
 
+# Statement level variant of DNS_NIC_IP_UNLINK. Makes a single publication
+# for all the IP addresses that were unlinked.
+DNS_NIC_IP_UNLINK_STATEMENT = dedent(
+    """\
+    CREATE OR REPLACE FUNCTION sys_dns_nic_ip_unlink()
+    RETURNS trigger as $$
+    DECLARE
+      reasons text[];
+    BEGIN
+      SELECT array_agg(
+        'ip ' || host(ip.ip) || ' disconnected from ' || node.hostname ||
+        ' on ' || nic.name ORDER BY link.id) INTO reasons
+      FROM old_table AS link
+      JOIN maasserver_interface AS nic ON nic.id = link.interface_id
+      JOIN maasserver_node AS node ON node.id = nic.node_id
+      JOIN maasserver_staticipaddress AS ip ON
+        ip.id = link.staticipaddress_id
+      JOIN maasserver_domain AS domain ON domain.id = node.domain_id
+      WHERE ip.ip IS NOT NULL AND ip.temp_expires_on IS NULL AND
+        domain.authoritative = TRUE;
+      PERFORM sys_dns_publish_updates(reasons);
+      RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+)
+
+
 # Triggered when a subnet is inserted. Increments the zone serial and notifies
 # that DNS needs to be updated. Doesn't notify if the rdns_mode is
 # disabled (0).
@@ -1918,6 +2175,151 @@ RBAC_CONFIG_UPDATE = dedent(
     """
 )
 
+# Procedure to notify that the free addresses in a subnet have changed. When
+# `ip` is set it has been taken, otherwise the subnet needs to be looked at
+# again. The id of the transaction is sent so that the region can tell
+# whether a snapshot includes the change. See `maasserver.freespace`.
+IPALLOC_ALERT = dedent(
+    """\
+    CREATE OR REPLACE FUNCTION sys_ipalloc_alert(subnet_id integer, ip inet)
+    RETURNS void AS $$
+    BEGIN
+      IF subnet_id IS NOT NULL THEN
+        IF ip IS NULL THEN
+          PERFORM pg_notify('sys_ipalloc', CONCAT(
+            subnet_id, ' changed ', txid_current()));
+        ELSE
+          PERFORM pg_notify('sys_ipalloc', CONCAT(
+            subnet_id, ' taken ', txid_current(), ' ', host(ip)));
+        END IF;
+      END IF;
+      RETURN;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+)
+
+# Triggered when an IP address is inserted. Notifies that the address was
+# taken from its subnet.
+IPALLOC_STATICIPADDRESS_INSERT = dedent(
+    """\
+    CREATE OR REPLACE FUNCTION sys_ipalloc_staticipaddress_insert()
+    RETURNS trigger as $$
+    BEGIN
+      IF NEW.ip IS NOT NULL THEN
+        PERFORM sys_ipalloc_alert(NEW.subnet_id, NEW.ip);
+      END IF;
+      RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+)
+
+# Statement level variant of IPALLOC_STATICIPADDRESS_INSERT.
+IPALLOC_STATICIPADDRESS_INSERT_STATEMENT = dedent(
+    """\
+    CREATE OR REPLACE FUNCTION sys_ipalloc_staticipaddress_insert()
+    RETURNS trigger as $$
+    DECLARE
+      new_ip RECORD;
+    BEGIN
+      FOR new_ip IN (
+        SELECT DISTINCT subnet_id, ip FROM new_table WHERE ip IS NOT NULL)
+      LOOP
+        PERFORM sys_ipalloc_alert(new_ip.subnet_id, new_ip.ip);
+      END LOOP;
+      RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+)
+
+# Triggered when the address or subnet of an IP address is updated. The old
+# subnet has to be looked at again, as an address may have been freed, and
+# the new address was taken from the new subnet.
+IPALLOC_STATICIPADDRESS_UPDATE = dedent(
+    """\
+    CREATE OR REPLACE FUNCTION sys_ipalloc_staticipaddress_update()
+    RETURNS trigger as $$
+    BEGIN
+      IF OLD.ip IS NOT NULL THEN
+        PERFORM sys_ipalloc_alert(OLD.subnet_id, NULL);
+      END IF;
+      IF NEW.ip IS NOT NULL THEN
+        PERFORM sys_ipalloc_alert(NEW.subnet_id, NEW.ip);
+      END IF;
+      RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+)
+
+# Statement level variant of IPALLOC_STATICIPADDRESS_UPDATE.
+IPALLOC_STATICIPADDRESS_UPDATE_STATEMENT = dedent(
+    """\
+    CREATE OR REPLACE FUNCTION sys_ipalloc_staticipaddress_update()
+    RETURNS trigger as $$
+    DECLARE
+      changed RECORD;
+    BEGIN
+      FOR changed IN (
+        SELECT old_ip.subnet_id, NULL::inet AS ip
+        FROM old_table AS old_ip
+        JOIN new_table AS new_ip ON new_ip.id = old_ip.id
+        WHERE old_ip.ip IS NOT NULL AND (
+          old_ip.ip IS DISTINCT FROM new_ip.ip OR
+          old_ip.subnet_id IS DISTINCT FROM new_ip.subnet_id)
+        UNION
+        SELECT new_ip.subnet_id, new_ip.ip
+        FROM old_table AS old_ip
+        JOIN new_table AS new_ip ON new_ip.id = old_ip.id
+        WHERE new_ip.ip IS NOT NULL AND (
+          old_ip.ip IS DISTINCT FROM new_ip.ip OR
+          old_ip.subnet_id IS DISTINCT FROM new_ip.subnet_id))
+      LOOP
+        PERFORM sys_ipalloc_alert(changed.subnet_id, changed.ip);
+      END LOOP;
+      RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+)
+
+# Triggered when an IP address is deleted. Its subnet has to be looked at
+# again, as the address may no longer be in use.
+IPALLOC_STATICIPADDRESS_DELETE = dedent(
+    """\
+    CREATE OR REPLACE FUNCTION sys_ipalloc_staticipaddress_delete()
+    RETURNS trigger as $$
+    BEGIN
+      IF OLD.ip IS NOT NULL THEN
+        PERFORM sys_ipalloc_alert(OLD.subnet_id, NULL);
+      END IF;
+      RETURN OLD;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+)
+
+# Statement level variant of IPALLOC_STATICIPADDRESS_DELETE.
+IPALLOC_STATICIPADDRESS_DELETE_STATEMENT = dedent(
+    """\
+    CREATE OR REPLACE FUNCTION sys_ipalloc_staticipaddress_delete()
+    RETURNS trigger as $$
+    DECLARE
+      old_ip RECORD;
+    BEGIN
+      FOR old_ip IN (
+        SELECT DISTINCT subnet_id FROM old_table WHERE ip IS NOT NULL)
+      LOOP
+        PERFORM sys_ipalloc_alert(old_ip.subnet_id, NULL);
+      END LOOP;
+      RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+)
+
 
 def render_sys_proxy_procedure(proc_name, on_delete=False):
     """Render a database procedure with name `proc_name` that notifies that a
@@ -1939,9 +2341,165 @@ def render_sys_proxy_procedure(proc_name, on_delete=False):
     )
 
 
+# Triggered when the status or boot settings of a node change. Notifies that
+# the boot configurations for the MAC addresses of the node have changed.
+BOOTCONFIG_NODE_UPDATE = dedent(
+    """\
+    CREATE OR REPLACE FUNCTION sys_bootconfig_node_update()
+    RETURNS trigger as $$
+    DECLARE
+      macs text;
+    BEGIN
+      SELECT string_agg(mac_address::text, ' ') INTO macs
+      FROM maasserver_interface
+      WHERE node_id = NEW.id AND mac_address IS NOT NULL;
+      IF macs IS NOT NULL THEN
+        PERFORM pg_notify('sys_bootconfig', macs);
+      END IF;
+      RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+)
+
+# Triggered when an interface is inserted. Notifies that the boot
+# configuration for its MAC address has changed, as it may have been booting
+# as an unknown machine.
+BOOTCONFIG_INTERFACE_INSERT = dedent(
+    """\
+    CREATE OR REPLACE FUNCTION sys_bootconfig_interface_insert()
+    RETURNS trigger as $$
+    BEGIN
+      IF NEW.mac_address IS NOT NULL THEN
+        PERFORM pg_notify('sys_bootconfig', NEW.mac_address::text);
+      END IF;
+      RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+)
+
+# Triggered when the MAC address, node or type of an interface changes.
+# Notifies that the boot configurations for its old and new MAC addresses
+# have changed.
+BOOTCONFIG_INTERFACE_UPDATE = dedent(
+    """\
+    CREATE OR REPLACE FUNCTION sys_bootconfig_interface_update()
+    RETURNS trigger as $$
+    DECLARE
+      macs text;
+    BEGIN
+      macs := CONCAT_WS(' ', OLD.mac_address::text, NEW.mac_address::text);
+      IF macs != '' THEN
+        PERFORM pg_notify('sys_bootconfig', macs);
+      END IF;
+      RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+)
+
+# Triggered when an interface is deleted. Notifies that the boot
+# configuration for its MAC address has changed.
+BOOTCONFIG_INTERFACE_DELETE = dedent(
+    """\
+    CREATE OR REPLACE FUNCTION sys_bootconfig_interface_delete()
+    RETURNS trigger as $$
+    BEGIN
+      IF OLD.mac_address IS NOT NULL THEN
+        PERFORM pg_notify('sys_bootconfig', OLD.mac_address::text);
+      END IF;
+      RETURN OLD;
+    END;
+    $$ LANGUAGE plpgsql;
+    """
+)
+
+
+def render_sys_bootconfig_all_procedure(proc_name, when="TRUE"):
+    """Render a database procedure with name `proc_name` that notifies that
+    the boot configurations of all machines have changed.
+
+    :param proc_name: Name of the procedure.
+    :param when: Condition on `NEW` for notifying.
+    """
+    return dedent(
+        """\
+        CREATE OR REPLACE FUNCTION %s() RETURNS trigger AS $$
+        BEGIN
+          IF %s THEN
+            PERFORM pg_notify('sys_bootconfig', '');
+          END IF;
+          RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    ) % (proc_name, when)
+
+
+def render_sys_bootsnapshot_procedure(proc_name, on_delete=False, when="TRUE"):
+    """Render a database procedure with name `proc_name` that notifies that
+    the global inputs of boot configurations have changed.
+
+    :param proc_name: Name of the procedure.
+    :param on_delete: True when procedure will be used as a delete trigger.
+    :param when: Condition on the row for notifying.
+    """
+    return dedent(
+        """\
+        CREATE OR REPLACE FUNCTION %s() RETURNS trigger AS $$
+        BEGIN
+          IF %s THEN
+            PERFORM pg_notify('sys_bootsnapshot', '');
+          END IF;
+          RETURN %s;
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    ) % (proc_name, when, "NEW" if not on_delete else "OLD")
+
+
+def render_sys_ipalloc_procedure(proc_name, subnet_column, event):
+    """Render a database procedure with name `proc_name` that notifies that
+    the free addresses in a subnet have to be looked at again.
+
+    :param proc_name: Name of the procedure.
+    :param subnet_column: Column of the table with the id of the subnet.
+    :param event: The event the procedure is used for; one of "insert",
+        "update" or "delete".
+    """
+    if event == "insert":
+        body = "PERFORM sys_ipalloc_alert(NEW.%(col)s, NULL);\n  RETURN NEW;"
+    elif event == "update":
+        body = (
+            "PERFORM sys_ipalloc_alert(OLD.%(col)s, NULL);\n"
+            "  IF NEW.%(col)s IS DISTINCT FROM OLD.%(col)s THEN\n"
+            "    PERFORM sys_ipalloc_alert(NEW.%(col)s, NULL);\n"
+            "  END IF;\n"
+            "  RETURN NEW;"
+        )
+    elif event == "delete":
+        body = "PERFORM sys_ipalloc_alert(OLD.%(col)s, NULL);\n  RETURN OLD;"
+    else:
+        raise ValueError("Unknown event: %s" % event)
+    return dedent(
+        """\
+        CREATE OR REPLACE FUNCTION %s() RETURNS trigger AS $$
+        BEGIN
+          %s
+        END;
+        $$ LANGUAGE plpgsql;
+        """
+    ) % (proc_name, body % {"col": subnet_column})
+
+
 @transactional
 def register_system_triggers():
     """Register all system triggers into the database."""
+    # Bulk changes to IP addresses are handled once per statement, rather
+    # than once per row, when the database supports it.
+    statement_triggers = supports_statement_triggers()
+
     # Core
     register_procedure(CORE_GET_MANAGING_COUNT)
     register_procedure(CORE_GET_NUMBER_OF_CONN)
@@ -1981,24 +2539,44 @@ def register_system_triggers():
     register_trigger("maasserver_iprange", "sys_dhcp_iprange_delete", "delete")
 
     # - StaticIPAddress
-    register_procedure(DHCP_STATICIPADDRESS_INSERT)
-    register_trigger(
-        "maasserver_staticipaddress",
-        "sys_dhcp_staticipaddress_insert",
-        "insert",
-    )
-    register_procedure(DHCP_STATICIPADDRESS_UPDATE)
-    register_trigger(
-        "maasserver_staticipaddress",
-        "sys_dhcp_staticipaddress_update",
-        "update",
-    )
-    register_procedure(DHCP_STATICIPADDRESS_DELETE)
-    register_trigger(
-        "maasserver_staticipaddress",
-        "sys_dhcp_staticipaddress_delete",
-        "delete",
-    )
+    if statement_triggers:
+        register_procedure(DHCP_STATICIPADDRESS_INSERT_STATEMENT)
+        register_statement_trigger(
+            "maasserver_staticipaddress",
+            "sys_dhcp_staticipaddress_insert",
+            "insert",
+        )
+        register_procedure(DHCP_STATICIPADDRESS_UPDATE_STATEMENT)
+        register_statement_trigger(
+            "maasserver_staticipaddress",
+            "sys_dhcp_staticipaddress_update",
+            "update",
+        )
+        register_procedure(DHCP_STATICIPADDRESS_DELETE_STATEMENT)
+        register_statement_trigger(
+            "maasserver_staticipaddress",
+            "sys_dhcp_staticipaddress_delete",
+            "delete",
+        )
+    else:
+        register_procedure(DHCP_STATICIPADDRESS_INSERT)
+        register_trigger(
+            "maasserver_staticipaddress",
+            "sys_dhcp_staticipaddress_insert",
+            "insert",
+        )
+        register_procedure(DHCP_STATICIPADDRESS_UPDATE)
+        register_trigger(
+            "maasserver_staticipaddress",
+            "sys_dhcp_staticipaddress_update",
+            "update",
+        )
+        register_procedure(DHCP_STATICIPADDRESS_DELETE)
+        register_trigger(
+            "maasserver_staticipaddress",
+            "sys_dhcp_staticipaddress_delete",
+            "delete",
+        )
 
     # - Interface
     register_procedure(DHCP_INTERFACE_UPDATE)
@@ -2052,6 +2630,7 @@ def register_system_triggers():
     register_procedure(DNS_PUBLISH)
     register_trigger("maasserver_dnspublication", "sys_dns_publish", "insert")
     register_procedure(DNS_PUBLISH_UPDATE)
+    register_procedure(DNS_PUBLISH_UPDATES)
 
     # - Domain
     register_procedure(DNS_DOMAIN_INSERT)
@@ -2062,22 +2641,48 @@ def register_system_triggers():
     register_trigger("maasserver_domain", "sys_dns_domain_delete", "delete")
 
     # - StaticIPAddress
-    register_procedure(DNS_STATICIPADDRESS_UPDATE)
-    register_trigger(
-        "maasserver_staticipaddress",
-        "sys_dns_staticipaddress_update",
-        "update",
-    )
+    if statement_triggers:
+        register_procedure(DNS_STATICIPADDRESS_UPDATE_STATEMENT)
+        register_statement_trigger(
+            "maasserver_staticipaddress",
+            "sys_dns_staticipaddress_update",
+            "update",
+        )
+    else:
+        register_procedure(DNS_STATICIPADDRESS_UPDATE)
+        register_trigger(
+            "maasserver_staticipaddress",
+            "sys_dns_staticipaddress_update",
+            "update",
+        )
 
     # - Interface -> StaticIPAddress
-    register_procedure(DNS_NIC_IP_LINK)
-    register_trigger(
-        "maasserver_interface_ip_addresses", "sys_dns_nic_ip_link", "insert"
-    )
-    register_procedure(DNS_NIC_IP_UNLINK)
-    register_trigger(
-        "maasserver_interface_ip_addresses", "sys_dns_nic_ip_unlink", "delete"
-    )
+    if statement_triggers:
+        register_procedure(DNS_NIC_IP_LINK_STATEMENT)
+        register_statement_trigger(
+            "maasserver_interface_ip_addresses",
+            "sys_dns_nic_ip_link",
+            "insert",
+        )
+        register_procedure(DNS_NIC_IP_UNLINK_STATEMENT)
+        register_statement_trigger(
+            "maasserver_interface_ip_addresses",
+            "sys_dns_nic_ip_unlink",
+            "delete",
+        )
+    else:
+        register_procedure(DNS_NIC_IP_LINK)
+        register_trigger(
+            "maasserver_interface_ip_addresses",
+            "sys_dns_nic_ip_link",
+            "insert",
+        )
+        register_procedure(DNS_NIC_IP_UNLINK)
+        register_trigger(
+            "maasserver_interface_ip_addresses",
+            "sys_dns_nic_ip_unlink",
+            "delete",
+        )
 
     # - DNSResource
     register_procedure(DNS_DNSRESOURCE_INSERT)
@@ -2187,3 +2792,218 @@ def register_system_triggers():
     register_trigger("maasserver_config", "sys_rbac_config_insert", "insert")
     register_procedure(RBAC_CONFIG_UPDATE)
     register_trigger("maasserver_config", "sys_rbac_config_update", "update")
+
+    # IP allocation
+    register_procedure(IPALLOC_ALERT)
+
+    # - StaticIPAddress
+    if statement_triggers:
+        register_procedure(IPALLOC_STATICIPADDRESS_INSERT_STATEMENT)
+        register_statement_trigger(
+            "maasserver_staticipaddress",
+            "sys_ipalloc_staticipaddress_insert",
+            "insert",
+        )
+        register_procedure(IPALLOC_STATICIPADDRESS_UPDATE_STATEMENT)
+        register_statement_trigger(
+            "maasserver_staticipaddress",
+            "sys_ipalloc_staticipaddress_update",
+            "update",
+        )
+        register_procedure(IPALLOC_STATICIPADDRESS_DELETE_STATEMENT)
+        register_statement_trigger(
+            "maasserver_staticipaddress",
+            "sys_ipalloc_staticipaddress_delete",
+            "delete",
+        )
+    else:
+        register_procedure(IPALLOC_STATICIPADDRESS_INSERT)
+        register_trigger(
+            "maasserver_staticipaddress",
+            "sys_ipalloc_staticipaddress_insert",
+            "insert",
+        )
+        register_procedure(IPALLOC_STATICIPADDRESS_UPDATE)
+        register_trigger(
+            "maasserver_staticipaddress",
+            "sys_ipalloc_staticipaddress_update",
+            "update",
+            fields=["ip", "subnet_id"],
+        )
+        register_procedure(IPALLOC_STATICIPADDRESS_DELETE)
+        register_trigger(
+            "maasserver_staticipaddress",
+            "sys_ipalloc_staticipaddress_delete",
+            "delete",
+        )
+
+    # - Subnet, IPRange and StaticRoute
+    ipalloc_tables = (
+        (
+            "maasserver_subnet",
+            "subnet",
+            "id",
+            ("update", "delete"),
+            ["cidr", "gateway_ip", "dns_servers", "managed"],
+        ),
+        (
+            "maasserver_iprange",
+            "iprange",
+            "subnet_id",
+            ("insert", "update", "delete"),
+            ["subnet_id", "type", "start_ip", "end_ip"],
+        ),
+        (
+            "maasserver_staticroute",
+            "staticroute",
+            "source_id",
+            ("insert", "update", "delete"),
+            ["source_id", "gateway_ip"],
+        ),
+    )
+    for table, name, subnet_column, events, fields in ipalloc_tables:
+        for event in events:
+            procedure = "sys_ipalloc_%s_%s" % (name, event)
+            register_procedure(
+                render_sys_ipalloc_procedure(procedure, subnet_column, event)
+            )
+            register_trigger(
+                table,
+                procedure,
+                event,
+                fields=fields if event == "update" else None,
+            )
+
+    # Boot configurations
+    # - Node
+    register_procedure(BOOTCONFIG_NODE_UPDATE)
+    register_trigger(
+        "maasserver_node",
+        "sys_bootconfig_node_update",
+        "update",
+        fields=[
+            "status",
+            "architecture",
+            "osystem",
+            "distro_series",
+            "hwe_kernel",
+            "min_hwe_kernel",
+            "netboot",
+            "ephemeral_deploy",
+            "hostname",
+            "domain_id",
+        ],
+    )
+
+    # - Interface
+    register_procedure(BOOTCONFIG_INTERFACE_INSERT)
+    register_trigger(
+        "maasserver_interface", "sys_bootconfig_interface_insert", "insert"
+    )
+    register_procedure(BOOTCONFIG_INTERFACE_UPDATE)
+    register_trigger(
+        "maasserver_interface",
+        "sys_bootconfig_interface_update",
+        "update",
+        fields=["mac_address", "node_id", "type"],
+    )
+    register_procedure(BOOTCONFIG_INTERFACE_DELETE)
+    register_trigger(
+        "maasserver_interface", "sys_bootconfig_interface_delete", "delete"
+    )
+
+    # - Config and Tag
+    config_names = "NEW.name IN (%s)" % ", ".join(
+        "'%s'" % name for name in BOOT_CONFIG_NAMES
+    )
+    register_procedure(
+        render_sys_bootconfig_all_procedure(
+            "sys_bootconfig_config_insert", config_names
+        )
+    )
+    register_trigger(
+        "maasserver_config", "sys_bootconfig_config_insert", "insert"
+    )
+    register_procedure(
+        render_sys_bootconfig_all_procedure(
+            "sys_bootconfig_config_update", config_names
+        )
+    )
+    register_trigger(
+        "maasserver_config",
+        "sys_bootconfig_config_update",
+        "update",
+        fields=["value"],
+    )
+    register_procedure(
+        render_sys_bootconfig_all_procedure("sys_bootconfig_tag_update")
+    )
+    register_trigger(
+        "maasserver_tag",
+        "sys_bootconfig_tag_update",
+        "update",
+        fields=["kernel_opts"],
+    )
+
+    # Boot configuration snapshots
+    # - Config
+    for event in "insert", "update":
+        procedure = "sys_bootsnapshot_config_%s" % event
+        register_procedure(
+            render_sys_bootsnapshot_procedure(procedure, when=config_names)
+        )
+        register_trigger(
+            "maasserver_config",
+            procedure,
+            event,
+            fields=["value"] if event == "update" else None,
+        )
+
+    # - Boot resources, subnets and VLANs
+    bootsnapshot_tables = {
+        "bootresource": ("maasserver_bootresource", None),
+        "bootresourceset": ("maasserver_bootresourceset", None),
+        "bootresourcefile": ("maasserver_bootresourcefile", None),
+        "subnet": (
+            "maasserver_subnet",
+            ["cidr", "vlan_id", "dns_servers"],
+        ),
+    }
+    for name, (table, fields) in bootsnapshot_tables.items():
+        for event in "insert", "update", "delete":
+            procedure = "sys_bootsnapshot_%s_%s" % (name, event)
+            register_procedure(
+                render_sys_bootsnapshot_procedure(
+                    procedure, on_delete=(event == "delete")
+                )
+            )
+            register_trigger(
+                table,
+                procedure,
+                event,
+                fields=fields if event == "update" else None,
+            )
+    register_procedure(
+        render_sys_bootsnapshot_procedure("sys_bootsnapshot_vlan_update")
+    )
+    register_trigger(
+        "maasserver_vlan",
+        "sys_bootsnapshot_vlan_update",
+        "update",
+        fields=["dhcp_on"],
+    )
+
+    # - Large files, once their content is complete, which completes the
+    #   boot resource sets they're in.
+    register_procedure(
+        render_sys_bootsnapshot_procedure(
+            "sys_bootsnapshot_largefile_update",
+            when="NEW.size = NEW.total_size",
+        )
+    )
+    register_trigger(
+        "maasserver_largefile",
+        "sys_bootsnapshot_largefile_update",
+        "update",
+        fields=["size"],
+    )
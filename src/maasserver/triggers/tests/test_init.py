@@ -9,7 +9,11 @@ from contextlib import closing
 
 from django.db import connection
 from maasserver.testing.testcase import MAASServerTestCase
-from maasserver.triggers import register_procedure, register_trigger
+from maasserver.triggers import (
+    register_procedure,
+    register_statement_trigger,
+    register_trigger,
+)
 from maasserver.triggers.system import register_system_triggers
 from maasserver.triggers.websocket import (
     register_websocket_triggers,
@@ -55,6 +59,25 @@ class TestTriggers(MAASServerTestCase):
 
         self.assertEqual(1, len(triggers), "Trigger was not created.")
 
+    def test_register_statement_trigger_creates_statement_trigger(self):
+        register_system_triggers()
+        register_statement_trigger(
+            "maasserver_staticipaddress",
+            "sys_dhcp_staticipaddress_update",
+            "update",
+        )
+
+        with closing(connection.cursor()) as cursor:
+            cursor.execute(
+                "SELECT tgtype & 1, tgoldtable, tgnewtable FROM pg_trigger "
+                "WHERE tgname = "
+                "'staticipaddress_sys_dhcp_staticipaddress_update'"
+            )
+            triggers = cursor.fetchall()
+
+        # Bit 0 of tgtype is set for row triggers only.
+        self.assertEqual([(0, "old_table", "new_table")], triggers)
+
 
 class TestTriggersUsed(MAASServerTestCase):
     """Tests relating to those triggers the MAAS application uses."""
@@ -65,6 +65,40 @@ class TestTriggers(MAASServerTestCase):
             "resourcepool_sys_rbac_rpool_delete",
             "config_sys_rbac_config_insert",
             "config_sys_rbac_config_update",
+            "staticipaddress_sys_ipalloc_staticipaddress_insert",
+            "staticipaddress_sys_ipalloc_staticipaddress_update",
+            "staticipaddress_sys_ipalloc_staticipaddress_delete",
+            "subnet_sys_ipalloc_subnet_update",
+            "subnet_sys_ipalloc_subnet_delete",
+            "iprange_sys_ipalloc_iprange_insert",
+            "iprange_sys_ipalloc_iprange_update",
+            "iprange_sys_ipalloc_iprange_delete",
+            "staticroute_sys_ipalloc_staticroute_insert",
+            "staticroute_sys_ipalloc_staticroute_update",
+            "staticroute_sys_ipalloc_staticroute_delete",
+            "node_sys_bootconfig_node_update",
+            "interface_sys_bootconfig_interface_insert",
+            "interface_sys_bootconfig_interface_update",
+            "interface_sys_bootconfig_interface_delete",
+            "config_sys_bootconfig_config_insert",
+            "config_sys_bootconfig_config_update",
+            "tag_sys_bootconfig_tag_update",
+            "config_sys_bootsnapshot_config_insert",
+            "config_sys_bootsnapshot_config_update",
+            "bootresource_sys_bootsnapshot_bootresource_insert",
+            "bootresource_sys_bootsnapshot_bootresource_update",
+            "bootresource_sys_bootsnapshot_bootresource_delete",
+            "bootresourceset_sys_bootsnapshot_bootresourceset_insert",
+            "bootresourceset_sys_bootsnapshot_bootresourceset_update",
+            "bootresourceset_sys_bootsnapshot_bootresourceset_delete",
+            "bootresourcefile_sys_bootsnapshot_bootresourcefile_insert",
+            "bootresourcefile_sys_bootsnapshot_bootresourcefile_update",
+            "bootresourcefile_sys_bootsnapshot_bootresourcefile_delete",
+            "subnet_sys_bootsnapshot_subnet_insert",
+            "subnet_sys_bootsnapshot_subnet_update",
+            "subnet_sys_bootsnapshot_subnet_delete",
+            "vlan_sys_bootsnapshot_vlan_update",
+            "largefile_sys_bootsnapshot_largefile_update",
         ]
         sql, args = psql_array(triggers, sql_type="text")
         with closing(connection.cursor()) as cursor:
@@ -16,6 +16,7 @@ from maasserver.enum import (
     INTERFACE_TYPE,
     IPADDRESS_TYPE,
     IPRANGE_TYPE,
+    NODE_STATUS,
     RDNS_MODE,
 )
 from maasserver.models.config import Config
@@ -25,6 +26,7 @@ from maasserver.models.interface import (
     PhysicalInterface,
     UnknownInterface,
 )
+from maasserver.models.staticipaddress import StaticIPAddress
 from maasserver.testing.factory import factory
 from maasserver.testing.testcase import (
     MAASLegacyTransactionServerTestCase,
@@ -3846,6 +3848,50 @@ class TestDNSStaticIPAddressListener(
         finally:
             yield listener.stopService()
 
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_sends_one_message_for_bulk_release(self):
+        yield deferToDatabase(register_system_triggers)
+        ips = []
+        for _ in range(3):
+            node = yield deferToDatabase(self.create_node_with_interface)
+            sip = yield deferToDatabase(self.get_node_ip_address, node)
+            new_ip = yield deferToDatabase(
+                lambda sip: factory.pick_ip_in_Subnet(sip.subnet), sip
+            )
+            yield deferToDatabase(
+                self.update_staticipaddress, sip.id, {"ip": new_ip}
+            )
+            ips.append((sip.id, new_ip))
+        ips.sort()
+        old = yield self.capturePublication()
+        dv = DeferredValue()
+        listener = self.make_listener_without_delay()
+        listener.register("sys_dns", lambda *args: dv.set(args))
+        yield listener.startService()
+        try:
+            yield deferToDatabase(
+                transactional(
+                    lambda: StaticIPAddress.objects.filter(
+                        id__in=[sip_id for sip_id, _ in ips]
+                    ).update(ip=None)
+                )
+            )
+            yield dv.get(timeout=2)
+            yield self.assertPublicationUpdated()
+        finally:
+            yield listener.stopService()
+        publications = yield deferToDatabase(
+            lambda: DNSPublication.objects.filter(
+                serial__gt=old.serial
+            ).count()
+        )
+        self.assertThat(publications, Equals(1))
+        self.assertThat(
+            self.getCapturedPublication().source,
+            Equals("ip %s released and 2 more" % ips[0][1]),
+        )
+
 
 class TestDNSInterfaceStaticIPAddressListener(
     MAASTransactionServerTestCase, TransactionalHelpersMixin, DNSHelpersMixin
@@ -5415,3 +5461,112 @@ class TestRBACConfigListener(
             ),
         )
         self.assertThat(change.action, Equals("full"))
+
+
+class TestBootConfigListener(
+    MAASTransactionServerTestCase, TransactionalHelpersMixin
+):
+    """End-to-end test for the boot configuration triggers code."""
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_sends_message_for_node_status_update(self):
+        yield deferToDatabase(register_system_triggers)
+        node = yield deferToDatabase(self.create_node_with_interface)
+        interface = yield deferToDatabase(
+            self.get_node_boot_interface, node.system_id
+        )
+        dv = DeferredValue()
+        listener = self.make_listener_without_delay()
+        listener.register("sys_bootconfig", lambda *args: dv.set(args))
+        yield listener.startService()
+        try:
+            yield deferToDatabase(
+                self.update_node,
+                node.system_id,
+                {"status": NODE_STATUS.COMMISSIONING},
+            )
+            channel, message = yield dv.get(timeout=2)
+        finally:
+            yield listener.stopService()
+        self.assertEqual("sys_bootconfig", channel)
+        self.assertIn(str(interface.mac_address), message.split())
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_sends_message_for_interface_insert(self):
+        yield deferToDatabase(register_system_triggers)
+        mac = factory.make_mac_address()
+        dv = DeferredValue()
+        listener = self.make_listener_without_delay()
+        listener.register("sys_bootconfig", lambda *args: dv.set(args))
+        yield listener.startService()
+        try:
+            yield deferToDatabase(self.create_interface, {"mac_address": mac})
+            channel, message = yield dv.get(timeout=2)
+        finally:
+            yield listener.stopService()
+        self.assertEqual(("sys_bootconfig", mac), (channel, message))
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_sends_message_for_config_update(self):
+        yield deferToDatabase(register_system_triggers)
+        dv = DeferredValue()
+        listener = self.make_listener_without_delay()
+        listener.register("sys_bootconfig", lambda *args: dv.set(args))
+        yield listener.startService()
+        try:
+            yield deferToDatabase(
+                Config.objects.set_config,
+                "kernel_opts",
+                factory.make_name("kernel_opts"),
+            )
+            channel, message = yield dv.get(timeout=2)
+        finally:
+            yield listener.stopService()
+        self.assertEqual(("sys_bootconfig", ""), (channel, message))
+
+
+class TestBootSnapshotListener(
+    MAASTransactionServerTestCase, TransactionalHelpersMixin
+):
+    """End-to-end test for the boot configuration snapshot triggers code."""
+
+    @inlineCallbacks
+    def assertNotifies(self, func, *args):
+        yield deferToDatabase(register_system_triggers)
+        dv = DeferredValue()
+        listener = self.make_listener_without_delay()
+        listener.register("sys_bootsnapshot", lambda *args: dv.set(args))
+        yield listener.startService()
+        try:
+            yield deferToDatabase(func, *args)
+            channel, message = yield dv.get(timeout=2)
+        finally:
+            yield listener.stopService()
+        self.assertEqual(("sys_bootsnapshot", ""), (channel, message))
+
+    @wait_for_reactor
+    def test_sends_message_for_config_update(self):
+        return self.assertNotifies(
+            Config.objects.set_config,
+            "default_osystem",
+            factory.make_name("osystem"),
+        )
+
+    @wait_for_reactor
+    def test_sends_message_for_boot_resource_insert(self):
+        return self.assertNotifies(transactional(factory.make_BootResource))
+
+    @wait_for_reactor
+    def test_sends_message_for_subnet_insert(self):
+        return self.assertNotifies(self.create_subnet)
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_sends_message_for_vlan_dhcp_on_update(self):
+        vlan = yield deferToDatabase(self.create_vlan)
+        yield self.assertNotifies(
+            self.update_vlan, vlan.id, {"dhcp_on": not vlan.dhcp_on}
+        )
@@ -19,6 +19,7 @@ from maasserver.enum import (
     NODE_STATUS,
     NODE_TYPE,
     NODE_TYPE_CHOICES,
+    POWER_STATE,
 )
 from maasserver.listener import PostgresListenerService
 from maasserver.models import ControllerInfo
@@ -258,6 +259,62 @@ class TestNodeListener(
         )
 
 
+class TestMachineChangesListener(
+    MAASTransactionServerTestCase, TransactionalHelpersMixin
+):
+    """End-to-end test of the changes sent with machine updates."""
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__sends_changes_of_changes_fields(self):
+        yield deferToDatabase(register_websocket_triggers)
+        listener = self.make_listener_without_delay()
+        dv = DeferredValue()
+        listener.register("machine", lambda *args: dv.set(args), changes=True)
+        node = yield deferToDatabase(
+            self.create_node, {"power_state": POWER_STATE.OFF}
+        )
+        yield listener.startService()
+        try:
+            yield deferToDatabase(
+                self.update_node,
+                node.system_id,
+                {"power_state": POWER_STATE.ON},
+            )
+            yield dv.get(timeout=2)
+            self.assertEqual(
+                ("update", node.system_id, {"power_state": POWER_STATE.ON}),
+                dv.value,
+            )
+        finally:
+            yield listener.stopService()
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test__sends_no_changes_when_other_fields_change(self):
+        yield deferToDatabase(register_websocket_triggers)
+        listener = self.make_listener_without_delay()
+        dv = DeferredValue()
+        listener.register("machine", lambda *args: dv.set(args), changes=True)
+        node = yield deferToDatabase(
+            self.create_node, {"power_state": POWER_STATE.OFF}
+        )
+        yield listener.startService()
+        try:
+            yield deferToDatabase(
+                self.update_node,
+                node.system_id,
+                {
+                    "power_state": POWER_STATE.ON,
+                    "hostname": factory.make_name("hostname"),
+                },
+            )
+            yield dv.get(timeout=2)
+            self.assertEqual(("update", node.system_id, None), dv.value)
+        finally:
+            yield listener.stopService()
+
+
 class TestControllerListener(
     MAASTransactionServerTestCase, TransactionalHelpersMixin
 ):
@@ -1151,6 +1151,53 @@ def render_notification_procedure(proc_name, event_name, cast):
     )
 
 
+def render_notification_with_changes_procedure(
+    proc_name, event_name, cast, fields, ignored_fields=()
+):
+    """Render a procedure notifying `cast` along with the changed columns.
+
+    When the only columns that changed are in `fields` (besides those in
+    `ignored_fields`), their new values are appended to the payload as a
+    JSON object, after a space, so listeners can apply the change without
+    reloading the row. The payload stays bounded by the 8000 bytes NOTIFY
+    limit, past which only `cast` is sent.
+    """
+    return dedent(
+        """\
+        CREATE OR REPLACE FUNCTION {proc_name}() RETURNS trigger AS $$
+        DECLARE
+          payload text;
+          changes jsonb;
+        BEGIN
+          payload := CAST({cast} AS text);
+          SELECT jsonb_object_agg(new_row.key, new_row.value) INTO changes
+          FROM jsonb_each(to_jsonb(NEW)) AS new_row
+          JOIN jsonb_each(to_jsonb(OLD)) AS old_row USING (key)
+          WHERE new_row.value IS DISTINCT FROM old_row.value
+          AND new_row.key NOT IN ({ignored_fields});
+          IF changes IS NOT NULL AND NOT EXISTS (
+              SELECT 1 FROM jsonb_object_keys(changes) AS key
+              WHERE key NOT IN ({fields})) THEN
+            IF octet_length(payload || ' ' || changes::text) < 8000 THEN
+              payload := payload || ' ' || changes::text;
+            END IF;
+          END IF;
+          PERFORM pg_notify('{event_name}', payload);
+          RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+        """.format(
+            proc_name=proc_name,
+            event_name=event_name,
+            cast=cast,
+            fields=", ".join("'%s'" % field for field in fields),
+            ignored_fields=", ".join(
+                "'%s'" % field for field in ("updated",) + ignored_fields
+            ),
+        )
+    )
+
+
 def render_device_notification_procedure(proc_name, event_name, obj):
     return dedent(
         """\
@@ -1401,6 +1448,9 @@ node_fields = (
     "locked",
 )
 
+# Node columns whose changes are sent in the update notification of a machine.
+node_changes_fields = ("power_state", "cpu_count", "cpu_speed")
+
 
 @transactional
 def register_websocket_triggers():
@@ -1424,13 +1474,26 @@ def register_websocket_triggers():
                 "NEW.system_id",
             )
         )
-        register_procedure(
-            render_notification_procedure(
-                "%s_update_notify" % proc_name_prefix,
-                "%s_update" % event_name_prefix,
-                "NEW.system_id",
+        if node_type == NODE_TYPE.MACHINE:
+            # Simple changes to machines are sent along with the update, so
+            # the listed machines can be updated without being reloaded.
+            register_procedure(
+                render_notification_with_changes_procedure(
+                    "%s_update_notify" % proc_name_prefix,
+                    "%s_update" % event_name_prefix,
+                    "NEW.system_id",
+                    node_changes_fields,
+                    ignored_fields=("power_state_updated",),
+                )
+            )
+        else:
+            register_procedure(
+                render_notification_procedure(
+                    "%s_update_notify" % proc_name_prefix,
+                    "%s_update" % event_name_prefix,
+                    "NEW.system_id",
+                )
             )
-        )
         register_procedure(
             render_notification_procedure(
                 "%s_delete_notify" % proc_name_prefix,
@@ -12,6 +12,8 @@ import socket
 
 from django.conf import settings
 from maasserver import concurrency
+from maasserver.bootsnapshot import boot_config_snapshots
+from maasserver.freespace import free_space_index
 from maasserver.utils.threads import deferToDatabase
 from maasserver.utils.views import WebApplicationHandler
 from maasserver.websockets.protocol import WebSocketFactory
@@ -167,6 +169,7 @@ class WebApplicationService(StreamServerEndpointService):
         # `endpoint` is set in `privilegedStartService`, at this point the
         # `endpoint` is None.
         super(WebApplicationService, self).__init__(None, self.site)
+        self.listener = listener
         self.websocket = WebSocketFactory(listener)
         self.threadpool = ThreadPoolLimiter(
             reactor.threadpoolForDatabase, concurrency.webapp
@@ -200,8 +203,17 @@ class WebApplicationService(StreamServerEndpointService):
         maas = Resource()
         maas.putChild(b"metadata", metadata)
         maas.putChild(b"static", File(settings.STATIC_ROOT))
+        if settings.WEBSOCKET_COMPRESSION:
+            deflateWindowBits = settings.WEBSOCKET_COMPRESSION_WINDOW_BITS
+        else:
+            deflateWindowBits = None
         maas.putChild(
-            b"ws", WebSocketsResource(lookupProtocolForFactory(self.websocket))
+            b"ws",
+            WebSocketsResource(
+                lookupProtocolForFactory(self.websocket),
+                deflateWindowBits=deflateWindowBits,
+                deflateThreshold=settings.WEBSOCKET_COMPRESSION_THRESHOLD,
+            ),
         )
 
         root = Resource()
@@ -227,6 +239,8 @@ class WebApplicationService(StreamServerEndpointService):
     @inlineCallbacks
     def startApplication(self):
         """Start the Django application, and install it."""
+        free_space_index.register(self.listener)
+        boot_config_snapshots.register(self.listener)
         application = yield deferToDatabase(self.prepareApplication)
         self.startWebsocket()
         self.installApplication(application)
@@ -279,6 +293,9 @@ class WebApplicationService(StreamServerEndpointService):
         def _cleanup(_):
             self.starting = False
 
+        if self.starting:
+            free_space_index.unregister(self.listener)
+            boot_config_snapshots.unregister(self.listener)
         d = super(WebApplicationService, self).stopService()
         d.addCallback(lambda _: self.websocket.stopFactory())
         d.addCallback(_cleanup)
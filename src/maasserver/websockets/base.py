@@ -11,8 +11,10 @@ __all__ = [
 ]
 
 from functools import wraps
-from operator import attrgetter
+from operator import attrgetter, itemgetter
+from time import time
 
+from django.conf import settings
 from django.contrib.postgres.fields import ArrayField
 from django.core.exceptions import ValidationError
 from django.db.models import Model
@@ -24,12 +26,40 @@ from maasserver.rbac import rbac
 from maasserver.utils.forms import get_QueryDict
 from maasserver.utils.orm import transactional
 from maasserver.utils.threads import deferToDatabase
+from provisioningserver.logger import LegacyLogger
 from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.utils.twisted import asynchronous, IAsynchronous
 
 
+log = LegacyLogger()
+
 DATETIME_FORMAT = "%a, %d %b. %Y %H:%M:%S"
 
+# Maximum length of the SQL of each query logged for a slow call.
+SLOW_CALL_SQL_LENGTH = 500
+
+
+def timed_full_dehydrate(full_dehydrate):
+    """Add the time spent in `full_dehydrate` to the handler's total.
+
+    Only the outermost call is timed, so overrides calling the base method
+    are not counted twice.
+    """
+
+    @wraps(full_dehydrate)
+    def wrapper(self, obj, for_list=False):
+        if self._dehydrating:
+            return full_dehydrate(self, obj, for_list=for_list)
+        self._dehydrating = True
+        start = time()
+        try:
+            return full_dehydrate(self, obj, for_list=for_list)
+        finally:
+            self._dehydrating = False
+            self._dehydrate_time += time() - start
+
+    return wrapper
+
 
 def dehydrate_datetime(datetime):
     """Convert the `datetime` to string with `DATETIME_FORMAT`."""
@@ -96,6 +126,7 @@ class HandlerOptions(object):
     form = None
     form_requires_request = True
     listen_channels = []
+    patchable_fields = None
     batch_key = "id"
     create_permission = None
     view_permission = None
@@ -134,6 +165,12 @@ class HandlerMetaclass(type):
             handler_name = "".join(name_bits).lower()
             new_class._meta.handler_name = handler_name
 
+        # Time the dehydration of objects for the call metrics.
+        if "full_dehydrate" in attrs:
+            new_class.full_dehydrate = timed_full_dehydrate(
+                attrs["full_dehydrate"]
+            )
+
         # Setup the object_class if the queryset is provided.
         if new_class._meta.queryset is not None:
             new_class._meta.object_class = new_class._meta.queryset.model
@@ -165,6 +202,18 @@ class Handler(metaclass=HandlerMetaclass):
 
     """
 
+    # Cache of dehydrated objects shared between connections, set with
+    # `use_dehydration_cache`.
+    dehydration_cache = None
+
+    # Objects loaded for a notification, shared by all the handlers with the
+    # same notify view. Set with `use_notify_objects`.
+    notify_objects = None
+
+    # Time spent in `full_dehydrate` by the current call.
+    _dehydrate_time = 0.0
+    _dehydrating = False
+
     def __init__(self, user, cache, request):
         self.user = user
         self.cache = cache
@@ -175,6 +224,33 @@ class Handler(metaclass=HandlerMetaclass):
         if "loaded_pks" not in self.cache:
             self.cache["loaded_pks"] = set()
 
+    def use_dehydration_cache(self, dehydration_cache):
+        """Use `dehydration_cache` for the objects this handler returns.
+
+        Must be called before the handler starts its transaction, so that
+        objects changed while it runs are not stored in the cache.
+        """
+        self.dehydration_cache = dehydration_cache
+        self._dehydration_sequence = dehydration_cache.sequence
+
+    def use_notify_objects(self, notify_objects):
+        """Share the objects loaded by `on_listen` through `notify_objects`.
+
+        Handlers with the same `get_notify_view` then load a notified object
+        only once.
+        """
+        self.notify_objects = notify_objects
+
+    def get_notify_view(self, pk):
+        """Return what the user may see of the notified object `pk`, as a
+        hashable value.
+
+        Handlers with the same notify view must load the same object from
+        `listen`. Returning `None`, the default, means the loaded object is
+        never shared.
+        """
+        return None
+
     def full_dehydrate(self, obj, for_list=False):
         """Convert the given object into a dictionary.
 
@@ -220,6 +296,34 @@ class Handler(metaclass=HandlerMetaclass):
         # Return the data after the final dehydrate.
         return self.dehydrate(obj, data, for_list=for_list)
 
+    def get_dehydration_cache_key(self, obj, for_list=False):
+        """Return the key the dehydrated `obj` is cached under.
+
+        The key must change whenever the dehydrated object would. Returning
+        `None`, the default, means the object is never cached.
+        """
+        return None
+
+    def cached_full_dehydrate(self, obj, for_list=False):
+        """Return `full_dehydrate` for `obj`, using the dehydration cache.
+
+        Only used where the object is read, the returned dictionary must not
+        be modified.
+        """
+        if self.dehydration_cache is None:
+            return self.full_dehydrate(obj, for_list=for_list)
+        key = self.get_dehydration_cache_key(obj, for_list=for_list)
+        if key is None:
+            return self.full_dehydrate(obj, for_list=for_list)
+        pk = getattr(obj, self._meta.pk)
+        data = self.dehydration_cache.get(pk, key)
+        if data is None:
+            data = self.full_dehydrate(obj, for_list=for_list)
+            self.dehydration_cache.set(
+                pk, key, data, self._dehydration_sequence
+            )
+        return data
+
     def dehydrate(self, obj, data, for_list=False):
         """Add any extra info to the `data` before finalizing the final object.
 
@@ -421,11 +525,19 @@ class Handler(metaclass=HandlerMetaclass):
             raise HandlerNoSuchMethodError(method_name)
 
     def _call_method_track_queries(self, method_name, method, params):
-        """Call the specified method tracking query-related metrics."""
+        """Call the specified method tracking query-related metrics.
+
+        The call is logged with its slowest queries when it takes longer than
+        `WEBSOCKET_SLOW_CALL_BUDGET`.
+        """
         latencies = []
+        queries = []
 
-        with wrap_query_counter_cursor(latencies):
+        self._dehydrate_time = 0.0
+        start = time()
+        with wrap_query_counter_cursor(latencies, queries=queries):
             result = method(params)
+        elapsed = time() - start
 
         labels = self._get_call_latency_metrics_label(method_name, [])
         PROMETHEUS_METRICS.update(
@@ -441,9 +553,46 @@ class Handler(metaclass=HandlerMetaclass):
                 value=latency,
                 labels=labels,
             )
+        PROMETHEUS_METRICS.update(
+            "maas_websocket_call_db_time",
+            "observe",
+            value=sum(latencies),
+            labels=labels,
+        )
+        PROMETHEUS_METRICS.update(
+            "maas_websocket_call_dehydrate_time",
+            "observe",
+            value=self._dehydrate_time,
+            labels=labels,
+        )
+
+        budget = settings.WEBSOCKET_SLOW_CALL_BUDGET
+        if budget and elapsed > budget:
+            self._log_slow_call(labels["call"], elapsed, budget, queries)
 
         return result
 
+    def _log_slow_call(self, call, elapsed, budget, queries):
+        """Log `call` as slow, with its slowest `queries`."""
+        slowest = sorted(queries, key=itemgetter(0), reverse=True)
+        lines = []
+        for latency, sql in slowest[: settings.WEBSOCKET_SLOW_CALL_QUERIES]:
+            if len(sql) > SLOW_CALL_SQL_LENGTH:
+                sql = sql[:SLOW_CALL_SQL_LENGTH] + "..."
+            lines.append("\n  %.3fs: %s" % (latency, sql))
+        log.warn(
+            "Slow websocket call {call}: {elapsed:.3f}s (budget "
+            "{budget:.3f}s), {count} queries in {db_time:.3f}s, "
+            "{dehydrate_time:.3f}s dehydrating.{slowest}",
+            call=call,
+            elapsed=elapsed,
+            budget=budget,
+            count=len(queries),
+            db_time=sum(latency for latency, _ in queries),
+            dehydrate_time=self._dehydrate_time,
+            slowest="".join(lines),
+        )
+
     def _cache_pks(self, objs):
         """Cache all loaded object pks."""
         getpk = attrgetter(self._meta.pk)
@@ -468,7 +617,7 @@ class Handler(metaclass=HandlerMetaclass):
             queryset = queryset[: params["limit"]]
         objs = list(queryset)
         self._cache_pks(objs)
-        return [self.full_dehydrate(obj, for_list=True) for obj in objs]
+        return [self.cached_full_dehydrate(obj, for_list=True) for obj in objs]
 
     def get(self, params):
         """Get object.
@@ -477,7 +626,7 @@ class Handler(metaclass=HandlerMetaclass):
         """
         obj = self.get_object(params)
         self._cache_pks([obj])
-        return self.full_dehydrate(obj)
+        return self.cached_full_dehydrate(obj)
 
     def create(self, params):
         """Create the object from data."""
@@ -599,10 +748,7 @@ class Handler(metaclass=HandlerMetaclass):
                 return None
 
         self.user.refresh_from_db()
-        try:
-            obj = self.listen(channel, action, pk)
-        except HandlerDoesNotExistError:
-            obj = None
+        obj = self._listen_shared(channel, action, pk)
         if action == "create" and obj is not None:
             if pk in self.cache["loaded_pks"]:
                 # The user already knows about this node, so its not a create
@@ -635,6 +781,27 @@ class Handler(metaclass=HandlerMetaclass):
             pass
         return None
 
+    def _listen_shared(self, channel, action, pk):
+        """Return the object from `listen`, or `None` if it doesn't exist.
+
+        The object is loaded once for all the handlers sharing
+        `notify_objects` with the same notify view.
+        """
+        view = None
+        if self.notify_objects is not None:
+            view = self.get_notify_view(pk)
+        if view is not None:
+            key = (self._meta.handler_name, view)
+            if key in self.notify_objects:
+                return self.notify_objects[key]
+        try:
+            obj = self.listen(channel, action, pk)
+        except HandlerDoesNotExistError:
+            obj = None
+        if view is not None:
+            self.notify_objects[key] = obj
+        return obj
+
     def on_listen_for_active_pk(self, action, pk, obj):
         """Return the correct data for `obj` depending on if its the
         active primary key."""
@@ -643,7 +810,7 @@ class Handler(metaclass=HandlerMetaclass):
             return (
                 self._meta.handler_name,
                 action,
-                self.full_dehydrate(obj, for_list=False),
+                self.cached_full_dehydrate(obj, for_list=False),
             )
         else:
             # Not active so only send the data like it was comming from
@@ -651,9 +818,27 @@ class Handler(metaclass=HandlerMetaclass):
             return (
                 self._meta.handler_name,
                 action,
-                self.full_dehydrate(obj, for_list=True),
+                self.cached_full_dehydrate(obj, for_list=True),
             )
 
+    def patch_dehydrated(self, pk, data, changes):
+        """Return `data` updated with the `changes` to the columns of `pk`.
+
+        `data` is the dehydrated object last sent to the client. Returning
+        `None` means the changes can't be applied without reloading the
+        object. By default only the columns in `Meta.patchable_fields` are
+        applied, and only to objects that are not active, as more data is
+        derived from the columns of the active object.
+        """
+        patchable_fields = self._meta.patchable_fields
+        if not patchable_fields or not set(changes).issubset(patchable_fields):
+            return None
+        if self.cache.get("active_pk") == pk:
+            return None
+        data = dict(data)
+        data.update(changes)
+        return data
+
     def listen(self, channel, action, pk):
         """Called when the handler listens for events on channels with
         `Meta.listen_channels`.
@@ -0,0 +1,150 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Cache of dehydrated objects shared by all websocket connections."""
+
+__all__ = ["DehydrationCache", "get_permission_view"]
+
+from collections import defaultdict, OrderedDict
+import threading
+
+from maasserver.rbac import rbac
+
+
+# Channels whose notifications carry the primary key of a node that changed.
+# The cached payloads of that node are evicted.
+NODE_CHANNELS = ("controller", "device", "machine")
+
+# Channels whose notifications can change the payload of any node. The whole
+# cache is cleared.
+GLOBAL_CHANNELS = ("config",)
+
+
+def get_permission_view(user):
+    """Return what `user` is permitted to view and do, as a hashable value.
+
+    Two users with the same permission view see the same dehydrated node,
+    unless one of them owns it. Must be called from the database thread, as
+    it may need to query RBAC.
+    """
+    if rbac.is_enabled():
+        pools = rbac.get_resource_pool_ids(
+            user.username,
+            "view",
+            "view-all",
+            "deploy-machines",
+            "admin-machines",
+        )
+        return (
+            user.is_superuser,
+            frozenset(pools["view"]),
+            frozenset(pools["view-all"]),
+            frozenset(pools["deploy-machines"]),
+            frozenset(pools["admin-machines"]),
+        )
+    else:
+        return (user.is_superuser,)
+
+
+class DehydrationCache:
+    """Size-bounded LRU cache of dehydrated objects.
+
+    Entries are stored by the primary key of the object and a handler
+    specific key, normally including the version of the object and the
+    permission view of the user. All the entries for a primary key are
+    evicted when a notification for it is received.
+
+    Objects are dehydrated in the database threads while notifications are
+    received in the reactor, so an object can be dehydrated from a
+    transaction that started before the change that evicted it. To never
+    store such a stale payload, callers take a `sequence` before starting
+    their transaction and pass it to `set`.
+    """
+
+    # Default maximum number of dehydrated payloads held.
+    DEFAULT_SIZE = 10000
+
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._keys = defaultdict(set)
+        # Sequence number at which each primary key was last evicted. This
+        # grows with the number of objects that ever changed, not with the
+        # number of changes, so it stays bounded by the number of nodes.
+        self._evicted = {}
+        self._cleared = 0
+        self._sequence = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def sequence(self):
+        """The current eviction sequence number."""
+        return self._sequence
+
+    def get(self, pk, key):
+        """Return the payload cached for `pk` under `key` or `None`."""
+        with self._lock:
+            data = self._entries.get((pk, key))
+            if data is not None:
+                self._entries.move_to_end((pk, key))
+            return data
+
+    def set(self, pk, key, data, sequence):
+        """Cache `data` for `pk` under `key`.
+
+        Nothing is stored if `pk` has been evicted since `sequence` was
+        taken, as `data` could then be stale.
+        """
+        with self._lock:
+            if sequence < self._cleared:
+                return
+            if sequence < self._evicted.get(pk, 0):
+                return
+            self._entries[(pk, key)] = data
+            self._entries.move_to_end((pk, key))
+            self._keys[pk].add(key)
+            while len(self._entries) > self.size:
+                (old_pk, old_key), _ = self._entries.popitem(last=False)
+                self._discard_key(old_pk, old_key)
+
+    def evict(self, pk):
+        """Evict all the payloads cached for `pk`."""
+        with self._lock:
+            self._sequence += 1
+            self._evicted[pk] = self._sequence
+            for key in self._keys.pop(pk, ()):
+                self._entries.pop((pk, key), None)
+
+    def clear(self):
+        """Evict all the cached payloads."""
+        with self._lock:
+            self._sequence += 1
+            self._cleared = self._sequence
+            self._evicted.clear()
+            self._entries.clear()
+            self._keys.clear()
+
+    def _discard_key(self, pk, key):
+        keys = self._keys.get(pk)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys[pk]
+
+    def register(self, listener):
+        """Register with `listener` to evict on notifications."""
+        for channel in NODE_CHANNELS:
+            listener.register(channel, self.on_node_notify)
+        for channel in GLOBAL_CHANNELS:
+            listener.register(channel, self.on_global_notify)
+
+    def on_node_notify(self, action, pk):
+        """Called by the listener when a node changed."""
+        self.evict(pk)
+
+    def on_global_notify(self, action, pk):
+        """Called by the listener when all nodes may have changed."""
+        self.clear()
@@ -10,13 +10,14 @@ import logging
 from operator import itemgetter
 
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
-from django.db.models import OuterRef, Subquery
+from django.db.models import Count, OuterRef, Subquery
 from maasserver.enum import (
     BMC_TYPE,
     INTERFACE_LINK_TYPE,
     IPADDRESS_TYPE,
     NODE_STATUS,
     NODE_STATUS_CHOICES,
+    NODE_STATUS_CHOICES_DICT,
     POWER_STATE,
 )
 from maasserver.exceptions import NodeActionError, NodeStateViolation
@@ -60,12 +61,14 @@ from maasserver.models.node import Machine, Node
 from maasserver.models.partition import Partition
 from maasserver.models.subnet import Subnet
 from maasserver.node_action import compile_node_actions
+from maasserver.node_constraint_filter_forms import ReadNodesForm
 from maasserver.permissions import NodePermission
 from maasserver.storage_layouts import (
     StorageLayoutError,
     StorageLayoutForm,
     StorageLayoutMissingBootDiskError,
 )
+from maasserver.utils.forms import get_QueryDict
 from maasserver.utils.orm import transactional
 from maasserver.utils.threads import deferToDatabase
 from maasserver.websockets.base import (
@@ -84,6 +87,39 @@ from provisioningserver.utils.twisted import asynchronous
 log = LegacyLogger()
 
 
+# Sort keys accepted by the paginated `machine.list`, mapped to the ordering
+# applied to the queryset.
+LIST_SORT_KEYS = {
+    "architecture": ("architecture",),
+    "cpu_count": ("cpu_count",),
+    "domain": ("domain__name",),
+    "fqdn": ("hostname", "domain__name"),
+    "hostname": ("hostname",),
+    "memory": ("memory",),
+    "owner": ("owner__username",),
+    "pool": ("pool__name",),
+    "power_state": ("power_state",),
+    "status": ("status",),
+    "system_id": ("system_id",),
+    "zone": ("zone__name",),
+}
+
+# Group keys accepted by the paginated `machine.list`, mapped to the field
+# the group counts are computed on.
+LIST_GROUP_KEYS = {
+    "architecture": "architecture",
+    "domain": "domain__name",
+    "owner": "owner__username",
+    "pool": "pool__name",
+    "power_state": "power_state",
+    "status": "status",
+    "zone": "zone__name",
+}
+
+# Upper bound on the number of machines returned in a single page.
+LIST_MAX_PAGE_SIZE = 500
+
+
 class MachineHandler(NodeHandler):
     class Meta(NodeHandler.Meta):
         abstract = False
@@ -236,6 +272,8 @@ class MachineHandler(NodeHandler):
             "zone",
         ]
         listen_channels = ["machine"]
+        # Columns sent along with machine updates, see `node_changes_fields`.
+        patchable_fields = ["power_state", "cpu_count", "cpu_speed"]
         create_permission = NodePermission.admin
         view_permission = NodePermission.view
         edit_permission = NodePermission.admin
@@ -249,6 +287,128 @@ class MachineHandler(NodeHandler):
             from_nodes=super().get_queryset(for_list=for_list),
         )
 
+    def list(self, params):
+        """List machines.
+
+        Without `page_size` this behaves as `Handler.list`, returning every
+        machine visible to the user. With `page_size` a single page is
+        returned, filtered, sorted and grouped on the server.
+
+        :param page_size: Number of machines in the page.
+        :param page_number: 1-based page number to return, defaults to 1.
+        :param filter: Constraints passed to `ReadNodesForm`.
+        :param sort_key: One of `LIST_SORT_KEYS`, prefix with "-" to sort in
+            descending order.
+        :param group_key: One of `LIST_GROUP_KEYS`, the page is ordered by
+            this key first and the count of matching machines for each
+            value is returned.
+        """
+        if "page_size" not in params:
+            return super().list(params)
+        return self._list_page(params)
+
+    def _get_list_page_params(self, params):
+        """Validate and return the pagination parameters from `params`."""
+        errors = {}
+        try:
+            page_size = int(params["page_size"])
+        except (TypeError, ValueError):
+            page_size = 0
+        if page_size < 1 or page_size > LIST_MAX_PAGE_SIZE:
+            errors["page_size"] = [
+                "Must be between 1 and %d." % LIST_MAX_PAGE_SIZE
+            ]
+        try:
+            page_number = int(params.get("page_number", 1))
+        except (TypeError, ValueError):
+            page_number = 0
+        if page_number < 1:
+            errors["page_number"] = ["Must be a positive integer."]
+        sort_key = params.get("sort_key") or "hostname"
+        if sort_key.lstrip("-") not in LIST_SORT_KEYS:
+            errors["sort_key"] = ["Unknown sort key: %s" % sort_key]
+        group_key = params.get("group_key")
+        if group_key is not None and group_key not in LIST_GROUP_KEYS:
+            errors["group_key"] = ["Unknown group key: %s" % group_key]
+        if errors:
+            raise HandlerValidationError(errors)
+        return page_size, page_number, sort_key, group_key
+
+    def _get_list_ordering(self, sort_key, group_key):
+        """Return the `order_by` arguments for `sort_key` and `group_key`."""
+        descending = sort_key.startswith("-")
+        ordering = [
+            "-%s" % field if descending else field
+            for field in LIST_SORT_KEYS[sort_key.lstrip("-")]
+        ]
+        if group_key is not None:
+            ordering.insert(0, LIST_GROUP_KEYS[group_key])
+        # Always end with the primary key so pages are stable.
+        ordering.append("id")
+        return ordering
+
+    def _dehydrate_list_groups(self, machines, group_key):
+        """Return the number of `machines` for each value of `group_key`."""
+        field = LIST_GROUP_KEYS[group_key]
+        groups = []
+        for row in (
+            machines.values(field).annotate(count=Count("id")).order_by(field)
+        ):
+            value = row[field]
+            if group_key == "status":
+                name = NODE_STATUS_CHOICES_DICT.get(value, "")
+            else:
+                name = "" if value is None else value
+            groups.append(
+                {"name": name, "value": value, "count": row["count"]}
+            )
+        return groups
+
+    def _list_page(self, params):
+        """Return a single page of machines matching `params`."""
+        (
+            page_size,
+            page_number,
+            sort_key,
+            group_key,
+        ) = self._get_list_page_params(params)
+        form = ReadNodesForm(data=get_QueryDict(params.get("filter") or {}))
+        if not form.is_valid():
+            raise HandlerValidationError(form.errors)
+        visible = Machine.objects.get_nodes(self.user, NodePermission.view)
+        filtered, _, _ = form.filter_nodes(visible)
+        # `filter_nodes` returns a distinct queryset, which can't be grouped
+        # or ordered on related fields. Select on the matching ids instead.
+        machines = Machine.objects.filter(id__in=filtered.values("id"))
+
+        count = machines.count()
+        num_pages = max(1, (count + page_size - 1) // page_size)
+        offset = (page_number - 1) * page_size
+        page_ids = list(
+            machines.order_by(
+                *self._get_list_ordering(sort_key, group_key)
+            ).values_list("id", flat=True)[offset : offset + page_size]
+        )
+        # Only the machines on this page are loaded with the expensive list
+        # queryset, then placed back in the requested order.
+        objs = {
+            obj.id: obj
+            for obj in self.get_queryset(for_list=True).filter(id__in=page_ids)
+        }
+        objs = [objs[obj_id] for obj_id in page_ids if obj_id in objs]
+        self._cache_pks(objs)
+        result = {
+            "count": count,
+            "cur_page": page_number,
+            "num_pages": num_pages,
+            "items": [
+                self.cached_full_dehydrate(obj, for_list=True) for obj in objs
+            ],
+        }
+        if group_key is not None:
+            result["groups"] = self._dehydrate_list_groups(machines, group_key)
+        return result
+
     def dehydrate(self, obj, data, for_list=False):
         """Add extra fields to `data`."""
         data = super().dehydrate(obj, data, for_list=for_list)
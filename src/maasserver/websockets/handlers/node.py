@@ -24,11 +24,12 @@ from maasserver.models.cacheset import CacheSet
 from maasserver.models.config import Config
 from maasserver.models.event import Event
 from maasserver.models.filesystemgroup import VolumeGroup
+from maasserver.models.node import Node
 from maasserver.models.nodeprobeddetails import script_output_nsmap
 from maasserver.models.physicalblockdevice import PhysicalBlockDevice
 from maasserver.models.tag import Tag
 from maasserver.models.virtualblockdevice import VirtualBlockDevice
-from maasserver.node_action import compile_node_actions
+from maasserver.node_action import compile_node_actions, PowerOff
 from maasserver.permissions import NodePermission
 from maasserver.storage_layouts import get_applied_storage_layout_for_node
 from maasserver.third_party_drivers import get_third_party_driver
@@ -39,6 +40,7 @@ from maasserver.websockets.base import (
     HandlerError,
     HandlerPermissionError,
 )
+from maasserver.websockets.cache import get_permission_view
 from maasserver.websockets.handlers.event import dehydrate_event_type_level
 from maasserver.websockets.handlers.node_result import NodeResultHandler
 from maasserver.websockets.handlers.timestampedmodel import (
@@ -98,6 +100,84 @@ class NodeHandler(TimestampedModelHandler):
     def __init__(self, user, cache, request):
         super().__init__(user, cache, request)
         self._script_results = {}
+        self._script_results_pending = []
+        self._permission_view = None
+
+    def get_dehydration_cache_key(self, obj, for_list=False):
+        """Return the key the dehydrated `obj` is cached under.
+
+        Besides the version of the node the key includes the names of its
+        domain, zone and pool, as renaming those does not notify the node.
+        The actions and permissions on a node depend on whether the user owns
+        it, so owners get their own entry.
+        """
+        return (
+            self._meta.handler_name,
+            for_list,
+            obj.updated,
+            getattr(obj.domain, "name", None),
+            getattr(obj.zone, "name", None),
+            getattr(obj.pool, "name", None),
+            self._get_permission_view(),
+            obj.owner_id == self.user.id,
+        )
+
+    def get_notify_view(self, pk):
+        """Return what the user may see of the notified node `pk`.
+
+        Superusers see all the nodes their permissions allow. Other users
+        also see the nodes they own, so whether they own the node is part of
+        their view, and all those not owning it share it.
+        """
+        view = self._get_permission_view()
+        if self.user.is_superuser:
+            return view
+        else:
+            return view + (self._get_notify_owner_id(pk) == self.user.id,)
+
+    def _get_notify_owner_id(self, pk):
+        """Return the owner of the notified node `pk`, looked up once for
+        all the handlers sharing `notify_objects`."""
+        key = ("owner", pk)
+        if key not in self.notify_objects:
+            self.notify_objects[key] = (
+                Node.objects.filter(system_id=pk)
+                .values_list("owner_id", flat=True)
+                .first()
+            )
+        return self.notify_objects[key]
+
+    def _get_permission_view(self):
+        if self._permission_view is None:
+            self._permission_view = get_permission_view(self.user)
+        return self._permission_view
+
+    def patch_dehydrated(self, pk, data, changes):
+        # Only the power off action depends on the power state. It's removed
+        # when the node is powered off, but whether it's allowed once powered
+        # on again can't be known without reloading the node.
+        power_state = changes.get("power_state")
+        was_off = data.get("power_state") == POWER_STATE.OFF
+        if power_state is not None and was_off:
+            return None
+        data = super().patch_dehydrated(pk, data, changes)
+        if data is not None and power_state == POWER_STATE.OFF:
+            if "actions" in data:
+                data["actions"] = [
+                    action
+                    for action in data["actions"]
+                    if action != PowerOff.name
+                ]
+        return data
+
+    def full_dehydrate(self, obj, for_list=False):
+        # Script results of the nodes loaded from the cache are not needed,
+        # they are only loaded once a node has to be dehydrated.
+        if self._script_results_pending:
+            nodes = self._script_results_pending
+            self._script_results_pending = []
+            self._cache_script_results(nodes)
+        return super().full_dehydrate(obj, for_list=for_list)
 
     def dehydrate_owner(self, user):
         """Return owners username."""
@@ -454,10 +534,16 @@ class NodeHandler(TimestampedModelHandler):
 
     def _cache_pks(self, nodes):
         super()._cache_pks(nodes)
-        self._cache_script_results(nodes)
+        if self.dehydration_cache is None:
+            self._cache_script_results(nodes)
+        else:
+            self._script_results_pending.extend(nodes)
 
     def on_listen_for_active_pk(self, action, pk, obj):
-        self._cache_script_results([obj])
+        if self.dehydration_cache is None:
+            self._cache_script_results([obj])
+        else:
+            self._script_results_pending.append(obj)
         return super().on_listen_for_active_pk(action, pk, obj)
 
     def dehydrate_blockdevice(self, blockdevice, obj):
@@ -82,6 +82,7 @@ from maasserver.websockets.base import (
     HandlerPermissionError,
     HandlerValidationError,
 )
+from maasserver.websockets.cache import DehydrationCache
 from maasserver.websockets.handlers import machine as machine_module
 from maasserver.websockets.handlers.event import dehydrate_event_type_level
 from maasserver.websockets.handlers.machine import (
@@ -2024,6 +2025,284 @@ class TestMachineHandler(MAASServerTestCase):
             handler.list({}),
         )
 
+    def test_list_paginated_returns_page(self):
+        user = factory.make_User()
+        nodes = [
+            factory.make_Node(owner=user, hostname="node%d" % i)
+            for i in range(5)
+        ]
+        handler = MachineHandler(user, {}, None)
+        result = handler.list({"page_size": 2, "page_number": 2})
+        self.assertEqual(5, result["count"])
+        self.assertEqual(2, result["cur_page"])
+        self.assertEqual(3, result["num_pages"])
+        self.assertEqual(
+            [
+                self.dehydrate_node(node, handler, for_list=True)
+                for node in nodes[2:4]
+            ],
+            result["items"],
+        )
+        self.assertNotIn("groups", result)
+
+    def test_list_paginated_caches_only_page_pks(self):
+        user = factory.make_User()
+        nodes = [
+            factory.make_Node(owner=user, hostname="node%d" % i)
+            for i in range(3)
+        ]
+        handler = MachineHandler(user, {}, None)
+        handler.list({"page_size": 1})
+        self.assertEqual({nodes[0].system_id}, handler.cache["loaded_pks"])
+
+    def test_list_paginated_sorts_descending(self):
+        user = factory.make_User()
+        nodes = [
+            factory.make_Node(owner=user, hostname="node%d" % i)
+            for i in range(3)
+        ]
+        handler = MachineHandler(user, {}, None)
+        result = handler.list({"page_size": 10, "sort_key": "-hostname"})
+        self.assertEqual(
+            [node.system_id for node in reversed(nodes)],
+            [item["system_id"] for item in result["items"]],
+        )
+
+    def test_list_paginated_filters(self):
+        user = factory.make_User()
+        node = factory.make_Node(owner=user, status=NODE_STATUS.ALLOCATED)
+        factory.make_Node(owner=user, status=NODE_STATUS.DEPLOYED)
+        handler = MachineHandler(user, {}, None)
+        result = handler.list(
+            {"page_size": 10, "filter": {"status": "allocated"}}
+        )
+        self.assertEqual(1, result["count"])
+        self.assertEqual(
+            [node.system_id], [item["system_id"] for item in result["items"]]
+        )
+
+    def test_list_paginated_returns_group_counts(self):
+        user = factory.make_User()
+        for _ in range(2):
+            factory.make_Node(owner=user, status=NODE_STATUS.ALLOCATED)
+        factory.make_Node(owner=user, status=NODE_STATUS.DEPLOYED)
+        handler = MachineHandler(user, {}, None)
+        result = handler.list({"page_size": 10, "group_key": "status"})
+        self.assertEqual(
+            [
+                {
+                    "name": "Deployed",
+                    "value": NODE_STATUS.DEPLOYED,
+                    "count": 1,
+                },
+                {
+                    "name": "Allocated",
+                    "value": NODE_STATUS.ALLOCATED,
+                    "count": 2,
+                },
+            ],
+            result["groups"],
+        )
+        # The page is ordered by the group key first.
+        self.assertEqual(
+            [
+                NODE_STATUS.DEPLOYED,
+                NODE_STATUS.ALLOCATED,
+                NODE_STATUS.ALLOCATED,
+            ],
+            [item["status_code"] for item in result["items"]],
+        )
+
+    def test_list_paginated_returns_nodes_only_viewable_by_user(self):
+        user = factory.make_User()
+        node = factory.make_Node(owner=user, status=NODE_STATUS.ALLOCATED)
+        factory.make_Node(
+            owner=factory.make_User(), status=NODE_STATUS.ALLOCATED
+        )
+        handler = MachineHandler(user, {}, None)
+        result = handler.list({"page_size": 10})
+        self.assertEqual(1, result["count"])
+        self.assertEqual(
+            [node.system_id], [item["system_id"] for item in result["items"]]
+        )
+
+    def test_list_paginated_num_queries_is_independent_of_node_count(self):
+        user = factory.make_admin()
+        handler = MachineHandler(user, {}, None)
+        for _ in range(3):
+            factory.make_Node()
+        query_10_count, _ = count_queries(handler.list, {"page_size": 2})
+        for _ in range(10):
+            factory.make_Node()
+        query_20_count, _ = count_queries(handler.list, {"page_size": 2})
+        self.assertEqual(query_10_count, query_20_count)
+
+    def test_list_paginated_rejects_invalid_params(self):
+        user = factory.make_User()
+        handler = MachineHandler(user, {}, None)
+        error = self.assertRaises(
+            HandlerValidationError,
+            handler.list,
+            {"page_size": 0, "sort_key": "unknown", "group_key": "unknown"},
+        )
+        self.assertItemsEqual(
+            ["page_size", "sort_key", "group_key"], error.message_dict.keys()
+        )
+
+    def test_list_paginated_rejects_invalid_filter(self):
+        user = factory.make_User()
+        handler = MachineHandler(user, {}, None)
+        self.assertRaises(
+            HandlerValidationError,
+            handler.list,
+            {"page_size": 10, "filter": {"unknown": "value"}},
+        )
+
+    def test_list_uses_dehydration_cache(self):
+        user = factory.make_User()
+        node = factory.make_Node(owner=user)
+        cache = DehydrationCache()
+        handler = MachineHandler(user, {}, None)
+        handler.use_dehydration_cache(cache)
+        [data] = handler.list({})
+        handler = MachineHandler(user, {}, None)
+        handler.use_dehydration_cache(cache)
+        full_dehydrate = self.patch(handler, "full_dehydrate")
+        self.assertEqual([data], handler.list({}))
+        self.assertThat(full_dehydrate, MockNotCalled())
+        self.assertEqual({}, handler._script_results)
+        # Once the node is evicted it is dehydrated again.
+        cache.evict(node.system_id)
+        full_dehydrate.return_value = {}
+        self.assertEqual([{}], handler.list({}))
+        self.assertThat(
+            full_dehydrate, MockCalledOnceWith(node, for_list=True)
+        )
+
+    def test_list_dehydration_cache_is_per_owner(self):
+        user = factory.make_User()
+        other_user = factory.make_User()
+        node = factory.make_Node(status=NODE_STATUS.READY)
+        cache = DehydrationCache()
+        handler = MachineHandler(user, {}, None)
+        handler.use_dehydration_cache(cache)
+        other_handler = MachineHandler(other_user, {}, None)
+        other_handler.use_dehydration_cache(cache)
+        self.assertEqual(
+            handler.get_dehydration_cache_key(node, for_list=True),
+            other_handler.get_dehydration_cache_key(node, for_list=True),
+        )
+        node.owner = user
+        self.assertNotEqual(
+            handler.get_dehydration_cache_key(node, for_list=True),
+            other_handler.get_dehydration_cache_key(node, for_list=True),
+        )
+
+    def test_dehydration_cache_key_changes_with_node(self):
+        user = factory.make_User()
+        node = factory.make_Node(owner=user)
+        handler = MachineHandler(user, {}, None)
+        key = handler.get_dehydration_cache_key(node)
+        self.assertNotEqual(
+            key, handler.get_dehydration_cache_key(node, for_list=True)
+        )
+        node.zone = factory.make_Zone()
+        self.assertNotEqual(key, handler.get_dehydration_cache_key(node))
+        node.hostname = factory.make_name("hostname")
+        node.save()
+        self.assertNotEqual(key, handler.get_dehydration_cache_key(node))
+
+    def make_notify_handler(self, user, notify_objects):
+        handler = MachineHandler(user, {}, None)
+        handler.use_notify_objects(notify_objects)
+        return handler
+
+    def test_notify_view_is_shared_by_superusers(self):
+        node = factory.make_Node(owner=factory.make_admin())
+        notify_objects = {}
+        handler = self.make_notify_handler(
+            factory.make_admin(), notify_objects
+        )
+        other_handler = self.make_notify_handler(node.owner, notify_objects)
+        self.assertEqual(
+            handler.get_notify_view(node.system_id),
+            other_handler.get_notify_view(node.system_id),
+        )
+
+    def test_notify_view_is_shared_by_non_superusers_not_owning_node(self):
+        owner = factory.make_User()
+        node = factory.make_Node(owner=owner)
+        notify_objects = {}
+        handlers = [
+            self.make_notify_handler(factory.make_User(), notify_objects)
+            for _ in range(2)
+        ]
+        owner_handler = self.make_notify_handler(owner, notify_objects)
+        self.assertEqual(
+            handlers[0].get_notify_view(node.system_id),
+            handlers[1].get_notify_view(node.system_id),
+        )
+        self.assertNotEqual(
+            handlers[0].get_notify_view(node.system_id),
+            owner_handler.get_notify_view(node.system_id),
+        )
+
+    def test_notify_view_looks_up_owner_once(self):
+        node = factory.make_Node(owner=factory.make_User())
+        notify_objects = {}
+        handlers = [
+            self.make_notify_handler(factory.make_User(), notify_objects)
+            for _ in range(3)
+        ]
+        handlers[0].get_notify_view(node.system_id)
+        for handler in handlers[1:]:
+            handler._get_permission_view()
+            queries, _ = count_queries(
+                handler.get_notify_view, node.system_id
+            )
+            self.assertEqual(0, queries)
+
+    def test_on_listen_shares_node_and_payload_for_same_notify_view(self):
+        node = factory.make_Node()
+        cache = DehydrationCache()
+        notify_objects = {}
+        handlers = []
+        for _ in range(3):
+            handler = MachineHandler(factory.make_admin(), {}, None)
+            handler.use_dehydration_cache(cache)
+            handler.use_notify_objects(notify_objects)
+            handlers.append(handler)
+        handler = handlers[0]
+        result = handler.on_listen("machine", "update", node.system_id)
+        for other_handler in handlers[1:]:
+            get_object = self.patch(other_handler, "get_object")
+            full_dehydrate = self.patch(other_handler, "full_dehydrate")
+            other_result = other_handler.on_listen(
+                "machine", "update", node.system_id
+            )
+            self.assertIs(result[2], other_result[2])
+            self.assertThat(get_object, MockNotCalled())
+            self.assertThat(full_dehydrate, MockNotCalled())
+
+    def test_patch_dehydrated_removes_power_off_when_powered_off(self):
+        handler = MachineHandler(factory.make_User(), {}, None)
+        data = {"power_state": POWER_STATE.ON, "actions": ["off", "tag"]}
+        self.assertEqual(
+            {"power_state": POWER_STATE.OFF, "actions": ["tag"]},
+            handler.patch_dehydrated(
+                "abc", data, {"power_state": POWER_STATE.OFF}
+            ),
+        )
+
+    def test_patch_dehydrated_returns_None_when_powered_on(self):
+        handler = MachineHandler(factory.make_User(), {}, None)
+        data = {"power_state": POWER_STATE.OFF, "actions": ["tag"]}
+        self.assertIsNone(
+            handler.patch_dehydrated(
+                "abc", data, {"power_state": POWER_STATE.ON}
+            )
+        )
+
     def test_list_includes_pod_details_when_available(self):
         user = factory.make_User()
         pod = factory.make_Pod()
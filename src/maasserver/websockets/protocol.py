@@ -5,7 +5,7 @@
 
 __all__ = ["WebSocketProtocol"]
 
-from collections import deque
+from collections import deque, OrderedDict
 from functools import partial
 from http.cookies import SimpleCookie
 import json
@@ -18,15 +18,21 @@ from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.http import HttpRequest
 from maasserver.eventloop import services
-from maasserver.utils.orm import transactional
+from maasserver.utils.orm import (
+    is_retryable_failure,
+    savepoint,
+    transactional,
+)
 from maasserver.utils.threads import deferToDatabase
 from maasserver.websockets import handlers
+from maasserver.websockets.cache import DehydrationCache
 from maasserver.websockets.websockets import STATUSES
 from provisioningserver.logger import LegacyLogger
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.utils import typed
 from provisioningserver.utils.twisted import deferred, synchronous
 from provisioningserver.utils.url import splithost
-from twisted.internet import defer
+from twisted.internet import defer, reactor
 from twisted.internet.defer import fail, inlineCallbacks
 from twisted.internet.protocol import Factory, Protocol
 from twisted.python.modules import getModule
@@ -50,6 +56,9 @@ class MSG_TYPE:
     PING = 3
     PING_REPLY = 4
 
+    #: Notify message from server with the changes from the last notify.
+    NOTIFY_DELTA = 5
+
 
 class RESPONSE_TYPE:
     #:
@@ -71,6 +80,58 @@ def get_cookie(cookies: Optional[str], cookie_name: str) -> Optional[str]:
         return None
 
 
+def coalesce_actions(pending_action, action):
+    """Return the action to process for an object notified with
+    `pending_action` and then `action` in the same window."""
+    if pending_action == "create" and action == "update":
+        # The object is still new to the clients.
+        return pending_action
+    return action
+
+
+def make_list_patch(old, new):
+    """Return the patch from the `old` to the `new` list, or `None`.
+
+    Only lists of dictionaries identified by their "id" are patched. The
+    patch holds the ids in the new list and the items that are new or
+    changed.
+    """
+    if not isinstance(old, list) or not isinstance(new, list):
+        return None
+    try:
+        old_items = {item["id"]: item for item in old}
+        new_ids = [item["id"] for item in new]
+    except (KeyError, TypeError):
+        return None
+    if len(old_items) != len(old) or len(set(new_ids)) != len(new):
+        return None
+    items = [item for item in new if old_items.get(item["id"]) != item]
+    if len(items) == len(new):
+        return None
+    return {"ids": new_ids, "items": items}
+
+
+def make_notify_delta(old, new):
+    """Return the changes from the `old` to the `new` dehydrated object.
+
+    Changed keys are given with their new value, except lists that can be
+    patched with `make_list_patch`.
+    """
+    changed = {}
+    lists = {}
+    for key, value in new.items():
+        if key not in old:
+            changed[key] = value
+        elif old[key] != value:
+            patch = make_list_patch(old[key], value)
+            if patch is None:
+                changed[key] = value
+            else:
+                lists[key] = patch
+    removed = [key for key in old if key not in new]
+    return {"changed": changed, "removed": removed, "lists": lists}
+
+
 class WebSocketProtocol(Protocol):
     """The web-socket protocol that supports the web UI.
 
@@ -83,6 +144,12 @@ class WebSocketProtocol(Protocol):
         self.request = None
         self.cache = {}
         self.sequence_number = 0
+        # When the client asks for deltas, the last data notified for the
+        # most recently notified objects is kept so updates can be sent as
+        # the changes from it.
+        self.notifyDeltas = False
+        self.notified = OrderedDict()
+        self.notifiedLimit = settings.WEBSOCKET_NOTIFY_DELTA_OBJECTS
 
     def connectionMade(self):
         """Connection has been made to client."""
@@ -116,6 +183,9 @@ class WebSocketProtocol(Protocol):
                 ] = self.transport.user_agent
                 self.request.META["REMOTE_ADDR"] = self.transport.ip_address
 
+                query = parse_qs(urlparse(self.transport.uri).query)
+                self.notifyDeltas = query.get(b"deltas") == [b"1"]
+
                 # XXX newell 2018-10-17 bug=1798479:
                 # Check that 'SERVER_NAME' and 'SERVER_PORT' are set.
                 # 'SERVER_NAME' and 'SERVER_PORT' are required so
@@ -323,7 +393,7 @@ class WebSocketProtocol(Protocol):
         handler = self.buildHandler(handler_class)
         d = handler.execute(method, message.get("params", {}))
         d.addCallbacks(
-            partial(self.sendResult, request_id),
+            partial(self.sendResult, request_id, call=msg_method),
             partial(self.sendError, request_id, handler, method),
         )
         return d
@@ -337,17 +407,31 @@ class WebSocketProtocol(Protocol):
         else:
             raise TypeError("Could not convert object to JSON: %r" % obj)
 
-    def sendResult(self, request_id, result, msg_type=MSG_TYPE.RESPONSE):
-        """Send final result to client."""
+    def sendResult(
+        self, request_id, result, msg_type=MSG_TYPE.RESPONSE, call=None
+    ):
+        """Send final result to client.
+
+        :param call: The "handler.method" that returned `result`, to record
+            the size of the payload sent for it.
+        """
         result_msg = {
             "type": msg_type,
             "request_id": request_id,
             "rtype": RESPONSE_TYPE.SUCCESS,
             "result": result,
         }
-        self.transport.write(
-            json.dumps(result_msg, default=self._json_encode).encode("ascii")
+        payload = json.dumps(result_msg, default=self._json_encode).encode(
+            "ascii"
         )
+        if call is not None:
+            PROMETHEUS_METRICS.update(
+                "maas_websocket_call_payload_bytes",
+                "observe",
+                value=len(payload),
+                labels={"call": call},
+            )
+        self.transport.write(payload)
         return result
 
     def sendError(self, request_id, handler, method, failure):
@@ -381,23 +465,130 @@ class WebSocketProtocol(Protocol):
         )
         return None
 
-    def sendNotify(self, name, action, data):
-        """Send the notify message with data."""
+    def encodeNotify(self, name, action, data):
+        """Return the encoded notify message with data."""
         notify_msg = {
             "type": MSG_TYPE.NOTIFY,
             "name": name,
             "action": action,
             "data": data,
         }
-        self.transport.write(
-            json.dumps(notify_msg, default=self._json_encode).encode("ascii")
+        return json.dumps(notify_msg, default=self._json_encode).encode(
+            "ascii"
+        )
+
+    def encodeNotifyDelta(self, name, action, pk, delta):
+        """Return the encoded notify delta message."""
+        delta_msg = {
+            "type": MSG_TYPE.NOTIFY_DELTA,
+            "name": name,
+            "action": action,
+            "pk": pk,
+        }
+        delta_msg.update(delta)
+        return json.dumps(delta_msg, default=self._json_encode).encode("ascii")
+
+    def makeNotifyMessage(self, pk_name, name, action, data, messages):
+        """Return the encoded notify message for `data`.
+
+        When the client asks for deltas, an update is sent as the changes
+        from the last data notified for the object, if that is smaller than
+        the full data. Otherwise the full data is sent along with its
+        primary key, so the client can keep it.
+
+        Encoded messages are cached in `messages`, so clients getting the
+        same message share the encoding.
+        """
+        if not self.notifyDeltas:
+            return self._getEncodedNotify(name, action, data, messages)
+        if action == "delete":
+            self.notified.pop((name, data), None)
+            return self._getEncodedNotify(name, action, data, messages)
+        if not isinstance(data, dict) or pk_name not in data:
+            return self._getEncodedNotify(name, action, data, messages)
+        pk = data[pk_name]
+        last = self.notified.pop((name, pk), None)
+        self.notified[(name, pk)] = data
+        while len(self.notified) > self.notifiedLimit:
+            self.notified.popitem(last=False)
+        full_key = ("full", name, action, id(data))
+        if full_key not in messages:
+            notify_msg = {
+                "type": MSG_TYPE.NOTIFY,
+                "name": name,
+                "action": action,
+                "pk": pk,
+                "data": data,
+            }
+            messages[full_key] = (
+                data,
+                json.dumps(notify_msg, default=self._json_encode).encode(
+                    "ascii"
+                ),
+            )
+        _, full = messages[full_key]
+        if action != "update" or last is None:
+            return full
+        # The last data is held with the message so its id is not reused
+        # while `messages` is alive.
+        delta_key = ("delta", name, action, id(last), id(data))
+        if delta_key not in messages:
+            delta = make_notify_delta(last, data)
+            messages[delta_key] = (
+                last,
+                self.encodeNotifyDelta(name, action, pk, delta),
+            )
+        _, delta = messages[delta_key]
+        if len(delta) < len(full):
+            return delta
+        else:
+            return full
+
+    def makePatchMessage(self, handler_class, pk, changes, messages):
+        """Return the encoded update of the object `pk` with `changes`.
+
+        The changes are applied to the data last notified to the client,
+        so `None` is returned when the client doesn't ask for deltas, wasn't
+        notified of the object yet, or the handler can't apply them.
+        """
+        if not self.notifyDeltas:
+            return None
+        name = handler_class._meta.handler_name
+        pk = handler_class._meta.pk_type(pk)
+        last = self.notified.get((name, pk))
+        if last is None:
+            return None
+        handler = self.buildHandler(handler_class)
+        data = handler.patch_dehydrated(pk, last, changes)
+        if data is None:
+            return None
+        return self.makeNotifyMessage(
+            handler_class._meta.pk, name, "update", data, messages
         )
 
+    def _getEncodedNotify(self, name, action, data, messages):
+        key = (name, action, id(data))
+        message = messages.get(key)
+        if message is None:
+            message = self.encodeNotify(name, action, data)
+            messages[key] = message
+        return message
+
+    def sendNotify(self, name, action, data):
+        """Send the notify message with data."""
+        self.sendEncodedNotify(self.encodeNotify(name, action, data))
+
+    def sendEncodedNotify(self, message):
+        """Send the notify message already encoded by `encodeNotify`."""
+        self.transport.write(message)
+
     def buildHandler(self, handler_class):
         """Return an initialised instance of `handler_class`."""
         handler_name = handler_class._meta.handler_name
         handler_cache = self.cache.setdefault(handler_name, {})
-        return handler_class(self.user, handler_cache, self.request)
+        handler = handler_class(self.user, handler_cache, self.request)
+        handler.use_dehydration_cache(self.factory.dehydration_cache)
+        return handler
 
 
 class WebSocketFactory(Factory):
@@ -405,10 +596,17 @@ class WebSocketFactory(Factory):
 
     protocol = WebSocketProtocol
 
-    def __init__(self, listener):
+    def __init__(self, listener, clock=reactor):
         self.handlers = {}
         self.clients = []
         self.listener = listener
+        self.clock = clock
+        self.dehydration_cache = DehydrationCache()
+        # Notifications received but not yet processed, coalesced per
+        # handler, channel and object.
+        self.notifyWindow = settings.WEBSOCKET_NOTIFY_WINDOW
+        self.pendingNotifies = OrderedDict()
+        self.pendingNotifiesCall = None
         self.cacheHandlers()
         self.registerNotifiers()
 
@@ -419,6 +617,11 @@ class WebSocketFactory(Factory):
     def stopFactory(self):
         """Unregister RPC events."""
         self.unregisterRPCEvents()
+        if self.pendingNotifiesCall is not None:
+            if self.pendingNotifiesCall.active():
+                self.pendingNotifiesCall.cancel()
+            self.pendingNotifiesCall = None
+        self.pendingNotifies.clear()
 
     def getSessionEngine(self):
         """Returns the session engine being used by Django.
@@ -455,26 +658,131 @@ class WebSocketFactory(Factory):
 
     def registerNotifiers(self):
         """Registers all of the postgres channels in the handlers."""
+        # Registered first so stale dehydrated objects are evicted before
+        # the handlers are notified.
+        self.dehydration_cache.register(self.listener)
         for handler in self.handlers.values():
             for channel in handler._meta.listen_channels:
                 self.listener.register(
-                    channel, partial(self.onNotify, handler, channel)
+                    channel,
+                    partial(self.queueNotify, handler, channel),
+                    changes=True,
                 )
 
-    @inlineCallbacks
-    def onNotify(self, handler_class, channel, action, obj_id):
-        for client in self.clients:
-            handler = client.buildHandler(handler_class)
-            data = yield deferToDatabase(
-                self.processNotify, handler, channel, action, obj_id
+    def queueNotify(
+        self, handler_class, channel, action, obj_id, changes=None
+    ):
+        """Queue a notification to be processed after `notifyWindow`.
+
+        Notifications for an object that is already queued from the same
+        channel are coalesced, so the object is processed once for all of
+        them. Their `changes` are merged, unless one of them has none.
+        """
+        handler_name = handler_class._meta.handler_name
+        labels = {"handler": handler_name}
+        PROMETHEUS_METRICS.update(
+            "maas_websocket_notifications", "inc", labels=labels
+        )
+        if self.notifyWindow <= 0:
+            return self.onNotify(
+                handler_class, channel, action, obj_id, changes
             )
-            if data is not None:
-                (name, client_action, data) = data
-                client.sendNotify(name, client_action, data)
+        key = (handler_name, channel, obj_id)
+        if key in self.pendingNotifies:
+            PROMETHEUS_METRICS.update(
+                "maas_websocket_notifications_coalesced", "inc", labels=labels
+            )
+            _, _, pending_action, pending_changes = self.pendingNotifies[key]
+            action = coalesce_actions(pending_action, action)
+            if pending_changes is None or changes is None:
+                changes = None
+            else:
+                changes = dict(pending_changes, **changes)
+        self.pendingNotifies[key] = (handler_class, channel, action, changes)
+        if self.pendingNotifiesCall is None:
+            self.pendingNotifiesCall = self.clock.callLater(
+                self.notifyWindow, self.processPendingNotifies
+            )
+
+    @inlineCallbacks
+    def processPendingNotifies(self):
+        """Process all the queued notifications."""
+        self.pendingNotifiesCall = None
+        pending, self.pendingNotifies = self.pendingNotifies, OrderedDict()
+        for (_, _, obj_id), notify in pending.items():
+            handler_class, channel, action, changes = notify
+            try:
+                yield self.onNotify(
+                    handler_class, channel, action, obj_id, changes
+                )
+            except Exception:
+                log.err(
+                    None,
+                    "Failed to process notification %s %s for %s."
+                    % (channel, action, obj_id),
+                )
+
+    @inlineCallbacks
+    def onNotify(self, handler_class, channel, action, obj_id, changes=None):
+        # Clients already holding the object are sent the changes carried
+        # by the notification, without reloading the object.
+        messages = {}
+        clients = list(self.clients)
+        if action == "update" and changes is not None:
+            reload_clients = []
+            for client in clients:
+                message = client.makePatchMessage(
+                    handler_class, obj_id, changes, messages
+                )
+                if message is None:
+                    reload_clients.append(client)
+                else:
+                    client.sendEncodedNotify(message)
+            clients = reload_clients
+        if len(clients) == 0:
+            return
+        # Handlers are built in the reactor, before the transaction starts.
+        handlers = [client.buildHandler(handler_class) for client in clients]
+        results = yield deferToDatabase(
+            self.processNotifies, handlers, channel, action, obj_id
+        )
+        # Clients with the same notify view mostly get the same dehydrated
+        # object, which is only encoded once for all of them.
+        pk_name = handler_class._meta.pk
+        for client, result in zip(clients, results):
+            if result is not None:
+                (name, client_action, data) = result
+                message = client.makeNotifyMessage(
+                    pk_name, name, client_action, data, messages
+                )
+                client.sendEncodedNotify(message)
 
     @transactional
-    def processNotify(self, handler, channel, action, obj_id):
-        return handler.on_listen(channel, action, obj_id)
+    def processNotifies(self, handlers, channel, action, obj_id):
+        """Process the notification for all `handlers` in one transaction.
+
+        Handlers with the same notify view load and dehydrate the notified
+        object once. Each handler runs in a savepoint, so that one failing
+        only drops the notification for its client.
+        """
+        notify_objects = {}
+        results = []
+        for handler in handlers:
+            handler.use_notify_objects(notify_objects)
+            try:
+                with savepoint():
+                    result = handler.on_listen(channel, action, obj_id)
+            except Exception as error:
+                if is_retryable_failure(error):
+                    raise
+                log.err(
+                    None,
+                    "Failed to process notification %s %s for %s."
+                    % (channel, action, obj_id),
+                )
+                result = None
+            results.append(result)
+        return results
 
     def registerRPCEvents(self):
         """Register for connected and disconnected events from the RPC
@@ -503,6 +811,7 @@ class WebSocketFactory(Factory):
         This is hard-coded to call the `ControllerHandler` as at the moment
         it is the only handler that needs this event.
         """
+        self.dehydration_cache.evict(ident)
         d = self.sendOnNotifyToController(ident)
         d.addErrback(
             log.err,
@@ -8,6 +8,7 @@ __all__ = []
 import random
 from unittest.mock import ANY, MagicMock, sentinel
 
+from django.conf import settings
 from django.db.models.query import QuerySet
 from django.http import HttpRequest
 from maasserver.forms import AdminMachineForm, AdminMachineWithMACAddressesForm
@@ -32,6 +33,7 @@ from maasserver.websockets.base import (
 )
 from maastesting.matchers import MockCalledOnceWith, MockNotCalled
 from maastesting.testcase import MAASTestCase
+from maastesting.twisted import TwistedLoggerFixture
 from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
 from provisioningserver.utils.twisted import asynchronous
 from testtools.matchers import Equals, Is, IsInstance, MatchesStructure
@@ -451,6 +453,40 @@ class TestHandler(MAASServerTestCase, FakeNodesHandlerMixin):
             value=ANY,
         )
 
+    def test_call_method_track_queries_records_db_and_dehydrate_time(self):
+        factory.make_Node()
+        mock_metrics = self.patch(PROMETHEUS_METRICS, "update")
+        handler = self.make_nodes_handler(fields=["hostname"])
+        handler._call_method_track_queries("list", handler.list, {})
+        labels = {"call": "testnodes.list"}
+        mock_metrics.assert_any_call(
+            "maas_websocket_call_db_time", "observe", value=ANY, labels=labels
+        )
+        mock_metrics.assert_any_call(
+            "maas_websocket_call_dehydrate_time",
+            "observe",
+            value=ANY,
+            labels=labels,
+        )
+        self.assertGreater(handler._dehydrate_time, 0)
+
+    def test_call_method_track_queries_logs_slow_call(self):
+        factory.make_Node()
+        self.patch(settings, "WEBSOCKET_SLOW_CALL_BUDGET", 1e-9)
+        self.patch(settings, "WEBSOCKET_SLOW_CALL_QUERIES", 1)
+        handler = self.make_nodes_handler(fields=["hostname"])
+        with TwistedLoggerFixture() as logger:
+            handler._call_method_track_queries("list", handler.list, {})
+        self.assertIn("Slow websocket call testnodes.list", logger.output)
+        self.assertIn("SELECT", logger.output)
+
+    def test_call_method_track_queries_does_not_log_within_budget(self):
+        self.patch(settings, "WEBSOCKET_SLOW_CALL_BUDGET", 60)
+        handler = self.make_nodes_handler(fields=["hostname"])
+        with TwistedLoggerFixture() as logger:
+            handler._call_method_track_queries("list", handler.list, {})
+        self.assertEqual("", logger.output)
+
     def test_list(self):
         output = [{"hostname": factory.make_Node().hostname} for _ in range(3)]
         handler = self.make_nodes_handler(fields=["hostname"])
@@ -707,6 +743,29 @@ class TestHandler(MAASServerTestCase, FakeNodesHandlerMixin):
         self.expectThat(node_data["system_id"], Equals(node.system_id))
         self.expectThat(handler.cache["active_pk"], Equals(node.system_id))
 
+    def test_patch_dehydrated_returns_None_without_patchable_fields(self):
+        handler = self.make_nodes_handler()
+        self.assertIsNone(handler.patch_dehydrated("abc", {"a": 1}, {"a": 2}))
+
+    def test_patch_dehydrated_applies_patchable_fields(self):
+        handler = self.make_nodes_handler(patchable_fields=["a"])
+        data = {"a": 1, "b": 1}
+        self.assertEqual(
+            {"a": 2, "b": 1}, handler.patch_dehydrated("abc", data, {"a": 2})
+        )
+        self.assertEqual({"a": 1, "b": 1}, data)
+
+    def test_patch_dehydrated_returns_None_for_other_fields(self):
+        handler = self.make_nodes_handler(patchable_fields=["a"])
+        self.assertIsNone(
+            handler.patch_dehydrated("abc", {"a": 1}, {"a": 2, "b": 2})
+        )
+
+    def test_patch_dehydrated_returns_None_for_active_pk(self):
+        handler = self.make_nodes_handler(patchable_fields=["a"])
+        handler.cache["active_pk"] = "abc"
+        self.assertIsNone(handler.patch_dehydrated("abc", {"a": 1}, {"a": 2}))
+
     def test_on_listen_calls_listen(self):
         handler = self.make_nodes_handler()
         pk = factory.make_name("system_id")
@@ -718,6 +777,41 @@ class TestHandler(MAASServerTestCase, FakeNodesHandlerMixin):
             MockCalledOnceWith(sentinel.channel, sentinel.action, pk),
         )
 
+    def test_on_listen_shares_listen_for_same_notify_view(self):
+        notify_objects = {}
+        handler = self.make_nodes_handler()
+        handler.use_notify_objects(notify_objects)
+        self.patch(handler, "get_notify_view").return_value = sentinel.view
+        mock_listen = self.patch(handler, "listen")
+        mock_listen.return_value = None
+        other_handler = self.make_nodes_handler()
+        other_handler.use_notify_objects(notify_objects)
+        self.patch(
+            other_handler, "get_notify_view"
+        ).return_value = sentinel.view
+        other_mock_listen = self.patch(other_handler, "listen")
+        handler.on_listen(sentinel.channel, "update", sentinel.pk)
+        other_handler.on_listen(sentinel.channel, "update", sentinel.pk)
+        self.assertThat(
+            mock_listen,
+            MockCalledOnceWith(sentinel.channel, "update", sentinel.pk),
+        )
+        self.assertThat(other_mock_listen, MockNotCalled())
+
+    def test_on_listen_does_not_share_listen_without_notify_view(self):
+        notify_objects = {}
+        handlers = [self.make_nodes_handler() for _ in range(2)]
+        for handler in handlers:
+            handler.use_notify_objects(notify_objects)
+            mock_listen = self.patch(handler, "listen")
+            mock_listen.return_value = None
+            handler.on_listen(sentinel.channel, "update", sentinel.pk)
+            self.assertThat(
+                mock_listen,
+                MockCalledOnceWith(sentinel.channel, "update", sentinel.pk),
+            )
+        self.assertEqual({}, notify_objects)
+
     def test_on_listen_returns_None_if_unknown_action(self):
         handler = self.make_nodes_handler()
         mock_listen = self.patch(handler, "listen")
@@ -0,0 +1,135 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for `maasserver.websockets.cache`"""
+
+__all__ = []
+
+from unittest.mock import sentinel
+
+from maasserver.testing.factory import factory
+from maasserver.testing.fixtures import RBACEnabled
+from maasserver.testing.listener import FakePostgresListenerService
+from maasserver.testing.testcase import MAASServerTestCase
+from maasserver.websockets.cache import (
+    DehydrationCache,
+    get_permission_view,
+    GLOBAL_CHANNELS,
+    NODE_CHANNELS,
+)
+from maastesting.testcase import MAASTestCase
+
+
+class TestGetPermissionView(MAASServerTestCase):
+    def test_same_for_all_admins(self):
+        self.assertEqual(
+            get_permission_view(factory.make_admin()),
+            get_permission_view(factory.make_admin()),
+        )
+
+    def test_same_for_all_users(self):
+        self.assertEqual(
+            get_permission_view(factory.make_User()),
+            get_permission_view(factory.make_User()),
+        )
+
+    def test_differs_for_admins_and_users(self):
+        self.assertNotEqual(
+            get_permission_view(factory.make_admin()),
+            get_permission_view(factory.make_User()),
+        )
+
+    def test_rbac_depends_on_pools(self):
+        rbac = self.useFixture(RBACEnabled())
+        pool = factory.make_ResourcePool()
+        rbac.store.add_pool(pool)
+        user1 = factory.make_User()
+        user2 = factory.make_User()
+        user3 = factory.make_User()
+        for user in (user1, user2):
+            rbac.store.allow(user.username, pool, "view")
+        rbac.store.allow(user3.username, pool, "admin-machines")
+        self.assertEqual(
+            get_permission_view(user1), get_permission_view(user2)
+        )
+        self.assertNotEqual(
+            get_permission_view(user1), get_permission_view(user3)
+        )
+
+
+class TestDehydrationCache(MAASTestCase):
+    def test_get_returns_None_when_missing(self):
+        cache = DehydrationCache()
+        self.assertIsNone(cache.get("pk", "key"))
+
+    def test_set_and_get(self):
+        cache = DehydrationCache()
+        cache.set("pk", "key", sentinel.data, cache.sequence)
+        self.assertIs(sentinel.data, cache.get("pk", "key"))
+        self.assertIsNone(cache.get("pk", "other"))
+
+    def test_set_is_bounded_and_evicts_least_recently_used(self):
+        cache = DehydrationCache(size=2)
+        cache.set("pk1", "key", sentinel.data1, cache.sequence)
+        cache.set("pk2", "key", sentinel.data2, cache.sequence)
+        cache.get("pk1", "key")
+        cache.set("pk3", "key", sentinel.data3, cache.sequence)
+        self.assertEqual(2, len(cache))
+        self.assertIs(sentinel.data1, cache.get("pk1", "key"))
+        self.assertIsNone(cache.get("pk2", "key"))
+        self.assertIs(sentinel.data3, cache.get("pk3", "key"))
+
+    def test_evict_removes_all_keys_for_pk(self):
+        cache = DehydrationCache()
+        cache.set("pk1", "key1", sentinel.data1, cache.sequence)
+        cache.set("pk1", "key2", sentinel.data2, cache.sequence)
+        cache.set("pk2", "key1", sentinel.data3, cache.sequence)
+        cache.evict("pk1")
+        self.assertIsNone(cache.get("pk1", "key1"))
+        self.assertIsNone(cache.get("pk1", "key2"))
+        self.assertIs(sentinel.data3, cache.get("pk2", "key1"))
+
+    def test_set_ignored_when_evicted_after_sequence(self):
+        cache = DehydrationCache()
+        sequence = cache.sequence
+        cache.evict("pk")
+        cache.set("pk", "key", sentinel.data, sequence)
+        self.assertIsNone(cache.get("pk", "key"))
+
+    def test_set_stored_when_evicted_before_sequence(self):
+        cache = DehydrationCache()
+        cache.evict("pk")
+        cache.set("pk", "key", sentinel.data, cache.sequence)
+        self.assertIs(sentinel.data, cache.get("pk", "key"))
+
+    def test_clear_removes_all(self):
+        cache = DehydrationCache()
+        sequence = cache.sequence
+        cache.set("pk", "key", sentinel.data, sequence)
+        cache.clear()
+        self.assertEqual(0, len(cache))
+        cache.set("pk", "key", sentinel.data, sequence)
+        self.assertIsNone(cache.get("pk", "key"))
+
+    def test_register_registers_channels(self):
+        cache = DehydrationCache()
+        listener = FakePostgresListenerService()
+        cache.register(listener)
+        for channel in NODE_CHANNELS:
+            self.assertIn(cache.on_node_notify, listener.listeners[channel])
+        for channel in GLOBAL_CHANNELS:
+            self.assertIn(cache.on_global_notify, listener.listeners[channel])
+
+    def test_on_node_notify_evicts_pk(self):
+        cache = DehydrationCache()
+        cache.set("pk1", "key", sentinel.data1, cache.sequence)
+        cache.set("pk2", "key", sentinel.data2, cache.sequence)
+        cache.on_node_notify("update", "pk1")
+        self.assertIsNone(cache.get("pk1", "key"))
+        self.assertIs(sentinel.data2, cache.get("pk2", "key"))
+
+    def test_on_global_notify_clears(self):
+        cache = DehydrationCache()
+        cache.set("pk", "key", sentinel.data, cache.sequence)
+        cache.on_global_notify("update", "name")
+        self.assertEqual(0, len(cache))
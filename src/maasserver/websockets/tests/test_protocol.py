@@ -7,7 +7,7 @@ __all__ = []
 from collections import deque
 import json
 import random
-from unittest.mock import MagicMock, sentinel
+from unittest.mock import ANY, call, MagicMock, sentinel
 
 from apiclient.utils import ascii_url
 from crochet import wait_for
@@ -23,6 +23,7 @@ from maasserver.websockets import protocol as protocol_module
 from maasserver.websockets.base import Handler
 from maasserver.websockets.handlers import DeviceHandler, MachineHandler
 from maasserver.websockets.protocol import (
+    make_notify_delta,
     MSG_TYPE,
     RESPONSE_TYPE,
     WebSocketFactory,
@@ -34,6 +35,8 @@ from maastesting.matchers import (
     IsFiredDeferred,
     MockCalledOnceWith,
     MockCalledWith,
+    MockCallsMatch,
+    MockNotCalled,
 )
 from maastesting.testcase import MAASTestCase
 from maastesting.twisted import TwistedLoggerFixture
@@ -43,6 +46,7 @@ from provisioningserver.utils.url import splithost
 from testtools.matchers import Equals, Is
 from twisted.internet import defer
 from twisted.internet.defer import fail, inlineCallbacks, succeed
+from twisted.internet.task import Clock
 from twisted.web.server import NOT_DONE_YET
 
 
@@ -145,6 +149,26 @@ class TestWebSocketProtocol(MAASTransactionServerTestCase):
         self.assertThat(protocol.user, Is(sentinel.user))
         self.assertThat(protocol.processMessages, MockCalledOnceWith())
 
+    def test_connectionMade_enables_notify_deltas_if_requested(self):
+        protocol, factory = self.make_protocol(
+            transport_uri=ascii_url("/MAAS/ws?deltas=1")
+        )
+        protocol.authenticate.return_value = defer.succeed(sentinel.user)
+        self.patch_autospec(protocol, "processMessages")
+        protocol.connectionMade()
+        self.addCleanup(protocol.connectionLost, "")
+        self.assertTrue(protocol.notifyDeltas)
+
+    def test_connectionMade_disables_notify_deltas_by_default(self):
+        protocol, factory = self.make_protocol(
+            transport_uri=self.make_ws_uri(csrftoken="token")
+        )
+        protocol.authenticate.return_value = defer.succeed(sentinel.user)
+        self.patch_autospec(protocol, "processMessages")
+        protocol.connectionMade()
+        self.addCleanup(protocol.connectionLost, "")
+        self.assertFalse(protocol.notifyDeltas)
+
     def test_connectionMade_adds_self_to_factory_if_auth_succeeds(self):
         protocol, factory = self.make_protocol()
         mock_authenticate = self.patch(protocol, "authenticate")
@@ -602,6 +626,12 @@ class TestWebSocketProtocol(MAASTransactionServerTestCase):
             protocol.cache[handler_name], handler_class.call_args[0][1]
         )
 
+    def test_buildHandler_uses_factory_dehydration_cache(self):
+        protocol, factory = self.make_protocol()
+        protocol.user = sentinel.user
+        handler = protocol.buildHandler(MachineHandler)
+        self.assertIs(factory.dehydration_cache, handler.dehydration_cache)
+
     @wait_for_reactor
     @inlineCallbacks
     def test_handleRequest_sends_response(self):
@@ -741,6 +771,173 @@ class TestWebSocketProtocol(MAASTransactionServerTestCase):
             message, self.get_written_transport_message(protocol)
         )
 
+    def test_sendResult_records_payload_bytes_for_call(self):
+        mock_metrics = self.patch(protocol_module.PROMETHEUS_METRICS, "update")
+        protocol, factory = self.make_protocol()
+        protocol.sendResult(1, {"data": "value"}, call="machine.get")
+        payload = protocol.transport.write.call_args[0][0]
+        self.assertThat(
+            mock_metrics,
+            MockCalledOnceWith(
+                "maas_websocket_call_payload_bytes",
+                "observe",
+                value=len(payload),
+                labels={"call": "machine.get"},
+            ),
+        )
+
+    def test_sendEncodedNotify_writes_message(self):
+        protocol, factory = self.make_protocol()
+        message = protocol.encodeNotify("name", "action", {"data": "value"})
+        protocol.sendEncodedNotify(message)
+        self.assertThat(protocol.transport.write, MockCalledWith(message))
+
+    def test_makeNotifyMessage_without_deltas_sends_full_data(self):
+        protocol, factory = self.make_protocol()
+        data = {"id": 1, "name": "old"}
+        protocol.makeNotifyMessage("id", "name", "create", data, {})
+        new_data = {"id": 1, "name": "new"}
+        message = protocol.makeNotifyMessage(
+            "id", "name", "update", new_data, {}
+        )
+        self.assertEqual(
+            protocol.encodeNotify("name", "update", new_data), message
+        )
+        self.assertEqual({}, protocol.notified)
+
+    def test_makeNotifyMessage_with_deltas_sends_full_data_with_pk(self):
+        protocol, factory = self.make_protocol()
+        protocol.notifyDeltas = True
+        data = {"id": 1, "name": "name"}
+        message = protocol.makeNotifyMessage("id", "name", "create", data, {})
+        self.assertEqual(
+            {
+                "type": MSG_TYPE.NOTIFY,
+                "name": "name",
+                "action": "create",
+                "pk": 1,
+                "data": data,
+            },
+            json.loads(message.decode("ascii")),
+        )
+        self.assertEqual({("name", 1): data}, protocol.notified)
+
+    def test_makeNotifyMessage_with_deltas_sends_update_delta(self):
+        protocol, factory = self.make_protocol()
+        protocol.notifyDeltas = True
+        data = {
+            "id": 1,
+            "status": "Ready",
+            "description": maas_factory.make_string(size=100),
+        }
+        protocol.makeNotifyMessage("id", "name", "create", data, {})
+        new_data = dict(data, status="Deploying")
+        message = protocol.makeNotifyMessage(
+            "id", "name", "update", new_data, {}
+        )
+        self.assertEqual(
+            {
+                "type": MSG_TYPE.NOTIFY_DELTA,
+                "name": "name",
+                "action": "update",
+                "pk": 1,
+                "changed": {"status": "Deploying"},
+                "removed": [],
+                "lists": {},
+            },
+            json.loads(message.decode("ascii")),
+        )
+        self.assertEqual({("name", 1): new_data}, protocol.notified)
+
+    def test_makeNotifyMessage_with_deltas_resyncs_if_smaller(self):
+        protocol, factory = self.make_protocol()
+        protocol.notifyDeltas = True
+        protocol.makeNotifyMessage("id", "name", "create", {"id": 1}, {})
+        new_data = {"id": 1, "status": "Deploying"}
+        message = protocol.makeNotifyMessage(
+            "id", "name", "update", new_data, {}
+        )
+        self.assertEqual(
+            MSG_TYPE.NOTIFY, json.loads(message.decode("ascii"))["type"]
+        )
+
+    def test_makeNotifyMessage_with_deltas_forgets_deleted(self):
+        protocol, factory = self.make_protocol()
+        protocol.notifyDeltas = True
+        protocol.makeNotifyMessage("id", "name", "create", {"id": 1}, {})
+        protocol.makeNotifyMessage("id", "name", "delete", 1, {})
+        self.assertEqual({}, protocol.notified)
+
+    def test_makeNotifyMessage_with_deltas_forgets_least_recent(self):
+        protocol, factory = self.make_protocol()
+        protocol.notifyDeltas = True
+        protocol.notifiedLimit = 2
+        for pk in (1, 2, 1, 3):
+            protocol.makeNotifyMessage("id", "name", "update", {"id": pk}, {})
+        self.assertEqual([("name", 1), ("name", 3)], list(protocol.notified))
+
+    def test_makeNotifyMessage_shares_messages(self):
+        protocol, factory = self.make_protocol()
+        data = {"id": 1}
+        messages = {}
+        message = protocol.makeNotifyMessage(
+            "id", "name", "update", data, messages
+        )
+        self.assertIs(
+            message,
+            protocol.makeNotifyMessage("id", "name", "update", data, messages),
+        )
+
+    def test_makePatchMessage_without_deltas_returns_None(self):
+        protocol, factory = self.make_protocol()
+        protocol.user = MagicMock()
+        protocol.notified[("machine", "abc")] = {"system_id": "abc"}
+        self.assertIsNone(
+            protocol.makePatchMessage(
+                MachineHandler, "abc", {"power_state": "on"}, {}
+            )
+        )
+
+    def test_makePatchMessage_without_notified_data_returns_None(self):
+        protocol, factory = self.make_protocol()
+        protocol.user = MagicMock()
+        protocol.notifyDeltas = True
+        self.assertIsNone(
+            protocol.makePatchMessage(
+                MachineHandler, "abc", {"power_state": "on"}, {}
+            )
+        )
+
+    def test_makePatchMessage_sends_delta_of_patched_data(self):
+        protocol, factory = self.make_protocol()
+        protocol.user = MagicMock()
+        protocol.notifyDeltas = True
+        data = {
+            "system_id": "abc",
+            "power_state": "on",
+            "description": maas_factory.make_string(size=100),
+        }
+        protocol.notified[("machine", "abc")] = data
+        message = protocol.makePatchMessage(
+            MachineHandler, "abc", {"power_state": "unknown"}, {}
+        )
+        self.assertEqual(
+            {
+                "type": MSG_TYPE.NOTIFY_DELTA,
+                "name": "machine",
+                "action": "update",
+                "pk": "abc",
+                "changed": {"power_state": "unknown"},
+                "removed": [],
+                "lists": {},
+            },
+            json.loads(message.decode("ascii")),
+        )
+        self.assertEqual(
+            dict(data, power_state="unknown"),
+            protocol.notified[("machine", "abc")],
+        )
+
 
 class MakeProtocolFactoryMixin:
     def make_factory(self, rpc_service=None):
@@ -758,6 +955,7 @@ class MakeProtocolFactoryMixin:
         protocol = factory.buildProtocol(None)
         protocol.transport = MagicMock()
         protocol.transport.cookies = b""
+        protocol.transport.uri = b""
         if user is None:
             user = maas_factory.make_User()
         mock_authenticate = self.patch(protocol, "authenticate")
@@ -899,6 +1097,195 @@ class TestWebSocketFactory(MAASTestCase, MakeProtocolFactoryMixin):
         factory = self.make_factory()
         self.assertItemsEqual(ALL_NOTIFIERS, factory.listener.listeners.keys())
 
+    def test_registerNotifiers_registers_dehydration_cache_first(self):
+        factory = self.make_factory()
+        cache = factory.dehydration_cache
+        self.assertEqual(
+            cache.on_node_notify, factory.listener.listeners["machine"][0]
+        )
+        self.assertEqual(
+            cache.on_global_notify, factory.listener.listeners["config"][0]
+        )
+
+    def test_updateRackController_evicts_dehydration_cache(self):
+        factory = self.make_factory()
+        self.patch(factory, "sendOnNotifyToController").return_value = succeed(
+            None
+        )
+        evict = self.patch(factory.dehydration_cache, "evict")
+        factory.updateRackController(sentinel.system_id)
+        self.assertThat(evict, MockCalledOnceWith(sentinel.system_id))
+
+    def test_queueNotify_without_window_calls_onNotify(self):
+        factory = self.make_factory()
+        factory.notifyWindow = 0
+        onNotify = self.patch(factory, "onNotify")
+        factory.queueNotify(
+            MachineHandler, "machine", "update", sentinel.obj_id
+        )
+        self.assertThat(
+            onNotify,
+            MockCalledOnceWith(
+                MachineHandler, "machine", "update", sentinel.obj_id, None
+            ),
+        )
+
+    def test_queueNotify_coalesces_per_object(self):
+        factory = self.make_factory()
+        factory.clock = Clock()
+        factory.notifyWindow = 1
+        onNotify = self.patch(factory, "onNotify")
+        onNotify.return_value = succeed(None)
+        for _ in range(3):
+            factory.queueNotify(
+                MachineHandler, "machine", "update", sentinel.obj_id1
+            )
+        factory.queueNotify(
+            MachineHandler, "machine", "update", sentinel.obj_id2
+        )
+        factory.queueNotify(
+            DeviceHandler, "device", "update", sentinel.obj_id1
+        )
+        factory.queueNotify(
+            MachineHandler, "event", "update", sentinel.obj_id1
+        )
+        self.assertThat(onNotify, MockNotCalled())
+        factory.clock.advance(1)
+        self.assertThat(
+            onNotify,
+            MockCallsMatch(
+                call(
+                    MachineHandler, "machine", "update", sentinel.obj_id1, None
+                ),
+                call(
+                    MachineHandler, "machine", "update", sentinel.obj_id2, None
+                ),
+                call(
+                    DeviceHandler, "device", "update", sentinel.obj_id1, None
+                ),
+                call(
+                    MachineHandler, "event", "update", sentinel.obj_id1, None
+                ),
+            ),
+        )
+        self.assertEqual({}, factory.pendingNotifies)
+        self.assertIsNone(factory.pendingNotifiesCall)
+
+    def test_queueNotify_keeps_create_action(self):
+        factory = self.make_factory()
+        factory.clock = Clock()
+        factory.notifyWindow = 1
+        onNotify = self.patch(factory, "onNotify")
+        onNotify.return_value = succeed(None)
+        factory.queueNotify(
+            MachineHandler, "machine", "create", sentinel.obj_id
+        )
+        factory.queueNotify(
+            MachineHandler, "machine", "update", sentinel.obj_id
+        )
+        factory.clock.advance(1)
+        self.assertThat(
+            onNotify,
+            MockCalledOnceWith(
+                MachineHandler, "machine", "create", sentinel.obj_id, None
+            ),
+        )
+
+    def test_queueNotify_uses_last_delete_action(self):
+        factory = self.make_factory()
+        factory.clock = Clock()
+        factory.notifyWindow = 1
+        onNotify = self.patch(factory, "onNotify")
+        onNotify.return_value = succeed(None)
+        factory.queueNotify(
+            MachineHandler, "machine", "update", sentinel.obj_id
+        )
+        factory.queueNotify(
+            MachineHandler, "machine", "delete", sentinel.obj_id
+        )
+        factory.clock.advance(1)
+        self.assertThat(
+            onNotify,
+            MockCalledOnceWith(
+                MachineHandler, "machine", "delete", sentinel.obj_id, None
+            ),
+        )
+
+    def test_queueNotify_merges_changes(self):
+        factory = self.make_factory()
+        factory.clock = Clock()
+        factory.notifyWindow = 1
+        onNotify = self.patch(factory, "onNotify")
+        onNotify.return_value = succeed(None)
+        factory.queueNotify(
+            MachineHandler, "machine", "update", sentinel.obj_id, {"a": 1}
+        )
+        factory.queueNotify(
+            MachineHandler, "machine", "update", sentinel.obj_id, {"b": 2}
+        )
+        factory.clock.advance(1)
+        self.assertThat(
+            onNotify,
+            MockCalledOnceWith(
+                MachineHandler,
+                "machine",
+                "update",
+                sentinel.obj_id,
+                {"a": 1, "b": 2},
+            ),
+        )
+
+    def test_queueNotify_drops_changes_if_one_has_none(self):
+        factory = self.make_factory()
+        factory.clock = Clock()
+        factory.notifyWindow = 1
+        onNotify = self.patch(factory, "onNotify")
+        onNotify.return_value = succeed(None)
+        factory.queueNotify(
+            MachineHandler, "machine", "update", sentinel.obj_id, {"a": 1}
+        )
+        factory.queueNotify(
+            MachineHandler, "machine", "update", sentinel.obj_id
+        )
+        factory.clock.advance(1)
+        self.assertThat(
+            onNotify,
+            MockCalledOnceWith(
+                MachineHandler, "machine", "update", sentinel.obj_id, None
+            ),
+        )
+
+    def test_processPendingNotifies_logs_errors(self):
+        factory = self.make_factory()
+        factory.clock = Clock()
+        factory.notifyWindow = 1
+        onNotify = self.patch(factory, "onNotify")
+        onNotify.side_effect = [fail(ValueError()), succeed(None)]
+        factory.queueNotify(
+            MachineHandler, "machine", "update", sentinel.obj_id1
+        )
+        factory.queueNotify(
+            MachineHandler, "machine", "update", sentinel.obj_id2
+        )
+        with TwistedLoggerFixture() as logger:
+            factory.clock.advance(1)
+        self.assertIn("Failed to process notification", logger.output)
+        self.assertEqual(2, onNotify.call_count)
+
+    def test_stopFactory_cancels_pending_notifies(self):
+        factory = self.make_factory()
+        factory.clock = Clock()
+        factory.notifyWindow = 1
+        onNotify = self.patch(factory, "onNotify")
+        factory.startFactory()
+        factory.queueNotify(
+            MachineHandler, "machine", "update", sentinel.obj_id
+        )
+        factory.stopFactory()
+        factory.clock.advance(1)
+        self.assertThat(onNotify, MockNotCalled())
+        self.assertEqual({}, factory.pendingNotifies)
+
 
 class TestWebSocketFactoryTransactional(
     MAASTransactionServerTestCase, MakeProtocolFactoryMixin
@@ -971,11 +1358,133 @@ class TestWebSocketFactoryTransactional(
         data = maas_factory.make_name("data")
         mock_class = MagicMock()
         mock_class.return_value.on_listen.return_value = (name, action, data)
-        mock_sendNotify = self.patch(protocol, "sendNotify")
+        mock_sendEncodedNotify = self.patch(protocol, "sendEncodedNotify")
         yield factory.onNotify(
             mock_class, sentinel.channel, action, sentinel.obj_id
         )
-        self.assertThat(mock_sendNotify, MockCalledWith(name, action, data))
+        self.assertThat(
+            mock_sendEncodedNotify,
+            MockCalledWith(protocol.encodeNotify(name, action, data)),
+        )
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_onNotify_sends_patch_without_processing(self):
+        user = yield deferToDatabase(self.make_user)
+        protocol, factory = self.make_protocol_with_factory(user=user)
+        protocol.notifyDeltas = True
+        protocol.notified[("machine", "abc")] = {
+            "system_id": "abc",
+            "power_state": "on",
+            "description": maas_factory.make_string(size=100),
+        }
+        processNotifies = self.patch(factory, "processNotifies")
+        yield factory.onNotify(
+            MachineHandler,
+            "machine",
+            "update",
+            "abc",
+            {"power_state": "unknown"},
+        )
+        self.assertThat(processNotifies, MockNotCalled())
+        self.assertThat(protocol.transport.write, MockCalledOnceWith(ANY))
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_onNotify_processes_clients_that_cannot_patch(self):
+        user = yield deferToDatabase(self.make_user)
+        protocol, factory = self.make_protocol_with_factory(user=user)
+        processNotifies = self.patch(factory, "processNotifies")
+        processNotifies.return_value = [None]
+        yield factory.onNotify(
+            MachineHandler,
+            "machine",
+            "update",
+            "abc",
+            {"power_state": "unknown"},
+        )
+        self.assertThat(
+            processNotifies,
+            MockCalledOnceWith([ANY], "machine", "update", "abc"),
+        )
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_processNotifies_isolates_failing_handler(self):
+        user = yield deferToDatabase(self.make_user)
+        protocol, factory = self.make_protocol_with_factory(user=user)
+        failing_handler = MagicMock()
+        failing_handler.on_listen.side_effect = ValueError()
+        handler = MagicMock()
+        handler.on_listen.return_value = sentinel.result
+        with TwistedLoggerFixture() as logger:
+            results = yield deferToDatabase(
+                factory.processNotifies,
+                [failing_handler, handler],
+                "machine",
+                "update",
+                "abc",
+            )
+        self.assertEqual([None, sentinel.result], results)
+        self.assertIn("Failed to process notification", logger.output)
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_onNotify_encodes_shared_data_once(self):
+        user = yield deferToDatabase(self.make_user)
+        protocol1, factory = self.make_protocol_with_factory(user=user)
+        protocol2 = factory.buildProtocol(None)
+        protocol2.transport = MagicMock()
+        protocol2.user = user
+        factory.clients.append(protocol2)
+        self.addCleanup(factory.clients.remove, protocol2)
+        data = {"name": maas_factory.make_name("data")}
+        self.patch(factory, "processNotifies").return_value = [
+            ("machine", "update", data),
+            ("machine", "update", data),
+        ]
+        encodeNotify1 = self.patch(protocol1, "encodeNotify")
+        encodeNotify1.return_value = b"message"
+        encodeNotify2 = self.patch(protocol2, "encodeNotify")
+        yield factory.onNotify(
+            MagicMock(), sentinel.channel, sentinel.action, sentinel.obj_id
+        )
+        self.assertThat(
+            encodeNotify1, MockCalledOnceWith("machine", "update", data)
+        )
+        self.assertThat(encodeNotify2, MockNotCalled())
+        self.assertThat(
+            protocol1.transport.write, MockCalledOnceWith(b"message")
+        )
+        self.assertThat(
+            protocol2.transport.write, MockCalledOnceWith(b"message")
+        )
+
+    @wait_for_reactor
+    @inlineCallbacks
+    def test_onNotify_processes_all_clients_in_one_call(self):
+        user = yield deferToDatabase(self.make_user)
+        protocol1, factory = self.make_protocol_with_factory(user=user)
+        protocol2 = factory.buildProtocol(None)
+        protocol2.transport = MagicMock()
+        protocol2.user = user
+        factory.clients.append(protocol2)
+        self.addCleanup(factory.clients.remove, protocol2)
+        processNotifies = self.patch(factory, "processNotifies")
+        processNotifies.return_value = [None, None]
+        mock_class = MagicMock()
+        yield factory.onNotify(
+            mock_class, sentinel.channel, sentinel.action, sentinel.obj_id
+        )
+        self.assertThat(
+            processNotifies,
+            MockCalledOnceWith(
+                [mock_class.return_value, mock_class.return_value],
+                sentinel.channel,
+                sentinel.action,
+                sentinel.obj_id,
+            ),
+        )
 
     @wait_for_reactor
     @inlineCallbacks
@@ -998,3 +1507,39 @@ class TestWebSocketFactoryTransactional(
                 controller.system_id,
             ),
         )
+
+
+class TestMakeNotifyDelta(MAASTestCase):
+    def test_changed_and_removed_keys(self):
+        self.assertEqual(
+            {"changed": {"b": 3, "c": 4}, "removed": ["d"], "lists": {}},
+            make_notify_delta(
+                {"a": 1, "b": 2, "d": 5}, {"a": 1, "b": 3, "c": 4}
+            ),
+        )
+
+    def test_patches_lists_of_objects(self):
+        old = {"disks": [{"id": 1, "size": 1}, {"id": 2, "size": 2}]}
+        new = {"disks": [{"id": 2, "size": 2}, {"id": 3, "size": 3}]}
+        self.assertEqual(
+            {
+                "changed": {},
+                "removed": [],
+                "lists": {
+                    "disks": {"ids": [2, 3], "items": [{"id": 3, "size": 3}]}
+                },
+            },
+            make_notify_delta(old, new),
+        )
+
+    def test_replaces_lists_that_cannot_be_patched(self):
+        for old, new in [
+            ([1, 2], [1, 3]),
+            ([{"id": 1}], [{"id": 2}]),
+            ([{"id": 1}, {"name": "a"}], [{"id": 1}]),
+            ([{"id": 1}, {"id": 1}], [{"id": 1}]),
+        ]:
+            self.assertEqual(
+                {"changed": {"list": new}, "removed": [], "lists": {}},
+                make_notify_delta({"list": old}, {"list": new}),
+            )
@@ -14,15 +14,22 @@ HyBi-07 (http://tools.ietf.org/html/draft-ietf-hybi-thewebsocketprotocol-07),
 which are drafts of RFC 6455.
 """
 
+import zlib
+
 from maasserver.websockets.websockets import (
+    _DEFLATE_TAIL,
     _makeAccept,
     _makeFrame,
+    _makeFrameSequence,
     _mask,
+    _negotiateDeflate,
+    _parseExtensions,
     _parseFrames,
     _WSException,
     CONTROLS,
     IWebSocketsFrameReceiver,
     lookupProtocolForFactory,
+    PerMessageDeflate,
     STATUSES,
     WebSocketsProtocol,
     WebSocketsProtocolWrapper,
@@ -100,6 +107,76 @@ class TestFrameHelpers(MAASTestCase):
         key = b"\x37\xfa\x21\x3d"
         self.assertEqual(_mask(b"Hello", key), b"\x7f\x9f\x4d\x51\x58")
 
+    def test_maskLong(self):
+        """
+        Masking a buffer longer than the key repeats the key.
+        """
+        key = b"\x37\xfa\x21\x3d"
+        self.assertEqual(
+            _mask(b"Hello" * 3, key),
+            b"\x7f\x9f\x4d\x51\x58\xb2\x44\x51\x5b\x95"
+            b"\x69\x58\x5b\x96\x4e",
+        )
+
+    def test_maskRoundTrip(self):
+        """
+        Masking twice with the same key restores the buffer, whatever its
+        length.
+        """
+        key = b"abcd"
+        for length in (0, 1, 3, 4, 5, 1000):
+            data = bytes(range(256)) * 4
+            data = data[:length]
+            self.assertEqual(data, _mask(_mask(data, key), key))
+
+    def test_maskMemoryview(self):
+        """
+        L{_mask} accepts a C{memoryview} of the buffer.
+        """
+        key = b"\x37\xfa\x21\x3d"
+        self.assertEqual(
+            _mask(memoryview(b"Hello"), key), b"\x7f\x9f\x4d\x51\x58"
+        )
+
+    def test_makeFrameSequence(self):
+        """
+        L{_makeFrameSequence} returns the header of the frame and the payload
+        as is.
+        """
+        payload = b"x" * 200
+        header, data = _makeFrameSequence(payload, CONTROLS.TEXT, True)
+        self.assertEqual(b"\x81\x7e\x00\xc8", header)
+        self.assertIs(payload, data)
+
+    def test_parseByteArray(self):
+        """
+        L{_parseFrames} parses a C{bytearray} buffer in place, leaving the
+        data of incomplete frames in it.
+        """
+        frame = _makeFrame(b"Hello", CONTROLS.TEXT, True, mask=b"abcd")
+        buffer = bytearray(frame + frame[:3])
+        frames = list(_parseFrames(buffer))
+        self.assertEqual([(CONTROLS.TEXT, b"Hello", True)], frames)
+        self.assertEqual(bytearray(frame[:3]), buffer)
+        buffer += frame[3:]
+        frames = list(_parseFrames(buffer))
+        self.assertEqual([(CONTROLS.TEXT, b"Hello", True)], frames)
+        self.assertEqual(bytearray(), buffer)
+
+    def test_parseByteArrayStopped(self):
+        """
+        When the caller stops consuming frames, the frames already parsed
+        are removed from the C{bytearray} buffer and it can grow again.
+        """
+        frame = _makeFrame(b"Hello", CONTROLS.TEXT, True, mask=b"abcd")
+        buffer = bytearray(frame * 2)
+        frames = _parseFrames(buffer)
+        next(frames)
+        frames.close()
+        self.assertEqual(bytearray(frame), buffer)
+        buffer += frame
+        self.assertEqual(2, len(list(_parseFrames(buffer))))
+
     def test_parseUnmaskedText(self):
         """
         A sample unmasked frame of "Hello" from HyBi-10, 4.7.
@@ -174,6 +251,80 @@ class TestFrameHelpers(MAASTestCase):
         self.assertEqual(frames[1], (CONTROLS.CONTINUE, b"lo", True))
         self.assertEqual(frame, [])
 
+    def test_parseReservedRSV1WithoutDeflate(self):
+        """
+        L{_parseFrames} raises L{_WSException} for frames flagged with RSV1
+        when permessage-deflate isn't negotiated.
+        """
+        frame = [_makeFrame(b"Hello", CONTROLS.TEXT, True, rsv1=True)]
+        self.assertRaises(
+            _WSException, list, _parseFrames(frame, needMask=False)
+        )
+
+    def test_parseCompressedText(self):
+        """
+        L{_parseFrames} decompresses messages flagged with RSV1 when
+        permessage-deflate is negotiated.
+        """
+        data = PerMessageDeflate().compress(b"Hello" * 10)
+        frame = [_makeFrame(data, CONTROLS.TEXT, True, rsv1=True)]
+        frames = list(
+            _parseFrames(frame, needMask=False, deflate=PerMessageDeflate())
+        )
+        self.assertEqual([(CONTROLS.TEXT, b"Hello" * 10, True)], frames)
+
+    def test_parseCompressedTextFragments(self):
+        """
+        L{_parseFrames} decompresses messages fragmented over several frames,
+        only the first one being flagged with RSV1.
+        """
+        data = PerMessageDeflate().compress(b"Hello" * 10)
+        frame = [
+            _makeFrame(data[:4], CONTROLS.TEXT, False, rsv1=True),
+            _makeFrame(data[4:], CONTROLS.CONTINUE, True),
+        ]
+        frames = list(
+            _parseFrames(frame, needMask=False, deflate=PerMessageDeflate())
+        )
+        self.assertEqual(
+            b"Hello" * 10, b"".join(data for _, data, _ in frames)
+        )
+
+    def test_parseUncompressedTextWithDeflate(self):
+        """
+        Messages not flagged with RSV1 are left as is when permessage-deflate
+        is negotiated.
+        """
+        frame = [b"\x81\x05Hello"]
+        frames = list(
+            _parseFrames(frame, needMask=False, deflate=PerMessageDeflate())
+        )
+        self.assertEqual([(CONTROLS.TEXT, b"Hello", True)], frames)
+
+    def test_parseRSV1OnControlFrame(self):
+        """
+        L{_parseFrames} raises L{_WSException} for control frames flagged
+        with RSV1.
+        """
+        frame = [_makeFrame(b"Hello", CONTROLS.PING, True, rsv1=True)]
+        self.assertRaises(
+            _WSException,
+            list,
+            _parseFrames(frame, needMask=False, deflate=PerMessageDeflate()),
+        )
+
+    def test_parseInvalidCompressedText(self):
+        """
+        L{_parseFrames} raises L{_WSException} for compressed messages which
+        can't be decompressed.
+        """
+        frame = [_makeFrame(b"\xff" * 10, CONTROLS.TEXT, True, rsv1=True)]
+        self.assertRaises(
+            _WSException,
+            list,
+            _parseFrames(frame, needMask=False, deflate=PerMessageDeflate()),
+        )
+
     def test_parsePing(self):
         """
         Ping packets are decoded.
@@ -337,6 +488,199 @@ class TestFrameHelpers(MAASTestCase):
 
 
 @implementer(IWebSocketsFrameReceiver)
+class PerMessageDeflateTest(MAASTestCase):
+    """
+    Tests for L{PerMessageDeflate} and its negotiation.
+    """
+
+    def test_compressRoundTrip(self):
+        """
+        Messages compressed by L{PerMessageDeflate.compress} are decompressed
+        by another L{PerMessageDeflate}, keeping the context between them.
+        """
+        sender = PerMessageDeflate(windowBits=10)
+        receiver = PerMessageDeflate()
+        message = b'{"hostname": "machine", "status": "Ready"}' * 20
+        for _ in range(3):
+            data = sender.compress(message)
+            self.assertLess(len(data), len(message))
+            self.assertEqual(
+                message,
+                receiver.receiveFrame(CONTROLS.TEXT, data, True, True),
+            )
+
+    def test_receiveFrameAtMaxMessageSize(self):
+        """
+        Messages decompressed to exactly C{maxMessageSize} bytes are
+        accepted.
+        """
+        message = b"x" * 1000
+        data = PerMessageDeflate().compress(message)
+        receiver = PerMessageDeflate(maxMessageSize=len(message))
+        self.assertEqual(
+            message, receiver.receiveFrame(CONTROLS.TEXT, data, True, True)
+        )
+
+    def test_receiveFrameOverMaxMessageSize(self):
+        """
+        L{PerMessageDeflate.receiveFrame} raises L{_WSException} for
+        messages decompressed to more than C{maxMessageSize} bytes.
+        """
+        data = PerMessageDeflate().compress(b"x" * 1001)
+        receiver = PerMessageDeflate(maxMessageSize=1000)
+        self.assertRaises(
+            _WSException,
+            receiver.receiveFrame,
+            CONTROLS.TEXT,
+            data,
+            True,
+            True,
+        )
+
+    def test_receiveFrameOverMaxMessageSizeAcrossFrames(self):
+        """
+        The size of a compressed message split in several frames is limited
+        as a whole.
+        """
+        compressor = zlib.compressobj(
+            zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15
+        )
+        first = compressor.compress(b"x" * 600)
+        first += compressor.flush(zlib.Z_SYNC_FLUSH)
+        last = compressor.compress(b"y" * 600)
+        last += compressor.flush(zlib.Z_SYNC_FLUSH)
+        receiver = PerMessageDeflate(maxMessageSize=1000)
+        self.assertEqual(
+            b"x" * 600,
+            receiver.receiveFrame(CONTROLS.TEXT, first, True, False),
+        )
+        self.assertRaises(
+            _WSException,
+            receiver.receiveFrame,
+            CONTROLS.CONTINUE,
+            last[: -len(_DEFLATE_TAIL)],
+            False,
+            True,
+        )
+
+    def test_compressWithContextTakeover(self):
+        """
+        With context takeover, repeated messages compress better.
+        """
+        deflate = PerMessageDeflate()
+        message = b'{"hostname": "machine", "status": "Ready"}' * 5
+        first = deflate.compress(message)
+        self.assertLess(len(deflate.compress(message)), len(first))
+
+    def test_compressWithoutContextTakeover(self):
+        """
+        Without context takeover, each message is compressed on its own.
+        """
+        deflate = PerMessageDeflate(contextTakeover=False)
+        message = b'{"hostname": "machine", "status": "Ready"}' * 5
+        self.assertEqual(deflate.compress(message), deflate.compress(message))
+
+    def test_shouldCompress(self):
+        """
+        Only messages of at least C{threshold} bytes are compressed.
+        """
+        deflate = PerMessageDeflate(threshold=10)
+        self.assertFalse(deflate.shouldCompress(b"x" * 9))
+        self.assertTrue(deflate.shouldCompress(b"x" * 10))
+
+    def test_parseExtensions(self):
+        """
+        L{_parseExtensions} parses the offers of all the headers.
+        """
+        self.assertEqual(
+            [
+                (
+                    b"permessage-deflate",
+                    {
+                        b"client_max_window_bits": None,
+                        b"server_max_window_bits": b"10",
+                    },
+                ),
+                (b"permessage-deflate", {}),
+                (b"x-webkit-deflate-frame", {}),
+            ],
+            _parseExtensions(
+                [
+                    b"permessage-deflate; client_max_window_bits; "
+                    b'server_max_window_bits="10", permessage-deflate',
+                    b"x-webkit-deflate-frame",
+                ]
+            ),
+        )
+
+    def test_negotiateDeflate(self):
+        """
+        L{_negotiateDeflate} accepts a plain permessage-deflate offer.
+        """
+        deflate, response = _negotiateDeflate(
+            [(b"permessage-deflate", {b"client_max_window_bits": None})],
+            12,
+            100,
+        )
+        self.assertEqual(b"permessage-deflate", response)
+        self.assertEqual(12, deflate.windowBits)
+        self.assertTrue(deflate.contextTakeover)
+        self.assertEqual(100, deflate.threshold)
+
+    def test_negotiateDeflateParameters(self):
+        """
+        L{_negotiateDeflate} accepts server parameters, using the smallest
+        window.
+        """
+        deflate, response = _negotiateDeflate(
+            [
+                (
+                    b"permessage-deflate",
+                    {
+                        b"server_no_context_takeover": None,
+                        b"server_max_window_bits": b"10",
+                    },
+                )
+            ],
+            15,
+            0,
+        )
+        self.assertEqual(
+            b"permessage-deflate; server_no_context_takeover; "
+            b"server_max_window_bits=10",
+            response,
+        )
+        self.assertEqual(10, deflate.windowBits)
+        self.assertFalse(deflate.contextTakeover)
+
+    def test_negotiateDeflateDeclinesUnsupportedOffers(self):
+        """
+        L{_negotiateDeflate} declines offers it can't support, accepting the
+        next one.
+        """
+        deflate, response = _negotiateDeflate(
+            [
+                (b"x-webkit-deflate-frame", {}),
+                (b"permessage-deflate", {b"server_max_window_bits": b"8"}),
+                (b"permessage-deflate", {b"unknown": None}),
+                (b"permessage-deflate", {b"client_max_window_bits": b"x"}),
+                (b"permessage-deflate", {}),
+            ],
+            15,
+            0,
+        )
+        self.assertEqual(b"permessage-deflate", response)
+
+    def test_negotiateDeflateNoOffer(self):
+        """
+        L{_negotiateDeflate} returns C{None} when nothing can be accepted.
+        """
+        self.assertEqual(
+            (None, None),
+            _negotiateDeflate([(b"x-webkit-deflate-frame", {})], 15, 0),
+        )
+
+
 class SavingEchoReceiver(object):
     """
     A test receiver saving the data received and sending it back.
@@ -434,6 +778,38 @@ class WebSocketsTransportTest(MAASTestCase):
         # We can call loseConnection again without side effects
         webSocketsTranport.loseConnection()
 
+    def test_sendFrameCompressed(self):
+        """
+        L{WebSocketsTransport.sendFrame} compresses messages of at least the
+        threshold size when permessage-deflate is negotiated.
+        """
+        transport = StringTransportWithDisconnection()
+        webSocketsTransport = WebSocketsTransport(
+            transport, PerMessageDeflate(threshold=10)
+        )
+        webSocketsTransport.sendFrame(CONTROLS.TEXT, b"Hello" * 10, True)
+        frames = list(
+            _parseFrames(
+                [transport.value()],
+                needMask=False,
+                deflate=PerMessageDeflate(),
+            )
+        )
+        self.assertEqual([(CONTROLS.TEXT, b"Hello" * 10, True)], frames)
+        self.assertTrue(transport.value()[0] & 0x40)
+
+    def test_sendFrameBelowThreshold(self):
+        """
+        L{WebSocketsTransport.sendFrame} sends messages smaller than the
+        threshold as is.
+        """
+        transport = StringTransportWithDisconnection()
+        webSocketsTransport = WebSocketsTransport(
+            transport, PerMessageDeflate(threshold=10)
+        )
+        webSocketsTransport.sendFrame(CONTROLS.TEXT, b"Hello", True)
+        self.assertEqual(b"\x81\x05Hello", transport.value())
+
     def test_loseConnectionCodeAndReason(self):
         """
         L{WebSocketsTransport.loseConnection} accepts a code and a reason which
@@ -549,10 +925,12 @@ class WebSocketsResourceTest(MAASTestCase):
             def buildProtocol(oself, addr):
                 return self.echoProtocol
 
-        factory = SavingEchoFactory()
+        self.factory = SavingEchoFactory()
         self.echoProtocol = WebSocketsProtocol(SavingEchoReceiver())
 
-        self.resource = WebSocketsResource(lookupProtocolForFactory(factory))
+        self.resource = WebSocketsResource(
+            lookupProtocolForFactory(self.factory)
+        )
 
     def assertRequestFail(self, request):
         """
@@ -977,3 +1355,76 @@ class WebSocketsResourceTest(MAASTestCase):
         self.assertIsInstance(
             transport.protocol.wrappedProtocol, AccumulatingProtocol
         )
+
+    def test_renderDeflate(self):
+        """
+        When configured with C{deflateWindowBits}, L{WebSocketsResource}
+        negotiates permessage-deflate with clients offering it.
+        """
+        self.resource = WebSocketsResource(
+            lookupProtocolForFactory(self.factory),
+            deflateWindowBits=15,
+            deflateThreshold=100,
+        )
+        request = DummyRequest(b"/")
+        request.requestHeaders = Headers(
+            {
+                b"user-agent": [b"user-agent"],
+                b"host": [b"host"],
+                b"sec-websocket-extensions": [
+                    b"permessage-deflate; client_max_window_bits"
+                ],
+            }
+        )
+        transport = StringTransportWithDisconnection()
+        transport.protocol = Protocol()
+        request.transport = transport
+        self.update_headers(
+            request,
+            headers={
+                b"upgrade": b"Websocket",
+                b"connection": b"Upgrade",
+                b"sec-websocket-key": b"secure",
+                b"sec-websocket-version": b"13",
+            },
+        )
+        result = self.resource.render(request)
+        self.assertEqual(NOT_DONE_YET, result)
+        self.assertEqual(
+            [b"permessage-deflate"],
+            request.responseHeaders.getRawHeaders(b"Sec-WebSocket-Extensions"),
+        )
+        self.assertIsInstance(transport.protocol._deflate, PerMessageDeflate)
+        self.assertEqual(100, transport.protocol._deflate.threshold)
+
+    def test_renderDeflateNotConfigured(self):
+        """
+        Without C{deflateWindowBits}, L{WebSocketsResource} ignores
+        permessage-deflate offers.
+        """
+        request = DummyRequest(b"/")
+        request.requestHeaders = Headers(
+            {
+                b"user-agent": [b"user-agent"],
+                b"host": [b"host"],
+                b"sec-websocket-extensions": [b"permessage-deflate"],
+            }
+        )
+        transport = StringTransportWithDisconnection()
+        transport.protocol = Protocol()
+        request.transport = transport
+        self.update_headers(
+            request,
+            headers={
+                b"upgrade": b"Websocket",
+                b"connection": b"Upgrade",
+                b"sec-websocket-key": b"secure",
+                b"sec-websocket-version": b"13",
+            },
+        )
+        result = self.resource.render(request)
+        self.assertEqual(NOT_DONE_YET, result)
+        self.assertIsNone(
+            request.responseHeaders.getRawHeaders(b"Sec-WebSocket-Extensions")
+        )
+        self.assertIsNone(transport.protocol._deflate)
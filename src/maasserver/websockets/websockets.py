@@ -15,6 +15,7 @@ factory.
 __all__ = [
     "WebSocketsResource",
     "IWebSocketsFrameReceiver",
+    "PerMessageDeflate",
     "lookupProtocolForFactory",
     "WebSocketsProtocol",
     "WebSocketsProtocolWrapper",
@@ -25,9 +26,9 @@ __all__ = [
 
 import base64
 from hashlib import sha1
-from itertools import cycle
-from struct import pack, unpack
-from typing import List, Sequence
+from struct import pack, unpack, unpack_from
+from typing import List, Sequence, Union
+import zlib
 
 from provisioningserver.logger import LegacyLogger
 from provisioningserver.utils import typed
@@ -87,6 +88,18 @@ class STATUSES(Values):
 # The GUID for WebSockets, from RFC 6455.
 _WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
 
+# The opcodes of the frames carrying a message.
+_DATA_CONTROLS = (CONTROLS.TEXT, CONTROLS.BINARY, CONTROLS.CONTINUE)
+
+# The tail removed from compressed messages, from RFC 7692.
+_DEFLATE_TAIL = b"\x00\x00\xff\xff"
+
+# The smallest LZ77 window zlib can compress a raw deflate stream with.
+_DEFLATE_MIN_WINDOW_BITS = 9
+
+# The largest size, in bytes, a compressed message may be inflated to.
+_DEFLATE_MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
 
 @typed
 def _makeAccept(key: bytes) -> bytes:
@@ -104,11 +117,14 @@ def _makeAccept(key: bytes) -> bytes:
 
 
 @typed
-def _mask(buf: bytes, key: bytes) -> bytes:
+def _mask(buf: Union[bytes, bytearray, memoryview], key: bytes) -> bytes:
     """
     Mask or unmask a buffer of bytes with a masking key.
 
-    @type buf: C{bytes}
+    The whole buffer is XORed at once, as an integer, with the key repeated
+    to its length.
+
+    @type buf: C{bytes}, C{bytearray} or C{memoryview}
     @param buf: A buffer of bytes.
 
     @type key: C{bytes}
@@ -117,14 +133,38 @@ def _mask(buf: bytes, key: bytes) -> bytes:
     @rtype: C{str}
     @return: A masked buffer of bytes.
     """
-    return bytes((b ^ k) for b, k in zip(buf, cycle(key)))
+    length = len(buf)
+    if length == 0:
+        return b""
+    repeated = (key * (length // 4 + 1))[:length]
+    masked = int.from_bytes(buf, "big") ^ int.from_bytes(repeated, "big")
+    return masked.to_bytes(length, "big")
 
 
 @typed
-def _makeFrame(buf: bytes, opcode, fin: bool, mask: bytes = None) -> bytes:
+def _makeFrame(
+    buf: bytes, opcode, fin: bool, mask: bytes = None, rsv1: bool = False
+) -> bytes:
     """
     Make a frame.
 
+    See L{_makeFrameSequence} for the parameters.
+
+    @rtype: C{bytes}
+    @return: A packed frame.
+    """
+    return b"".join(_makeFrameSequence(buf, opcode, fin, mask, rsv1))
+
+
+@typed
+def _makeFrameSequence(
+    buf: bytes, opcode, fin: bool, mask: bytes = None, rsv1: bool = False
+) -> list:
+    """
+    Make a frame, as a header and a payload to write in sequence.
+
+    Unmasked payloads are not copied.
+
     This function always creates unmasked frames, and attempts to use the
     smallest possible lengths.
 
@@ -140,8 +180,12 @@ def _makeFrame(buf: bytes, opcode, fin: bool, mask: bytes = None) -> bytes:
     @type mask: C{bytes} or C{NoneType}
     @param mask: If specified, the masking key to apply on the created frame.
 
-    @rtype: C{bytes}
-    @return: A packed frame.
+    @type rsv1: C{bool}
+    @param rsv1: Whether or not to set the RSV1 flag, marking the message as
+        compressed.
+
+    @rtype: C{list} of C{bytes}
+    @return: The header of the frame and its payload.
     """
     bufferLength = len(buf)
     if mask is not None:
@@ -166,116 +210,355 @@ def _makeFrame(buf: bytes, opcode, fin: bool, mask: bytes = None) -> bytes:
         header = 0x80
     else:
         header = 0x01
+    if rsv1:
+        header |= 0x40
 
     header = bytes([header | opcode.value])
     if mask is not None:
-        buf = b"%s%s" % (mask, _mask(buf, mask))
-    frame = b"%s%s%s" % (header, length, buf)
-    return frame
+        return [b"%s%s%s" % (header, length, mask), _mask(buf, mask)]
+    else:
+        return [b"%s%s" % (header, length), buf]
 
 
 @typed
-def _parseFrames(frameBuffer: List[bytes], needMask: bool = True):
+def _parseFrames(
+    frameBuffer: Union[List[bytes], bytearray],
+    needMask: bool = True,
+    deflate=None,
+):
     """
     Parse frames in a highly compliant manner. It modifies C{frameBuffer}
     removing the parsed content from it.
 
+    A C{bytearray} buffer is parsed in place, without copying it.
+
     @param frameBuffer: A buffer of bytes.
-    @type frameBuffer: C{list}
+    @type frameBuffer: C{list} of C{bytes} or C{bytearray}
 
     @param needMask: If C{True}, refuse any frame which is not masked.
     @type needMask: C{bool}
+
+    @param deflate: If specified, the negotiated permessage-deflate extension
+        used to decompress the messages flagged with RSV1.
+    @type deflate: L{PerMessageDeflate} or C{NoneType}
     """
     start = 0
-    payload = b"".join(frameBuffer)
+    if isinstance(frameBuffer, bytearray):
+        payload = memoryview(frameBuffer)
+    else:
+        payload = memoryview(b"".join(frameBuffer))
 
-    while True:
-        # If there's not at least two bytes in the buffer, bail.
-        if len(payload) - start < 2:
-            break
+    try:
+        while True:
+            # If there's not at least two bytes in the buffer, bail.
+            if len(payload) - start < 2:
+                break
 
-        # Grab the header. This single byte holds some flags and an opcode
-        header = payload[start]
-        if header & 0x70:
-            # At least one of the reserved flags is set. Pork chop sandwiches!
-            raise _WSException("Reserved flag in frame (%d)" % (header,))
+            # Grab the header. This single byte holds some flags and an
+            # opcode
+            header = payload[start]
+            if deflate is None:
+                reserved = 0x70
+            else:
+                # RSV1 flags compressed messages.
+                reserved = 0x30
+            if header & reserved:
+                # At least one of the reserved flags is set. Pork chop
+                # sandwiches!
+                raise _WSException("Reserved flag in frame (%d)" % (header,))
+
+            fin = header & 0x80
+            rsv1 = header & 0x40
+
+            # Get the opcode, and translate it to a local enum which we
+            # actually care about.
+            opcode = header & 0xF
+            try:
+                opcode = CONTROLS.lookupByValue(opcode)
+            except ValueError:
+                raise _WSException("Unknown opcode %d in frame" % opcode)
+
+            if rsv1 and opcode not in (CONTROLS.TEXT, CONTROLS.BINARY):
+                # Only the first frame of a message can be flagged as
+                # compressed.
+                raise _WSException("RSV1 flag in %s frame" % opcode.name)
+
+            # Get the payload length and determine whether we need to look
+            # for an extra length.
+            length = payload[start + 1]
+            masked = length & 0x80
+
+            if not masked and needMask:
+                # The client must mask the data sent
+                raise _WSException("Received data not masked")
+
+            length &= 0x7F
+
+            # The offset we'll be using to walk through the frame. We use this
+            # because the offset is variable depending on the length and mask.
+            offset = 2
+
+            # Extra length fields.
+            if length == 0x7E:
+                if len(payload) - start < 4:
+                    break
+
+                length = unpack_from(">H", payload, start + 2)[0]
+                offset += 2
+            elif length == 0x7F:
+                if len(payload) - start < 10:
+                    break
+
+                # Protocol bug: The top bit of this long long *must* be
+                # cleared; that is, it is expected to be interpreted as
+                # signed.
+                length = unpack_from(">Q", payload, start + 2)[0]
+                offset += 8
+
+            if masked:
+                if len(payload) - (start + offset) < 4:
+                    # This is not strictly necessary, but it's more explicit so
+                    # that we don't create an invalid key.
+                    break
+
+                key = payload[start + offset : start + offset + 4].tobytes()
+                offset += 4
+
+            if len(payload) - (start + offset) < length:
+                break
 
-        fin = header & 0x80
+            data = payload[start + offset : start + offset + length]
 
-        # Get the opcode, and translate it to a local enum which we actually
-        # care about.
-        opcode = header & 0xF
-        try:
-            opcode = CONTROLS.lookupByValue(opcode)
-        except ValueError:
-            raise _WSException("Unknown opcode %d in frame" % opcode)
+            if masked:
+                data = _mask(data, key)
+            else:
+                data = data.tobytes()
 
-        # Get the payload length and determine whether we need to look for an
-        # extra length.
-        length = payload[start + 1]
-        masked = length & 0x80
+            if deflate is not None and opcode in _DATA_CONTROLS:
+                data = deflate.receiveFrame(
+                    opcode, data, bool(rsv1), bool(fin)
+                )
 
-        if not masked and needMask:
-            # The client must mask the data sent
-            raise _WSException("Received data not masked")
+            if opcode == CONTROLS.CLOSE:
+                if len(data) >= 2:
+                    # Gotta unpack the opcode and return usable data here.
+                    code = STATUSES.lookupByValue(unpack(">H", data[:2])[0])
+                    data = code, data[2:]
+                else:
+                    # No reason given; use generic data.
+                    data = STATUSES.NONE, b""
+
+            start += offset + length
+            yield opcode, data, bool(fin)
+    finally:
+        # Remove the parsed frames from the buffer, even if the caller stops
+        # consuming them. The view must be released before the buffer can be
+        # resized.
+        if isinstance(frameBuffer, bytearray):
+            payload.release()
+            del frameBuffer[:start]
+        else:
+            remaining = payload[start:].tobytes()
+            payload.release()
+            frameBuffer[:] = [remaining] if remaining else []
 
-        length &= 0x7F
 
-        # The offset we'll be using to walk through the frame. We use this
-        # because the offset is variable depending on the length and mask.
-        offset = 2
+class PerMessageDeflate:
+    """
+    The permessage-deflate extension (RFC 7692) negotiated for a connection.
 
-        # Extra length fields.
-        if length == 0x7E:
-            if len(payload) - start < 4:
-                break
+    Incoming messages flagged with RSV1 are decompressed. Outgoing messages
+    smaller than C{threshold} are sent as is, larger ones are compressed.
 
-            length = payload[start + 2 : start + 4]
-            length = unpack(">H", length)[0]
-            offset += 2
-        elif length == 0x7F:
-            if len(payload) - start < 10:
-                break
+    @ivar windowBits: The base two logarithm of the LZ77 window used to
+        compress messages.
+    @type windowBits: C{int}
 
-            # Protocol bug: The top bit of this long long *must* be cleared;
-            # that is, it is expected to be interpreted as signed.
-            length = payload[start + 2 : start + 10]
-            length = unpack(">Q", length)[0]
-            offset += 8
+    @ivar contextTakeover: Whether or not the compression context is kept
+        between messages.
+    @type contextTakeover: C{bool}
 
-        if masked:
-            if len(payload) - (start + offset) < 4:
-                # This is not strictly necessary, but it's more explicit so
-                # that we don't create an invalid key.
-                break
+    @ivar threshold: The size, in bytes, from which messages are compressed.
+    @type threshold: C{int}
+
+    @ivar maxMessageSize: The largest size, in bytes, a received message may
+        be decompressed to.
+    @type maxMessageSize: C{int}
+    """
+
+    name = b"permessage-deflate"
+
+    def __init__(
+        self,
+        windowBits=15,
+        contextTakeover=True,
+        threshold=0,
+        maxMessageSize=_DEFLATE_MAX_MESSAGE_SIZE,
+    ):
+        self.windowBits = windowBits
+        self.contextTakeover = contextTakeover
+        self.threshold = threshold
+        self.maxMessageSize = maxMessageSize
+        self._compressor = None
+        # Messages are always decompressed with the largest window, so it
+        # doesn't matter which one the client compresses them with.
+        self._decompressor = zlib.decompressobj(-15)
+        self._inflating = False
+        self._inflated = 0
+
+    def shouldCompress(self, data):
+        """
+        Whether or not C{data} is large enough to be compressed.
+        """
+        return len(data) >= self.threshold
 
-            key = payload[start + offset : start + offset + 4]
-            offset += 4
+    def compress(self, data):
+        """
+        Compress the message C{data}.
 
-        if len(payload) - (start + offset) < length:
-            break
+        @type data: C{bytes}
+        @param data: The content of a whole message.
 
-        data = payload[start + offset : start + offset + length]
+        @rtype: C{bytes}
+        @return: The compressed message, to send with the RSV1 flag.
+        """
+        if self._compressor is None or not self.contextTakeover:
+            self._compressor = zlib.compressobj(
+                zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -self.windowBits
+            )
+        data = self._compressor.compress(data)
+        data += self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data.endswith(_DEFLATE_TAIL):
+            data = data[: -len(_DEFLATE_TAIL)]
+        return data
+
+    def receiveFrame(self, opcode, data, rsv1, fin):
+        """
+        Return the content of a received data frame, decompressed if it is
+        part of a compressed message.
 
-        if masked:
-            data = _mask(data, key)
+        @type opcode: C{CONTROLS}
+        @param opcode: The type of frame received.
 
-        if opcode == CONTROLS.CLOSE:
-            if len(data) >= 2:
-                # Gotta unpack the opcode and return usable data here.
-                code = STATUSES.lookupByValue(unpack(">H", data[:2])[0])
-                data = code, data[2:]
-            else:
-                # No reason given; use generic data.
-                data = STATUSES.NONE, b""
+        @type data: C{bytes}
+        @param data: The content of the frame received.
 
-        yield opcode, data, bool(fin)
-        start += offset + length
+        @type rsv1: C{bool}
+        @param rsv1: Whether or not the RSV1 flag is set.
 
-    if len(payload) > start:
-        frameBuffer[:] = [payload[start:]]
-    else:
-        frameBuffer[:] = []
+        @type fin: C{bool}
+        @param fin: Whether or not the frame is final.
+
+        @raise _WSException: If the message can't be decompressed, or is
+            larger than C{maxMessageSize} once decompressed.
+        """
+        if opcode != CONTROLS.CONTINUE:
+            self._inflating = rsv1
+            self._inflated = 0
+        if not self._inflating:
+            return data
+        if fin:
+            data += _DEFLATE_TAIL
+        # Ask for one byte more than allowed, to tell a message which fits
+        # exactly from one which doesn't, without inflating the whole of it.
+        remaining = self.maxMessageSize - self._inflated
+        try:
+            data = self._decompressor.decompress(data, remaining + 1)
+        except zlib.error as error:
+            raise _WSException("Invalid compressed data: %s" % error)
+        self._inflated += len(data)
+        if len(data) > remaining or self._decompressor.unconsumed_tail:
+            raise _WSException(
+                "Decompressed message larger than %d bytes"
+                % self.maxMessageSize
+            )
+        return data
+
+
+def _parseExtensions(headers):
+    """
+    Parse the values of I{Sec-WebSocket-Extensions} headers.
+
+    @type headers: C{list} of C{bytes} or C{NoneType}
+    @param headers: The raw header values.
+
+    @rtype: C{list}
+    @return: The offered extensions, as (name, parameters) tuples. The
+        parameters are a C{dict}, with a value of C{None} for the parameters
+        given without one.
+    """
+    extensions = []
+    for header in headers or ():
+        for offer in header.split(b","):
+            parts = [part.strip() for part in offer.split(b";")]
+            if not parts[0]:
+                continue
+            params = {}
+            for part in parts[1:]:
+                if not part:
+                    continue
+                key, sep, value = part.partition(b"=")
+                if sep:
+                    params[key.strip().lower()] = value.strip().strip(b'"')
+                else:
+                    params[key.strip().lower()] = None
+            extensions.append((parts[0].lower(), params))
+    return extensions
+
+
+def _negotiateDeflate(offers, windowBits, threshold):
+    """
+    Accept the first permessage-deflate offer that can be supported.
+
+    @type offers: C{list}
+    @param offers: The extensions offered, as returned by L{_parseExtensions}.
+
+    @type windowBits: C{int}
+    @param windowBits: The largest LZ77 window to compress messages with.
+
+    @type threshold: C{int}
+    @param threshold: The size, in bytes, from which messages are compressed.
+
+    @return: A tuple of the L{PerMessageDeflate} and the
+        I{Sec-WebSocket-Extensions} response value, or C{(None, None)} if no
+        offer was accepted.
+    """
+    for name, params in offers:
+        if name != PerMessageDeflate.name:
+            continue
+        response = [PerMessageDeflate.name]
+        bits = windowBits
+        contextTakeover = True
+        try:
+            for key, value in params.items():
+                if key == b"server_no_context_takeover" and value is None:
+                    contextTakeover = False
+                    response.append(key)
+                elif key == b"client_no_context_takeover" and value is None:
+                    pass
+                elif key == b"server_max_window_bits":
+                    value = int(value)
+                    if not 8 <= value <= 15:
+                        raise ValueError(value)
+                    bits = min(bits, value)
+                    if bits < _DEFLATE_MIN_WINDOW_BITS:
+                        raise ValueError(value)
+                    response.append(b"%s=%d" % (key, bits))
+                elif key == b"client_max_window_bits":
+                    if value is not None and not 8 <= int(value) <= 15:
+                        raise ValueError(value)
+                else:
+                    raise ValueError(key)
+        except (TypeError, ValueError):
+            # Decline this offer, the client may have made another one.
+            continue
+        deflate = PerMessageDeflate(
+            windowBits=bits,
+            contextTakeover=contextTakeover,
+            threshold=threshold,
+        )
+        return deflate, b"; ".join(response)
+    return None, None
 
 
 class IWebSocketsFrameReceiver(Interface):
@@ -320,8 +603,9 @@ class WebSocketsTransport(object):
 
     _disconnecting = False
 
-    def __init__(self, transport):
+    def __init__(self, transport, deflate=None):
         self._transport = transport
+        self._deflate = deflate
 
     @typed
     def sendFrame(self, opcode, data: bytes, fin: bool):
@@ -337,8 +621,20 @@ class WebSocketsTransport(object):
         @type fin: C{bool}
         @param fin: Whether or not we're sending a final frame.
         """
-        packet = _makeFrame(data, opcode, fin)
-        self._transport.write(packet)
+        # Only messages sent in a single frame are compressed.
+        rsv1 = (
+            self._deflate is not None
+            and fin
+            and opcode in (CONTROLS.TEXT, CONTROLS.BINARY)
+            and self._deflate.shouldCompress(data)
+        )
+        if rsv1:
+            data = self._deflate.compress(data)
+        # The payload is written as is after the header, without copying it
+        # into a single packet.
+        self._transport.writeSequence(
+            _makeFrameSequence(data, opcode, fin, rsv1=rsv1)
+        )
 
     @typed
     def loseConnection(self, code=STATUSES.NORMAL, reason: bytes = b""):
@@ -378,31 +674,40 @@ class WebSocketsProtocol(Protocol):
         frames.
     @type _receiver: L{IWebSocketsFrameReceiver} provider
 
-    @ivar _buffer: The pending list of frames not processed yet.
-    @type _buffer: C{list}
+    @ivar _buffer: The pending data of the frames not processed yet.
+    @type _buffer: C{bytearray}
+
+    @ivar _deflate: The permessage-deflate extension negotiated by
+        L{WebSocketsResource}, if any.
+    @type _deflate: L{PerMessageDeflate} or C{NoneType}
 
     @since: 13.2
     """
 
     _buffer = None
+    _deflate = None
 
     def __init__(self, receiver):
         self._receiver = receiver
 
     def connectionMade(self):
         """
-        Log the new connection and initialize the buffer list.
+        Log the new connection and initialize the buffer.
         """
         peer = self.transport.getPeer()
         log.debug("Opening connection with {peer}", peer=peer)
-        self._buffer = []
-        self._receiver.makeConnection(WebSocketsTransport(self.transport))
+        self._buffer = bytearray()
+        self._receiver.makeConnection(
+            WebSocketsTransport(self.transport, self._deflate)
+        )
 
     def _parseFrames(self):
         """
         Find frames in incoming data and pass them to the underlying protocol.
         """
-        for opcode, data, fin in _parseFrames(self._buffer):
+        for opcode, data, fin in _parseFrames(
+            self._buffer, deflate=self._deflate
+        ):
             self._receiver.frameReceived(opcode, data, fin)
             if opcode == CONTROLS.CLOSE:
                 # The other side wants us to close.
@@ -424,12 +729,12 @@ class WebSocketsProtocol(Protocol):
     @typed
     def dataReceived(self, data: bytes):
         """
-        Append the data to the buffer list and parse the whole.
+        Append the data to the buffer and parse the whole.
 
         @type data: C{bytes}
         @param data: The buffer received.
         """
-        self._buffer.append(data)
+        self._buffer += data
         try:
             self._parseFrames()
         except _WSException:
@@ -590,13 +895,26 @@ class WebSocketsResource(object):
         L{lookupProtocolForFactory}.
     @type lookupProtocol: C{callable}.
 
+    @param deflateWindowBits: If specified, permessage-deflate is negotiated
+        with clients offering it, compressing with a LZ77 window of at most
+        this base two logarithm.
+    @type deflateWindowBits: C{int} or C{NoneType}
+
+    @param deflateThreshold: The size, in bytes, from which messages are
+        compressed once permessage-deflate is negotiated.
+    @type deflateThreshold: C{int}
+
     @since: 13.2
     """
 
     isLeaf = True
 
-    def __init__(self, lookupProtocol):
+    def __init__(
+        self, lookupProtocol, deflateWindowBits=None, deflateThreshold=0
+    ):
         self._lookupProtocol = lookupProtocol
+        self._deflateWindowBits = deflateWindowBits
+        self._deflateThreshold = deflateThreshold
 
     def getChildWithDefault(self, name, request):
         """
@@ -699,6 +1017,19 @@ class WebSocketsResource(object):
         # 4.2.2.5.5 Optional codec declaration
         if protocolName:
             request.setHeader(b"Sec-WebSocket-Protocol", protocolName)
+        # 4.2.2.5.6 Optional extensions
+        deflate = None
+        if self._deflateWindowBits is not None:
+            offers = _parseExtensions(
+                request.requestHeaders.getRawHeaders(
+                    b"Sec-WebSocket-Extensions"
+                )
+            )
+            deflate, extensions = _negotiateDeflate(
+                offers, self._deflateWindowBits, self._deflateThreshold
+            )
+            if deflate is not None:
+                request.setHeader(b"Sec-WebSocket-Extensions", extensions)
 
         # Provoke request into flushing headers and finishing the handshake.
         request.write(b"")
@@ -730,6 +1061,7 @@ class WebSocketsResource(object):
 
         if not isinstance(protocol, WebSocketsProtocol):
             protocol = WebSocketsProtocolWrapper(protocol)
+        protocol._deflate = deflate
 
         # Connect the transport to our factory, and make things go. We need to
         # do some stupid stuff here; see #3204, which could fix it.
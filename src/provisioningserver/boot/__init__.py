@@ -71,6 +71,12 @@ class BytesReader:
         self.buffer.close()
 
 
+@lru_cache(512)
+def compile_template(content):
+    """Return a `tempita.Template` of `content`, compiled once."""
+    return tempita.Template(content)
+
+
 class BootMethodError(Exception):
     """Exception raised for errors from a BootMethod."""
 
@@ -144,6 +150,11 @@ class BootMethod(metaclass=ABCMeta):
     # Includes "HTTPClient" as the vendor-class-identifier.
     http_url = False
 
+    # Set to `True` when the configuration files from `get_reader` depend
+    # only on its arguments, so that the backend renders them only once.
+    # See `RenderedConfigCache`.
+    render_once = False
+
     # Arches for which this boot method needs to install boot loaders.
     bootloader_arches = []
 
@@ -315,8 +326,8 @@ class BootMethod(metaclass=ABCMeta):
     def get_template(self, purpose, arch, subarch):
         """Gets the best avaliable template for the boot method.
 
-        Templates are loaded each time here so that they can be changed on
-        the fly without restarting the provisioning server.
+        Templates are loaded and compiled once per process, so changes to
+        them are only seen once the provisioning server restarts.
 
         :param purpose: The boot purpose, e.g. "local".
         :param arch: Main machine architecture.
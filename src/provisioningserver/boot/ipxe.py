@@ -10,9 +10,13 @@ import os
 import re
 from textwrap import dedent
 
-from provisioningserver.boot import BootMethod, BytesReader, get_parameters
+from provisioningserver.boot import (
+    BootMethod,
+    BytesReader,
+    compile_template,
+    get_parameters,
+)
 from provisioningserver.utils import typed
-import tempita
 
 
 CONFIG_FILE = dedent(
@@ -61,6 +65,7 @@ class IPXEBootMethod(BootMethod):
     name = "ipxe"
     bios_boot_method = "pxe"
     template_subdir = "ipxe"
+    render_once = True
     bootloader_path = "ipxe.cfg"
     arch_octet = "00:00"
     user_class = "iPXE"
@@ -110,7 +115,7 @@ class IPXEBootMethod(BootMethod):
         # the simplestream.
         step1 = template.substitute(namespace)
         return BytesReader(
-            tempita.Template(step1).substitute(namespace).encode("utf-8")
+            compile_template(step1).substitute(namespace).encode("utf-8")
         )
 
     @typed
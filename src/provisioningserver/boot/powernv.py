@@ -73,6 +73,7 @@ class PowerNVBootMethod(BootMethod):
     name = "powernv"
     bios_boot_method = "powernv"
     template_subdir = "pxe"
+    render_once = True
     bootloader_path = "pxelinux.0"
     arch_octet = "00:0E"
     user_class = None
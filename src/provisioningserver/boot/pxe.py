@@ -10,11 +10,15 @@ import os
 import re
 import shutil
 
-from provisioningserver.boot import BootMethod, BytesReader, get_parameters
+from provisioningserver.boot import (
+    BootMethod,
+    BytesReader,
+    compile_template,
+    get_parameters,
+)
 from provisioningserver.events import EVENT_TYPES, try_send_rack_event
 from provisioningserver.logger import get_maas_logger
 from provisioningserver.utils.fs import atomic_copy, atomic_symlink
-import tempita
 
 
 maaslog = get_maas_logger("pxe")
@@ -74,6 +78,7 @@ class PXEBootMethod(BootMethod):
     name = "pxe"
     bios_boot_method = "pxe"
     template_subdir = "pxe"
+    render_once = True
     bootloader_arches = ["i386", "amd64"]
     bootloader_path = "lpxelinux.0"
     bootloader_files = [
@@ -125,7 +130,7 @@ class PXEBootMethod(BootMethod):
         # stream.
         step1 = template.substitute(namespace)
         return BytesReader(
-            tempita.Template(step1).substitute(namespace).encode("utf-8")
+            compile_template(step1).substitute(namespace).encode("utf-8")
         )
 
     def link_bootloader(self, destination: str):
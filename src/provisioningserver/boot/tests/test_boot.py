@@ -17,6 +17,7 @@ from provisioningserver import boot
 from provisioningserver.boot import (
     BootMethod,
     BytesReader,
+    compile_template,
     gen_template_filenames,
     get_main_archive_url,
     get_ports_archive_url,
@@ -332,6 +333,14 @@ class TestBootMethod(MAASTestCase):
         )
 
 
+class TestCompileTemplate(MAASTestCase):
+    def test_compiles_template_once(self):
+        content = "{{%s}}" % factory.make_name("name")
+        template = compile_template(content)
+        self.assertIsInstance(template, tempita.Template)
+        self.assertIs(template, compile_template(content))
+
+
 class TestGetArchiveUrl(MAASTestCase):
 
     run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
@@ -68,6 +68,7 @@ class UEFIAMD64BootMethod(BootMethod):
     name = "uefi_amd64"
     bios_boot_method = "uefi"
     template_subdir = "uefi"
+    render_once = True
     bootloader_arches = ["amd64"]
     bootloader_path = "bootx64.efi"
     bootloader_files = ["bootx64.efi", "grubx64.efi"]
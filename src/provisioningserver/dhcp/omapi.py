@@ -0,0 +1,426 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Client for the OMAPI of the ISC DHCP server.
+
+`Omshell` runs an ``omshell`` process for every change to a host map. The
+`OMAPIClient` here keeps one authenticated connection to the DHCP server
+open, and sends a whole batch of changes to host maps over it without
+waiting for each of them to be answered in turn.
+"""
+
+__all__ = [
+    "OMAPIClient",
+    "OMAPIConnectionError",
+    "OMAPIError",
+    "OMAPIMessage",
+]
+
+from base64 import b64decode
+import hmac
+import random
+import socket
+import struct
+import threading
+
+from netaddr import EUI, IPAddress
+from provisioningserver.logger import LegacyLogger
+
+
+log = LegacyLogger()
+
+
+# The version of the protocol, and the size of the message header, sent by
+# both ends of a new connection.
+OMAPI_PROTOCOL_VERSION = 100
+OMAPI_HEADER_SIZE = 24
+
+# Message opcodes.
+OMAPI_OP_OPEN = 1
+OMAPI_OP_REFRESH = 2
+OMAPI_OP_UPDATE = 3
+OMAPI_OP_NOTIFY = 4
+OMAPI_OP_STATUS = 5
+OMAPI_OP_DELETE = 6
+
+# Result codes of status messages, from ISC's result.h.
+ISC_R_SUCCESS = 0
+ISC_R_EXISTS = 18
+ISC_R_NOTFOUND = 23
+ISC_R_IOERROR = 26
+
+# The name of the key in the DHCP server configuration, and the only
+# signature algorithm it supports.
+OMAPI_KEY_NAME = "omapi_key"
+OMAPI_ALGORITHM = b"hmac-md5.SIG-ALG.REG.INT."
+OMAPI_SIGNATURE_SIZE = 16
+
+# Hardware type of Ethernet MAC addresses.
+HARDWARE_TYPE_ETHERNET = 1
+
+
+class OMAPIError(Exception):
+    """The DHCP server refused or failed an operation."""
+
+
+class OMAPIConnectionError(OMAPIError):
+    """The DHCP server could not be reached, or the connection failed."""
+
+
+def pack_int(value):
+    """Pack `value` as an OMAPI integer value."""
+    return struct.pack("!I", value)
+
+
+def unpack_int(value):
+    """Unpack an OMAPI integer value."""
+    return struct.unpack("!I", value)[0]
+
+
+def pack_pairs(pairs):
+    """Pack `(name, value)` pairs of bytes, terminated by an empty name."""
+    packed = []
+    for name, value in pairs:
+        packed.append(struct.pack("!H", len(name)))
+        packed.append(name)
+        packed.append(struct.pack("!I", len(value)))
+        packed.append(value)
+    packed.append(struct.pack("!H", 0))
+    return b"".join(packed)
+
+
+def read_pairs(read):
+    """Read `(name, value)` pairs with `read`, up to an empty name."""
+    pairs = []
+    while True:
+        (name_length,) = struct.unpack("!H", read(2))
+        if name_length == 0:
+            return pairs
+        name = read(name_length)
+        (value_length,) = struct.unpack("!I", read(4))
+        pairs.append((name, read(value_length)))
+
+
+def sign(key, data):
+    """Return the HMAC-MD5 signature of `data` with the base64 `key`."""
+    return hmac.new(b64decode(key), data, "md5").digest()
+
+
+class OMAPIMessage:
+    """A message sent to or received from an OMAPI server.
+
+    :ivar message: `(name, value)` pairs of the message, as bytes.
+    :ivar obj: `(name, value)` pairs of the object it refers to, as bytes.
+    """
+
+    def __init__(self, opcode, handle=0, tid=None, rid=0, message=(), obj=()):
+        self.opcode = opcode
+        self.handle = handle
+        if tid is None:
+            tid = random.randint(1, 2 ** 32 - 1)
+        self.tid = tid
+        self.rid = rid
+        self.message = list(message)
+        self.obj = list(obj)
+        self.authid = 0
+        self.signature = b""
+
+    @classmethod
+    def open(cls, object_type, obj=(), create=False):
+        """Return a message to open, or create, an object of `object_type`."""
+        message = [(b"type", object_type)]
+        if create:
+            message.append((b"create", pack_int(1)))
+        return cls(OMAPI_OP_OPEN, message=message, obj=obj)
+
+    def _pack_signed_part(self, authlen):
+        return (
+            struct.pack(
+                "!IIIII", authlen, self.opcode, self.handle, self.tid, self.rid
+            )
+            + pack_pairs(self.message)
+            + pack_pairs(self.obj)
+        )
+
+    def pack(self, authid=0, key=None):
+        """Return the message as bytes, signed with `key` if given."""
+        if key is None:
+            signature = b""
+        else:
+            signature = sign(
+                key, self._pack_signed_part(OMAPI_SIGNATURE_SIZE)
+            )
+        return (
+            struct.pack("!I", authid)
+            + self._pack_signed_part(len(signature))
+            + signature
+        )
+
+    @classmethod
+    def read(cls, read):
+        """Read a message with `read`, a function returning exactly as many
+        bytes as asked for."""
+        authid, authlen, opcode, handle, tid, rid = struct.unpack(
+            "!IIIIII", read(OMAPI_HEADER_SIZE)
+        )
+        msg = cls(
+            opcode,
+            handle=handle,
+            tid=tid,
+            rid=rid,
+            message=read_pairs(read),
+            obj=read_pairs(read),
+        )
+        msg.authid = authid
+        msg.signature = read(authlen)
+        return msg
+
+    def verify(self, key):
+        """Return whether the message was signed with `key`."""
+        expected = sign(key, self._pack_signed_part(len(self.signature)))
+        return hmac.compare_digest(expected, self.signature)
+
+    def get_message(self, name, default=None):
+        """Return the value of `name` in the message."""
+        return dict(self.message).get(name, default)
+
+    def get_status(self):
+        """Return `(result, text)` of a status message."""
+        result = self.get_message(b"result")
+        text = self.get_message(b"message", b"")
+        return (
+            ISC_R_SUCCESS if result is None else unpack_int(result),
+            text.decode("utf-8", "replace"),
+        )
+
+
+def make_host_name(mac):
+    """Return the name of the host map for `mac`.
+
+    It is not a host name but an identifier within the DHCP server. MAAS
+    uses the MAC address; see `Omshell.create`.
+    """
+    return mac.replace(":", "-").encode("ascii")
+
+
+def make_host_object(mac, ip_address):
+    """Return the object values setting `mac` -> `ip_address`."""
+    return [
+        (b"hardware-address", EUI(mac).packed),
+        (b"hardware-type", pack_int(HARDWARE_TYPE_ETHERNET)),
+        (b"ip-address", IPAddress(ip_address).packed),
+    ]
+
+
+class OMAPIClient:
+    """A session with the OMAPI of a DHCP server.
+
+    The connection is made when first needed, and kept open for the batches
+    of changes that follow. When it fails, e.g. because the DHCP server was
+    restarted, a new connection is made and the batch is sent again: all of
+    the changes are idempotent.
+
+    :param server_address: The address of the DHCP server.
+    :param shared_key: The base64 HMAC-MD5 key set in the DHCP server's
+        configuration as `omapi_key`.
+    :param port: The OMAPI port of the DHCP server.
+    """
+
+    def __init__(self, server_address, shared_key, port, timeout=10):
+        self.server_address = server_address
+        self.shared_key = shared_key
+        self.port = port
+        self.timeout = timeout
+        self._socket = None
+        self._buffer = None
+        self._authid = 0
+        self._lock = threading.Lock()
+
+    @property
+    def connected(self):
+        return self._socket is not None
+
+    def _read(self, size):
+        data = self._buffer.read(size)
+        if len(data) != size:
+            raise OMAPIConnectionError("Connection closed by DHCP server.")
+        return data
+
+    def _send(self, messages):
+        """Send all of `messages` at once, signed if authenticated."""
+        key = self.shared_key if self._authid else None
+        self._socket.sendall(
+            b"".join(msg.pack(self._authid, key) for msg in messages)
+        )
+
+    def _receive(self, messages):
+        """Return the responses to `messages`, by transaction ID."""
+        waiting = {msg.tid for msg in messages}
+        responses = {}
+        while waiting:
+            response = OMAPIMessage.read(self._read)
+            if self._authid and not response.verify(self.shared_key):
+                raise OMAPIConnectionError(
+                    "Response from DHCP server has a bad signature."
+                )
+            if response.rid in waiting:
+                waiting.discard(response.rid)
+                responses[response.rid] = response
+        return responses
+
+    def _query(self, messages):
+        """Send `messages` and return their responses, in the same order.
+
+        Everything is sent before reading any response, so the whole batch
+        costs a single round-trip.
+        """
+        if len(messages) == 0:
+            return []
+        self._send(messages)
+        responses = self._receive(messages)
+        return [responses[msg.tid] for msg in messages]
+
+    def connect(self):
+        """Connect to, and authenticate with, the DHCP server."""
+        self.close()
+        try:
+            self._socket = socket.create_connection(
+                (self.server_address, self.port), timeout=self.timeout
+            )
+            self._buffer = self._socket.makefile("rb")
+            startup = struct.pack(
+                "!II", OMAPI_PROTOCOL_VERSION, OMAPI_HEADER_SIZE
+            )
+            self._socket.sendall(startup)
+            if self._read(len(startup)) != startup:
+                raise OMAPIConnectionError(
+                    "DHCP server does not speak OMAPI version %d."
+                    % OMAPI_PROTOCOL_VERSION
+                )
+            [response] = self._query(
+                [
+                    OMAPIMessage.open(
+                        b"authenticator",
+                        obj=[
+                            (b"name", OMAPI_KEY_NAME.encode("ascii")),
+                            (b"algorithm", OMAPI_ALGORITHM),
+                        ],
+                    )
+                ]
+            )
+            if response.opcode != OMAPI_OP_UPDATE or response.handle == 0:
+                raise OMAPIConnectionError(
+                    "DHCP server refused the OMAPI key: %s"
+                    % response.get_status()[1]
+                )
+            self._authid = response.handle
+        except OSError as error:
+            self.close()
+            raise OMAPIConnectionError(str(error)) from error
+        except OMAPIError:
+            self.close()
+            raise
+
+    def close(self):
+        """Close the connection, if open."""
+        if self._socket is not None:
+            self._buffer.close()
+            self._socket.close()
+        self._socket = None
+        self._buffer = None
+        self._authid = 0
+
+    def update_host_maps(self, remove, add, modify):
+        """Remove, add and modify host maps in two round-trips.
+
+        :param remove: Dicts with the "mac" of the host maps to remove.
+        :param add: Dicts with the "mac" and "ip" of the host maps to add.
+        :param modify: Dicts with the "mac" and "ip" of the host maps to
+            change.
+        :return: A list of `(action, host, message)` tuples for the hosts
+            that could not be updated, where `action` is "remove", "create"
+            or "modify".
+        :raise OMAPIConnectionError: If the DHCP server could not be reached.
+        """
+        with self._lock:
+            try:
+                return self._update_host_maps(remove, add, modify)
+            except (OSError, OMAPIConnectionError) as error:
+                log.debug(
+                    "OMAPI session failed ({error}); reconnecting.",
+                    error=error,
+                )
+                self.close()
+            try:
+                return self._update_host_maps(remove, add, modify)
+            except OSError as error:
+                self.close()
+                raise OMAPIConnectionError(str(error)) from error
+            except OMAPIConnectionError:
+                self.close()
+                raise
+
+    def _update_host_maps(self, remove, add, modify):
+        if not self.connected:
+            self.connect()
+        failures = []
+
+        # First open the existing host maps, and create the new ones.
+        opens = [
+            OMAPIMessage.open(
+                b"host", obj=[(b"name", make_host_name(host["mac"]))]
+            )
+            for host in remove + modify
+        ]
+        creates = [
+            OMAPIMessage.open(
+                b"host",
+                obj=[(b"name", make_host_name(host["mac"]))]
+                + make_host_object(host["mac"], host["ip"]),
+                create=True,
+            )
+            for host in add
+        ]
+        responses = self._query(opens + creates)
+        opened = responses[: len(opens)]
+        for host, response in zip(add, responses[len(opens) :]):
+            if response.opcode != OMAPI_OP_UPDATE:
+                result, text = response.get_status()
+                # The host map already existed.
+                if result not in (ISC_R_EXISTS, ISC_R_IOERROR):
+                    failures.append(("create", host, text))
+
+        # Then delete or change the host maps that were opened.
+        changes, changed = [], []
+        for host, response in zip(remove, opened):
+            if response.opcode == OMAPI_OP_UPDATE:
+                changes.append(
+                    OMAPIMessage(OMAPI_OP_DELETE, handle=response.handle)
+                )
+                changed.append(("remove", host))
+            elif response.get_status()[0] != ISC_R_NOTFOUND:
+                # A host map that was not found is already removed.
+                failures.append(("remove", host, response.get_status()[1]))
+        for host, response in zip(modify, opened[len(remove) :]):
+            if response.opcode == OMAPI_OP_UPDATE:
+                changes.append(
+                    OMAPIMessage(
+                        OMAPI_OP_UPDATE,
+                        handle=response.handle,
+                        obj=make_host_object(host["mac"], host["ip"]),
+                    )
+                )
+                changed.append(("modify", host))
+            else:
+                failures.append(("modify", host, response.get_status()[1]))
+        for (action, host), response in zip(changed, self._query(changes)):
+            if action == "remove":
+                succeeded = (
+                    response.opcode == OMAPI_OP_STATUS
+                    and response.get_status()[0] == ISC_R_SUCCESS
+                )
+            else:
+                succeeded = response.opcode == OMAPI_OP_UPDATE
+            if not succeeded:
+                failures.append((action, host, response.get_status()[1]))
+        return failures
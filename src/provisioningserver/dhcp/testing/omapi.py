@@ -0,0 +1,181 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""A fake OMAPI server for testing the OMAPI client."""
+
+__all__ = ["FakeOMAPIServer", "make_omapi_key"]
+
+from base64 import b64encode
+import os
+import socket
+import socketserver
+import threading
+
+from fixtures import Fixture
+from netaddr import IPAddress
+from provisioningserver.dhcp.omapi import (
+    ISC_R_NOTFOUND,
+    ISC_R_SUCCESS,
+    OMAPI_KEY_NAME,
+    OMAPI_OP_DELETE,
+    OMAPI_OP_OPEN,
+    OMAPI_OP_STATUS,
+    OMAPI_OP_UPDATE,
+    OMAPIMessage,
+    pack_int,
+)
+
+# Result codes for requests the fake does not accept.
+ISC_R_NOPERM = 6
+ISC_R_NOTIMPLEMENTED = 27
+
+
+def make_omapi_key():
+    """Return a random base64 key, like those from `generate_omapi_key`."""
+    return b64encode(os.urandom(64)).decode("ascii")
+
+
+def unpack_host_object(obj):
+    """Return the MAC and IP address set in a host object, as strings."""
+    values = dict(obj)
+    mac = values.get(b"hardware-address")
+    if mac is not None:
+        mac = ":".join("%02x" % octet for octet in mac)
+    ip = values.get(b"ip-address")
+    if ip is not None:
+        ip = str(
+            IPAddress(
+                int.from_bytes(ip, "big"), version=4 if len(ip) == 4 else 6
+            )
+        )
+    return mac, ip
+
+
+class FakeOMAPIServer(Fixture):
+    """A fake of the OMAPI of the ISC DHCP server, for host maps only.
+
+    :ivar hosts: The host maps, as a dict mapping their names to dicts with
+        their "mac" and "ip".
+    :ivar connections: The number of connections made to the server.
+    :ivar received: The opcodes of the messages received, in order.
+    """
+
+    def __init__(self, shared_key=None):
+        super(FakeOMAPIServer, self).__init__()
+        if shared_key is None:
+            shared_key = make_omapi_key()
+        self.shared_key = shared_key
+        self.hosts = {}
+        self.connections = 0
+        self.received = []
+        self._sockets = set()
+        self._lock = threading.Lock()
+
+    def _setUp(self):
+        fake = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                fake._serve(self.request)
+
+        server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        server.daemon_threads = True
+        self.address, self.port = server.server_address
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(self.disconnect)
+        self.addCleanup(server.shutdown)
+
+    def disconnect(self):
+        """Close all connections, as if the DHCP server was restarted."""
+        with self._lock:
+            sockets, self._sockets = self._sockets, set()
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _serve(self, sock):
+        with self._lock:
+            self.connections += 1
+            self._sockets.add(sock)
+        buffer = sock.makefile("rb")
+
+        def read(size):
+            data = buffer.read(size)
+            if len(data) != size:
+                raise EOFError()
+            return data
+
+        try:
+            sock.sendall(read(8))
+            session = {"authid": 0, "handles": {}}
+            while True:
+                msg = OMAPIMessage.read(read)
+                with self._lock:
+                    self.received.append(msg.opcode)
+                response = self._respond(session, msg)
+                response.rid = msg.tid
+                key = self.shared_key if session["authid"] else None
+                sock.sendall(response.pack(session["authid"], key))
+                if session["authid"] == 0 and msg.opcode == OMAPI_OP_OPEN:
+                    session["authid"] = response.handle
+        except (EOFError, OSError):
+            pass
+        finally:
+            with self._lock:
+                self._sockets.discard(sock)
+            buffer.close()
+
+    def _status(self, result, text):
+        return OMAPIMessage(
+            OMAPI_OP_STATUS,
+            message=[
+                (b"result", pack_int(result)),
+                (b"message", text.encode("utf-8")),
+            ],
+        )
+
+    def _respond(self, session, msg):
+        handles = session["handles"]
+        if session["authid"] == 0:
+            values = dict(msg.obj)
+            if msg.get_message(b"type") != b"authenticator" or values.get(
+                b"name"
+            ) != OMAPI_KEY_NAME.encode("ascii"):
+                return self._status(ISC_R_NOPERM, "not authenticated")
+            return OMAPIMessage(OMAPI_OP_UPDATE, handle=len(handles) + 1000)
+        if msg.authid != session["authid"] or not msg.verify(
+            self.shared_key
+        ):
+            return self._status(ISC_R_NOPERM, "invalid signature")
+        if msg.opcode == OMAPI_OP_OPEN:
+            if msg.get_message(b"type") != b"host":
+                return self._status(ISC_R_NOTIMPLEMENTED, "not implemented")
+            name = dict(msg.obj)[b"name"].decode("ascii")
+            mac, ip = unpack_host_object(msg.obj)
+            with self._lock:
+                if name not in self.hosts:
+                    if msg.get_message(b"create") is None:
+                        return self._status(ISC_R_NOTFOUND, "not found")
+                    self.hosts[name] = {"mac": mac, "ip": ip}
+            handle = len(handles) + 1
+            handles[handle] = name
+            return OMAPIMessage(OMAPI_OP_UPDATE, handle=handle, obj=msg.obj)
+        name = handles.get(msg.handle)
+        with self._lock:
+            if name not in self.hosts:
+                return self._status(ISC_R_NOTFOUND, "not found")
+            if msg.opcode == OMAPI_OP_UPDATE:
+                mac, ip = unpack_host_object(msg.obj)
+                self.hosts[name] = {"mac": mac, "ip": ip}
+                return OMAPIMessage(
+                    OMAPI_OP_UPDATE, handle=msg.handle, obj=msg.obj
+                )
+            elif msg.opcode == OMAPI_OP_DELETE:
+                del self.hosts[name]
+                return self._status(ISC_R_SUCCESS, "")
+        return self._status(ISC_R_NOTIMPLEMENTED, "not implemented")
@@ -0,0 +1,150 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for the omapi.py file."""
+
+__all__ = []
+
+from maastesting.factory import factory
+from maastesting.testcase import MAASTestCase
+from provisioningserver.dhcp.omapi import (
+    make_host_name,
+    OMAPI_OP_OPEN,
+    OMAPIClient,
+    OMAPIConnectionError,
+    OMAPIMessage,
+    sign,
+)
+from provisioningserver.dhcp.testing.omapi import (
+    FakeOMAPIServer,
+    make_omapi_key,
+)
+
+
+def make_hosts(count):
+    return [
+        {"mac": factory.make_mac_address(), "ip": factory.make_ip_address()}
+        for _ in range(count)
+    ]
+
+
+class TestOMAPIMessage(MAASTestCase):
+    def test_pack_and_read_round_trip(self):
+        key = make_omapi_key()
+        message = OMAPIMessage.open(
+            b"host", obj=[(b"name", factory.make_bytes(10))]
+        )
+        data = message.pack(1, key)
+        chunks = [data]
+
+        def read(size):
+            chunk, chunks[0] = chunks[0][:size], chunks[0][size:]
+            return chunk
+
+        read_message = OMAPIMessage.read(read)
+        self.assertEqual(OMAPI_OP_OPEN, read_message.opcode)
+        self.assertEqual(message.tid, read_message.tid)
+        self.assertEqual(b"host", read_message.get_message(b"type"))
+        self.assertEqual(message.obj, read_message.obj)
+        self.assertTrue(read_message.verify(key))
+        self.assertFalse(read_message.verify(make_omapi_key()))
+
+    def test_sign_depends_on_key(self):
+        data = factory.make_bytes()
+        self.assertNotEqual(
+            sign(make_omapi_key(), data), sign(make_omapi_key(), data)
+        )
+
+
+class TestOMAPIClient(MAASTestCase):
+    def setUp(self):
+        super(TestOMAPIClient, self).setUp()
+        self.server = self.useFixture(FakeOMAPIServer())
+        self.client = OMAPIClient(
+            self.server.address, self.server.shared_key, self.server.port
+        )
+        self.addCleanup(self.client.close)
+
+    def get_hosts(self, hosts):
+        return {
+            make_host_name(host["mac"]).decode("ascii"): {
+                "mac": host["mac"],
+                "ip": host["ip"],
+            }
+            for host in hosts
+        }
+
+    def test_creates_host_maps(self):
+        hosts = make_hosts(5)
+        self.assertEqual([], self.client.update_host_maps([], hosts, []))
+        self.assertEqual(self.get_hosts(hosts), self.server.hosts)
+
+    def test_removes_and_modifies_host_maps(self):
+        hosts = make_hosts(3)
+        self.client.update_host_maps([], hosts, [])
+        hosts[1]["ip"] = factory.make_ipv4_address()
+        self.assertEqual(
+            [], self.client.update_host_maps([hosts[0]], [], [hosts[1]])
+        )
+        self.assertEqual(self.get_hosts(hosts[1:]), self.server.hosts)
+
+    def test_removing_missing_host_map_succeeds(self):
+        self.assertEqual(
+            [], self.client.update_host_maps(make_hosts(1), [], [])
+        )
+
+    def test_creating_existing_host_map_succeeds(self):
+        hosts = make_hosts(1)
+        self.client.update_host_maps([], hosts, [])
+        self.assertEqual([], self.client.update_host_maps([], hosts, []))
+        self.assertEqual(self.get_hosts(hosts), self.server.hosts)
+
+    def test_returns_failure_for_missing_host_map_to_modify(self):
+        hosts = make_hosts(1)
+        [(action, host, message)] = self.client.update_host_maps(
+            [], [], hosts
+        )
+        self.assertEqual(("modify", hosts[0]), (action, host))
+        self.assertEqual({}, self.server.hosts)
+
+    def test_uses_one_connection_for_all_batches(self):
+        for _ in range(3):
+            self.client.update_host_maps([], make_hosts(2), [])
+        self.assertEqual(1, self.server.connections)
+        self.assertEqual(6, len(self.server.hosts))
+
+    def test_reconnects_when_connection_is_lost(self):
+        self.client.update_host_maps([], make_hosts(1), [])
+        self.server.disconnect()
+        self.assertEqual(
+            [], self.client.update_host_maps([], make_hosts(1), [])
+        )
+        self.assertEqual(2, self.server.connections)
+        self.assertEqual(2, len(self.server.hosts))
+
+    def test_raises_error_with_wrong_key(self):
+        client = OMAPIClient(
+            self.server.address, make_omapi_key(), self.server.port
+        )
+        self.addCleanup(client.close)
+        self.assertRaises(
+            OMAPIConnectionError,
+            client.update_host_maps,
+            [],
+            make_hosts(1),
+            [],
+        )
+        self.assertEqual({}, self.server.hosts)
+
+    def test_raises_error_when_server_is_not_running(self):
+        server = FakeOMAPIServer()
+        with server:
+            pass
+        client = OMAPIClient(server.address, server.shared_key, server.port)
+        self.assertRaises(
+            OMAPIConnectionError,
+            client.update_host_maps,
+            [],
+            make_hosts(1),
+            [],
+        )
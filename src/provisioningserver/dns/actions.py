@@ -4,29 +4,54 @@
 """Low-level actions to manage the DNS service, like reloading zones."""
 
 __all__ = [
+    "bind_freeze_zones",
     "bind_reconfigure",
     "bind_reload",
     "bind_reload_zones",
+    "bind_reload_zones_with_retries",
+    "bind_remove_journals",
+    "bind_thaw_zones",
+    "bind_update_zone",
     "bind_write_configuration",
     "bind_write_options",
     "bind_write_zones",
+    "get_zone_update_size",
+    "start_zone_writers",
+    "stop_zone_writers",
 ]
 
 import collections
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+import os
 from subprocess import CalledProcessError, TimeoutExpired
 from time import sleep
 
 from provisioningserver.dns.config import (
     DNSConfig,
+    execute_nsupdate_command,
     execute_rndc_command,
     set_up_options_conf,
 )
+from provisioningserver.dns.zoneconfig import DomainConfigBase
 from provisioningserver.logger import get_maas_logger
 from provisioningserver.utils.shell import ExternalProcessError
 
 
 maaslog = get_maas_logger("dns")
 
+# The processes zone files are written in, and how many there are, see
+# `start_zone_writers`.
+_zone_writers = None
+_zone_writer_processes = 0
+
+# The largest dynamic update BIND accepts: a DNS message over TCP is
+# prefixed with its length as 16 bits.
+DNS_UPDATE_MAX_SIZE = 65535
+
+# Room in a dynamic update for the TSIG record signing it.
+_TSIG_RECORD_SIZE = 256
+
 
 def bind_reconfigure():
     """Ask BIND to reload its configuration and *new* zone files.
@@ -81,7 +106,7 @@ def bind_reload_with_retries(attempts=10, interval=2, timeout=2):
             sleep(interval)
 
 
-def bind_reload_zones(zone_list):
+def bind_reload_zones(zone_list, timeout=2):
     """Ask BIND to reload the zone file for the given zone.
 
     :param zone_list: A list of zone names to reload, or a single name as a
@@ -93,16 +118,166 @@ def bind_reload_zones(zone_list):
         zone_list = [zone_list]
     for name in zone_list:
         try:
-            execute_rndc_command(("reload", name))
+            execute_rndc_command(("reload", name), timeout=timeout)
         except CalledProcessError as exc:
             maaslog.error(
                 "Reloading BIND zone %r failed (is it running?): %s", name, exc
             )
             ret = False
+        except TimeoutExpired as exc:
+            maaslog.error(
+                "Reloading BIND zone %r timed out (is it locked?): %s",
+                name,
+                exc,
+            )
+            ret = False
     return ret
 
 
-def bind_write_configuration(zones, trusted_networks):
+def bind_reload_zones_with_retries(
+    zone_list, attempts=10, interval=2, timeout=2
+):
+    """Ask BIND to reload the zone files for the given zones, retrying on
+    failure.
+
+    :param zone_list: A list of zone names to reload, or a single name as a
+        string.
+    :param attempts: The number of attempts.
+    :param interval: The time in seconds to sleep between each attempt.
+    :return: True if success, False otherwise.
+    """
+    for countdown in range(attempts - 1, -1, -1):
+        if bind_reload_zones(zone_list, timeout=timeout):
+            return True
+        if countdown != 0:
+            sleep(interval)
+    return False
+
+
+def bind_freeze_zones(timeout=2):
+    """Ask BIND to stop accepting dynamic updates to all zones.
+
+    This writes the changes BIND has journaled to the zone files, so they
+    can be rewritten safely.  This operation is 'best effort' (with logging)
+    as the server may not be running.
+
+    :return: True if success, False otherwise.
+    """
+    try:
+        execute_rndc_command(("freeze",), timeout=timeout)
+        return True
+    except (CalledProcessError, TimeoutExpired) as exc:
+        maaslog.warning("Freezing BIND zones failed: %s", exc)
+        return False
+
+
+def bind_thaw_zones(timeout=2):
+    """Ask BIND to reload all frozen zones and accept dynamic updates again.
+
+    :return: True if success, False otherwise.
+    """
+    try:
+        execute_rndc_command(("thaw",), timeout=timeout)
+        return True
+    except (CalledProcessError, TimeoutExpired) as exc:
+        maaslog.warning("Thawing BIND zones failed: %s", exc)
+        return False
+
+
+def _get_name_size(name):
+    """Return the size of `name` in a DNS message, uncompressed."""
+    name = name.rstrip(".")
+    return len(name) + 2 if name else 1
+
+
+def _get_record_size(name, rrtype, rrdata):
+    """Return the size of a resource record in a DNS message."""
+    if rrtype == "A":
+        rdata_size = 4
+    elif rrtype == "AAAA":
+        rdata_size = 16
+    elif rrtype in ("CNAME", "NS", "PTR"):
+        rdata_size = _get_name_size(rrdata)
+    else:
+        rdata_size = len(rrdata)
+    # Type, class, TTL and the length of the data.
+    return _get_name_size(name) + 10 + rdata_size
+
+
+def get_zone_update_size(zone_name, soa, deleted, added):
+    """Return the size of the dynamic update `bind_update_zone` sends.
+
+    Names are counted uncompressed, so this is an upper bound. The update
+    cannot be sent when it is larger than `DNS_UPDATE_MAX_SIZE`.
+
+    :param zone_name: The name of the zone to update.
+    :param soa: `(ttl, rrdata)` of the new SOA record for the zone.
+    :param deleted: `(name, ttl, rrtype, rrdata)` tuples of the records to
+        remove.
+    :param added: `(name, ttl, rrtype, rrdata)` tuples of the records to add.
+    """
+    mname, rname = soa[1].split()[:2]
+    # The header, the zone section, and the SOA record.
+    size = 12 + _get_name_size(zone_name) + 4
+    size += _get_name_size(zone_name) + 10
+    size += _get_name_size(mname) + _get_name_size(rname) + 20
+    size += _TSIG_RECORD_SIZE
+    for records in (deleted, added):
+        size += sum(
+            _get_record_size(name, rrtype, rrdata)
+            for name, _, rrtype, rrdata in records
+        )
+    return size
+
+
+def bind_update_zone(zone_name, soa, deleted, added, timeout=2):
+    """Apply a change to the records of a zone with a dynamic update.
+
+    :param zone_name: The name of the zone to update.
+    :param soa: `(ttl, rrdata)` of the new SOA record for the zone.
+    :param deleted: `(name, ttl, rrtype, rrdata)` tuples of the records to
+        remove. Names must be fully-qualified.
+    :param added: `(name, ttl, rrtype, rrdata)` tuples of the records to
+        add. Names must be fully-qualified.
+    :return: True if success, False otherwise.
+
+    The change is sent as one DNS message, so it must be no larger than
+    `DNS_UPDATE_MAX_SIZE`; see `get_zone_update_size`.
+    """
+    commands = [
+        "update delete %s %s %s" % (name, rrtype, rrdata)
+        for name, _, rrtype, rrdata in sorted(deleted)
+    ]
+    commands.extend(
+        "update add %s %s %s %s" % record for record in sorted(added)
+    )
+    commands.append("update add %s. %s SOA %s" % ((zone_name,) + soa))
+    try:
+        execute_nsupdate_command(zone_name, commands, timeout=timeout)
+        return True
+    except (CalledProcessError, TimeoutExpired) as exc:
+        maaslog.error("Updating BIND zone %r failed: %s", zone_name, exc)
+        return False
+
+
+def bind_remove_journals(zones):
+    """Remove the journals of dynamic updates BIND keeps for `zones`.
+
+    Call this once the zone files have been rewritten, while the zones are
+    frozen, so that BIND does not apply stale updates to the new files.
+
+    :param zones: Those zones whose journals to remove.
+    :type zones: Sequence of :py:class:`DomainData`.
+    """
+    for zone in zones:
+        for zone_info in zone.zone_info:
+            try:
+                os.remove(zone_info.target_path + ".jnl")
+            except FileNotFoundError:
+                pass
+
+
+def bind_write_configuration(zones, trusted_networks, dynamic_updates=False):
     """Write BIND's configuration.
 
     :param zones: Those zones to include in main config.
@@ -110,6 +285,9 @@ def bind_write_configuration(zones, trusted_networks):
 
     :param trusted_networks: A sequence of CIDR network specifications that
         are permitted to use the DNS server as a forwarder.
+
+    :param dynamic_updates: Whether the zones accept dynamic updates signed
+        with MAAS's key.
     """
     # trusted_networks was formerly specified as a single IP address with
     # netmask. These assertions are here to prevent code that assumes that
@@ -118,7 +296,9 @@ def bind_write_configuration(zones, trusted_networks):
     assert isinstance(trusted_networks, collections.Sequence)
 
     dns_config = DNSConfig(zones=zones)
-    dns_config.write_config(trusted_networks=trusted_networks)
+    dns_config.write_config(
+        trusted_networks=trusted_networks, dynamic_updates=dynamic_updates
+    )
 
 
 def bind_write_options(upstream_dns, dnssec_validation):
@@ -137,11 +317,75 @@ def bind_write_options(upstream_dns, dnssec_validation):
     )
 
 
-def bind_write_zones(zones):
+def start_zone_writers(processes):
+    """Start the processes that `bind_write_zones` writes zone files in.
+
+    The processes are spawned rather than forked: zones are written from
+    threads of the region, whose other threads and database connections
+    a forked process would inherit. They're sent each zone file as plain
+    data, and only render and write it.
+
+    :param processes: The number of processes, or 0 for one per CPU. With
+        1, none are started, and zone files are written in this process.
+    """
+    global _zone_writers, _zone_writer_processes
+    stop_zone_writers()
+    if processes == 0:
+        processes = os.cpu_count() or 1
+    if processes > 1:
+        _zone_writers = ProcessPoolExecutor(
+            max_workers=processes, mp_context=get_context("spawn")
+        )
+        _zone_writer_processes = processes
+
+
+def stop_zone_writers():
+    """Stop the processes started by `start_zone_writers`.
+
+    They exit once they've written the zone files they were already sent.
+    """
+    global _zone_writers, _zone_writer_processes
+    executor, _zone_writers = _zone_writers, None
+    _zone_writer_processes = 0
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def _write_zone_file(target_path, parameters):
+    """Write a zone file returned by `DomainConfigBase.get_zone_files`.
+
+    This runs in the processes started by `start_zone_writers`, if any.
+    """
+    DomainConfigBase.write_zone_file(target_path, *parameters)
+
+
+def bind_write_zones(zones, zone_names=None):
     """Write out DNS zones.
 
+    The zone files are rendered and written in the processes started by
+    `start_zone_writers`, or in this process if there are none or there's
+    only one file to write.
+
     :param zones: Those zones to write.
     :type zones: Sequence of :py:class:`DomainData`.
+    :param zone_names: If given, only write the zones with these names.
     """
-    for zone in zones:
-        zone.write_config()
+    zone_files = [
+        zone_file
+        for zone in zones
+        for zone_file in zone.get_zone_files(zone_names)
+    ]
+    executor = _zone_writers
+    if executor is None or len(zone_files) <= 1:
+        for target_path, parameters in zone_files:
+            _write_zone_file(target_path, parameters)
+        return
+    # Files are sent in chunks, a few per process, as most are small. The
+    # results come back in the order of the files, so the first file that
+    # could not be written is the one whose error is raised, whatever the
+    # order in which they're written.
+    chunksize = max(1, len(zone_files) // (_zone_writer_processes * 4))
+    for _ in executor.map(
+        _write_zone_file, *zip(*zone_files), chunksize=chunksize
+    ):
+        pass
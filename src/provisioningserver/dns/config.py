@@ -5,6 +5,7 @@
 
 __all__ = [
     "DNSConfig",
+    "execute_nsupdate_command",
     "MAAS_NAMED_CONF_OPTIONS_INSIDE_NAME",
     "set_up_rndc",
     "set_up_options_conf",
@@ -19,6 +20,7 @@ import os
 import os.path
 import re
 import sys
+from tempfile import NamedTemporaryFile
 
 from provisioningserver.logger import get_maas_logger
 from provisioningserver.utils import load_template, locate_config
@@ -34,6 +36,7 @@ MAAS_NAMED_CONF_NAME = "named.conf.maas"
 MAAS_NAMED_CONF_OPTIONS_INSIDE_NAME = "named.conf.options.inside.maas"
 MAAS_NAMED_RNDC_CONF_NAME = "named.conf.rndc.maas"
 MAAS_RNDC_CONF_NAME = "rndc.conf.maas"
+MAAS_RNDC_KEY_NAME = "rndc-maas-key"
 
 
 def get_dns_config_dir():
@@ -66,6 +69,12 @@ def get_dns_rndc_port():
     return int(setting)
 
 
+def get_dns_port():
+    """Port on which BIND answers queries and dynamic updates."""
+    setting = os.getenv("MAAS_DNS_PORT", "53")
+    return int(setting)
+
+
 def get_dns_default_controls():
     """Include the default RNDC controls (default RNDC key on port 953)?"""
     if running_in_snap():
@@ -119,7 +128,7 @@ def uncomment_named_conf(named_comment):
 
 
 def generate_rndc(
-    port=953, key_name="rndc-maas-key", include_default_controls=True
+    port=953, key_name=MAAS_RNDC_KEY_NAME, include_default_controls=True
 ):
     """Use `rndc-confgen` (from bind9utils) to generate a rndc+named
     configuration.
@@ -191,6 +200,39 @@ def execute_rndc_command(arguments, timeout=None):
     call_and_check(rndc_cmd, timeout=timeout)
 
 
+def get_rndc_key():
+    """Return the algorithm and secret of the key MAAS uses with BIND.
+
+    This is the key generated by `set_up_rndc`.
+    """
+    rndc_conf = read_isc_file(get_rndc_conf_path())
+    key = rndc_conf['key "%s"' % MAAS_RNDC_KEY_NAME]
+    return key["algorithm"], key["secret"].strip('"')
+
+
+def execute_nsupdate_command(zone_name, commands, timeout=None):
+    """Send a dynamic update (RFC 2136) for `zone_name` to BIND.
+
+    :param zone_name: The name of the zone to update.
+    :param commands: A list of `nsupdate` commands, like "update add ...",
+        making up the update. They are sent as one transaction.
+    """
+    algorithm, secret = get_rndc_key()
+    lines = [
+        "server 127.0.0.1 %d" % get_dns_port(),
+        "key %s:%s %s" % (algorithm, MAAS_RNDC_KEY_NAME, secret),
+        "zone %s." % zone_name,
+    ]
+    lines.extend(commands)
+    lines.append("send")
+    # Pass the commands in a file, rather than on the command line, so that
+    # the secret is not visible to other users.
+    with NamedTemporaryFile("w", encoding="ascii", prefix="nsupdate.") as f:
+        f.write("\n".join(lines) + "\n")
+        f.flush()
+        call_and_check(["nsupdate", f.name], timeout=timeout)
+
+
 def set_up_options_conf(overwrite=True, **kwargs):
     """Write out the named.conf.options.inside.maas file.
 
@@ -311,11 +353,14 @@ class DNSConfig:
             does not exist.
         """
         trusted_networks = kwargs.pop("trusted_networks", "")
+        dynamic_updates = kwargs.pop("dynamic_updates", False)
         context = {
             "zones": self.zones,
             "DNS_CONFIG_DIR": get_dns_config_dir(),
             "named_rndc_conf_path": get_named_rndc_conf_path(),
             "trusted_networks": trusted_networks,
+            "dynamic_updates": dynamic_updates,
+            "update_key_name": MAAS_RNDC_KEY_NAME,
             "modified": str(datetime.today()),
         }
         content = render_dns_template(self.template_file_name, kwargs, context)
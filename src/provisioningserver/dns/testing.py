@@ -6,6 +6,7 @@
 __all__ = [
     "patch_dns_config_path",
     "patch_dns_default_controls",
+    "patch_dns_port",
     "patch_dns_rndc_port",
 ]
 
@@ -23,6 +24,10 @@ def patch_dns_config_path(testcase, config_dir=None):
     return config_dir
 
 
+def patch_dns_port(testcase, port):
+    testcase.useFixture(EnvironmentVariable("MAAS_DNS_PORT", "%d" % port))
+
+
 def patch_dns_rndc_port(testcase, port):
     testcase.useFixture(EnvironmentVariable("MAAS_DNS_RNDC_PORT", "%d" % port))
 
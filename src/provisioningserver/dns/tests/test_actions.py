@@ -9,13 +9,17 @@ import os
 from os.path import join
 import random
 from random import randint
-from subprocess import CalledProcessError
+from subprocess import CalledProcessError, TimeoutExpired
 from textwrap import dedent
-from unittest.mock import call, sentinel
+from unittest.mock import ANY, call, sentinel
 
 from fixtures import FakeLogger
 from maastesting.factory import factory
-from maastesting.matchers import MockCalledOnceWith, MockCallsMatch
+from maastesting.matchers import (
+    MockCalledOnceWith,
+    MockCallsMatch,
+    MockNotCalled,
+)
 from maastesting.testcase import MAASTestCase
 from netaddr import IPNetwork
 from provisioningserver.dns import actions
@@ -30,7 +34,14 @@ from provisioningserver.dns.zoneconfig import (
     DNSReverseZoneConfig,
 )
 from provisioningserver.utils.shell import ExternalProcessError
-from testtools.matchers import AllMatch, Contains, FileContains, FileExists
+from testtools.matchers import (
+    AllMatch,
+    Contains,
+    FileContains,
+    FileExists,
+    HasLength,
+    Not,
+)
 
 
 class TestReconfigure(MAASTestCase):
@@ -132,7 +143,7 @@ class TestReloadZone(MAASTestCase):
         self.assertTrue(actions.bind_reload_zones(sentinel.zone))
         self.assertThat(
             actions.execute_rndc_command,
-            MockCalledOnceWith(("reload", sentinel.zone)),
+            MockCalledOnceWith(("reload", sentinel.zone), timeout=2),
         )
 
     def test__logs_subprocess_error(self):
@@ -151,6 +162,150 @@ class TestReloadZone(MAASTestCase):
         erc.side_effect = factory.make_CalledProcessError()
         self.assertFalse(actions.bind_reload_zones(sentinel.zone))
 
+    def test__false_on_timeout(self):
+        erc = self.patch_autospec(actions, "execute_rndc_command")
+        erc.side_effect = TimeoutExpired((), 2)
+        self.assertFalse(actions.bind_reload_zones(sentinel.zone))
+
+
+class TestReloadZoneWithRetries(MAASTestCase):
+    """Tests for :py:func:`actions.bind_reload_zones_with_retries`."""
+
+    def test__calls_bind_reload_zones_count_times(self):
+        self.patch_autospec(actions, "sleep")  # Disable.
+        bind_reload_zones = self.patch_autospec(actions, "bind_reload_zones")
+        bind_reload_zones.return_value = False
+        attempts = randint(3, 13)
+        self.assertFalse(
+            actions.bind_reload_zones_with_retries(
+                sentinel.zone, attempts=attempts, interval=sentinel.interval
+            )
+        )
+        expected_calls = [call(sentinel.zone, timeout=2)] * attempts
+        self.assertThat(bind_reload_zones, MockCallsMatch(*expected_calls))
+        expected_sleep_calls = [call(sentinel.interval)] * (attempts - 1)
+        self.assertThat(actions.sleep, MockCallsMatch(*expected_sleep_calls))
+
+    def test__returns_on_success(self):
+        self.patch_autospec(actions, "sleep")  # Disable.
+        bind_reload_zones = self.patch_autospec(actions, "bind_reload_zones")
+        bind_reload_zones.side_effect = [False, False, True]
+        self.assertTrue(
+            actions.bind_reload_zones_with_retries(sentinel.zone, attempts=5)
+        )
+        self.assertThat(bind_reload_zones.call_args_list, HasLength(3))
+
+
+class TestFreezeAndThawZones(MAASTestCase):
+    """Tests for `actions.bind_freeze_zones` and `actions.bind_thaw_zones`."""
+
+    scenarios = (
+        ("freeze", {"action": "bind_freeze_zones", "command": "freeze"}),
+        ("thaw", {"action": "bind_thaw_zones", "command": "thaw"}),
+    )
+
+    def test__executes_rndc_command(self):
+        self.patch_autospec(actions, "execute_rndc_command")
+        self.assertTrue(getattr(actions, self.action)())
+        self.assertThat(
+            actions.execute_rndc_command,
+            MockCalledOnceWith((self.command,), timeout=2),
+        )
+
+    def test__false_on_subprocess_error(self):
+        erc = self.patch_autospec(actions, "execute_rndc_command")
+        erc.side_effect = factory.make_CalledProcessError()
+        with FakeLogger("maas"):
+            self.assertFalse(getattr(actions, self.action)())
+
+
+class TestUpdateZone(MAASTestCase):
+    """Tests for :py:func:`actions.bind_update_zone`."""
+
+    def test__executes_nsupdate_command(self):
+        self.patch_autospec(actions, "execute_nsupdate_command")
+        self.assertTrue(
+            actions.bind_update_zone(
+                "example.com",
+                (30, "example.com. nobody.example.com. 5 600 1800 604800 30"),
+                {("old.example.com.", 30, "A", "10.0.0.1")},
+                {
+                    ("new.example.com.", 60, "A", "10.0.0.2"),
+                    ("new.example.com.", 60, "AAAA", "::2"),
+                },
+            )
+        )
+        self.assertThat(
+            actions.execute_nsupdate_command,
+            MockCalledOnceWith(
+                "example.com",
+                [
+                    "update delete old.example.com. A 10.0.0.1",
+                    "update add new.example.com. 60 A 10.0.0.2",
+                    "update add new.example.com. 60 AAAA ::2",
+                    "update add example.com. 30 SOA example.com. "
+                    "nobody.example.com. 5 600 1800 604800 30",
+                ],
+                timeout=2,
+            ),
+        )
+
+    def test__logs_subprocess_error(self):
+        erc = self.patch_autospec(actions, "execute_nsupdate_command")
+        erc.side_effect = factory.make_CalledProcessError()
+        with FakeLogger("maas") as logger:
+            self.assertFalse(
+                actions.bind_update_zone("example.com", (30, ""), (), ())
+            )
+        self.assertDocTestMatches(
+            "Updating BIND zone 'example.com' failed: "
+            "Command ... returned non-zero exit status ...",
+            logger.output,
+        )
+
+
+class TestGetZoneUpdateSize(MAASTestCase):
+    """Tests for :py:func:`actions.get_zone_update_size`."""
+
+    soa = (30, "example.com. nobody.example.com. 5 600 1800 604800 30")
+
+    def test__counts_header_zone_soa_and_signature(self):
+        # 12 bytes of header, 17 of zone section, 23 + 53 of SOA record.
+        self.assertEqual(
+            12 + 17 + 23 + 53 + actions._TSIG_RECORD_SIZE,
+            actions.get_zone_update_size("example.com", self.soa, (), ()),
+        )
+
+    def test__counts_records(self):
+        empty = actions.get_zone_update_size("example.com", self.soa, (), ())
+        size = actions.get_zone_update_size(
+            "example.com",
+            self.soa,
+            {("old.example.com.", 30, "A", "10.0.0.1")},
+            {
+                ("new.example.com.", 60, "AAAA", "::2"),
+                ("2.0.0.10.in-addr.arpa.", 60, "PTR", "new.example.com."),
+            },
+        )
+        self.assertEqual(empty + (27 + 4) + (27 + 16) + (33 + 17), size)
+
+
+class TestRemoveJournals(MAASTestCase):
+    """Tests for :py:func:`actions.bind_remove_journals`."""
+
+    def test__removes_existing_journals(self):
+        patch_dns_config_path(self)
+        zone = DNSReverseZoneConfig(
+            factory.make_name("domain"),
+            serial=random.randint(1, 100),
+            network=IPNetwork("10.0.0.0/23"),
+        )
+        first, second = zone.zone_info
+        factory.make_file(*os.path.split(first.target_path + ".jnl"))
+        actions.bind_remove_journals([zone])
+        self.assertFalse(os.path.exists(first.target_path + ".jnl"))
+        self.assertFalse(os.path.exists(second.target_path + ".jnl"))
+
 
 class TestConfiguration(MAASTestCase):
     """Tests for the `bind_write_*` functions."""
@@ -207,6 +362,25 @@ class TestConfiguration(MAASTestCase):
             expected_file, FileContains(matcher=Contains(expected_content))
         )
 
+    def test_bind_write_configuration_allows_dynamic_updates(self):
+        zones = [
+            DNSReverseZoneConfig(
+                factory.make_string(),
+                serial=random.randint(1, 100),
+                network=factory.make_ipv4_network(),
+            )
+        ]
+        actions.bind_write_configuration(
+            zones=zones, trusted_networks=[], dynamic_updates=True
+        )
+        expected_file = os.path.join(self.dns_conf_dir, MAAS_NAMED_CONF_NAME)
+        self.assertThat(
+            expected_file,
+            FileContains(
+                matcher=Contains('allow-update { key "rndc-maas-key"; };')
+            ),
+        )
+
     def test_bind_write_zones_writes_file(self):
         domain = factory.make_string()
         network = IPNetwork("192.168.0.3/24")
@@ -234,6 +408,90 @@ class TestConfiguration(MAASTestCase):
         ]
         self.assertThat(expected_files, AllMatch(FileExists()))
 
+    def test_bind_write_zones_writes_only_named_zones(self):
+        domain = factory.make_string()
+        network = IPNetwork("192.168.0.3/24")
+        forward_zone = DNSForwardZoneConfig(
+            domain, serial=random.randint(1, 100)
+        )
+        reverse_zone = DNSReverseZoneConfig(
+            domain, serial=random.randint(1, 100), network=network
+        )
+        actions.bind_write_zones(
+            zones=[forward_zone, reverse_zone],
+            zone_names={"0.168.192.in-addr.arpa"},
+        )
+
+        self.assertThat(
+            join(self.dns_conf_dir, "zone.%s" % domain), Not(FileExists())
+        )
+        self.assertThat(
+            join(self.dns_conf_dir, "zone.0.168.192.in-addr.arpa"),
+            FileExists(),
+        )
+
+    def test_bind_write_zones_writes_files_in_zone_writers(self):
+        actions.start_zone_writers(3)
+        self.addCleanup(actions.stop_zone_writers)
+        domain = factory.make_string()
+        network = IPNetwork("10.0.0.0/22")
+        forward_zone = DNSForwardZoneConfig(
+            domain, serial=random.randint(1, 100)
+        )
+        reverse_zone = DNSReverseZoneConfig(
+            domain, serial=random.randint(1, 100), network=network
+        )
+        actions.bind_write_zones(zones=[forward_zone, reverse_zone])
+
+        expected_files = [join(self.dns_conf_dir, "zone.%s" % domain)] + [
+            join(self.dns_conf_dir, "zone.%d.0.10.in-addr.arpa" % octet)
+            for octet in range(4)
+        ]
+        self.assertThat(expected_files, AllMatch(FileExists()))
+
+    def test_bind_write_zones_writes_single_file_in_process(self):
+        executor = self.patch(actions, "_zone_writers")
+        zone = DNSForwardZoneConfig(
+            factory.make_string(), serial=random.randint(1, 100)
+        )
+        actions.bind_write_zones(zones=[zone])
+        self.assertThat(executor.map, MockNotCalled())
+        self.assertThat(zone.zone_info[0].target_path, FileExists())
+
+    def test_start_zone_writers_spawns_processes(self):
+        executor = self.patch(actions, "ProcessPoolExecutor")
+        self.addCleanup(actions.stop_zone_writers)
+        actions.start_zone_writers(3)
+        self.assertThat(
+            executor, MockCalledOnceWith(max_workers=3, mp_context=ANY)
+        )
+        mp_context = executor.call_args[1]["mp_context"]
+        self.assertEqual("spawn", mp_context.get_start_method())
+
+    def test_start_zone_writers_with_zero_starts_one_per_cpu(self):
+        executor = self.patch(actions, "ProcessPoolExecutor")
+        self.addCleanup(actions.stop_zone_writers)
+        self.patch(actions.os, "cpu_count").return_value = 5
+        actions.start_zone_writers(0)
+        self.assertThat(
+            executor, MockCalledOnceWith(max_workers=5, mp_context=ANY)
+        )
+
+    def test_start_zone_writers_with_one_starts_none(self):
+        executor = self.patch(actions, "ProcessPoolExecutor")
+        actions.start_zone_writers(1)
+        self.assertThat(executor, MockNotCalled())
+        self.assertIsNone(actions._zone_writers)
+
+    def test_stop_zone_writers_shuts_processes_down(self):
+        executor = self.patch(actions, "ProcessPoolExecutor")
+        actions.start_zone_writers(3)
+        actions.stop_zone_writers()
+        self.assertThat(
+            executor.return_value.shutdown, MockCalledOnceWith(wait=False)
+        )
+        self.assertIsNone(actions._zone_writers)
+
     def test_bind_write_options_sets_up_config(self):
         # bind_write_configuration_and_zones writes the config file, writes
         # the zone files, and reloads the dns service.
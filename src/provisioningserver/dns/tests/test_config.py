@@ -23,6 +23,7 @@ from provisioningserver.dns.config import (
     DNSConfig,
     DNSConfigDirectoryMissing,
     DNSConfigFail,
+    execute_nsupdate_command,
     execute_rndc_command,
     extract_suggested_named_conf,
     generate_rndc,
@@ -310,6 +311,46 @@ class TestRNDCUtilities(MAASTestCase):
         self.assertEqual((expected_command,), recorder.calls[0][0])
         self.assertEqual({"timeout": sentinel.timeout}, recorder.calls[0][1])
 
+    def test_execute_nsupdate_command_sends_signed_update(self):
+        fake_dir = patch_dns_config_path(self)
+        factory.make_file(
+            location=fake_dir,
+            name=MAAS_RNDC_CONF_NAME,
+            contents=dedent(
+                """\
+                key "rndc-maas-key" {
+                    algorithm hmac-md5;
+                    secret "FAKE/secret==";
+                };
+                """
+            ),
+        )
+        self.useFixture(EnvironmentVariable("MAAS_DNS_PORT", "5353"))
+        sent = []
+
+        def call_and_check(command, timeout=None):
+            with open(command[-1], "r", encoding="ascii") as stream:
+                sent.append((command[:-1], stream.read(), timeout))
+
+        self.patch(config, "call_and_check", call_and_check)
+        execute_nsupdate_command(
+            "example.com",
+            ["update delete host.example.com. A 10.0.0.1"],
+            timeout=sentinel.timeout,
+        )
+        expected_update = dedent(
+            """\
+            server 127.0.0.1 5353
+            key hmac-md5:rndc-maas-key FAKE/secret==
+            zone example.com.
+            update delete host.example.com. A 10.0.0.1
+            send
+            """
+        )
+        self.assertEqual(
+            [(["nsupdate"], expected_update, sentinel.timeout)], sent
+        )
+
     def test_extract_suggested_named_conf_extracts_section(self):
         named_part = factory.make_string()
         # Actual rndc-confgen output, mildly mangled for testing purposes.
@@ -313,6 +313,108 @@ class TestDNSForwardZoneConfig(MAASTestCase):
         dns_zone_config.write_config()
         self.assertThat(get_generate_directives, MockNotCalled())
 
+    def test_get_records_returns_qualified_address_records(self):
+        domain = factory.make_name("domain")
+        hostname = factory.make_name("host")
+        mapping = {
+            hostname: HostnameIPMapping(None, 30, {"10.0.0.1", "2001:db8::1"})
+        }
+        other_mapping = {
+            "@": HostnameRRsetMapping(None, {(60, "A", "10.0.0.2")}),
+            "mail": HostnameRRsetMapping(None, {(60, "MX", "10 mx")}),
+        }
+        dns_zone_config = DNSForwardZoneConfig(
+            domain,
+            serial=random.randint(1, 100),
+            mapping=mapping,
+            other_mapping=other_mapping,
+        )
+        self.assertEqual(
+            {
+                domain: {
+                    ("%s.%s." % (hostname, domain), 30, "A", "10.0.0.1"),
+                    ("%s.%s." % (hostname, domain), 30, "AAAA", "2001:db8::1"),
+                    ("%s." % domain, 60, "A", "10.0.0.2"),
+                }
+            },
+            dns_zone_config.get_records(),
+        )
+
+    def test_get_structure_changes_with_non_address_records(self):
+        domain = factory.make_name("domain")
+        dns_zone_config = DNSForwardZoneConfig(
+            domain,
+            serial=random.randint(1, 100),
+            mapping={"host": HostnameIPMapping(None, 30, {"10.0.0.1"})},
+            other_mapping={},
+        )
+        other_zone_config = DNSForwardZoneConfig(
+            domain,
+            serial=random.randint(1, 100),
+            mapping={"host": HostnameIPMapping(None, 30, {"10.0.0.2"})},
+            other_mapping={
+                "mail": HostnameRRsetMapping(None, {(60, "MX", "10 mx")})
+            },
+        )
+        self.assertEqual(
+            dns_zone_config.get_structure(),
+            DNSForwardZoneConfig(
+                domain,
+                serial=random.randint(1, 100),
+                mapping={"host": HostnameIPMapping(None, 30, {"10.0.0.2"})},
+            ).get_structure(),
+        )
+        self.assertNotEqual(
+            dns_zone_config.get_structure(), other_zone_config.get_structure()
+        )
+
+    def test_get_soa_matches_zone_file(self):
+        domain = factory.make_name("domain")
+        serial = random.randint(1, 100)
+        dns_zone_config = DNSForwardZoneConfig(
+            domain, serial=serial, default_ttl=42
+        )
+        self.assertEqual(
+            (
+                42,
+                "%s. nobody.example.com. %d 600 1800 604800 42"
+                % (domain, serial),
+            ),
+            dns_zone_config.get_soa(),
+        )
+
+    def test_get_fingerprints_ignores_serial(self):
+        domain = factory.make_name("domain")
+        mapping = {"host": HostnameIPMapping(None, 30, {"10.0.0.1"})}
+        other_mapping = {
+            "mail": HostnameRRsetMapping(None, {(60, "MX", "10 mx")})
+        }
+        fingerprints = DNSForwardZoneConfig(
+            domain, serial=1, mapping=mapping, other_mapping=other_mapping
+        ).get_fingerprints()
+        self.assertEqual([domain], list(fingerprints))
+        self.assertEqual(
+            fingerprints,
+            DNSForwardZoneConfig(
+                domain, serial=2, mapping=mapping, other_mapping=other_mapping
+            ).get_fingerprints(),
+        )
+
+    def test_get_fingerprints_changes_with_records(self):
+        domain = factory.make_name("domain")
+        self.assertNotEqual(
+            DNSForwardZoneConfig(
+                domain,
+                serial=1,
+                mapping={"host": HostnameIPMapping(None, 30, {"10.0.0.1"})},
+            ).get_fingerprints(),
+            DNSForwardZoneConfig(
+                domain,
+                serial=1,
+                mapping={"host": HostnameIPMapping(None, 30, {"10.0.0.2"})},
+            ).get_fingerprints(),
+        )
+
     def test_config_file_is_world_readable(self):
         patch_dns_config_path(self)
         dns_zone_config = DNSForwardZoneConfig(
@@ -545,6 +647,141 @@ class TestDNSReverseZoneConfig(MAASTestCase):
             expected, DNSReverseZoneConfig.get_PTR_mapping(mapping, network)
         )
 
+    def test_get_zone_files_returns_ptr_mapping_of_each_zone(self):
+        network = IPNetwork("10.0.0.0/22")
+        # The mapping is shared by all reverse zones, so it holds addresses
+        # outside the network too.
+        mapping = {
+            factory.make_name("host"): HostnameIPMapping(
+                None, 30, {factory.pick_ip_in_network(IPNetwork(cidr))}
+            )
+            for cidr in ["10.0.0.0/21"] * 20 + ["2001:db8::/64"] * 5
+        }
+        dns_zone_config = DNSReverseZoneConfig(
+            factory.make_name("domain"),
+            serial=random.randint(1, 100),
+            mapping=mapping,
+            network=network,
+        )
+        zone_files = dns_zone_config.get_zone_files()
+        self.assertEqual(
+            [zi.target_path for zi in dns_zone_config.zone_info],
+            [target_path for target_path, _ in zone_files],
+        )
+        for zi, (_, (_, parameters)) in zip(
+            dns_zone_config.zone_info, zone_files
+        ):
+            self.assertItemsEqual(
+                DNSReverseZoneConfig.get_PTR_mapping(mapping, zi.subnetwork),
+                parameters["mappings"]["PTR"],
+            )
+
+    def test_get_records_returns_ptr_records_by_zone(self):
+        network = IPNetwork("10.0.0.0/23")
+        mapping = {
+            "first.example.com": HostnameIPMapping(None, 30, {"10.0.0.1"}),
+            "second.example.com": HostnameIPMapping(None, 30, {"10.0.1.2"}),
+        }
+        dns_zone_config = DNSReverseZoneConfig(
+            factory.make_name("domain"),
+            serial=random.randint(1, 100),
+            mapping=mapping,
+            network=network,
+        )
+        self.assertEqual(
+            {
+                "0.0.10.in-addr.arpa": {
+                    (
+                        "1.0.0.10.in-addr.arpa.",
+                        30,
+                        "PTR",
+                        "first.example.com.",
+                    )
+                },
+                "1.0.10.in-addr.arpa": {
+                    (
+                        "2.1.0.10.in-addr.arpa.",
+                        30,
+                        "PTR",
+                        "second.example.com.",
+                    )
+                },
+            },
+            dns_zone_config.get_records(),
+        )
+
+    def test_get_records_returns_ptr_mapping_of_each_zone(self):
+        network = IPNetwork("10.0.0.0/22")
+        mapping = {
+            factory.make_name("host"): HostnameIPMapping(
+                None, 30, {factory.pick_ip_in_network(IPNetwork(cidr))}
+            )
+            for cidr in ["10.0.0.0/21"] * 20 + ["2001:db8::/64"] * 5
+        }
+        dns_zone_config = DNSReverseZoneConfig(
+            factory.make_name("domain"),
+            serial=random.randint(1, 100),
+            mapping=mapping,
+            network=network,
+        )
+        self.assertEqual(
+            {
+                zi.zone_name: {
+                    ("%s.%s." % (name, zi.zone_name), ttl, "PTR", hostname)
+                    for name, ttl, hostname in (
+                        DNSReverseZoneConfig.get_PTR_mapping(
+                            mapping, zi.subnetwork
+                        )
+                    )
+                }
+                for zi in dns_zone_config.zone_info
+            },
+            dns_zone_config.get_records(),
+        )
+
+    def test_get_structure_ignores_ptr_records(self):
+        network = IPNetwork("10.0.0.0/24")
+        domain = factory.make_name("domain")
+        dns_zone_config = DNSReverseZoneConfig(
+            domain,
+            serial=random.randint(1, 100),
+            mapping={
+                "host.example.com": HostnameIPMapping(None, 30, {"10.0.0.1"})
+            },
+            network=network,
+        )
+        self.assertEqual(
+            DNSReverseZoneConfig(
+                domain, serial=random.randint(1, 100), network=network
+            ).get_structure(),
+            dns_zone_config.get_structure(),
+        )
+
+    def test_get_fingerprints_only_change_for_changed_zones(self):
+        network = IPNetwork("10.0.0.0/23")
+        domain = factory.make_name("domain")
+
+        def get_fingerprints(serial, ip):
+            mapping = {
+                "first.example.com": HostnameIPMapping(None, 30, {"10.0.0.1"}),
+                "second.example.com": HostnameIPMapping(None, 30, {ip}),
+            }
+            return DNSReverseZoneConfig(
+                domain, serial=serial, mapping=mapping, network=network
+            ).get_fingerprints()
+
+        before = get_fingerprints(1, "10.0.1.1")
+        after = get_fingerprints(2, "10.0.1.2")
+        self.assertItemsEqual(
+            ["0.0.10.in-addr.arpa", "1.0.10.in-addr.arpa"], after
+        )
+        self.assertEqual(
+            before["0.0.10.in-addr.arpa"], after["0.0.10.in-addr.arpa"]
+        )
+        self.assertNotEqual(
+            before["1.0.10.in-addr.arpa"], after["1.0.10.in-addr.arpa"]
+        )
+
     def test_writes_dns_zone_config_with_NS_record(self):
         target_dir = patch_dns_config_path(self)
         network = factory.make_ipv4_network()
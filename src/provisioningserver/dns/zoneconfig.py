@@ -5,7 +5,9 @@
 
 __all__ = ["DNSForwardZoneConfig", "DNSReverseZoneConfig", "DomainInfo"]
 
+from bisect import bisect_right
 from datetime import datetime
+from hashlib import sha256
 from itertools import chain
 
 from netaddr import IPAddress, IPNetwork, spanning_cidr
@@ -53,6 +55,30 @@ def enumerate_rrset_mapping(mapping):
             yield hostname, value[0], value[1], value[2]
 
 
+def qualify_name(name, zone_name):
+    """Return `name`, relative to `zone_name`, as a fully-qualified name."""
+    if name == "@":
+        return "%s." % zone_name
+    elif name.endswith("."):
+        return name
+    else:
+        return "%s.%s." % (name, zone_name)
+
+
+def canonical_repr(value):
+    """Return a `repr` of `value` that is the same for equal values.
+
+    Sets are not ordered, so their members are sorted by their own
+    canonical representation.
+    """
+    if isinstance(value, (set, frozenset)):
+        return "{%s}" % ", ".join(sorted(map(canonical_repr, value)))
+    elif isinstance(value, (list, tuple)):
+        return "(%s)" % ", ".join(map(canonical_repr, value))
+    else:
+        return repr(value)
+
+
 def get_details_for_ip_range(ip_range):
     """For a given IPRange, return all subnets, a useable prefix and the
     reverse DNS suffix calculated from that IP range.
@@ -155,6 +181,84 @@ class DomainConfigBase:
             "ns_host_name": self.ns_host_name,
         }
 
+    def get_soa(self):
+        """Return `(ttl, rrdata)` of the SOA record in the zone files."""
+        return (
+            self.default_ttl,
+            "%s. nobody.example.com. %s 600 1800 604800 %s"
+            % (self.domain, self.serial, self.default_ttl),
+        )
+
+    def get_records(self):
+        """Return the address records in each of the zones.
+
+        These are the records that can be changed with dynamic updates. All
+        other content is returned by `get_structure`.
+
+        :return: A dict mapping zone names to frozensets of
+            `(name, ttl, rrtype, rrdata)` tuples, with fully-qualified names.
+        """
+        raise NotImplementedError()
+
+    def get_structure(self):
+        """Return the content, other than address records, of each zone.
+
+        A change to any of it needs the zone file to be rewritten.
+
+        :return: A dict mapping zone names to hashable values.
+        """
+        raise NotImplementedError()
+
+    def get_fingerprints(self):
+        """Return a fingerprint of the content of each of the zones.
+
+        The serial is not part of it, so a zone whose fingerprint has not
+        changed does not need to be rewritten or reloaded.
+
+        :return: A dict mapping zone names to hex digests.
+        """
+        structure, records = self.get_structure(), self.get_records()
+        return {
+            zone_name: sha256(
+                canonical_repr(
+                    (structure[zone_name], records[zone_name])
+                ).encode("utf-8")
+            ).hexdigest()
+            for zone_name in structure
+        }
+
+    def _get_zone_info(self, zone_names=None):
+        """Return the `DomainInfo` of the zones in `zone_names`, or of all
+        zones if `zone_names` is `None`."""
+        return [
+            zi
+            for zi in self.zone_info
+            if zone_names is None or zi.zone_name in zone_names
+        ]
+
+    def get_zone_files(self, zone_names=None):
+        """Return the content of the zone files, to pass to
+        `write_zone_file`.
+
+        It's only made of plain data, so that the files can be rendered and
+        written in other processes.
+
+        :param zone_names: The names of the zones to return, or `None` to
+            return all of them.
+        :return: A list of `(target_path, parameters)` tuples, where
+            `parameters` is a tuple of the template parameters.
+        """
+        raise NotImplementedError()
+
+    def write_config(self, zone_names=None):
+        """Write the zone files.
+
+        :param zone_names: The names of the zones to write, or `None` to
+            write all of them.
+        """
+        for target_path, parameters in self.get_zone_files(zone_names):
+            self.write_zone_file(target_path, *parameters)
+
     @classmethod
     def write_zone_file(cls, output_file, *parameters):
         """Write a zone file based on the zone file template.
@@ -282,33 +386,85 @@ class DNSForwardZoneConfig(DomainConfigBase):
 
         return sorted(generate_directives, key=lambda directive: directive[2])
 
-    def write_config(self):
-        """Write the zone file."""
-        # Create GENERATE directives for IPv4 ranges.
-        for zi in self.zone_info:
-            generate_directives = list(
-                chain.from_iterable(
-                    self.get_GENERATE_directives(dynamic_range)
-                    for dynamic_range in self._dynamic_ranges
-                    if dynamic_range.version == 4
-                )
+    def _get_other_records(self):
+        """Split `other_mapping` into address and other records."""
+        addresses, others = set(), set()
+        for record in enumerate_rrset_mapping(self._other_mapping):
+            if record[2] in ("A", "AAAA"):
+                addresses.add(record)
+            else:
+                others.add(record)
+        return addresses, others
+
+    def get_records(self):
+        """See `DomainConfigBase.get_records`."""
+        records = {
+            (hostname, ttl, "A", ip)
+            for hostname, ttl, ip in self.get_A_mapping(
+                self._mapping, self._ipv4_ttl
             )
-            self.write_zone_file(
-                zi.target_path,
-                self.make_parameters(),
-                {
-                    "mappings": {
-                        "A": self.get_A_mapping(self._mapping, self._ipv4_ttl),
-                        "AAAA": self.get_AAAA_mapping(
-                            self._mapping, self._ipv6_ttl
-                        ),
-                    },
-                    "other_mapping": enumerate_rrset_mapping(
-                        self._other_mapping
-                    ),
-                    "generate_directives": {"A": generate_directives},
-                },
+        }
+        records.update(
+            (hostname, ttl, "AAAA", ip)
+            for hostname, ttl, ip in self.get_AAAA_mapping(
+                self._mapping, self._ipv6_ttl
+            )
+        )
+        records.update(self._get_other_records()[0])
+        return {
+            zi.zone_name: frozenset(
+                (qualify_name(name, zi.zone_name), ttl, rrtype, rrdata)
+                for name, ttl, rrtype, rrdata in records
+            )
+            for zi in self.zone_info
+        }
+
+    def get_structure(self):
+        """See `DomainConfigBase.get_structure`."""
+        return {
+            zi.zone_name: (
+                self.default_ttl,
+                self.ns_ttl,
+                self.ns_host_name,
+                frozenset(self._get_other_records()[1]),
+                tuple(self._get_generate_directives()),
             )
+            for zi in self.zone_info
+        }
+
+    def _get_generate_directives(self):
+        """Return the GENERATE directives for the IPv4 dynamic ranges."""
+        return list(
+            chain.from_iterable(
+                self.get_GENERATE_directives(dynamic_range)
+                for dynamic_range in self._dynamic_ranges
+                if dynamic_range.version == 4
+            )
+        )
+
+    def get_zone_files(self, zone_names=None):
+        """See `DomainConfigBase.get_zone_files`."""
+        zone_info = self._get_zone_info(zone_names)
+        if len(zone_info) == 0:
+            return []
+        # Create GENERATE directives for IPv4 ranges.
+        generate_directives = self._get_generate_directives()
+        parameters = {
+            "mappings": {
+                "A": list(self.get_A_mapping(self._mapping, self._ipv4_ttl)),
+                "AAAA": list(
+                    self.get_AAAA_mapping(self._mapping, self._ipv6_ttl)
+                ),
+            },
+            "other_mapping": list(
+                enumerate_rrset_mapping(self._other_mapping)
+            ),
+            "generate_directives": {"A": generate_directives},
+        }
+        return [
+            (zi.target_path, (self.make_parameters(), parameters))
+            for zi in zone_info
+        ]
 
 
 class DNSReverseZoneConfig(DomainConfigBase):
@@ -441,6 +597,17 @@ class DNSReverseZoneConfig(DomainConfigBase):
         :param network: DNS Zone's network. (Not a supernet.)
         :type network: :class:`netaddr.IPNetwork`
         """
+        if mapping is None:
+            return ()
+        return cls._get_PTR_records(enumerate_ip_mapping(mapping), network)
+
+    @classmethod
+    def _get_PTR_records(cls, addresses, network):
+        """Return the PTR records for the `(hostname, ttl, ip)` tuples of
+        `addresses` that are in `network`.
+
+        See `get_PTR_mapping`.
+        """
 
         def short_name(ip, network):
             long_name = IPAddress(ip).reverse_dns
@@ -454,11 +621,9 @@ class DNSReverseZoneConfig(DomainConfigBase):
                 )
             return short_name
 
-        if mapping is None:
-            return ()
         return (
             (short_name(ip, network), ttl, "%s." % hostname)
-            for hostname, ttl, ip in enumerate_ip_mapping(mapping)
+            for hostname, ttl, ip in addresses
             # Filter out the IP addresses that are not in `network`.
             if IPAddress(ip) in network
         )
@@ -536,34 +701,92 @@ class DNSReverseZoneConfig(DomainConfigBase):
                 generate_directives.add((iterator, "${0,1,x}", hostname))
         return sorted(generate_directives)
 
-    def write_config(self):
-        """Write the zone file."""
-        # Create GENERATE directives for IPv4 ranges.
-        for zi in self.zone_info:
-            generate_directives = list(
-                chain.from_iterable(
-                    self.get_GENERATE_directives(
-                        dynamic_range, self.domain, zi
+    def _get_generate_directives(self, zone_info):
+        """Return the GENERATE directives for the IPv4 dynamic ranges in the
+        zone described by `zone_info`."""
+        return list(
+            chain.from_iterable(
+                self.get_GENERATE_directives(
+                    dynamic_range, self.domain, zone_info
+                )
+                for dynamic_range in self._dynamic_ranges
+                if dynamic_range.version == 4
+            )
+        )
+
+    def get_records(self):
+        """See `DomainConfigBase.get_records`."""
+        addresses = self._get_addresses_by_zone(self.zone_info)
+        return {
+            zi.zone_name: frozenset(
+                (qualify_name(name, zi.zone_name), ttl, "PTR", hostname)
+                for name, ttl, hostname in self._get_PTR_records(
+                    addresses[zi.zone_name], zi.subnetwork
+                )
+            )
+            for zi in self.zone_info
+        }
+
+    def get_structure(self):
+        """See `DomainConfigBase.get_structure`."""
+        return {
+            zi.zone_name: (
+                self.default_ttl,
+                self.ns_ttl,
+                self.ns_host_name,
+                tuple(self._get_generate_directives(zi)),
+                tuple(
+                    self.get_rfc2317_GENERATE_directives(
+                        zi.subnetwork, self._rfc2317_ranges, self.domain
                     )
-                    for dynamic_range in self._dynamic_ranges
-                    if dynamic_range.version == 4
+                ),
+            )
+            for zi in self.zone_info
+        }
+
+    def _get_addresses_by_zone(self, zone_info):
+        """Return the `(hostname, ttl, ip)` tuples of the mapping that are in
+        each of the zones of `zone_info`, by zone name.
+
+        The mapping is shared by all the reverse zones of the region, so it
+        is gone through once, rather than once for each zone.
+        """
+        addresses = {zi.zone_name: [] for zi in zone_info}
+        if self._mapping is None or len(zone_info) == 0:
+            return addresses
+        # The zones are in the order of their subnetworks, which don't
+        # overlap.
+        firsts = [zi.subnetwork.first for zi in zone_info]
+        for hostname, ttl, ip in enumerate_ip_mapping(self._mapping):
+            address = IPAddress(ip)
+            index = bisect_right(firsts, address.value) - 1
+            if index >= 0 and address in zone_info[index].subnetwork:
+                addresses[zone_info[index].zone_name].append(
+                    (hostname, ttl, ip)
                 )
+        return addresses
+
+    def get_zone_files(self, zone_names=None):
+        """See `DomainConfigBase.get_zone_files`."""
+        zone_info = self._get_zone_info(zone_names)
+        addresses = self._get_addresses_by_zone(zone_info)
+        zone_files = []
+        for zi in zone_info:
+            ptr_records = self._get_PTR_records(
+                addresses[zi.zone_name], zi.subnetwork
             )
-            self.write_zone_file(
-                zi.target_path,
-                self.make_parameters(),
-                {
-                    "mappings": {
-                        "PTR": self.get_PTR_mapping(
-                            self._mapping, zi.subnetwork
-                        )
-                    },
-                    "other_mapping": [],
-                    "generate_directives": {
-                        "PTR": generate_directives,
-                        "CNAME": self.get_rfc2317_GENERATE_directives(
-                            zi.subnetwork, self._rfc2317_ranges, self.domain
-                        ),
-                    },
+            parameters = {
+                "mappings": {"PTR": list(ptr_records)},
+                "other_mapping": [],
+                # Create GENERATE directives for IPv4 ranges.
+                "generate_directives": {
+                    "PTR": self._get_generate_directives(zi),
+                    "CNAME": self.get_rfc2317_GENERATE_directives(
+                        zi.subnetwork, self._rfc2317_ranges, self.domain
+                    ),
                 },
+            }
+            zone_files.append(
+                (zi.target_path, (self.make_parameters(), parameters))
             )
+        return zone_files
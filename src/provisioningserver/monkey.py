@@ -27,6 +27,8 @@ def fix_tftp_requests():
     """Use intelligence in determining IPv4 vs IPv6 when creatinging a session.
 
        Specifically, look at addr[0] and pass iface to listenUDP based on that.
+       Read sessions are created with `read_session_factory`, so that the
+       MAAS TFTP server can pick the session for each request.
 
        See https://bugs.launchpad.net/ubuntu/+source/python-tx-tftp/1614581
     """
@@ -121,13 +123,15 @@ def fix_tftp_requests():
             elif datagram.opcode == OP_RRQ:
                 if mode == b"netascii":
                     fs_interface = NetasciiSenderProxy(fs_interface)
-                session = RemoteOriginReadSession(
+                session = self.read_session_factory(
                     addr, fs_interface, datagram.options, _clock=self._clock
                 )
                 reactor.listenUDP(0, session, iface)
                 returnValue(session)
 
     tftp.protocol.TFTP._startSession = new_startSession
+    # Subclasses can create read sessions of their own.
+    tftp.protocol.TFTP.read_session_factory = RemoteOriginReadSession
 
 
 def get_patched_URI():
@@ -32,6 +32,16 @@ METRICS_DEFINITIONS = [
         "Latency of TFTP file downloads",
         ["filename"],
     ),
+    MetricDefinition(
+        "Counter",
+        "maas_rack_boot_config_cache_hits",
+        "Number of boot configurations found in the rack cache",
+    ),
+    MetricDefinition(
+        "Counter",
+        "maas_rack_boot_config_cache_misses",
+        "Number of boot configurations requested from the region",
+    ),
     # regiond metrics
     MetricDefinition(
         "Histogram",
@@ -84,6 +94,37 @@ METRICS_DEFINITIONS = [
         "HTTP request query latency",
         _WEBSOCKET_CALL_LABELS,
     ),
+    MetricDefinition(
+        "Histogram",
+        "maas_websocket_call_db_time",
+        "Total time spent in database queries by a Websocket call",
+        _WEBSOCKET_CALL_LABELS,
+    ),
+    MetricDefinition(
+        "Histogram",
+        "maas_websocket_call_dehydrate_time",
+        "Time spent dehydrating objects by a Websocket call",
+        _WEBSOCKET_CALL_LABELS,
+    ),
+    MetricDefinition(
+        "Histogram",
+        "maas_websocket_call_payload_bytes",
+        "Size of the result of a Websocket call, before compression",
+        _WEBSOCKET_CALL_LABELS,
+        buckets=[1024, 10240, 102400, 1048576, 10485760],
+    ),
+    MetricDefinition(
+        "Counter",
+        "maas_websocket_notifications",
+        "Number of database notifications received by the websocket",
+        ["handler"],
+    ),
+    MetricDefinition(
+        "Counter",
+        "maas_websocket_notifications_coalesced",
+        "Number of websocket notifications coalesced with a pending one",
+        ["handler"],
+    ),
     # Common metrics
     *node_metrics_definitions(),
 ]
@@ -9,6 +9,7 @@ from collections import defaultdict
 from datetime import timedelta
 import os
 import sys
+from urllib.parse import quote
 
 import attr
 from netaddr import IPAddress
@@ -29,6 +30,7 @@ from twisted.internet.defer import maybeDeferred
 from twisted.internet.task import deferLater
 from twisted.internet.threads import deferToThread
 from twisted.python import context
+from twisted.python.filepath import FilePath
 from twisted.web import resource
 from twisted.web.server import NOT_DONE_YET
 from twisted.web.static import NoRangeStaticProducer
@@ -36,6 +38,10 @@ from twisted.web.static import NoRangeStaticProducer
 
 log = LegacyLogger()
 
+# The internal location of nginx serving the boot resources, for
+# `X-Accel-Redirect`. See rackd.nginx.conf.template.
+BOOT_RESOURCES_LOCATION = "/boot-resources/"
+
 
 def get_http_config_dir():
     """Location of MAAS' http configuration files."""
@@ -283,7 +289,25 @@ class HTTPBootResource(resource.Resource):
                 request.write(str(failure.value).encode("utf-8"))
             request.finish()
 
+        def redirectToResource(file_path):
+            # Static files are sent by nginx, which handles `Range` and
+            # `If-None-Match` requests and uses sendfile. Only the response
+            # headers go through rackd.
+            segments = file_path.asTextMode().segmentsFrom(
+                tftp.backend.base.asTextMode()
+            )
+            request.setHeader(
+                b"X-Accel-Redirect",
+                quote(BOOT_RESOURCES_LOCATION + "/".join(segments)).encode(
+                    "ascii"
+                ),
+            )
+            request.finish()
+
         def writeResponse(reader):
+            if isinstance(reader, FilePath):
+                return redirectToResource(reader)
+
             # Some readers from `tftp` do not provide a way to get the size
             # of the generated content. Only set `Content-Length` when size
             # can be determined for the response.
@@ -306,7 +330,7 @@ class HTTPBootResource(resource.Resource):
                 "local": (localHost, localPort),
                 "remote": (remoteHost, remotePort),
             },
-            tftp.backend.get_reader,
+            tftp.backend.get_path_or_reader,
             path,
             skip_logging=True,
         )
@@ -12,12 +12,13 @@ import os
 from provisioningserver.logger import get_maas_logger
 from provisioningserver.path import get_data_path
 from provisioningserver.rpc.exceptions import NoConnectionsAvailable
-from provisioningserver.rpc.region import UpdateLease
+from provisioningserver.rpc.region import UpdateLease, UpdateLeases
 from provisioningserver.utils.twisted import pause, retries
 from twisted.application.service import Service
 from twisted.internet import reactor, task
 from twisted.internet.defer import inlineCallbacks
 from twisted.internet.protocol import DatagramProtocol
+from twisted.protocols.amp import UnhandledCommand
 
 
 maaslog = get_maas_logger("lease_socket_service")
@@ -34,6 +35,9 @@ class LeaseSocketService(Service, DatagramProtocol):
     # None, or a Deferred that will fire when the processor exits.
     done = None
 
+    # The most notifications to send to the region in one batch.
+    batch_size = 100
+
     def __init__(self, client_service, reactor):
         self.client_service = client_service
         self.reactor = reactor
@@ -85,20 +89,27 @@ class LeaseSocketService(Service, DatagramProtocol):
         self.notifications.append(notification)
 
     def processNotifications(self, clock=reactor):
-        """Process all notifications."""
+        """Process all notifications.
+
+        The notifications received since the last run, which is at most 0.1
+        seconds ago, are sent to the region in batches of `batch_size`.
+        """
 
-        def gen_notifications(notifications):
+        def gen_batches(notifications):
             while len(notifications) != 0:
-                yield notifications.popleft()
+                yield [
+                    notifications.popleft()
+                    for _ in range(min(len(notifications), self.batch_size))
+                ]
 
         return task.coiterate(
-            self.processNotification(notification, clock=clock)
-            for notification in gen_notifications(self.notifications)
+            self.processNotificationBatch(notifications, clock=clock)
+            for notifications in gen_batches(self.notifications)
         )
 
     @inlineCallbacks
-    def processNotification(self, notification, clock=reactor):
-        """Send a notification to the region."""
+    def processNotificationBatch(self, notifications, clock=reactor):
+        """Send a batch of notifications to the region."""
         client = None
         for elapsed, remaining, wait in retries(30, 10, clock):
             try:
@@ -113,8 +124,31 @@ class LeaseSocketService(Service, DatagramProtocol):
             )
             return
 
-        # Notification contains all the required data except for the cluster
-        # UUID. Add that into the notification and send the information to
-        # the region for processing.
-        notification["cluster_uuid"] = client.localIdent
-        yield client(UpdateLease, **notification)
+        # Notifications contain all the required data except for the cluster
+        # UUID, which is sent once for the batch.
+        try:
+            response = yield client(
+                UpdateLeases,
+                cluster_uuid=client.localIdent,
+                leases=notifications,
+            )
+        except UnhandledCommand:
+            # The region is older than 2.7; send the notifications one at a
+            # time instead.
+            for notification in notifications:
+                yield client(
+                    UpdateLease, cluster_uuid=client.localIdent, **notification
+                )
+            return
+
+        for failure in response["failures"]:
+            notification = notifications[failure["index"]]
+            maaslog.error(
+                "Failed to update DHCP lease (%s of %s for %s): %s"
+                % (
+                    notification.get("action"),
+                    notification.get("ip"),
+                    notification.get("mac"),
+                    failure["error"],
+                )
+            )
@@ -31,6 +31,7 @@ from tftp.errors import AccessViolation, FileNotFound
 from twisted.application.service import Service
 from twisted.internet import reactor
 from twisted.internet.defer import fail, inlineCallbacks, succeed
+from twisted.python.filepath import FilePath
 from twisted.web.http_headers import Headers
 from twisted.web.server import NOT_DONE_YET, Request
 from twisted.web.test.test_web import DummyChannel, DummyRequest
@@ -147,6 +148,16 @@ class TestRackHTTPService(MAASTestCase):
                 matcher=Contains("proxy_pass http://maas-regions/MAAS/;")
             ),
         )
+        self.assertThat(
+            target_path,
+            FileContains(
+                matcher=Contains(
+                    "location %s {\n        internal;\n"
+                    "        alias %s;\n"
+                    % (http.BOOT_RESOURCES_LOCATION, resource_root)
+                )
+            ),
+        )
         self.assertThat(mock_reloadService, MockCalledOnceWith("http"))
 
         # If the configuration has not changed then a second call to
@@ -356,7 +367,7 @@ class TestHTTPBootResource(MAASTestCase):
         self.tftp = Service()
         self.tftp.setName("tftp")
         self.tftp.backend = Mock()
-        self.tftp.backend.get_reader = Mock()
+        self.tftp.backend.get_path_or_reader = Mock()
         self.tftp.setServiceParent(services)
 
         def teardown():
@@ -474,7 +485,9 @@ class TestHTTPBootResource(MAASTestCase):
         mock_deferLater = self.patch(http, "deferLater")
         mock_deferLater.side_effect = always_succeed_with(None)
 
-        self.tftp.backend.get_reader.return_value = fail(AccessViolation())
+        self.tftp.backend.get_path_or_reader.return_value = fail(
+            AccessViolation()
+        )
 
         resource = http.HTTPBootResource()
         yield self.render_GET(resource, request)
@@ -500,7 +513,9 @@ class TestHTTPBootResource(MAASTestCase):
         mock_deferLater = self.patch(http, "deferLater")
         mock_deferLater.side_effect = always_succeed_with(None)
 
-        self.tftp.backend.get_reader.return_value = fail(FileNotFound(path))
+        self.tftp.backend.get_path_or_reader.return_value = fail(
+            FileNotFound(path)
+        )
 
         resource = http.HTTPBootResource()
         yield self.render_GET(resource, request)
@@ -527,7 +542,7 @@ class TestHTTPBootResource(MAASTestCase):
         mock_deferLater.side_effect = always_succeed_with(None)
 
         exc = factory.make_exception("internal error")
-        self.tftp.backend.get_reader.return_value = fail(exc)
+        self.tftp.backend.get_path_or_reader.return_value = fail(exc)
 
         resource = http.HTTPBootResource()
         yield self.render_GET(resource, request)
@@ -555,7 +570,7 @@ class TestHTTPBootResource(MAASTestCase):
 
         content = factory.make_string(size=100).encode("utf-8")
         reader = BytesReader(content)
-        self.tftp.backend.get_reader.return_value = succeed(reader)
+        self.tftp.backend.get_path_or_reader.return_value = succeed(reader)
 
         resource = http.HTTPBootResource()
         yield self.render_GET(resource, request)
@@ -565,6 +580,40 @@ class TestHTTPBootResource(MAASTestCase):
         )
         self.assertEquals(content, b"".join(request.written))
 
+    @inlineCallbacks
+    def test_render_GET_redirects_to_nginx_for_static_file(self):
+        base = FilePath(self.make_dir())
+        base.child("ubuntu").makedirs()
+        file_path = base.child("ubuntu").child("boot-kernel")
+        file_path.setContent(factory.make_bytes())
+        self.tftp.backend.base = base
+        request = DummyRequest([b"ubuntu", b"boot-kernel"])
+        request.requestHeaders = Headers(
+            {
+                "X-Server-Addr": ["192.168.1.1"],
+                "X-Server-Port": ["5248"],
+                "X-Forwarded-For": [factory.make_ip_address()],
+                "X-Forwarded-Port": ["%s" % factory.pick_port()],
+            }
+        )
+
+        self.patch(http.log, "info")
+        mock_deferLater = self.patch(http, "deferLater")
+        mock_deferLater.side_effect = always_succeed_with(None)
+
+        self.tftp.backend.get_path_or_reader.return_value = succeed(
+            file_path
+        )
+
+        resource = http.HTTPBootResource()
+        yield self.render_GET(resource, request)
+
+        self.assertEquals(
+            [b"/boot-resources/ubuntu/boot-kernel"],
+            request.responseHeaders.getRawHeaders(b"X-Accel-Redirect"),
+        )
+        self.assertEquals(b"", b"".join(request.written))
+
     @inlineCallbacks
     def test_render_GET_logs_node_event_with_original_path_ip(self):
         path = factory.make_name("path")
@@ -583,7 +632,9 @@ class TestHTTPBootResource(MAASTestCase):
         mock_deferLater = self.patch(http, "deferLater")
         mock_deferLater.side_effect = always_succeed_with(None)
 
-        self.tftp.backend.get_reader.return_value = fail(AccessViolation())
+        self.tftp.backend.get_path_or_reader.return_value = fail(
+            AccessViolation()
+        )
 
         resource = http.HTTPBootResource()
         yield self.render_GET(resource, request)
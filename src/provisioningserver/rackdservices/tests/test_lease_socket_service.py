@@ -11,6 +11,7 @@ import socket
 import time
 from unittest.mock import MagicMock, sentinel
 
+from fixtures import FakeLogger
 from maastesting.factory import factory
 from maastesting.matchers import MockCalledOnceWith
 from maastesting.testcase import MAASTestCase, MAASTwistedRunTest
@@ -19,7 +20,7 @@ from provisioningserver.rackdservices.lease_socket_service import (
     LeaseSocketService,
 )
 from provisioningserver.rpc import getRegionClient
-from provisioningserver.rpc.region import UpdateLease
+from provisioningserver.rpc.region import UpdateLease, UpdateLeases
 from provisioningserver.rpc.testing import MockLiveClusterToRegionRPCFixture
 from provisioningserver.utils.twisted import DeferredValue, pause, retries
 from testtools.matchers import Not, PathExists
@@ -46,6 +47,11 @@ class TestLeaseSocketService(MAASTestCase):
         protocol, connecting = fixture.makeEventLoop(UpdateLease)
         return protocol, connecting
 
+    def patch_rpc_UpdateLeases(self):
+        fixture = self.useFixture(MockLiveClusterToRegionRPCFixture())
+        protocol, connecting = fixture.makeEventLoop(UpdateLeases)
+        return protocol, connecting
+
     def send_notification(self, socket_path, payload):
         conn = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
         conn.connect(socket_path)
@@ -107,16 +113,18 @@ class TestLeaseSocketService(MAASTestCase):
         self.assertEquals([packet], list(service.notifications))
 
     @defer.inlineCallbacks
-    def test_processNotification_gets_called_with_notification(self):
+    def test_processNotificationBatch_gets_called_with_notification(self):
         socket_path = self.patch_socket_path()
         service = LeaseSocketService(sentinel.service, reactor)
         dv = DeferredValue()
 
-        # Mock processNotifcation to catch the call.
-        def mock_processNotification(*args, **kwargs):
+        # Mock processNotificationBatch to catch the call.
+        def mock_processNotificationBatch(*args, **kwargs):
             dv.set(args)
 
-        self.patch(service, "processNotification", mock_processNotification)
+        self.patch(
+            service, "processNotificationBatch", mock_processNotificationBatch
+        )
 
         # Start the service and stop it at the end of the test.
         service.startService()
@@ -129,45 +137,91 @@ class TestLeaseSocketService(MAASTestCase):
         yield deferToThread(self.send_notification, socket_path, packet)
         yield dv.get(timeout=10)
 
-        # Packet should be the argument passed to processNotifcation
-        self.assertEquals((packet,), dv.value)
+        # Packet should be in the batch passed to processNotificationBatch.
+        self.assertEquals(([packet],), dv.value)
 
     @defer.inlineCallbacks
-    def test_processNotification_gets_called_multiple_times(self):
-        socket_path = self.patch_socket_path()
+    def test_processNotificationBatch_gets_called_with_batches(self):
+        self.patch_socket_path()
         service = LeaseSocketService(sentinel.service, reactor)
-        dvs = [DeferredValue(), DeferredValue()]
+        service.batch_size = 2
+        batches = []
 
-        # Mock processNotifcation to catch the call.
-        def mock_processNotification(*args, **kwargs):
-            for dv in dvs:
-                if not dv.isSet:
-                    dv.set(args)
-                    break
+        # Mock processNotificationBatch to catch the calls.
+        def mock_processNotificationBatch(notifications, clock=None):
+            batches.append(notifications)
 
-        self.patch(service, "processNotification", mock_processNotification)
+        self.patch(
+            service, "processNotificationBatch", mock_processNotificationBatch
+        )
 
-        # Start the service and stop it at the end of the test.
-        service.startService()
-        self.addCleanup(service.stopService)
+        # Queue notifications and process them.
+        packets = [{"test": factory.make_name("test")} for _ in range(3)]
+        service.notifications.extend(packets)
+        yield service.processNotifications()
 
-        # Create test payload to send.
-        packet1 = {"test1": factory.make_name("test1")}
-        packet2 = {"test2": factory.make_name("test2")}
+        # Notifications are sent in order, in batches of at most batch_size.
+        self.assertEquals([packets[:2], packets[2:]], batches)
+        self.assertEquals(0, len(service.notifications))
 
-        # Send notifications to the socket and wait for notifications.
-        yield deferToThread(self.send_notification, socket_path, packet1)
-        yield deferToThread(self.send_notification, socket_path, packet2)
-        yield dvs[0].get(timeout=10)
-        yield dvs[1].get(timeout=10)
+    def make_notification(self):
+        return {
+            "action": "commit",
+            "mac": factory.make_mac_address(),
+            "ip_family": "ipv4",
+            "ip": factory.make_ipv4_address(),
+            "timestamp": int(time.time()),
+            "lease_time": 30,
+            "hostname": factory.make_name("host"),
+        }
 
-        # Packet should be the argument passed to processNotification in
-        # order.
-        self.assertEquals((packet1,), dvs[0].value)
-        self.assertEquals((packet2,), dvs[1].value)
+    @defer.inlineCallbacks
+    def test_processNotificationBatch_send_to_region(self):
+        protocol, connecting = self.patch_rpc_UpdateLeases()
+        self.addCleanup((yield connecting))
+        protocol.UpdateLeases.return_value = defer.succeed({"failures": []})
+
+        client = getRegionClient()
+        rpc_service = MagicMock()
+        rpc_service.getClientNow.return_value = defer.succeed(client)
+        service = LeaseSocketService(rpc_service, reactor)
+
+        # Notifications to region.
+        packets = [self.make_notification() for _ in range(3)]
+        yield service.processNotificationBatch(packets, clock=reactor)
+        self.assertThat(
+            protocol.UpdateLeases,
+            MockCalledOnceWith(
+                protocol, cluster_uuid=client.localIdent, leases=packets
+            ),
+        )
 
     @defer.inlineCallbacks
-    def test_processNotification_send_to_region(self):
+    def test_processNotificationBatch_logs_failed_leases(self):
+        protocol, connecting = self.patch_rpc_UpdateLeases()
+        self.addCleanup((yield connecting))
+        error = factory.make_name("error")
+        protocol.UpdateLeases.return_value = defer.succeed(
+            {"failures": [{"index": 1, "error": error}]}
+        )
+
+        client = getRegionClient()
+        rpc_service = MagicMock()
+        rpc_service.getClientNow.return_value = defer.succeed(client)
+        service = LeaseSocketService(rpc_service, reactor)
+
+        packets = [self.make_notification() for _ in range(2)]
+        with FakeLogger("maas.lease_socket_service") as logger:
+            yield service.processNotificationBatch(packets, clock=reactor)
+        self.assertDocTestMatches(
+            "Failed to update DHCP lease (commit of %s for %s): %s"
+            % (packets[1]["ip"], packets[1]["mac"], error),
+            logger.output,
+        )
+
+    @defer.inlineCallbacks
+    def test_processNotificationBatch_falls_back_to_UpdateLease(self):
+        # The region does not handle UpdateLeases, as before 2.7.
         protocol, connecting = self.patch_rpc_UpdateLease()
         self.addCleanup((yield connecting))
 
@@ -177,16 +231,8 @@ class TestLeaseSocketService(MAASTestCase):
         service = LeaseSocketService(rpc_service, reactor)
 
         # Notification to region.
-        packet = {
-            "action": "commit",
-            "mac": factory.make_mac_address(),
-            "ip_family": "ipv4",
-            "ip": factory.make_ipv4_address(),
-            "timestamp": int(time.time()),
-            "lease_time": 30,
-            "hostname": factory.make_name("host"),
-        }
-        yield service.processNotification(packet, clock=reactor)
+        packet = self.make_notification()
+        yield service.processNotificationBatch([packet], clock=reactor)
         self.assertThat(
             protocol.UpdateLease,
             MockCalledOnceWith(
@@ -5,12 +5,14 @@
 
 __all__ = []
 
+import errno
 from functools import partial
 import json
 import os
 import random
 import re
 from socket import AF_INET, AF_INET6
+import struct
 import time
 from unittest.mock import ANY, Mock, sentinel
 
@@ -32,13 +34,19 @@ from provisioningserver.rackdservices import tftp as tftp_module
 from provisioningserver.rackdservices.tftp import (
     get_boot_image,
     log_request,
+    make_read_session,
+    MappedFileReader,
+    MappedFiles,
+    MAX_WINDOW_SIZE,
     Port,
     TFTPBackend,
     TFTPService,
     track_tftp_latency,
     TransferTimeTrackingTFTP,
     UDPServer,
+    WindowedReadSession,
 )
+from provisioningserver.rpc.boot_config import BootConfigCache
 from provisioningserver.rpc.exceptions import BootConfigNoResponse
 from provisioningserver.rpc.region import GetBootConfig
 from provisioningserver.testing.boot_images import (
@@ -58,8 +66,9 @@ from testtools.matchers import (
     MatchesStructure,
 )
 from tftp.backend import IReader
-from tftp.datagram import RQDatagram
-from tftp.errors import BackendError, FileNotFound
+from tftp.bootstrap import RemoteOriginReadSession
+from tftp.datagram import OP_ACK, OP_DATA, OP_ERROR, OP_OACK, RQDatagram
+from tftp.errors import AccessViolation, BackendError, FileNotFound
 import tftp.protocol
 from tftp.protocol import TFTP
 from twisted.application import internet
@@ -70,6 +79,7 @@ from twisted.internet.defer import fail, inlineCallbacks, succeed
 from twisted.internet.protocol import Protocol
 from twisted.internet.task import Clock
 from twisted.python import context
+from twisted.python.filepath import FilePath
 from zope.interface.verify import verifyObject
 
 
@@ -193,6 +203,77 @@ class TestBytesReader(MAASTestCase):
         self.assertRaises(ValueError, reader.read, 1)
 
 
+class TestMappedFileReader(MAASTestCase):
+    """Tests for `MappedFileReader`."""
+
+    def make_reader(self, path, files):
+        reader = MappedFileReader(FilePath(path), files)
+        self.addCleanup(reader.finish)
+        return reader
+
+    def test_interfaces(self):
+        path = self.make_file(contents=b"data")
+        verifyObject(IReader, self.make_reader(path, MappedFiles()))
+
+    def test_read(self):
+        data = factory.make_bytes(size=10)
+        reader = self.make_reader(self.make_file(contents=data), MappedFiles())
+        self.assertEqual(10, reader.size)
+        self.assertEqual(data[:7], reader.read(7))
+        self.assertEqual(data[7:], reader.read(7))
+        self.assertEqual(b"", reader.read(7))
+
+    def test_read_empty_file(self):
+        reader = self.make_reader(self.make_file(contents=b""), MappedFiles())
+        self.assertEqual(0, reader.size)
+        self.assertEqual(b"", reader.read(7))
+
+    def test_raises_FileNotFound_for_missing_file(self):
+        path = FilePath(os.path.join(self.make_dir(), "missing"))
+        self.assertRaises(FileNotFound, MappedFileReader, path, MappedFiles())
+
+    def test_readers_share_mapping(self):
+        path = self.make_file(contents=b"data")
+        files = MappedFiles()
+        reader1 = self.make_reader(path, files)
+        reader2 = self.make_reader(path, files)
+        self.assertIs(reader1.mapped, reader2.mapped)
+        self.assertEqual(2, reader1.mapped.readers)
+
+    def test_finish_releases_mapping(self):
+        path = self.make_file(contents=b"data")
+        files = MappedFiles()
+        reader1 = self.make_reader(path, files)
+        reader2 = self.make_reader(path, files)
+        reader1.finish()
+        self.assertEqual(b"data", reader2.read(4))
+        reader2.finish()
+        self.assertEqual({}, files._files)
+        self.assertEqual(b"", reader2.read(4))
+
+    def test_maps_replaced_file_again(self):
+        path = self.make_file(contents=b"old")
+        files = MappedFiles()
+        reader1 = self.make_reader(path, files)
+        replacement = self.make_file(contents=b"new data")
+        os.rename(replacement, path)
+        reader2 = self.make_reader(path, files)
+        self.assertIsNot(reader1.mapped, reader2.mapped)
+        self.assertEqual(b"old", reader1.read(10))
+        self.assertEqual(b"new data", reader2.read(10))
+        reader1.finish()
+        self.assertIs(reader2.mapped, files._files[path])
+
+    def test_read_fails_for_file_truncated_in_place(self):
+        data = factory.make_bytes(size=10)
+        path = self.make_file(contents=data)
+        reader = self.make_reader(path, MappedFiles())
+        self.assertEqual(data[:4], reader.read(4))
+        os.truncate(path, 6)
+        error = self.assertRaises(OSError, reader.read, 4)
+        self.assertEqual(errno.EIO, error.errno)
+
+
 class TestTFTPBackend(MAASTestCase):
     """Tests for `TFTPBackend`."""
 
@@ -220,11 +301,12 @@ class TestTFTPBackend(MAASTestCase):
 
     @inlineCallbacks
     def test_get_reader_regular_file(self):
-        # TFTPBackend.get_reader() returns a regular FilesystemReader for
-        # paths not matching re_config_file.
+        # TFTPBackend.get_reader() returns a MappedFileReader for paths not
+        # matching re_config_file.
         data = factory.make_string().encode("ascii")
         reader = yield self.get_reader(data)
         self.addCleanup(reader.finish)
+        self.assertIsInstance(reader, MappedFileReader)
         self.assertEqual(len(data), reader.size)
         self.assertEqual(data, reader.read(len(data)))
         self.assertEqual(b"", reader.read(1))
@@ -247,6 +329,23 @@ class TestTFTPBackend(MAASTestCase):
         self.assertEqual(data, reader.read(len(data)))
         self.assertEqual(b"", reader.read(1))
 
+    def test_get_file_reader_rejects_insecure_path(self):
+        backend = TFTPBackend(self.make_dir(), Mock())
+        self.assertRaises(
+            AccessViolation, backend.get_file_reader, b"../etc/passwd"
+        )
+
+    def test_get_file_path_raises_FileNotFound_for_missing_file(self):
+        backend = TFTPBackend(self.make_dir(), Mock())
+        self.assertRaises(FileNotFound, backend.get_file_path, b"missing")
+
+    @inlineCallbacks
+    def test_get_path_or_reader_returns_path_of_regular_file(self):
+        temp_file = self.make_file(name="example")
+        backend = TFTPBackend(os.path.dirname(temp_file), Mock())
+        file_path = yield backend.get_path_or_reader(b"example")
+        self.assertEqual(FilePath(temp_file), file_path)
+
     @inlineCallbacks
     def test_get_reader_logs_node_event(self):
         data = factory.make_string().encode("ascii")
@@ -862,6 +961,115 @@ class TestTFTPBackend(MAASTestCase):
             MockCalledOnceWith(client, GetBootConfig, **params_okay),
         )
 
+    def make_backend_with_cache(self, response):
+        client = Mock()
+        client.localIdent = factory.make_name("system_id")
+        client_service = Mock()
+        client_service.getClientNow.return_value = succeed(client)
+        backend = TFTPBackend(self.make_dir(), client_service)
+        backend.boot_config_cache = BootConfigCache(clock=Clock())
+        backend.fetcher = Mock()
+        backend.fetcher.side_effect = lambda *args, **kwargs: succeed(
+            response.copy()
+        )
+        get_boot_image = self.patch(backend, "get_boot_image")
+        get_boot_image.side_effect = lambda data, client, remote_ip: data
+        return backend
+
+    def make_boot_config_params(self):
+        return {
+            "local_ip": factory.make_ipv4_address(),
+            "remote_ip": factory.make_ipv4_address(),
+            "mac": factory.make_mac_address(),
+        }
+
+    @inlineCallbacks
+    def test_get_kernel_params_caches_boot_config(self):
+        response = make_kernel_parameters()._asdict()
+        backend = self.make_backend_with_cache(response)
+        params = self.make_boot_config_params()
+
+        first = yield backend.get_kernel_params(params.copy())
+        second = yield backend.get_kernel_params(params.copy())
+
+        self.assertEqual(first, second)
+        self.assertEqual(1, backend.fetcher.call_count)
+
+    @inlineCallbacks
+    def test_get_kernel_params_fetches_boot_config_after_invalidation(self):
+        response = make_kernel_parameters()._asdict()
+        backend = self.make_backend_with_cache(response)
+        params = self.make_boot_config_params()
+
+        yield backend.get_kernel_params(params.copy())
+        backend.boot_config_cache.invalidate([params["mac"]])
+        yield backend.get_kernel_params(params.copy())
+
+        self.assertEqual(2, backend.fetcher.call_count)
+
+    def make_rendering_method(self, render_once=True):
+        method = PXEBootMethod()
+        method.render_once = render_once
+        render_patch = self.patch(method, "get_reader")
+        render_patch.side_effect = lambda backend, **kwargs: BytesReader(
+            factory.make_name("render").encode("utf-8")
+        )
+        return method
+
+    @inlineCallbacks
+    def test_get_boot_method_reader_renders_config_once(self):
+        response = make_kernel_parameters()._asdict()
+        backend = self.make_backend_with_cache(response)
+        params = self.make_boot_config_params()
+        method = self.make_rendering_method()
+
+        first = yield backend.get_boot_method_reader(method, params.copy())
+        second = yield backend.get_boot_method_reader(method, params.copy())
+
+        self.assertEqual(first.read(10000), second.read(10000))
+        self.assertEqual(1, method.get_reader.call_count)
+
+    @inlineCallbacks
+    def test_get_boot_method_reader_renders_config_after_invalidation(self):
+        response = make_kernel_parameters()._asdict()
+        backend = self.make_backend_with_cache(response)
+        params = self.make_boot_config_params()
+        method = self.make_rendering_method()
+
+        yield backend.get_boot_method_reader(method, params.copy())
+        backend.boot_config_cache.invalidate([params["mac"]])
+        yield backend.get_boot_method_reader(method, params.copy())
+
+        self.assertEqual(2, method.get_reader.call_count)
+
+    @inlineCallbacks
+    def test_get_boot_method_reader_renders_for_new_kernel_params(self):
+        response = make_kernel_parameters()._asdict()
+        backend = self.make_backend_with_cache(response)
+        params = self.make_boot_config_params()
+        method = self.make_rendering_method()
+
+        yield backend.get_boot_method_reader(method, params.copy())
+        response["hostname"] = factory.make_name("hostname")
+        backend.boot_config_cache.invalidate()
+        yield backend.get_boot_method_reader(method, params.copy())
+
+        self.assertEqual(2, method.get_reader.call_count)
+
+    @inlineCallbacks
+    def test_get_boot_method_reader_renders_every_time_if_not_render_once(
+        self,
+    ):
+        response = make_kernel_parameters()._asdict()
+        backend = self.make_backend_with_cache(response)
+        params = self.make_boot_config_params()
+        method = self.make_rendering_method(render_once=False)
+
+        yield backend.get_boot_method_reader(method, params.copy())
+        yield backend.get_boot_method_reader(method, params.copy())
+
+        self.assertEqual(2, method.get_reader.call_count)
+
 
 class TestTFTPService(MAASTestCase):
     def test_tftp_service(self):
@@ -1078,6 +1286,203 @@ class TestTransferTimeTrackingTFTPStartSession(MAASTestCase):
         )
 
 
+class TestMakeReadSession(MAASTestCase):
+    """Tests for `make_read_session`."""
+
+    def test_returns_windowed_session_when_asked_for_window_size(self):
+        session = make_read_session(
+            ("192.168.1.1", 69), BytesReader(b""), {b"WindowSize": b"8"}
+        )
+        self.assertIsInstance(session, WindowedReadSession)
+
+    def test_returns_tftp_session_otherwise(self):
+        session = make_read_session(
+            ("192.168.1.1", 69), BytesReader(b""), {b"blksize": b"1428"}
+        )
+        self.assertIsInstance(session, RemoteOriginReadSession)
+
+    def test_used_by_TransferTimeTrackingTFTP(self):
+        tracking_tftp = TransferTimeTrackingTFTP(sentinel.backend)
+        self.assertIs(make_read_session, tracking_tftp.read_session_factory)
+
+
+class FakeDatagramTransport:
+    """A connected UDP transport, recording what is written."""
+
+    def __init__(self):
+        self.connected = None
+        self.written = []
+        self.listening = True
+
+    def connect(self, host, port):
+        self.connected = host, port
+
+    def write(self, datagram):
+        self.written.append(datagram)
+
+    def stopListening(self):
+        self.listening = False
+
+
+def make_ack(number):
+    return struct.pack("!HH", OP_ACK, number)
+
+
+def make_data(number, data):
+    return struct.pack("!HH", OP_DATA, number) + data
+
+
+class TestWindowedReadSession(MAASTestCase):
+    """Tests for `WindowedReadSession`."""
+
+    def make_session(self, data, options):
+        self.clock = Clock()
+        self.reader = BytesReader(data)
+        self.reader.finish = Mock()
+        self.transport = FakeDatagramTransport()
+        session = WindowedReadSession(
+            ("192.168.1.1", 1234), self.reader, options, _clock=self.clock
+        )
+        session.makeConnection(self.transport)
+        return session
+
+    def take_written(self):
+        written, self.transport.written = self.transport.written, []
+        return written
+
+    def test_acknowledges_options_and_waits(self):
+        self.make_session(
+            b"0123456789",
+            {b"blksize": b"8", b"tsize": b"0", b"windowsize": b"2"},
+        )
+        self.assertEqual(("192.168.1.1", 1234), self.transport.connected)
+        self.assertEqual(
+            [
+                struct.pack("!H", OP_OACK)
+                + b"blksize\x008\x00tsize\x0010\x00windowsize\x002\x00"
+            ],
+            self.take_written(),
+        )
+
+    def test_ignores_unsupported_and_invalid_options(self):
+        session = self.make_session(
+            b"", {b"windowsize": b"0", b"blksize": b"x", b"other": b"1"}
+        )
+        self.assertEqual((512, 1), (session.block_size, session.window_size))
+        # There is nothing to acknowledge, so the data is sent straight away.
+        self.assertEqual([make_data(1, b"")], self.take_written())
+
+    def test_limits_window_size(self):
+        session = self.make_session(b"", {b"windowsize": b"65535"})
+        self.assertEqual(MAX_WINDOW_SIZE, session.window_size)
+
+    def test_sends_window_of_blocks(self):
+        session = self.make_session(
+            b"0123456789abcdefghij", {b"blksize": b"8", b"windowsize": b"2"}
+        )
+        self.take_written()
+        session.datagramReceived(make_ack(0), None)
+        self.assertEqual(
+            [make_data(1, b"01234567"), make_data(2, b"89abcdef")],
+            self.take_written(),
+        )
+        session.datagramReceived(make_ack(2), None)
+        self.assertEqual([make_data(3, b"ghij")], self.take_written())
+        session.datagramReceived(make_ack(3), None)
+        self.assertTrue(session.finished)
+        self.assertThat(self.reader.finish, MockCalledOnceWith())
+        self.assertFalse(self.transport.listening)
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+    def test_sends_empty_last_block_for_whole_blocks(self):
+        session = self.make_session(
+            b"0123456789abcdef", {b"blksize": b"8", b"windowsize": b"4"}
+        )
+        self.take_written()
+        session.datagramReceived(make_ack(0), None)
+        self.assertEqual(
+            [
+                make_data(1, b"01234567"),
+                make_data(2, b"89abcdef"),
+                make_data(3, b""),
+            ],
+            self.take_written(),
+        )
+
+    def test_resends_from_block_after_last_acknowledged(self):
+        session = self.make_session(
+            b"x" * 8 + b"y" * 8 + b"z" * 8 + b"w",
+            {b"blksize": b"8", b"windowsize": b"3"},
+        )
+        self.take_written()
+        session.datagramReceived(make_ack(0), None)
+        self.take_written()
+        session.datagramReceived(make_ack(1), None)
+        self.assertEqual(
+            [
+                make_data(2, b"y" * 8),
+                make_data(3, b"z" * 8),
+                make_data(4, b"w"),
+            ],
+            self.take_written(),
+        )
+
+    def test_ignores_duplicate_acknowledgements(self):
+        session = self.make_session(
+            b"0123456789", {b"blksize": b"8", b"windowsize": b"2"}
+        )
+        session.datagramReceived(make_ack(0), None)
+        self.take_written()
+        session.datagramReceived(make_ack(0), None)
+        self.assertEqual([], self.take_written())
+
+    def test_wraps_block_numbers(self):
+        session = self.make_session(
+            b"x" * 10, {b"blksize": b"8", b"windowsize": b"2"}
+        )
+        session.acknowledged = 65535
+        self.take_written()
+        session.datagramReceived(make_ack(0), None)
+        self.assertEqual(
+            [make_data(0, b"x" * 8), make_data(1, b"xx")],
+            self.take_written(),
+        )
+        session.datagramReceived(make_ack(1), None)
+        self.assertTrue(session.finished)
+
+    def test_retransmits_window_then_times_out(self):
+        session = self.make_session(
+            b"0123456789", {b"timeout": b"2", b"windowsize": b"2"}
+        )
+        oack = self.take_written()
+        self.clock.advance(2)
+        self.assertEqual(oack, self.take_written())
+        self.clock.advance(2)
+        self.assertEqual(oack, self.take_written())
+        self.clock.advance(2)
+        self.assertEqual([], self.take_written())
+        self.assertTrue(session.finished)
+        self.assertThat(self.reader.finish, MockCalledOnceWith())
+
+    def test_stops_on_error_from_client(self):
+        session = self.make_session(b"0123456789", {b"windowsize": b"2"})
+        session.datagramReceived(
+            struct.pack("!HH", OP_ERROR, 0) + b"stop\x00", None
+        )
+        self.assertTrue(session.finished)
+        self.assertFalse(self.transport.listening)
+        self.assertEqual([], self.clock.getDelayedCalls())
+
+    def test_cancel_can_be_tracked(self):
+        # TransferTimeTrackingTFTP wraps `session.cancel`.
+        session = self.make_session(b"", {b"windowsize": b"2"})
+        self.assertIs(session, session.session)
+        session.session.cancel = Mock(wraps=session.cancel)
+        session.datagramReceived(make_ack(0), None)
+        session.datagramReceived(make_ack(1), None)
+        self.assertThat(session.session.cancel, MockCalledOnceWith())
+
+
 class TestTrackTFTPLatency(MAASTestCase):
     def test_track_tftp_latency(self):
         class Thing:
@@ -5,18 +5,24 @@
 
 __all__ = ["TFTPBackend", "TFTPService"]
 
+import errno
 from functools import partial
+from mmap import ACCESS_READ, mmap
+import os
 from socket import AF_INET, AF_INET6
+import struct
+import threading
 from time import time
 
 from netaddr import IPAddress
-from provisioningserver.boot import BootMethodRegistry
+from provisioningserver.boot import BootMethodRegistry, BytesReader
 from provisioningserver.drivers import ArchitectureRegistry
 from provisioningserver.drivers.osystem import OperatingSystemRegistry
 from provisioningserver.events import EVENT_TYPES, send_node_event_ip_address
 from provisioningserver.kernel_opts import KernelParameters
 from provisioningserver.logger import get_maas_logger, LegacyLogger
 from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
+from provisioningserver.rpc.boot_config import boot_config_cache
 from provisioningserver.rpc.boot_images import list_boot_images
 from provisioningserver.rpc.exceptions import BootConfigNoResponse
 from provisioningserver.rpc.region import GetBootConfig, MarkNodeFailed
@@ -25,7 +31,16 @@ from provisioningserver.utils.network import get_all_interface_addresses
 from provisioningserver.utils.tftp import TFTPPath
 from provisioningserver.utils.twisted import deferred, RPCFetcher
 from tftp.backend import FilesystemSynchronousBackend
-from tftp.errors import BackendError, FileNotFound
+from tftp.bootstrap import RemoteOriginReadSession
+from tftp.datagram import (
+    ERR_NOT_DEFINED,
+    ERRORDatagram,
+    OP_ACK,
+    OP_DATA,
+    OP_ERROR,
+    OP_OACK,
+)
+from tftp.errors import AccessViolation, BackendError, FileNotFound
 from tftp.protocol import TFTP
 from twisted.application import internet
 from twisted.application.service import MultiService
@@ -38,8 +53,9 @@ from twisted.internet.defer import (
     returnValue,
     succeed,
 )
+from twisted.internet.protocol import DatagramProtocol
 from twisted.internet.task import deferLater
-from twisted.python.filepath import FilePath
+from twisted.python.filepath import FilePath, InsecurePath
 
 
 maaslog = get_maas_logger("tftp")
@@ -113,6 +129,120 @@ def log_request(file_name, clock=reactor):
     d.addErrback(log.err, "Logging TFTP request failed.")
 
 
+class MappedFile:
+    """A read-only memory mapping of a file, shared by its readers."""
+
+    def __init__(self, path, key, fileobj, size):
+        self.path = path
+        self.key = key
+        self.size = size
+        if size:
+            self.data = mmap(fileobj.fileno(), 0, access=ACCESS_READ)
+            # Kept open to check the size of the file, see `read`.
+            self.fd = os.dup(fileobj.fileno())
+        else:
+            # Empty files can't be mapped.
+            self.data = b""
+        self.readers = 0
+
+    def read(self, offset, size):
+        """Return up to `size` bytes of the file from `offset`.
+
+        Touching the pages of a mapping past the end of its file kills the
+        process with SIGBUS. Files are normally replaced by renaming new
+        ones over them, which leaves the mapped file whole, but one that's
+        been truncated in place fails the read instead.
+
+        :raise OSError: When the file is now shorter than the data read.
+        """
+        end = min(offset + size, self.size)
+        if end <= offset:
+            return b""
+        if os.fstat(self.fd).st_size < end:
+            raise OSError(
+                errno.EIO, "File was truncated while being read", self.path
+            )
+        return self.data[offset:end]
+
+    def close(self):
+        if self.size:
+            self.data.close()
+            os.close(self.fd)
+
+
+class MappedFiles:
+    """The files mapped for `MappedFileReader`s, by path.
+
+    A file is mapped once for all of its concurrent readers, so that they
+    read from the same pages of the page cache instead of each copying the
+    file through a buffer of its own. It's mapped again once it has been
+    replaced, and unmapped when its last reader finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._files = {}
+
+    def open(self, path):
+        """Return the `MappedFile` for `path`, counting a new reader."""
+        with open(path, "rb") as fileobj:
+            stat = os.fstat(fileobj.fileno())
+            key = stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
+            with self._lock:
+                mapped = self._files.get(path)
+                if mapped is None or mapped.key != key:
+                    mapped = MappedFile(path, key, fileobj, stat.st_size)
+                    self._files[path] = mapped
+                mapped.readers += 1
+                return mapped
+
+    def release(self, mapped):
+        """Count a reader of `mapped` as finished."""
+        with self._lock:
+            mapped.readers -= 1
+            if mapped.readers == 0:
+                if self._files.get(mapped.path) is mapped:
+                    del self._files[mapped.path]
+                mapped.close()
+
+
+mapped_files = MappedFiles()
+
+
+class MappedFileReader:
+    """An `IReader` for a file, reading from its shared `MappedFile`.
+
+    :ivar path: The `FilePath` of the file.
+    :ivar size: The size of the file.
+    """
+
+    def __init__(self, file_path, files=mapped_files):
+        """
+        :param file_path: The `FilePath` of the file to read.
+        :raise FileNotFound: When the file can't be opened.
+        """
+        self.path = file_path
+        self.files = files
+        try:
+            self.mapped = files.open(file_path.path)
+        except OSError:
+            raise FileNotFound(file_path)
+        self.size = self.mapped.size
+        self.offset = 0
+
+    def read(self, size):
+        if self.mapped is None:
+            return b""
+        data = self.mapped.read(self.offset, size)
+        self.offset += len(data)
+        return data
+
+    def finish(self):
+        if self.mapped is not None:
+            self.files.release(self.mapped)
+            self.mapped = None
+
+
 class TFTPBackend(FilesystemSynchronousBackend):
     """A partially dynamic read-only TFTP server.
 
@@ -147,6 +277,7 @@ class TFTPBackend(FilesystemSynchronousBackend):
         self.client_to_remote = {}
         self.client_service = client_service
         self.fetcher = RPCFetcher()
+        self.boot_config_cache = boot_config_cache
 
     def _get_new_client_for_remote(self, remote_ip):
         """Return a new client for the `remote_ip`.
@@ -292,9 +423,21 @@ class TFTPBackend(FilesystemSynchronousBackend):
         )
         params = {name: params[name] for name in arguments if name in params}
 
+        def cache(response, params, generation):
+            self.boot_config_cache.set(params, response, generation)
+            return response
+
         def fetch(client, params):
             params["system_id"] = client.localIdent
-            d = self.fetcher(client, GetBootConfig, **params)
+            response = self.boot_config_cache.get(params)
+            if response is None:
+                generation = self.boot_config_cache.generation
+                d = self.fetcher(client, GetBootConfig, **params)
+                # The response is modified by get_boot_image, so it's cached
+                # before that.
+                d.addCallback(cache, params, generation)
+            else:
+                d = succeed(response)
             d.addCallback(self.get_boot_image, client, params["remote_ip"])
             d.addCallback(lambda data: KernelParameters(**data))
             return d
@@ -303,6 +446,28 @@ class TFTPBackend(FilesystemSynchronousBackend):
         d.addCallback(fetch, params)
         return d
 
+    def get_file_path(self, file_name):
+        """Return the `FilePath` of the file `file_name`.
+
+        :param file_name: The path of the file, relative to the root.
+        :raise AccessViolation: When the path is outside of the root.
+        :raise FileNotFound: When there's no such file.
+        """
+        try:
+            file_path = self.base.descendant(file_name.split(b"/"))
+        except InsecurePath as e:
+            raise AccessViolation("Insecure path: %s" % e)
+        if not file_path.isfile():
+            raise FileNotFound(file_path)
+        return file_path
+
+    def get_file_reader(self, file_name):
+        """Return a `MappedFileReader` for the file `file_name`.
+
+        :param file_name: The path of the file, relative to the root.
+        """
+        return MappedFileReader(self.get_file_path(file_name))
+
     @deferred
     def get_boot_method_reader(self, boot_method, params):
         """Return an `IReader` for a boot method.
@@ -313,9 +478,22 @@ class TFTPBackend(FilesystemSynchronousBackend):
         """
 
         def generate(kernel_params):
-            return boot_method.get_reader(
+            if boot_method.render_once:
+                rendered = self.boot_config_cache.rendered
+                data = rendered.get(boot_method.name, params, kernel_params)
+                if data is not None:
+                    return BytesReader(data)
+            reader = boot_method.get_reader(
                 self, kernel_params=kernel_params, **params
             )
+            if boot_method.render_once and isinstance(reader, BytesReader):
+                rendered.set(
+                    boot_method.name,
+                    params,
+                    kernel_params,
+                    reader.buffer.getvalue(),
+                )
+            return reader
 
         return self.get_kernel_params(params).addCallback(generate)
 
@@ -327,10 +505,12 @@ class TFTPBackend(FilesystemSynchronousBackend):
 
     @deferred
     @typed
-    def handle_boot_method(self, file_name: TFTPPath, result):
+    def handle_boot_method(self, file_name: TFTPPath, result, get_file=None):
         boot_method, params = result
         if boot_method is None:
-            return super(TFTPBackend, self).get_reader(file_name)
+            if get_file is None:
+                get_file = self.get_file_reader
+            return get_file(file_name)
 
         # Map pxe namespace architecture names to MAAS's.
         arch = params.get("arch")
@@ -368,6 +548,21 @@ class TFTPBackend(FilesystemSynchronousBackend):
         from that boot method. Otherwise the filesystem is used to service
         the response.
         """
+        return self._get_reader(file_name, skip_logging, self.get_file_reader)
+
+    @deferred
+    @typed
+    def get_path_or_reader(
+        self, file_name: TFTPPath, skip_logging: bool = False
+    ):
+        """Like `get_reader`, but return the `FilePath` of a file that no
+        boot method matches, rather than a reader for it.
+
+        This is for the HTTP boot service, which has nginx send those files.
+        """
+        return self._get_reader(file_name, skip_logging, self.get_file_path)
+
+    def _get_reader(self, file_name, skip_logging, get_file):
         # It is possible for a client to request the file with '\' instead
         # of '/', example being 'bootx64.efi'. Convert all '\' to '/' to be
         # unix compatiable.
@@ -377,7 +572,9 @@ class TFTPBackend(FilesystemSynchronousBackend):
             # 2 log messages are not created.
             log_request(file_name)
         d = self.get_boot_method(file_name)
-        d.addCallback(partial(self.handle_boot_method, file_name))
+        d.addCallback(
+            partial(self.handle_boot_method, file_name, get_file=get_file)
+        )
         d.addErrback(self.no_response_errback, file_name)
         d.addErrback(self.all_is_lost_errback)
         return d
@@ -435,7 +632,197 @@ def track_tftp_latency(
     return wrapped
 
 
+# The largest window size agreed to with clients asking for one.
+MAX_WINDOW_SIZE = 64
+
+
+def make_read_session(remote, reader, options, _clock=None):
+    """Return the session sending `reader` to `remote`.
+
+    Clients asking for a window size get a `WindowedReadSession`. Others
+    get the session from `tftp`, which acknowledges every block.
+    """
+    if any(name.lower() == b"windowsize" for name in options):
+        return WindowedReadSession(remote, reader, options, _clock=_clock)
+    else:
+        return RemoteOriginReadSession(remote, reader, options, _clock=_clock)
+
+
+class WindowedReadSession(DatagramProtocol):
+    """Send a file to a TFTP client, several blocks per acknowledgement.
+
+    This implements the window size option of RFC 7440. Up to `window_size`
+    blocks are sent before waiting for an acknowledgement. The client
+    acknowledges the last block it received in order, and sending resumes
+    from the block after it. The block size, timeout and transfer size
+    options of RFCs 2348 and 2349 are supported too.
+
+    Blocks are numbered from 1 without wrapping here. Their numbers wrap to
+    0 on the wire after 65535, as most clients expect.
+    """
+
+    block_size = 512
+    window_size = 1
+    timeout = (1, 3, 7)
+
+    def __init__(self, remote, reader, options, _clock=None):
+        super().__init__()
+        self.remote = remote
+        self.reader = reader
+        self.options = options
+        self.clock = reactor if _clock is None else _clock
+        # The blocks sent and not acknowledged yet, as (number, datagram).
+        self.window = []
+        self.acknowledged = 0
+        self.read_all = False
+        self.negotiating = False
+        self.finished = False
+        # The datagrams being sent, their number of retransmissions, and
+        # the call that retransmits them.
+        self.sending = []
+        self.retransmissions = 0
+        self.timeout_call = None
+        # Sessions from `tftp` hold the transfer in `session`.
+        self.session = self
+
+    def startProtocol(self):
+        self.transport.connect(*self.remote[:2])
+        accepted = self.negotiate(self.options)
+        if accepted:
+            self.negotiating = True
+            self.send(
+                [
+                    struct.pack("!H", OP_OACK)
+                    + b"".join(
+                        b"%s\0%s\0" % option for option in accepted.items()
+                    )
+                ]
+            )
+        else:
+            self.sendWindow()
+
+    def negotiate(self, options):
+        """Apply the supported `options`.
+
+        :return: The accepted options and their values, to be acknowledged.
+        """
+        accepted = {}
+        for name, value in options.items():
+            option = name.lower()
+            try:
+                value = int(value)
+            except ValueError:
+                continue
+            if option == b"blksize" and 8 <= value <= 65464:
+                self.block_size = value
+            elif option == b"timeout" and 1 <= value <= 255:
+                self.timeout = (value,) * 3
+            elif option == b"windowsize" and 1 <= value:
+                value = self.window_size = min(value, MAX_WINDOW_SIZE)
+            elif option == b"tsize" and hasattr(self.reader, "size"):
+                value = self.reader.size
+            else:
+                continue
+            accepted[name] = b"%d" % value
+        return accepted
+
+    def datagramReceived(self, datagram, addr=None):
+        if self.finished or len(datagram) < 4:
+            return
+        opcode, number = struct.unpack("!HH", datagram[:4])
+        if opcode == OP_ACK:
+            self.acknowledge(number)
+        elif opcode == OP_ERROR:
+            log.msg(
+                "TFTP transfer aborted by client: %s"
+                % datagram[4:].rstrip(b"\0").decode("ascii", "replace")
+            )
+            self.cancel()
+
+    def acknowledge(self, number):
+        """Handle the acknowledgement of block `number`, as on the wire."""
+        if self.negotiating:
+            if number == 0:
+                self.negotiating = False
+                self.sendWindow()
+            return
+        for index, (block, _) in enumerate(self.window):
+            if block % 65536 == number:
+                break
+        else:
+            # A duplicate, or from before this window; any blocks that
+            # were lost are sent again when the window times out.
+            return
+        del self.window[: index + 1]
+        self.acknowledged = block
+        if self.read_all and len(self.window) == 0:
+            self.cancel()
+        else:
+            self.sendWindow()
+
+    def sendWindow(self):
+        """Send the blocks after the last one acknowledged."""
+        try:
+            while len(self.window) < self.window_size and not self.read_all:
+                data = self.reader.read(self.block_size)
+                if len(data) < self.block_size:
+                    self.read_all = True
+                block = self.acknowledged + len(self.window) + 1
+                self.window.append(
+                    (block, struct.pack("!HH", OP_DATA, block % 65536) + data)
+                )
+        except Exception as e:
+            log.err(None, "Reading for TFTP transfer failed.")
+            self.transport.write(
+                ERRORDatagram.from_code(
+                    ERR_NOT_DEFINED, str(e).encode("ascii", "replace")
+                ).to_wire()
+            )
+            self.cancel()
+        else:
+            self.send([datagram for _, datagram in self.window])
+
+    def send(self, datagrams):
+        """Send `datagrams`, and again until acknowledged or timed out."""
+        if self.timeout_call is not None:
+            self.timeout_call.cancel()
+        self.sending = datagrams
+        self.retransmissions = 0
+        self.transmit()
+
+    def transmit(self):
+        for datagram in self.sending:
+            self.transport.write(datagram)
+        self.timeout_call = self.clock.callLater(
+            self.timeout[self.retransmissions], self.timedOut
+        )
+
+    def timedOut(self):
+        self.timeout_call = None
+        self.retransmissions += 1
+        if self.retransmissions < len(self.timeout):
+            self.transmit()
+        else:
+            log.msg("TFTP transfer to %s:%s timed out." % self.remote[:2])
+            self.cancel()
+
+    def cancel(self):
+        """Stop the transfer and clean up."""
+        if self.finished:
+            return
+        self.finished = True
+        if self.timeout_call is not None:
+            self.timeout_call.cancel()
+            self.timeout_call = None
+        self.reader.finish()
+        if self.transport is not None:
+            self.transport.stopListening()
+
+
 class TransferTimeTrackingTFTP(TFTP):
+
+    read_session_factory = staticmethod(make_read_session)
+
     @inlineCallbacks
     def _startSession(
         self, datagram, addr, mode, prometheus_metrics=PROMETHEUS_METRICS
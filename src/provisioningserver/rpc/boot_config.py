@@ -0,0 +1,181 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""RPC helpers relating to boot configurations."""
+
+__all__ = ["boot_config_cache", "BootConfigCache", "RenderedConfigCache"]
+
+from collections import OrderedDict
+
+from provisioningserver.prometheus.metrics import PROMETHEUS_METRICS
+from twisted.internet import reactor
+
+
+# How long, in seconds, a boot configuration obtained from the region is
+# used for before asking for it again.
+BOOT_CONFIG_CACHE_TTL = 30
+
+# How many configurations rendered by boot methods are kept.
+RENDERED_CONFIG_CACHE_SIZE = 1024
+
+
+def normalise_mac(mac):
+    """Return `mac` in the colon-separated, lower-case form."""
+    return mac.replace("-", ":").lower()
+
+
+class BootConfigCache:
+    """Cache of the responses to `GetBootConfig`.
+
+    A machine asks for its boot configuration for most of the files it
+    requests while booting, and a rack of machines powered on together
+    makes the region work them all out at once. Responses are cached for
+    `ttl` seconds, keyed by the arguments they were obtained with.
+
+    The region invalidates the responses for a machine's MAC addresses when
+    its status or boot settings change, and all responses when the global
+    boot settings change, with `InvalidateBootConfigs`. The TTL bounds how
+    long other changes take to be seen.
+
+    :ivar rendered: The `RenderedConfigCache` of the configuration files
+        rendered from the responses, invalidated along with them.
+    """
+
+    def __init__(self, ttl=BOOT_CONFIG_CACHE_TTL, clock=reactor):
+        self.ttl = ttl
+        self.clock = clock
+        # Incremented by every invalidation, so that responses to requests
+        # made before one are not cached.
+        self.generation = 0
+        self._entries = {}
+        self.rendered = RenderedConfigCache()
+
+    @staticmethod
+    def _make_key(params):
+        params = dict(params)
+        # The rack controller's system_id is the same for every request.
+        params.pop("system_id", None)
+        if params.get("mac"):
+            params["mac"] = normalise_mac(params["mac"])
+        return tuple(sorted(params.items()))
+
+    def get(self, params):
+        """Return the cached response for `params`, or `None`.
+
+        A copy of the response is returned; it's fine to modify it.
+        """
+        key = self._make_key(params)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, response = entry
+            if expires > self.clock.seconds():
+                PROMETHEUS_METRICS.update(
+                    "maas_rack_boot_config_cache_hits", "inc"
+                )
+                return dict(response)
+            del self._entries[key]
+        PROMETHEUS_METRICS.update("maas_rack_boot_config_cache_misses", "inc")
+        return None
+
+    def set(self, params, response, generation):
+        """Cache `response` for `params`.
+
+        :param generation: The `generation` of the cache when the request
+            for `response` was made. If there were invalidations since,
+            `response` may be out of date and is not cached.
+        """
+        if generation != self.generation:
+            return
+        now = self.clock.seconds()
+        # Drop expired responses, so that those of machines that are no
+        # longer booting do not accumulate.
+        expired = [
+            key
+            for key, (expires, _) in self._entries.items()
+            if expires <= now
+        ]
+        for key in expired:
+            del self._entries[key]
+        key = self._make_key(params)
+        self._entries[key] = (now + self.ttl, dict(response))
+
+    def invalidate(self, macs=None):
+        """Invalidate the cached responses for `macs`.
+
+        Responses obtained without a MAC address can't be attributed to a
+        machine, so they are invalidated as well.
+
+        :param macs: MAC addresses, or `None` to invalidate all responses.
+        """
+        self.generation += 1
+        if macs is None:
+            self._entries.clear()
+        else:
+            macs = {normalise_mac(mac) for mac in macs}
+            for key in list(self._entries):
+                mac = dict(key).get("mac")
+                if not mac or mac in macs:
+                    del self._entries[key]
+        self.rendered.invalidate(macs)
+
+
+class RenderedConfigCache:
+    """Least recently used cache of the configuration files rendered by boot
+    methods.
+
+    Firmware often requests the same configuration file several times while
+    booting. Rendered files are keyed by the boot method, the parameters of
+    the request and the kernel parameters they were rendered with, so that
+    they're rendered only once. A change to the boot configuration changes
+    the kernel parameters, so it's never rendered from a stale entry.
+    """
+
+    def __init__(self, size=RENDERED_CONFIG_CACHE_SIZE):
+        self.size = size
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def _make_key(method_name, params, kernel_params):
+        params = dict(params)
+        if params.get("mac"):
+            params["mac"] = normalise_mac(params["mac"])
+        return method_name, tuple(sorted(params.items())), kernel_params
+
+    def get(self, method_name, params, kernel_params):
+        """Return the file rendered for the arguments, or `None`."""
+        key = self._make_key(method_name, params, kernel_params)
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+        return data
+
+    def set(self, method_name, params, kernel_params, data):
+        """Cache `data`, the file rendered for the arguments.
+
+        The least recently used file is dropped when there are more than
+        `size` files.
+        """
+        key = self._make_key(method_name, params, kernel_params)
+        self._entries[key] = data
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, macs=None):
+        """Invalidate the files rendered for `macs`.
+
+        Files rendered without a MAC address are invalidated as well.
+
+        :param macs: MAC addresses, or `None` to invalidate all files.
+        """
+        if macs is None:
+            self._entries.clear()
+        else:
+            macs = {normalise_mac(mac) for mac in macs}
+            for key in list(self._entries):
+                mac = dict(key[1]).get("mac")
+                if not mac or mac in macs:
+                    del self._entries[key]
+
+
+boot_config_cache = BootConfigCache()
@@ -18,6 +18,7 @@ __all__ = [
     "DescribeNOSTypes",
     "GetPreseedData",
     "Identify",
+    "InvalidateBootConfigs",
     "ListBootImages",
     "ListOperatingSystems",
     "ListSupportedArchitectures",
@@ -914,3 +915,19 @@ class CheckIPs(amp.Command):
         )
     ]
     errors = {}
+
+
+class InvalidateBootConfigs(amp.Command):
+    """Invalidate the boot configurations cached by the rack controller.
+
+    :since: 2.7
+    """
+
+    arguments = [
+        # MAC addresses of the machines whose boot configurations are no
+        # longer valid. All boot configurations are invalidated when this
+        # is not given.
+        (b"macs", amp.ListOf(amp.Unicode(), optional=True))
+    ]
+    response = []
+    errors = {}
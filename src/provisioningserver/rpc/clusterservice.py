@@ -44,6 +44,7 @@ from provisioningserver.rpc import (
     pods,
     region,
 )
+from provisioningserver.rpc.boot_config import boot_config_cache
 from provisioningserver.rpc.boot_images import (
     import_boot_images,
     is_import_boot_images_running,
@@ -1002,6 +1003,16 @@ class Cluster(RPCProtocol):
         d.addErrback(log.err, "Failed to perform IP address checking.")
         return d
 
+    @cluster.InvalidateBootConfigs.responder
+    def invalidate_boot_configs(self, macs=None):
+        """InvalidateBootConfigs()
+
+        Implementation of
+        :py:class:`~provisioningserver.rpc.cluster.InvalidateBootConfigs`.
+        """
+        boot_config_cache.invalidate(macs)
+        return {}
+
 
 @implementer(IConnectionToRegion)
 class ClusterClient(Cluster):
@@ -20,7 +20,7 @@ from tempfile import NamedTemporaryFile
 from netaddr import IPAddress
 from provisioningserver.dhcp import DHCPv4Server, DHCPv6Server
 from provisioningserver.dhcp.config import get_config
-from provisioningserver.dhcp.omshell import Omshell
+from provisioningserver.dhcp.omapi import OMAPIClient, OMAPIConnectionError
 from provisioningserver.logger import get_maas_logger, LegacyLogger
 from provisioningserver.rpc.exceptions import (
     CannotConfigureDHCP,
@@ -48,6 +48,53 @@ log = LegacyLogger()
 # Holds the current state of DHCPv4 and DHCPv6.
 _current_server_state = {}
 
+# Holds the OMAPI sessions to the DHCPv4 and DHCPv6 servers.
+_omapi_sessions = {}
+
+
+def _get_snippets_config(dhcp_snippets):
+    """Return the configuration from `dhcp_snippets`.
+
+    Their names and descriptions are only rendered as comments.
+    """
+    return [dhcp_snippet["value"] for dhcp_snippet in dhcp_snippets]
+
+
+def _get_host_snippets_config(host):
+    """Return the configuration from the DHCP snippets of `host`."""
+    if host is None:
+        return []
+    else:
+        return _get_snippets_config(host["dhcp_snippets"])
+
+
+def _get_shared_networks_config(shared_networks):
+    """Return the configuration of `shared_networks`, by name.
+
+    The order of subnets and pools is not significant, the MTU is only set
+    when it is not the default, and the names and descriptions of DHCP
+    snippets are only comments.
+    """
+    networks = {}
+    for shared_network in shared_networks:
+        subnets = []
+        for subnet in shared_network["subnets"]:
+            subnet = dict(subnet)
+            subnet["pools"] = sorted(
+                subnet.get("pools", []), key=itemgetter("ip_range_low")
+            )
+            subnet["dhcp_snippets"] = _get_snippets_config(
+                subnet.get("dhcp_snippets", [])
+            )
+            subnets.append(subnet)
+        mtu = shared_network.get("mtu")
+        networks[shared_network["name"]] = (
+            shared_network.get("interface"),
+            mtu if mtu and mtu != 1500 else None,
+            sorted(subnets, key=itemgetter("subnet_cidr")),
+        )
+    return networks
+
 
 DHCPStateBase = namedtuple(
     "DHCPStateBase",
@@ -94,28 +141,56 @@ class DHCPState(DHCPStateBase):
     def requires_restart(self, other_state):
         """Return True when this state differs from `other_state` enough to
         require a restart."""
-
-        def gather_hosts_dhcp_snippets(hosts):
-            hosts_dhcp_snippets = list()
-            for _, host in hosts.items():
-                for dhcp_snippet in host["dhcp_snippets"]:
-                    hosts_dhcp_snippets.append(dhcp_snippet)
-            return sorted(hosts_dhcp_snippets, key=itemgetter("name"))
-
-        # Currently the OMAPI doesn't allow you to add or remove arbitrary
-        # config options. So gather a list of DHCP snippets from
-        hosts_dhcp_snippets = gather_hosts_dhcp_snippets(self.hosts)
-        other_hosts_dhcp_snippets = gather_hosts_dhcp_snippets(
-            other_state.hosts
+        return len(self.get_restart_reasons(other_state)) != 0
+
+    def get_restart_reasons(self, other_state):
+        """Return why changing from `other_state` to this state requires a
+        restart, or an empty list if the change can be made live.
+
+        The states are compared as they are configured in the DHCP server,
+        so changes to comments or to the order of unordered items do not
+        require a restart. Host maps are updated over the OMAPI, but it
+        cannot add or remove other statements, such as DHCP snippets.
+        """
+        reasons = []
+        if self.omapi_key != other_state.omapi_key:
+            reasons.append("OMAPI key changed")
+        if self.failover_peers != other_state.failover_peers:
+            reasons.append("failover peers changed")
+        networks = _get_shared_networks_config(self.shared_networks)
+        other_networks = _get_shared_networks_config(
+            other_state.shared_networks
+        )
+        changed_networks = sorted(
+            name
+            for name in set(networks) | set(other_networks)
+            if networks.get(name) != other_networks.get(name)
         )
-        return (
-            self.omapi_key != other_state.omapi_key
-            or self.failover_peers != other_state.failover_peers
-            or self.shared_networks != other_state.shared_networks
-            or self.interfaces != other_state.interfaces
-            or self.global_dhcp_snippets != other_state.global_dhcp_snippets
-            or hosts_dhcp_snippets != other_hosts_dhcp_snippets
+        if len(changed_networks) != 0:
+            reasons.append(
+                "shared networks changed: %s" % ", ".join(changed_networks)
+            )
+        if self.interfaces != other_state.interfaces:
+            reasons.append("interfaces changed")
+        if _get_snippets_config(
+            self.global_dhcp_snippets
+        ) != _get_snippets_config(other_state.global_dhcp_snippets):
+            reasons.append("global DHCP snippets changed")
+        # Currently the OMAPI doesn't allow you to add or remove arbitrary
+        # config options, so host maps with DHCP snippets cannot be changed
+        # live.
+        changed_hosts = sorted(
+            mac
+            for mac in set(self.hosts) | set(other_state.hosts)
+            if _get_host_snippets_config(self.hosts.get(mac))
+            != _get_host_snippets_config(other_state.hosts.get(mac))
         )
+        if len(changed_hosts) != 0:
+            reasons.append(
+                "DHCP snippets changed for hosts: %s"
+                % ", ".join(changed_hosts)
+            )
+        return reasons
 
     def host_diff(self, other_state):
         """Return tuple with the hosts that need to be removed, need to be
@@ -187,70 +262,79 @@ def _delete_config(server):
         sudo_delete_file(server.config_filename)
 
 
-def _remove_host_map(omshell, mac):
-    """Remove host by `mac`."""
-    try:
-        omshell.remove(mac)
-    except ExternalProcessError as e:
-        if "not connected." in e.output_as_unicode:
-            msg = "The DHCP server could not be reached."
-        else:
-            msg = str(e)
-        err = "Could not remove host map for %s: %s" % (mac, msg)
-        maaslog.error(err)
-        raise CannotRemoveHostMap(err)
+def _get_omapi_session(server):
+    """Return the OMAPI session to `server`.
+
+    The session is kept open between updates, unless the key changes.
+    """
+    session = _omapi_sessions.get(server.dhcp_service)
+    if session is None or session.shared_key != server.omapi_key:
+        _close_omapi_session(server)
+        session = OMAPIClient(
+            "127.0.0.1", server.omapi_key, port=7912 if server.ipv6 else 7911
+        )
+        _omapi_sessions[server.dhcp_service] = session
+    return session
 
 
-def _create_host_map(omshell, mac, ip_address):
-    """Create host with `mac` -> `ip_address`."""
-    try:
-        omshell.create(ip_address, mac)
-    except ExternalProcessError as e:
-        if "not connected." in e.output_as_unicode:
-            msg = "The DHCP server could not be reached."
-        else:
-            msg = str(e)
+def _close_omapi_session(server):
+    """Close the OMAPI session to `server`, if there is one."""
+    session = _omapi_sessions.pop(server.dhcp_service, None)
+    if session is not None:
+        session.close()
+
+
+def _host_map_error(action, host, msg):
+    """Log, and return an exception, for failing to `action` a host map."""
+    if action == "remove":
+        err = "Could not remove host map for %s: %s" % (host["mac"], msg)
+        exception = CannotRemoveHostMap
+    elif action == "create":
         err = "Could not create host map for %s -> %s: %s" % (
-            mac,
-            ip_address,
+            host["mac"],
+            host["ip"],
             msg,
         )
-        maaslog.error(err)
-        raise CannotCreateHostMap(err)
-
-
-def _modify_host_map(omshell, mac, ip_address):
-    """Modify host with `mac` -> `ip_address`."""
-    try:
-        omshell.modify(ip_address, mac)
-    except ExternalProcessError as e:
-        if "not connected." in e.output_as_unicode:
-            msg = "The DHCP server could not be reached."
-        else:
-            msg = str(e)
+        exception = CannotCreateHostMap
+    else:
         err = "Could not modify host map for %s -> %s: %s" % (
-            mac,
-            ip_address,
+            host["mac"],
+            host["ip"],
             msg,
         )
-        maaslog.error(err)
-        raise CannotModifyHostMap(err)
+        exception = CannotModifyHostMap
+    maaslog.error(err)
+    return exception(err)
 
 
 @synchronous
 def _update_hosts(server, remove, add, modify):
-    """Update the hosts using the OMAPI."""
-    omshell = Omshell(
-        server_address="127.0.0.1",
-        shared_key=server.omapi_key,
-        ipv6=server.ipv6,
-    )
-    for host in remove:
-        _remove_host_map(omshell, host["mac"])
-    for host in add:
-        _create_host_map(omshell, host["mac"], host["ip"])
-    for host in modify:
-        _modify_host_map(omshell, host["mac"], host["ip"])
+    """Update the hosts using the OMAPI.
+
+    All of the changes are sent in one batch over the session to the DHCP
+    server. Every host map that could not be updated is logged, and the
+    first of them raised.
+    """
+    if len(remove) + len(add) + len(modify) == 0:
+        return
+    session = _get_omapi_session(server)
+    try:
+        failures = session.update_host_maps(remove, add, modify)
+    except OMAPIConnectionError:
+        if len(remove) > 0:
+            action, host = "remove", remove[0]
+        elif len(add) > 0:
+            action, host = "create", add[0]
+        else:
+            action, host = "modify", modify[0]
+        raise _host_map_error(
+            action, host, "The DHCP server could not be reached."
+        )
+    errors = [
+        _host_map_error(action, host, msg) for action, host, msg in failures
+    ]
+    if len(errors) > 0:
+        raise errors[0]
 
 
 @asynchronous
@@ -353,6 +437,7 @@ def configure(
         yield _catch_service_error(
             server, "stop", service_monitor.ensureService, server.dhcp_service
         )
+        _close_omapi_session(server)
         _current_server_state[server.dhcp_service] = None
     else:
         # Get the new state for the DHCP server.
@@ -381,21 +466,14 @@ def configure(
         # Perform the required action based on the state change.
         current_state = _current_server_state.get(server.dhcp_service, None)
         if current_state is None:
-            log.debug(
-                "Unknown previous state; restarting {name} service.",
-                name=server.descriptive_name,
-            )
-            yield _catch_service_error(
-                server,
-                "restart",
-                service_monitor.restartService,
-                server.dhcp_service,
-            )
-        elif new_state.requires_restart(current_state):
-            log.debug(
-                "Restarting {name} service; configuration change requires "
-                "full restart.",
+            restart_reasons = ["unknown previous state"]
+        else:
+            restart_reasons = new_state.get_restart_reasons(current_state)
+        if len(restart_reasons) != 0:
+            log.info(
+                "Restarting {name} service; {reasons}.",
                 name=server.descriptive_name,
+                reasons="; ".join(restart_reasons),
             )
             yield _catch_service_error(
                 server,
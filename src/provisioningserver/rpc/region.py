@@ -551,6 +551,42 @@ class UpdateLease(amp.Command):
     errors = {NoSuchCluster: b"NoSuchCluster"}
 
 
+class UpdateLeases(amp.Command):
+    """Report a batch of DHCP lease updates from a cluster controller.
+
+    The leases are applied in order, in one transaction. A lease that cannot
+    be applied is reported in `failures` by its index in `leases`, without
+    affecting the others.
+
+    :since: 2.7
+    """
+
+    arguments = [
+        (b"cluster_uuid", amp.Unicode()),
+        (
+            b"leases",
+            AmpList(
+                [
+                    (b"action", amp.Unicode()),
+                    (b"mac", amp.Unicode()),
+                    (b"ip_family", amp.Unicode()),
+                    (b"ip", amp.Unicode()),
+                    (b"timestamp", amp.Integer()),
+                    (b"lease_time", amp.Integer(optional=True)),
+                    (b"hostname", amp.Unicode(optional=True)),
+                ]
+            ),
+        ),
+    ]
+    response = [
+        (
+            b"failures",
+            AmpList([(b"index", amp.Integer()), (b"error", amp.Unicode())]),
+        )
+    ]
+    errors = {NoSuchCluster: b"NoSuchCluster"}
+
+
 class UpdateServices(amp.Command):
     """Report service statuses that are monitored on the rackd.
 
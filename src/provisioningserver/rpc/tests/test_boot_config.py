@@ -0,0 +1,173 @@
+# Copyright 2020 Canonical Ltd.  This software is licensed under the
+# GNU Affero General Public License version 3 (see the file LICENSE).
+
+"""Tests for :py:module:`~provisioningserver.rpc.boot_config`."""
+
+__all__ = []
+
+from maastesting.factory import factory
+from maastesting.testcase import MAASTestCase
+from provisioningserver.kernel_opts import KernelParameters
+from provisioningserver.rpc.boot_config import (
+    BootConfigCache,
+    RenderedConfigCache,
+)
+from twisted.internet.task import Clock
+
+
+def make_params(mac=None):
+    return {
+        "system_id": factory.make_name("system_id"),
+        "local_ip": factory.make_ipv4_address(),
+        "remote_ip": factory.make_ipv4_address(),
+        "arch": "amd64",
+        "mac": mac,
+    }
+
+
+def make_response():
+    return {"purpose": factory.make_name("purpose")}
+
+
+def make_kernel_params():
+    return KernelParameters(
+        *(factory.make_name(field) for field in KernelParameters._fields)
+    )
+
+
+class TestBootConfigCache(MAASTestCase):
+    def setUp(self):
+        super(TestBootConfigCache, self).setUp()
+        self.clock = Clock()
+        self.cache = BootConfigCache(ttl=30, clock=self.clock)
+
+    def store(self, params, response):
+        self.cache.set(params, response, self.cache.generation)
+
+    def test_get_returns_none_when_not_cached(self):
+        self.assertIsNone(self.cache.get(make_params()))
+
+    def test_get_returns_copy_of_cached_response(self):
+        params, response = make_params(), make_response()
+        self.store(params, response)
+        cached = self.cache.get(params)
+        self.assertEqual(response, cached)
+        cached["purpose"] = "local"
+        self.assertEqual(response, self.cache.get(params))
+
+    def test_get_ignores_rack_system_id_and_mac_format(self):
+        mac = factory.make_mac_address(delimiter="-").upper()
+        params, response = make_params(mac), make_response()
+        self.store(params, response)
+        params["system_id"] = factory.make_name("system_id")
+        params["mac"] = mac.replace("-", ":").lower()
+        self.assertEqual(response, self.cache.get(params))
+
+    def test_get_returns_none_when_expired(self):
+        params = make_params()
+        self.store(params, make_response())
+        self.clock.advance(30)
+        self.assertIsNone(self.cache.get(params))
+
+    def test_set_ignores_response_from_before_invalidation(self):
+        params = make_params()
+        generation = self.cache.generation
+        self.cache.invalidate()
+        self.cache.set(params, make_response(), generation)
+        self.assertIsNone(self.cache.get(params))
+
+    def test_set_drops_expired_responses(self):
+        self.store(make_params(), make_response())
+        self.clock.advance(30)
+        self.store(make_params(), make_response())
+        self.assertEqual(1, len(self.cache._entries))
+
+    def test_invalidate_all(self):
+        params = make_params(factory.make_mac_address())
+        self.store(params, make_response())
+        self.cache.invalidate()
+        self.assertIsNone(self.cache.get(params))
+
+    def test_invalidate_macs(self):
+        mac = factory.make_mac_address()
+        params = make_params(mac)
+        params_other = make_params(factory.make_mac_address())
+        params_no_mac = make_params()
+        for each in params, params_other, params_no_mac:
+            self.store(each, make_response())
+        self.cache.invalidate([mac.upper()])
+        self.assertIsNone(self.cache.get(params))
+        self.assertIsNotNone(self.cache.get(params_other))
+        # Responses without a MAC can't be attributed to a machine.
+        self.assertIsNone(self.cache.get(params_no_mac))
+
+    def test_invalidate_invalidates_rendered_configs(self):
+        mac = factory.make_mac_address()
+        params = make_params(mac)
+        kernel_params = make_kernel_params()
+        self.cache.rendered.set("pxe", params, kernel_params, b"config")
+        self.cache.invalidate([mac])
+        self.assertIsNone(
+            self.cache.rendered.get("pxe", params, kernel_params)
+        )
+
+
+class TestRenderedConfigCache(MAASTestCase):
+    def test_get_returns_none_when_not_cached(self):
+        cache = RenderedConfigCache()
+        self.assertIsNone(
+            cache.get("pxe", make_params(), make_kernel_params())
+        )
+
+    def test_get_returns_cached_config(self):
+        cache = RenderedConfigCache()
+        params = make_params(factory.make_mac_address())
+        kernel_params = make_kernel_params()
+        cache.set("pxe", params, kernel_params, b"config")
+        self.assertEqual(b"config", cache.get("pxe", params, kernel_params))
+        params["mac"] = params["mac"].replace(":", "-").upper()
+        self.assertEqual(b"config", cache.get("pxe", params, kernel_params))
+
+    def test_get_depends_on_method_and_kernel_params(self):
+        cache = RenderedConfigCache()
+        params = make_params()
+        kernel_params = make_kernel_params()
+        cache.set("pxe", params, kernel_params, b"config")
+        self.assertIsNone(cache.get("ipxe", params, kernel_params))
+        self.assertIsNone(
+            cache.get("pxe", params, kernel_params(hostname="other"))
+        )
+
+    def test_set_drops_least_recently_used_config(self):
+        cache = RenderedConfigCache(size=2)
+        kernel_params = make_kernel_params()
+        params = [make_params() for _ in range(3)]
+        cache.set("pxe", params[0], kernel_params, b"0")
+        cache.set("pxe", params[1], kernel_params, b"1")
+        cache.get("pxe", params[0], kernel_params)
+        cache.set("pxe", params[2], kernel_params, b"2")
+        self.assertEqual(b"0", cache.get("pxe", params[0], kernel_params))
+        self.assertIsNone(cache.get("pxe", params[1], kernel_params))
+        self.assertEqual(b"2", cache.get("pxe", params[2], kernel_params))
+
+    def test_invalidate_all(self):
+        cache = RenderedConfigCache()
+        params = make_params(factory.make_mac_address())
+        kernel_params = make_kernel_params()
+        cache.set("pxe", params, kernel_params, b"config")
+        cache.invalidate()
+        self.assertIsNone(cache.get("pxe", params, kernel_params))
+
+    def test_invalidate_macs(self):
+        cache = RenderedConfigCache()
+        mac = factory.make_mac_address()
+        kernel_params = make_kernel_params()
+        params = make_params(mac)
+        params_other = make_params(factory.make_mac_address())
+        params_no_mac = make_params()
+        for each in params, params_other, params_no_mac:
+            cache.set("pxe", each, kernel_params, b"config")
+        cache.invalidate([mac.upper()])
+        self.assertIsNone(cache.get("pxe", params, kernel_params))
+        self.assertIsNotNone(cache.get("pxe", params_other, kernel_params))
+        self.assertIsNone(cache.get("pxe", params_no_mac, kernel_params))
@@ -4272,3 +4272,35 @@ class TestClusterProtocol_CheckIPs(MAASTestCaseThatWaitsForDeferredThreads):
                 }
             ),
         )
+
+
+class TestClusterProtocol_InvalidateBootConfigs(MAASTestCase):
+
+    run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
+
+    def test__is_registered(self):
+        protocol = Cluster()
+        responder = protocol.locateResponder(
+            cluster.InvalidateBootConfigs.commandName
+        )
+        self.assertIsNotNone(responder)
+
+    @inlineCallbacks
+    def test_invalidates_macs(self):
+        mock_invalidate = self.patch(
+            clusterservice.boot_config_cache, "invalidate"
+        )
+        macs = [factory.make_mac_address() for _ in range(3)]
+        response = yield call_responder(
+            Cluster(), cluster.InvalidateBootConfigs, {"macs": macs}
+        )
+        self.assertEqual({}, response)
+        self.assertThat(mock_invalidate, MockCalledOnceWith(macs))
+
+    @inlineCallbacks
+    def test_invalidates_all(self):
+        mock_invalidate = self.patch(
+            clusterservice.boot_config_cache, "invalidate"
+        )
+        yield call_responder(Cluster(), cluster.InvalidateBootConfigs, {})
+        self.assertThat(mock_invalidate, MockCalledOnceWith(None))
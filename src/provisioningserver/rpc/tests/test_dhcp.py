@@ -17,6 +17,8 @@ from maastesting.matchers import (
     MockNotCalled,
 )
 from maastesting.testcase import MAASTestCase, MAASTwistedRunTest
+from maastesting.twisted import TwistedLoggerFixture
+from provisioningserver.dhcp.omapi import make_host_name, OMAPIClient
 from provisioningserver.dhcp.testing.config import (
     DHCPConfigNameResolutionDisabled,
     fix_shared_networks_failover,
@@ -28,6 +30,7 @@ from provisioningserver.dhcp.testing.config import (
     make_shared_network,
     make_subnet_dhcp_snippets,
 )
+from provisioningserver.dhcp.testing.omapi import FakeOMAPIServer
 from provisioningserver.rpc import dhcp, exceptions
 from provisioningserver.utils.service_monitor import (
     SERVICE_STATE,
@@ -327,6 +330,31 @@ class TestDHCPState(MAASTestCase):
         )
         self.assertTrue(new_state.requires_restart(state))
 
+    def test_requires_restart_True_when_shared_network_interface_diff(self):
+        args = self.make_args()
+        state = dhcp.DHCPState(*args)
+        (
+            omapi_key,
+            failover_peers,
+            shared_networks,
+            hosts,
+            interfaces,
+            global_dhcp_snippets,
+        ) = copy.deepcopy(args)
+        shared_networks[0]["interface"] = factory.make_name("eth")
+        new_state = dhcp.DHCPState(
+            omapi_key,
+            failover_peers,
+            shared_networks,
+            hosts,
+            interfaces,
+            global_dhcp_snippets,
+        )
+        self.assertEqual(
+            ["shared networks changed: %s" % shared_networks[0]["name"]],
+            new_state.get_restart_reasons(state),
+        )
+
     def test_requires_restart_True_when_hosts_dhcp_snippets_diff(self):
         (
             omapi_key,
@@ -357,6 +385,71 @@ class TestDHCPState(MAASTestCase):
         )
         self.assertTrue(new_state.requires_restart(state))
 
+    def test_get_restart_reasons_ignores_comments_and_order(self):
+        args = self.make_args()
+        state = dhcp.DHCPState(*args)
+        (
+            omapi_key,
+            failover_peers,
+            shared_networks,
+            hosts,
+            interfaces,
+            global_dhcp_snippets,
+        ) = copy.deepcopy(args)
+        for dhcp_snippet in global_dhcp_snippets:
+            dhcp_snippet["description"] = factory.make_name("description")
+        for shared_network in shared_networks:
+            shared_network["mtu"] = None
+            shared_network["subnets"].reverse()
+            for subnet in shared_network["subnets"]:
+                subnet["pools"].reverse()
+                for dhcp_snippet in subnet["dhcp_snippets"]:
+                    dhcp_snippet["description"] = factory.make_name("desc")
+        for host in hosts:
+            host["host"] = factory.make_name("host")
+        new_state = dhcp.DHCPState(
+            omapi_key,
+            failover_peers,
+            shared_networks,
+            hosts,
+            interfaces,
+            global_dhcp_snippets,
+        )
+        self.assertEqual([], new_state.get_restart_reasons(state))
+        self.assertFalse(new_state.requires_restart(state))
+
+    def test_get_restart_reasons_describes_changes(self):
+        args = self.make_args()
+        state = dhcp.DHCPState(*args)
+        (
+            omapi_key,
+            failover_peers,
+            shared_networks,
+            hosts,
+            interfaces,
+            global_dhcp_snippets,
+        ) = copy.deepcopy(args)
+        shared_networks[0]["subnets"][0]["router_ip"] = factory.make_name(
+            "router"
+        )
+        hosts[0]["dhcp_snippets"] = make_host_dhcp_snippets(allow_empty=False)
+        new_state = dhcp.DHCPState(
+            factory.make_name("new_omapi_key"),
+            failover_peers,
+            shared_networks,
+            hosts,
+            interfaces,
+            global_dhcp_snippets,
+        )
+        self.assertEqual(
+            [
+                "OMAPI key changed",
+                "shared networks changed: %s" % shared_networks[0]["name"],
+                "DHCP snippets changed for hosts: %s" % hosts[0]["mac"],
+            ],
+            new_state.get_restart_reasons(state),
+        )
+
     def test_host_diff_returns_removal_added_and_modify(self):
         (
             omapi_key,
@@ -433,174 +526,166 @@ class TestDHCPState(MAASTestCase):
         )
 
 
-class TestRemoveHostMap(MAASTestCase):
-    def test_calls_omshell_remove(self):
-        omshell = Mock()
-        mac = factory.make_mac_address()
-        dhcp._remove_host_map(omshell, mac)
-        self.assertThat(omshell.remove, MockCalledOnceWith(mac))
+class TestGetOMAPISession(MAASTestCase):
+    def setUp(self):
+        super(TestGetOMAPISession, self).setUp()
+        self.addCleanup(dhcp._omapi_sessions.clear)
 
-    def test_raises_error_when_omshell_crashes(self):
-        error_message = factory.make_name("error").encode("ascii")
-        omshell = Mock()
-        omshell.remove.side_effect = ExternalProcessError(
-            returncode=2, cmd=("omshell",), output=error_message
-        )
-        mac = factory.make_mac_address()
-        with FakeLogger("maas.dhcp") as logger:
-            error = self.assertRaises(
-                exceptions.CannotRemoveHostMap,
-                dhcp._remove_host_map,
-                omshell,
-                mac,
-            )
-        # The CannotRemoveHostMap exception includes a message describing the
-        # problematic mapping.
-        self.assertDocTestMatches(
-            "Could not remove host map for %s: ..." % mac, str(error)
-        )
-        # A message is also written to the maas.dhcp logger that describes the
-        # problematic mapping.
-        self.assertDocTestMatches(
-            "Could not remove host map for %s: ..." % mac, logger.output
+    def test__creates_session_with_correct_arguments(self):
+        client = self.patch(dhcp, "OMAPIClient")
+        server = Mock()
+        server.ipv6 = factory.pick_bool()
+        session = dhcp._get_omapi_session(server)
+        self.assertIs(client.return_value, session)
+        self.assertThat(
+            client,
+            MockCalledOnceWith(
+                "127.0.0.1",
+                server.omapi_key,
+                port=7912 if server.ipv6 else 7911,
+            ),
         )
 
-    def test_raises_error_when_omshell_not_connected(self):
-        error = ExternalProcessError(returncode=2, cmd=("omshell",), output="")
-        self.patch(ExternalProcessError, "output_as_unicode", "not connected.")
-        omshell = Mock()
-        omshell.remove.side_effect = error
-        mac = factory.make_mac_address()
-        with FakeLogger("maas.dhcp") as logger:
-            error = self.assertRaises(
-                exceptions.CannotRemoveHostMap,
-                dhcp._remove_host_map,
-                omshell,
-                mac,
-            )
-        # The CannotCreateHostMap exception includes a message describing the
-        # problematic mapping.
-        self.assertDocTestMatches(
-            "Could not remove host map for %s: "
-            "The DHCP server could not be reached." % mac,
-            str(error),
-        )
-        # A message is also written to the maas.dhcp logger that describes the
-        # problematic mapping.
-        self.assertDocTestMatches(
-            "Could not remove host map for %s: "
-            "The DHCP server could not be reached." % mac,
-            logger.output,
-        )
+    def test__reuses_session(self):
+        client = self.patch(dhcp, "OMAPIClient")
+        client.return_value.shared_key = sentinel.omapi_key
+        server = Mock(omapi_key=sentinel.omapi_key)
+        session = dhcp._get_omapi_session(server)
+        self.assertIs(session, dhcp._get_omapi_session(server))
+        self.assertThat(client, MockCalledOnceWith(ANY, ANY, port=ANY))
 
+    def test__closes_session_when_key_changes(self):
+        client = self.patch(dhcp, "OMAPIClient")
+        client.side_effect = lambda address, key, port: Mock(shared_key=key)
+        server = Mock(omapi_key=sentinel.old_key)
+        old_session = dhcp._get_omapi_session(server)
+        server.omapi_key = sentinel.new_key
+        new_session = dhcp._get_omapi_session(server)
+        self.assertIsNot(old_session, new_session)
+        self.assertEqual(sentinel.new_key, new_session.shared_key)
+        self.assertThat(old_session.close, MockCalledOnceWith())
 
-class TestCreateHostMap(MAASTestCase):
-    def test_calls_omshell_create(self):
-        omshell = Mock()
-        mac = factory.make_mac_address()
-        ip = factory.make_ip_address()
-        dhcp._create_host_map(omshell, mac, ip)
-        self.assertThat(omshell.create, MockCalledOnceWith(ip, mac))
 
-    def test_raises_error_when_omshell_crashes(self):
-        error_message = factory.make_name("error").encode("ascii")
-        omshell = Mock()
-        omshell.create.side_effect = ExternalProcessError(
-            returncode=2, cmd=("omshell",), output=error_message
+class TestUpdateHosts(MAASTestCase):
+    def setUp(self):
+        super(TestUpdateHosts, self).setUp()
+        self.addCleanup(dhcp._omapi_sessions.clear)
+        self.omapi = self.useFixture(FakeOMAPIServer())
+        self.server = Mock(omapi_key=self.omapi.shared_key)
+        session = OMAPIClient(
+            self.omapi.address, self.omapi.shared_key, self.omapi.port
+        )
+        self.addCleanup(session.close)
+        dhcp._omapi_sessions[self.server.dhcp_service] = session
+
+    def add_host(self, host):
+        self.omapi.hosts[make_host_name(host["mac"]).decode("ascii")] = {
+            "mac": host["mac"],
+            "ip": host["ip"],
+        }
+
+    def test__does_nothing_without_changes(self):
+        dhcp._update_hosts(self.server, [], [], [])
+        self.assertEqual(0, self.omapi.connections)
+
+    def test__performs_operations(self):
+        remove_host = make_host()
+        add_host = make_host()
+        modify_host = make_host()
+        self.add_host(remove_host)
+        self.add_host(modify_host)
+        modify_host["ip"] = factory.make_ipv4_address()
+        dhcp._update_hosts(
+            self.server, [remove_host], [add_host], [modify_host]
         )
-        mac = factory.make_mac_address()
-        ip = factory.make_ip_address()
+        self.assertEqual(
+            {
+                make_host_name(add_host["mac"]).decode("ascii"): {
+                    "mac": add_host["mac"],
+                    "ip": add_host["ip"],
+                },
+                make_host_name(modify_host["mac"]).decode("ascii"): {
+                    "mac": modify_host["mac"],
+                    "ip": modify_host["ip"],
+                },
+            },
+            self.omapi.hosts,
+        )
+
+    def test__reuses_session(self):
+        dhcp._update_hosts(self.server, [], [make_host()], [])
+        dhcp._update_hosts(self.server, [], [make_host()], [])
+        self.assertEqual(1, self.omapi.connections)
+        self.assertEqual(2, len(self.omapi.hosts))
+
+    def test__reconnects_after_dhcp_server_restart(self):
+        dhcp._update_hosts(self.server, [], [make_host()], [])
+        self.omapi.disconnect()
+        dhcp._update_hosts(self.server, [], [make_host()], [])
+        self.assertEqual(2, self.omapi.connections)
+        self.assertEqual(2, len(self.omapi.hosts))
+
+    def test__raises_error_when_host_cannot_be_modified(self):
+        host = make_host()
         with FakeLogger("maas.dhcp") as logger:
             error = self.assertRaises(
-                exceptions.CannotCreateHostMap,
-                dhcp._create_host_map,
-                omshell,
-                mac,
-                ip,
+                exceptions.CannotModifyHostMap,
+                dhcp._update_hosts,
+                self.server,
+                [],
+                [],
+                [host],
             )
-        # The CannotCreateHostMap exception includes a message describing the
+        # The CannotModifyHostMap exception includes a message describing the
         # problematic mapping.
         self.assertDocTestMatches(
-            "Could not create host map for %s -> %s: ..." % (mac, ip),
+            "Could not modify host map for %s -> %s: ..."
+            % (host["mac"], host["ip"]),
             str(error),
         )
         # A message is also written to the maas.dhcp logger that describes the
         # problematic mapping.
         self.assertDocTestMatches(
-            "Could not create host map for %s -> %s: ..." % (mac, ip),
+            "Could not modify host map for %s -> %s: ..."
+            % (host["mac"], host["ip"]),
             logger.output,
         )
 
-    def test_raises_error_when_omshell_not_connected(self):
-        error = ExternalProcessError(returncode=2, cmd=("omshell",), output="")
-        self.patch(ExternalProcessError, "output_as_unicode", "not connected.")
-        omshell = Mock()
-        omshell.create.side_effect = error
-        mac = factory.make_mac_address()
-        ip = factory.make_ip_address()
+    def test__raises_error_when_not_connected(self):
+        omapi = FakeOMAPIServer(self.server.omapi_key)
+        with omapi:
+            pass
+        dhcp._omapi_sessions[self.server.dhcp_service] = OMAPIClient(
+            omapi.address, omapi.shared_key, omapi.port
+        )
+        host = make_host()
         with FakeLogger("maas.dhcp") as logger:
             error = self.assertRaises(
                 exceptions.CannotCreateHostMap,
-                dhcp._create_host_map,
-                omshell,
-                mac,
-                ip,
+                dhcp._update_hosts,
+                self.server,
+                [],
+                [host],
+                [],
             )
         # The CannotCreateHostMap exception includes a message describing the
         # problematic mapping.
         self.assertDocTestMatches(
             "Could not create host map for %s -> %s: "
-            "The DHCP server could not be reached." % (mac, ip),
+            "The DHCP server could not be reached."
+            % (host["mac"], host["ip"]),
             str(error),
         )
         # A message is also written to the maas.dhcp logger that describes the
         # problematic mapping.
         self.assertDocTestMatches(
             "Could not create host map for %s -> %s: "
-            "The DHCP server could not be reached." % (mac, ip),
+            "The DHCP server could not be reached."
+            % (host["mac"], host["ip"]),
             logger.output,
         )
 
 
-class TestUpdateHost(MAASTestCase):
-    def test__creates_omshell_with_correct_arguments(self):
-        omshell = self.patch(dhcp, "Omshell")
-        server = Mock()
-        server.ipv6 = factory.pick_bool()
-        dhcp._update_hosts(server, [], [], [])
-        self.assertThat(
-            omshell,
-            MockCallsMatch(
-                call(
-                    ipv6=server.ipv6,
-                    server_address="127.0.0.1",
-                    shared_key=server.omapi_key,
-                )
-            ),
-        )
-
-    def test__performs_operations(self):
-        omshell = Mock()
-        self.patch(dhcp, "Omshell").return_value = omshell
-        remove_host = make_host()
-        add_host = make_host()
-        modify_host = make_host()
-        server = Mock()
-        server.ipv6 = factory.pick_bool()
-        dhcp._update_hosts(server, [remove_host], [add_host], [modify_host])
-        self.assertThat(
-            omshell.remove, MockCallsMatch(call(remove_host["mac"]))
-        )
-        self.assertThat(
-            omshell.create,
-            MockCallsMatch(call(add_host["ip"], add_host["mac"])),
-        )
-        self.assertThat(
-            omshell.modify,
-            MockCallsMatch(call(modify_host["ip"], modify_host["mac"])),
-        )
-
-
 class TestConfigureDHCP(MAASTestCase):
 
     run_tests_with = MAASTwistedRunTest.make_factory(timeout=5)
@@ -846,6 +931,44 @@ class TestConfigureDHCP(MAASTestCase):
             ),
         )
 
+    @inlineCallbacks
+    def test__logs_why_it_restarts(self):
+        self.patch_sudo_write_file()
+        self.patch_restartService()
+        self.patch_get_config().return_value = factory.make_name("config")
+        dhcp_service = dhcp.service_monitor.getServiceByName(
+            self.server.dhcp_service
+        )
+        self.patch_autospec(dhcp_service, "on")
+
+        shared_network = make_shared_network()
+        host = make_host()
+        interface = make_interface()
+        dhcp._current_server_state[self.server.dhcp_service] = dhcp.DHCPState(
+            factory.make_name("omapi_key"),
+            [],
+            [shared_network],
+            [host],
+            [interface],
+            [],
+        )
+
+        with TwistedLoggerFixture() as logger:
+            yield self.configure(
+                factory.make_name("omapi_key"),
+                [],
+                [shared_network],
+                [host],
+                [interface],
+                [],
+            )
+
+        self.assertIn(
+            "Restarting %s service; OMAPI key changed."
+            % self.server.descriptive_name,
+            logger.messages,
+        )
+
     @inlineCallbacks
     def test__writes_config_and_calls_ensure_when_nothing_changed(self):
         write_file = self.patch_sudo_write_file()
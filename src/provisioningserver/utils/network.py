@@ -19,8 +19,10 @@ __all__ = [
     "ip_range_within_network",
 ]
 
+from bisect import bisect_right
 import codecs
 from collections import namedtuple
+import heapq
 from operator import attrgetter
 import random
 import re
@@ -151,6 +153,22 @@ class MAASIPRange(IPRange):
         return json
 
 
+def _make_maasiprange(first: int, last: int, version: int, purpose):
+    """Returns a `MAASIPRange` from `first` to `last` (inclusive) of the
+    given IP `version`.
+
+    Unlike `make_iprange`, this does not round-trip through strings, and
+    keeps the version of IPv6 addresses with small values.
+    """
+    return MAASIPRange(
+        IPAddress(first, version), IPAddress(last, version), purpose=purpose
+    )
+
+
+def _iprange_sort_key(iprange: MAASIPRange):
+    return iprange.first, iprange.last
+
+
 def _combine_overlapping_maasipranges(
     ranges: Iterable[MAASIPRange],
 ) -> List[MAASIPRange]:
@@ -161,23 +179,24 @@ def _combine_overlapping_maasipranges(
     range.
     """
     new_ranges = []
-    previous_min = None
-    previous_max = None
+    previous = None
     for item in ranges:
-        if previous_min is not None and previous_max is not None:
-            # Check for an overlapping range.
-            min_overlaps = previous_min <= item.first <= previous_max
-            max_overlaps = previous_min <= item.last <= previous_max
-            if min_overlaps or max_overlaps:
-                previous = new_ranges.pop()
-                item = make_iprange(
-                    min(item.first, previous_min),
-                    max(item.last, previous_max),
+        if previous is not None and item.first <= previous.last:
+            # Overlapping range; the ranges are sorted by their first
+            # address, so this one starts within the previous one.
+            if item.last > previous.last or not (
+                item.purpose <= previous.purpose
+            ):
+                previous = _make_maasiprange(
+                    previous.first,
+                    max(item.last, previous.last),
+                    previous.version,
                     previous.purpose | item.purpose,
                 )
-        previous_min = item.first
-        previous_max = item.last
-        new_ranges.append(item)
+                new_ranges[-1] = previous
+        else:
+            previous = item
+            new_ranges.append(item)
     return new_ranges
 
 
@@ -190,24 +209,27 @@ def _coalesce_adjacent_purposes(
     list where any adjacent ranges with identical purposes have been combined
     into a single range.
     """
-    new_ranges = []
-    previous_first = None
-    previous_last = None
-    previous_purpose = None
+    # Runs of adjacent ranges are combined in one go, rather than creating a
+    # new range for each of their members.
+    runs = []
     for item in ranges:
-        if previous_purpose is not None and previous_last is not None:
-            adjacent_and_identical = (
-                item.first == (previous_last + 1)
-                and item.purpose == previous_purpose
-            )
-            if adjacent_and_identical:
-                new_ranges.pop()
-                item = make_iprange(previous_first, item.last, item.purpose)
-        previous_first = item.first
-        previous_last = item.last
-        previous_purpose = item.purpose
-        new_ranges.append(item)
-    return new_ranges
+        if runs:
+            previous = runs[-1][-1]
+            if (
+                item.first == previous.last + 1
+                and item.purpose == previous.purpose
+            ):
+                runs[-1].append(item)
+                continue
+        runs.append([item])
+    return [
+        run[0]
+        if len(run) == 1
+        else _make_maasiprange(
+            run[0].first, run[-1].last, run[0].version, run[0].purpose
+        )
+        for run in runs
+    ]
 
 
 def _normalize_ipranges(ranges: Iterable) -> List[MAASIPRange]:
@@ -220,7 +242,7 @@ def _normalize_ipranges(ranges: Iterable) -> List[MAASIPRange]:
         if not isinstance(item, MAASIPRange):
             item = MAASIPRange(item)
         new_ranges.append(item)
-    return sorted(new_ranges)
+    return sorted(new_ranges, key=_iprange_sort_key)
 
 
 class IPRangeStatistics:
@@ -396,27 +418,46 @@ class IPRangeStatistics:
 
 
 class MAASIPSet(set):
+    """A set of `MAASIPRange` objects.
+
+    The ranges are kept condensed, as a list sorted by their first address
+    in which no two ranges overlap, so that looking up the range holding an
+    address is a binary search.
+    """
+
     def __init__(self, ranges, cidr=None):
         self.cidr = cidr
         self.ranges = ranges
         self._condense()
-        super().__init__(set(self.ranges))
+        super().__init__(self.ranges)
 
-    def _condense(self):
+    def _condense(self, presorted=False):
         """Condenses the `ranges` ivar in this `MAASIPSet` by:
 
         (1) Ensuring range set is is sorted list of MAASIPRange objects.
         (2) De-duplicate set by combining overlapping IP ranges.
         (3) Combining adjacent ranges with an identical purpose.
+
+        :param presorted: If True, `ranges` is already a sorted list of
+            `MAASIPRange` objects.
         """
-        self.ranges = _normalize_ipranges(self.ranges)
+        if not presorted:
+            self.ranges = _normalize_ipranges(self.ranges)
         self.ranges = _combine_overlapping_maasipranges(self.ranges)
         self.ranges = _coalesce_adjacent_purposes(self.ranges)
+        self._firsts = [item.first for item in self.ranges]
 
     def __ior__(self, other):
         """Return self |= other."""
-        self.ranges.extend(list(other.ranges))
-        self._condense()
+        if isinstance(other, MAASIPSet):
+            # Both are sorted already, so merge rather than sort again.
+            self.ranges = list(
+                heapq.merge(self.ranges, other.ranges, key=_iprange_sort_key)
+            )
+            self._condense(presorted=True)
+        else:
+            self.ranges.extend(list(other.ranges))
+            self._condense()
         # Replace the underlying set with the new ranges.
         super().clear()
         super().__ior__(set(self.ranges))
@@ -430,18 +471,16 @@ class MAASIPSet(set):
         within that range.)
         """
         if isinstance(search, IPRange):
-            for item in self.ranges:
-                if (
-                    item.first <= search.first <= item.last
-                    and item.first <= search.last <= item.last
-                ):
-                    return item
+            first, last = search.first, search.last
         else:
-            addr = IPAddress(search)
-            addr = int(addr)
-            for item in self.ranges:
-                if item.first <= addr <= item.last:
-                    return item
+            first = last = int(IPAddress(search))
+        # The only range that can hold `first` is the last one that starts
+        # at or before it.
+        index = bisect_right(self._firsts, first) - 1
+        if index >= 0:
+            item = self.ranges[index]
+            if first <= item.last and last <= item.last:
+                return item
         return None
 
     @property
@@ -573,7 +612,12 @@ class MAASIPSet(set):
             # range.
             if candidate_end - candidate_start >= 0:
                 unused_ranges.append(
-                    make_iprange(candidate_start, candidate_end, purpose)
+                    _make_maasiprange(
+                        candidate_start,
+                        candidate_end,
+                        outer_range.version,
+                        purpose,
+                    )
                 )
             candidate_start = used_range.last + 1
         # Skip the broadcast address, if this is an IPv4 network
@@ -589,7 +633,12 @@ class MAASIPSet(set):
         # of the range we're checking against.
         if candidate_end - candidate_start >= 0:
             unused_ranges.append(
-                make_iprange(candidate_start, candidate_end, purpose)
+                _make_maasiprange(
+                    candidate_start,
+                    candidate_end,
+                    outer_range.version,
+                    purpose,
+                )
             )
         return MAASIPSet(unused_ranges)
 
@@ -911,6 +911,40 @@ class TestMAASIPSet(MAASTestCase):
         self.assertThat(str(IPAddress(s1.first)), Equals("10.0.0.1"))
         self.assertThat(str(IPAddress(s1.last)), Equals("10.0.0.8"))
 
+    def test__ior_combines_overlapping_ranges_purposes(self):
+        s1 = MAASIPSet([make_iprange("10.0.0.1", "10.0.0.10", purpose="foo")])
+        s2 = MAASIPSet([make_iprange("10.0.0.5", "10.0.0.20", purpose="bar")])
+        s1 |= s2
+        self.assertThat(s1.ranges, HasLength(1))
+        self.assertThat(str(IPAddress(s1.first)), Equals("10.0.0.1"))
+        self.assertThat(str(IPAddress(s1.last)), Equals("10.0.0.20"))
+        self.assertThat(s1.find("10.0.0.15").purpose, Equals({"foo", "bar"}))
+
+    def test__find_in_many_ranges(self):
+        s = MAASIPSet(
+            [
+                make_iprange("10.0.%d.1" % octet, "10.0.%d.100" % octet)
+                for octet in range(200)
+            ]
+        )
+        self.assertThat(s.ranges, HasLength(200))
+        found = s.find("10.0.150.50")
+        self.assertThat(str(IPAddress(found.first)), Equals("10.0.150.1"))
+        self.assertThat(str(IPAddress(found.last)), Equals("10.0.150.100"))
+        self.assertThat(s.find("10.0.150.101"), Is(None))
+        self.assertThat(s.find("10.0.0.0"), Is(None))
+        self.assertThat(s.find("10.0.199.100"), Not(Is(None)))
+        self.assertThat(s.find("10.0.200.1"), Is(None))
+        self.assertThat(s, Contains(IPRange("10.0.150.1", "10.0.150.100")))
+        self.assertThat(s, Not(Contains(IPRange("10.0.150.1", "10.0.151.1"))))
+
+    def test__keeps_ipv6_version_of_low_addresses(self):
+        s = MAASIPSet([make_iprange("::1", "::10", purpose="foo")])
+        unused = s.get_unused_ranges("::/120")
+        for item in unused.ranges:
+            self.assertThat(item.version, Equals(6))
+        self.assertThat(unused, Contains("::11"))
+
 
 class TestIPRangeStatistics(MAASTestCase):
     def test__statistics_are_accurate(self):